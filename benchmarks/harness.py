@@ -0,0 +1,131 @@
+"""
+Benchmark Harness
+
+Drives an async operation at a fixed concurrency and reports throughput, latency percentiles and memory.
+"""
+import asyncio
+import math
+import os
+import resource
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+def rss_mb() -> float:
+    """Current resident set size of the process in MB"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of the process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(q * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+async def run_scenario(name: str, operation: Callable[[int], Awaitable[Any]], concurrency: int,
+                       requests: int, warmup: int = 0,
+                       round_trips: Optional[Callable[[], int]] = None) -> Dict[str, Any]:
+    """
+    Run an operation requests times from concurrency workers
+
+    Args:
+        name (str): Scenario name shown in the report
+        operation (Callable[[int], Awaitable]): Called with the request number, a raised exception counts as an error
+        concurrency (int): Number of concurrent workers
+        requests (int): Total number of measured calls
+        warmup (int): Unmeasured calls made before the run
+        round_trips (Callable[[], int], optional): Database round trips made so far, reported per measured call
+
+    Returns:
+        Dict[str, Any]: Throughput, latency percentiles in milliseconds, error count and memory
+    """
+    for i in range(warmup):
+        await operation(i)
+
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    next_request = iter(range(requests))
+    rss_before = rss_mb()
+
+    async def worker():
+        for i in next_request:
+            started = time.perf_counter()
+            try:
+                await operation(i)
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    round_trips_before = round_trips() if round_trips else 0
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    result = {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "max_ms": round(latencies[-1], 3) if latencies else 0.0,
+        "rss_mb": round(rss_mb(), 1),
+        "rss_delta_mb": round(rss_mb() - rss_before, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    if round_trips and requests:
+        result["round_trips"] = round((round_trips() - round_trips_before) / requests, 2)
+    return result
+
+
+def render_table(columns, rows: List[List[str]]) -> str:
+    """Render rows of strings as a fixed-width text table"""
+    widths = [max([len(c)] + [len(row[i]) for row in rows]) for i, c in enumerate(columns)]
+    lines = ["  ".join(c.ljust(w) for c, w in zip(columns, widths)),
+             "  ".join("-" * w for w in widths)]
+    lines.extend("  ".join(v.ljust(w) for v, w in zip(row, widths)) for row in rows)
+    return "\n".join(lines)
+
+
+def format_table(results: List[Dict[str, Any]]) -> str:
+    """Render results as a fixed-width text table"""
+    columns = ("server", "scenario", "concurrency", "throughput_rps", "p50_ms", "p95_ms", "p99_ms", "max_ms",
+               "errors", "round_trips", "rss_mb", "peak_rss_mb")
+    return render_table(columns, [[str(sum(r[c].values()) if c == "errors" else r.get(c, "")) for c in columns]
+                                  for r in results])
+
+
+def compare(before: List[Dict[str, Any]], after: List[Dict[str, Any]]) -> str:
+    """Render the throughput and tail latency change of every scenario present in both runs"""
+    key = lambda r: (r.get("server"), r["scenario"], r["concurrency"])
+    change = lambda old, new: f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+    baseline = {key(r): r for r in before}
+    columns = ("server", "scenario", "concurrency", "rps_before", "rps_after", "rps_change",
+               "p99_before", "p99_after", "p99_change")
+    rows = []
+    for r in after:
+        b = baseline.get(key(r))
+        if b is None:
+            continue
+        rows.append([str(r.get("server")), r["scenario"], str(r["concurrency"]),
+                     str(b["throughput_rps"]), str(r["throughput_rps"]), change(b["throughput_rps"], r["throughput_rps"]),
+                     str(b["p99_ms"]), str(r["p99_ms"]), change(b["p99_ms"], r["p99_ms"])])
+    return render_table(columns, rows)
@@ -0,0 +1,308 @@
+"""
+MCP Load Generator
+
+Calls the tools of a server's FastMCP app through the in-memory transport (fastmcp.Client(mcp)) at a
+target rate, so FastMCP dispatch, argument validation and result serialisation are measured together
+with the server code. The database is a local stand-in, see standins.py.
+
+Calls are scheduled open loop: call n starts at n / rps seconds whether or not earlier calls finished,
+and its latency is measured from that scheduled time, so a stalled server shows up as latency instead
+of as a lower request rate.
+
+Usage:
+    python benchmarks/loadgen.py benchmarks/profiles/mysql_mixed.yaml
+    python benchmarks/loadgen.py benchmarks/profiles/redis_mixed.json --rps 500 --duration 60
+    python benchmarks/loadgen.py benchmarks/profiles/mysql_mixed.yaml --server oceanbase --output ob.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+from typing import Any, Dict, List, Optional
+
+BENCHMARKS_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS_PATH)
+
+from harness import percentile, render_table, rss_mb
+from run import SERVERS, add_standin_arguments, prepare_server
+
+# Interval of the event-loop lag probe in seconds
+LAG_PROBE_INTERVAL = 0.01
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Drive the MCP tools of a server at a target request rate")
+    parser.add_argument("profile", help="YAML or JSON workload profile")
+    parser.add_argument("--server", choices=list(SERVERS), help="overrides the server of the profile")
+    parser.add_argument("--rps", type=float, help="overrides the target calls per second of the profile")
+    parser.add_argument("--duration", type=float, help="overrides the measured seconds of the profile")
+    parser.add_argument("--max-in-flight", type=int, help="overrides the in-flight call limit of the profile")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the weighted tool choice")
+    add_standin_arguments(parser)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def load_profile(path: str) -> Dict[str, Any]:
+    """
+    Load a workload profile
+
+    A profile names the server, the load and a weighted mix of tool calls:
+
+        server: mysql
+        rps: 200            # target calls per second
+        duration: 30        # measured seconds
+        warmup: 20          # unmeasured calls made first
+        max_in_flight: 256  # calls beyond this many outstanding are dropped and counted
+        tools:
+          - tool: sql_exec
+            name: point_select  # reported name, defaults to the tool name
+            weight: 8
+            arguments: {sql: "SELECT * FROM bench_items WHERE id = %s", params: ["{id}"]}
+
+    In string arguments "{n}" is replaced by the call number and "{id}" by a row id of the seeded table.
+    A value that is exactly "{n}" or "{id}" becomes an integer.
+    """
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+            profile = yaml.safe_load(f)
+        else:
+            profile = json.load(f)
+    if not profile.get("tools"):
+        raise ValueError(f"Profile {path} defines no tools")
+    names = set()
+    for i, entry in enumerate(profile["tools"]):
+        if "tool" not in entry:
+            raise ValueError(f"Profile {path} has a tools entry without a tool name: {entry}")
+        entry.setdefault("name", entry["tool"] if entry["tool"] not in names else f"{entry['tool']}#{i + 1}")
+        entry.setdefault("weight", 1)
+        entry.setdefault("arguments", {})
+        names.add(entry["name"])
+    return profile
+
+
+def render_arguments(value: Any, n: int, rows: int) -> Any:
+    """Substitute the {n} and {id} placeholders of a profile argument"""
+    if isinstance(value, str):
+        row_id = n % rows + 1
+        if value == "{n}":
+            return n
+        if value == "{id}":
+            return row_id
+        return value.replace("{n}", str(n)).replace("{id}", str(row_id))
+    if isinstance(value, list):
+        return [render_arguments(v, n, rows) for v in value]
+    if isinstance(value, dict):
+        return {k: render_arguments(v, n, rows) for k, v in value.items()}
+    return value
+
+
+def tool_error(result) -> Optional[str]:
+    """
+    Error of a tool call result, None on success
+
+    Tools report failures either as MCP errors or as a {"success": false, "error": ...} payload.
+    """
+    if result.isError:
+        return "tool_error"
+    payload = result.structuredContent
+    if payload is None and result.content and getattr(result.content[0], "text", "").startswith("{"):
+        try:
+            payload = json.loads(result.content[0].text)
+        except ValueError:
+            return None
+    if isinstance(payload, dict) and payload.get("success") is False:
+        return "failed"
+    return None
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes a sleeping task, the time other tasks held the loop"""
+
+    def __init__(self, interval: float = LAG_PROBE_INTERVAL):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _probe(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(loop.time() - started - self.interval, 0.0) * 1000)
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._probe())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def summary(self) -> Dict[str, float]:
+        lags = sorted(self.samples)
+        return {
+            "loop_lag_p50_ms": round(percentile(lags, 0.50), 3),
+            "loop_lag_p99_ms": round(percentile(lags, 0.99), 3),
+            "loop_lag_max_ms": round(lags[-1], 3) if lags else 0.0,
+        }
+
+
+class ToolStats:
+    """Latencies and outcomes of the calls of one profile entry"""
+
+    def __init__(self, name: str, tool: str):
+        self.name = name
+        self.tool = tool
+        self.latencies: List[float] = []
+        self.errors: Dict[str, int] = {}
+        self.dropped = 0
+
+    def add_error(self, kind: str):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        errors = sum(self.errors.values())
+        calls = len(latencies) + errors
+        return {
+            "name": self.name,
+            "tool": self.tool,
+            "calls": calls,
+            "throughput_rps": round(calls / elapsed, 1) if elapsed else 0.0,
+            "p50_ms": round(percentile(latencies, 0.50), 3),
+            "p95_ms": round(percentile(latencies, 0.95), 3),
+            "p99_ms": round(percentile(latencies, 0.99), 3),
+            "max_ms": round(latencies[-1], 3) if latencies else 0.0,
+            "errors": self.errors,
+            "error_rate": round(errors / calls, 4) if calls else 0.0,
+            "dropped": self.dropped,
+        }
+
+
+async def generate_load(client, profile: Dict[str, Any], rows: int, seed: int = 0) -> Dict[str, Any]:
+    """
+    Call the profile's tool mix at its target rate
+
+    Args:
+        client: Connected fastmcp.Client
+        profile (dict): Loaded profile, see load_profile
+        rows (int): Rows of the seeded table, the range of the {id} placeholder
+        seed (int): Seed of the weighted tool choice
+
+    Returns:
+        Dict[str, Any]: Target and achieved rate, per-tool results and event-loop lag
+    """
+    mix = profile["tools"]
+    weights = [entry["weight"] for entry in mix]
+    rps = float(profile.get("rps", 100))
+    duration = float(profile.get("duration", 10))
+    max_in_flight = int(profile.get("max_in_flight", 256))
+    chooser = random.Random(seed)
+    stats = {entry["name"]: ToolStats(entry["name"], entry["tool"]) for entry in mix}
+
+    for n in range(int(profile.get("warmup", 0))):
+        entry = mix[n % len(mix)]
+        await client.call_tool_mcp(entry["tool"], render_arguments(entry["arguments"], n, rows))
+
+    loop = asyncio.get_running_loop()
+    in_flight = set()
+
+    async def call(entry: Dict[str, Any], n: int, scheduled: float):
+        tool_stats = stats[entry["name"]]
+        try:
+            result = await client.call_tool_mcp(entry["tool"], render_arguments(entry["arguments"], n, rows))
+        except Exception as e:
+            tool_stats.add_error(type(e).__name__)
+            return
+        error = tool_error(result)
+        if error:
+            tool_stats.add_error(error)
+        else:
+            tool_stats.latencies.append((loop.time() - scheduled) * 1000)
+
+    monitor = LoopLagMonitor()
+    monitor.start()
+    rss_before = rss_mb()
+    started = loop.time()
+    n = 0
+    while n / rps < duration:
+        scheduled = started + n / rps
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        entry = chooser.choices(mix, weights)[0]
+        if len(in_flight) >= max_in_flight:
+            stats[entry["name"]].dropped += 1
+        else:
+            task = asyncio.ensure_future(call(entry, n, scheduled))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        n += 1
+    scheduling_done = loop.time()
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    elapsed = loop.time() - started
+    await monitor.stop()
+
+    tools = [s.summary(elapsed) for s in stats.values()]
+    completed = sum(t["calls"] for t in tools)
+    return {
+        "target_rps": rps,
+        "achieved_rps": round(completed / elapsed, 1) if elapsed else 0.0,
+        "scheduled": n,
+        "drain_s": round(elapsed - (scheduling_done - started), 3),
+        "tools": tools,
+        **monitor.summary(),
+        "rss_mb": round(rss_mb(), 1),
+        "rss_delta_mb": round(rss_mb() - rss_before, 1),
+    }
+
+
+def format_report(server: str, report: Dict[str, Any]) -> str:
+    columns = ("name", "tool", "calls", "throughput_rps", "p50_ms", "p95_ms", "p99_ms", "max_ms", "error_rate", "dropped")
+    table = render_table(columns, [[str(t[c]) for c in columns] for t in report["tools"]])
+    return "\n".join([
+        f"{server}: target {report['target_rps']} rps, achieved {report['achieved_rps']} rps, "
+        f"{report['scheduled']} calls scheduled, drained in {report['drain_s']} s",
+        f"event-loop lag p50 {report['loop_lag_p50_ms']} ms, p99 {report['loop_lag_p99_ms']} ms, "
+        f"max {report['loop_lag_max_ms']} ms, RSS {report['rss_mb']} MB",
+        table,
+    ])
+
+
+async def run(args) -> Dict[str, Any]:
+    profile = load_profile(args.profile)
+    for key in ("server", "rps", "duration", "max_in_flight"):
+        if getattr(args, key) is not None:
+            profile[key] = getattr(args, key)
+    server = profile.get("server")
+    if server not in SERVERS:
+        raise ValueError(f"Unknown server '{server}', expected one of {', '.join(SERVERS)}")
+
+    prepare_server(args, server)
+    from fastmcp import Client
+    from src.server import mcp
+
+    async with Client(mcp) as client:
+        report = await generate_load(client, profile, args.rows, args.seed)
+    report["server"] = server
+    return report
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    print(format_report(report["server"], report))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+Benchmark Runner
+
+Drives the real execute_sql / execute_command, generate_test_data and resource functions of each
+server against local stand-ins (see standins.py) and reports throughput, latency percentiles and RSS.
+
+Every server package imports itself as "src", so each server runs in its own child process.
+
+Usage:
+    python benchmarks/run.py                                   # all servers, default settings
+    python benchmarks/run.py --server mysql --concurrency 1,16,64 --requests 5000
+    python benchmarks/run.py --server postgresql --page-rows 1000 --row-bytes 512 --latency-ms 1
+    python benchmarks/run.py --output before.json              # save results
+    python benchmarks/run.py --compare before.json after.json  # throughput and p99 change per scenario
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Any, Callable, Dict, List, Tuple
+
+BENCHMARKS_PATH = os.path.dirname(os.path.abspath(__file__))
+REPO_PATH = os.path.dirname(BENCHMARKS_PATH)
+sys.path.insert(0, BENCHMARKS_PATH)
+
+from harness import compare, format_table, run_scenario
+
+# Server name -> (package directory, backend kind)
+SERVERS = {
+    "mysql": ("mysql_mcp_server", "mysql"),
+    "oceanbase": ("oceanbase_mcp_server", "mysql"),
+    "postgresql": ("postgresql_mcp_server", "postgresql"),
+    "multidb": ("multidb_mcp_client", "multidb"),
+    "redis": ("redis_mcp_server", "redis"),
+}
+
+# Options forwarded from the parent to each child process
+CHILD_OPTIONS = ("scenarios", "concurrency", "requests", "warmup", "rows", "page_rows", "row_bytes", "batch",
+                 "latency_ms", "pool_size", "max_overflow", "cost_guard", "extra_tables", "log_level")
+
+# Stand-in database of the server under test, None for redis
+standin_database = None
+
+BENCH_TABLE = "bench_items"
+WRITE_TABLE = "bench_writes"
+
+
+def add_standin_arguments(parser: argparse.ArgumentParser):
+    """Options of the stand-in database and of the generated server configuration"""
+    parser.add_argument("--rows", type=int, default=10000, help="rows seeded into the benchmark table")
+    parser.add_argument("--row-bytes", type=int, default=128, help="size of the payload column of each row")
+    parser.add_argument("--extra-tables", type=int, default=0,
+                        help="empty tables created besides the benchmark tables, listed by database://tables")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated round trip per statement")
+    parser.add_argument("--pool-size", type=int, default=5, help="dbPoolSize / redisPoolSize")
+    parser.add_argument("--max-overflow", type=int, default=10, help="dbMaxOverflow, redisMaxConnections is size + overflow")
+    parser.add_argument("--cost-guard", default="off", choices=("off", "reject", "limit"),
+                        help="dbCostGuard of the SQL servers, EXPLAIN pre-flight of every query")
+    parser.add_argument("--log-level", default="WARNING", help="logLevel of the servers under test")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the MCP database servers against local stand-ins")
+    parser.add_argument("--server", default="all", help=f"all or a comma separated list of {', '.join(SERVERS)}")
+    parser.add_argument("--scenarios", default="all", help="all or a comma separated list of scenario names")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=2000, help="measured calls per scenario and concurrency")
+    parser.add_argument("--warmup", type=int, default=50, help="unmeasured calls before each scenario")
+    parser.add_argument("--page-rows", type=int, default=100, help="rows returned by the range_select scenario")
+    parser.add_argument("--batch", type=int, default=10, help="rows generated per generate_test_data call")
+    parser.add_argument("--server-timeout", type=float, default=1800,
+                        help="seconds one server's benchmark may run before it is stopped and skipped")
+    add_standin_arguments(parser)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two saved result files")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def write_config(args, kind: str, directory: str, multidb_url: str = "") -> str:
+    """Write the dbconfig.json of the server under test and return its path"""
+    log_path = os.path.join(directory, "logs")
+    os.makedirs(log_path, exist_ok=True)
+    common = {"logPath": log_path, "logLevel": args.log_level}
+    if kind == "redis":
+        config = {
+            "redisPoolSize": args.pool_size,
+            "redisMaxConnections": args.pool_size + args.max_overflow,
+            "redisConnectionTimeout": 5,
+            "healthCheckInterval": 0,
+            "redisList": [{
+                "redisInstanceId": "bench", "redisType": "single", "redisHost": "127.0.0.1",
+                "redisPort": 6379, "redisDatabase": 0, "dbActive": True,
+            }],
+        }
+    else:
+        config = {
+            "dbPoolSize": args.pool_size,
+            "dbMaxOverflow": args.max_overflow,
+            "dbPoolTimeout": 30,
+            "dbCostGuard": args.cost_guard,
+            "dbList": [{
+                "dbInstanceId": "bench", "dbHost": "127.0.0.1", "dbPort": 3306, "dbDatabase": "bench",
+                "dbUsername": "bench", "dbPassword": "bench", "dbType": "MySQL", "dbVersion": "8.0", "dbActive": True,
+            }],
+        }
+        if kind == "multidb":
+            config["multiDBServer"] = multidb_url
+    config.update(common)
+    path = os.path.join(directory, "dbconfig.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=4)
+    return path
+
+
+def seed(database, args):
+    """Create and fill the benchmark tables directly, outside the measured code"""
+    payload = "x" * args.row_bytes
+    database.conn.execute(f"CREATE TABLE {BENCH_TABLE} (id INTEGER PRIMARY KEY, name TEXT NOT NULL, "
+                          f"payload TEXT, score INTEGER)")
+    database.conn.execute(f"CREATE TABLE {WRITE_TABLE} (id INTEGER PRIMARY KEY, name TEXT, payload TEXT)")
+    database.conn.executemany(f"INSERT INTO {BENCH_TABLE} (id, name, payload, score) VALUES (?, ?, ?, ?)",
+                              ((i, f"item{i}", payload, i % 100) for i in range(1, args.rows + 1)))
+    for i in range(args.extra_tables):
+        database.conn.execute(f"CREATE TABLE bench_extra_{i} (id INTEGER PRIMARY KEY, name TEXT, created TEXT)")
+    database.schema_changed()
+
+
+def sql_scenarios(args, kind: str) -> List[Tuple[str, Callable[[int], Any]]]:
+    """Scenarios of the SQL servers and the multidb client"""
+    from src.utils.db_operate import execute_sql
+    from src.tools.db_tool import generate_test_data
+    from src.resources.db_resources import generate_database_tables
+
+    placeholder = (lambda n: f"${n}") if kind == "postgresql" else (lambda n: "%s")
+    point_sql = f"SELECT * FROM {BENCH_TABLE} WHERE id = {placeholder(1)}"
+    range_sql = f"SELECT * FROM {BENCH_TABLE} WHERE id > {placeholder(1)} ORDER BY id LIMIT {args.page_rows}"
+    insert_sql = f"INSERT INTO {WRITE_TABLE} (name, payload) VALUES ({placeholder(1)}, {placeholder(2)})"
+    payload = "y" * args.row_bytes
+
+    async def generate(i):
+        result = await generate_test_data(WRITE_TABLE, ["name", "payload"], args.batch)
+        if isinstance(result, dict) and result.get("success") is False:
+            raise RuntimeError(result["error"])
+
+    scenarios = [
+        ("point_select", lambda i: execute_sql(point_sql, [i % args.rows + 1])),
+        ("range_select", lambda i: execute_sql(range_sql, [i % max(args.rows - args.page_rows, 1)])),
+        ("insert", lambda i: execute_sql(insert_sql, [f"row{i}", payload])),
+        ("generate_test_data", generate),
+        ("tables_resource", lambda i: generate_database_tables()),
+    ]
+    if kind != "multidb":
+        from src.tools.db_tool import paginate_query
+
+        page_sql = f"SELECT * FROM {BENCH_TABLE} WHERE score >= {placeholder(1)}"
+        walk = {"cursor": None}
+
+        async def paginate(i):
+            # Walks the table page by page, starting over after the last page
+            _, walk["cursor"] = await paginate_query(page_sql, [0], args.page_rows, ["id"], walk["cursor"])
+
+        scenarios.append(("paginate_query", paginate))
+    if kind == "postgresql":
+        from src.tools.db_tool import list_tables
+
+        tables_walk = {"cursor": None}
+
+        async def list_table_pages(i):
+            # Walks the table list page by page, starting over after the last page
+            _, tables_walk["cursor"] = await list_tables(page_size=args.page_rows, cursor=tables_walk["cursor"])
+
+        scenarios.append(("list_tables", list_table_pages))
+    return scenarios
+
+
+def redis_scenarios(args) -> Tuple[List[Tuple[str, Callable[[int], Any]]], Callable[[], Any]]:
+    """Scenarios of the Redis server, and the coroutine function that seeds the hash they read"""
+    from src.utils.db_operate import execute_command
+    from src.tools.db_tool import generate_test_data
+    from src.resources.db_resources import generate_pool_stats
+
+    payload = "y" * args.row_bytes
+
+    async def seed_hash():
+        mapping = {f"field{i}": payload for i in range(args.page_rows)}
+        await execute_command("HSET", "bench:hash", mapping=mapping)
+
+    return [
+        ("set", lambda i: execute_command("SET", f"bench:key:{i % args.rows}", payload)),
+        ("get", lambda i: execute_command("GET", f"bench:key:{i % args.rows}")),
+        ("hgetall", lambda i: execute_command("HGETALL", "bench:hash")),
+        ("generate_test_data", lambda i: generate_test_data("bench", ["name", "payload"], args.batch)),
+        ("pool_stats_resource", lambda i: generate_pool_stats()),
+    ], seed_hash
+
+
+def prepare_server(args, server: str) -> str:
+    """
+    Install the stand-in database of a server and put its package on the module path
+
+    Must run before anything of the server package is imported, the servers read their
+    configuration when src.utils.logger_util is first imported.
+
+    Returns:
+        str: Backend kind of the server, one of mysql, postgresql, multidb, redis
+    """
+    global standin_database
+    package, kind = SERVERS[server]
+    directory = tempfile.mkdtemp(prefix=f"bench_{server}_")
+
+    multidb_url = ""
+    if kind != "redis":
+        from standins import MultiDBStub, SqliteDatabase, fake_aiomysql, fake_asyncpg
+        database = standin_database = SqliteDatabase(args.latency_ms)
+        seed(database, args)
+        if kind == "mysql":
+            sys.modules["aiomysql"] = fake_aiomysql(database)
+        elif kind == "postgresql":
+            sys.modules["asyncpg"] = fake_asyncpg(database)
+        else:
+            multidb_url = MultiDBStub(database).url
+
+    os.environ["config_file"] = write_config(args, kind, directory, multidb_url)
+    sys.path.insert(0, os.path.join(REPO_PATH, package))
+
+    if kind == "redis":
+        from standins import install_fakeredis
+        from src.utils import connection_pool
+        install_fakeredis(connection_pool)
+    return kind
+
+
+async def run_child(args) -> List[Dict[str, Any]]:
+    """Benchmark one server inside this process"""
+    kind = prepare_server(args, args.server)
+    if kind == "redis":
+        scenarios, prepare = redis_scenarios(args)
+        await prepare()
+    else:
+        scenarios = sql_scenarios(args, kind)
+
+    selected = None if args.scenarios == "all" else set(args.scenarios.split(","))
+    # The multidb stub answers over HTTP, its round trips are not database statements of the server
+    round_trips = (lambda: standin_database.round_trips) if kind in ("mysql", "postgresql") else None
+    results = []
+    for name, operation in scenarios:
+        if selected is not None and name not in selected:
+            continue
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            result = await run_scenario(name, operation, concurrency, args.requests, args.warmup, round_trips)
+            result["server"] = args.server
+            results.append(result)
+            print(format_table([result]).splitlines()[-1], file=sys.stderr)
+    return results
+
+
+def run_parent(args) -> List[Dict[str, Any]]:
+    """Run every selected server in its own child process and collect the results"""
+    servers = list(SERVERS) if args.server == "all" else args.server.split(",")
+    options = []
+    for dest in CHILD_OPTIONS:
+        options += [f"--{dest.replace('_', '-')}", str(getattr(args, dest))]
+
+    results = []
+    for server in servers:
+        print(f"Benchmarking {server} ...", file=sys.stderr)
+        command = [sys.executable, os.path.abspath(__file__), "--child", "--server", server] + options
+        try:
+            completed = subprocess.run(command, stdout=subprocess.PIPE, text=True, timeout=args.server_timeout)
+        except subprocess.TimeoutExpired:
+            # One hanging server must not stop the benchmarks of the others
+            print(f"{server} benchmark timed out after {args.server_timeout:g}s", file=sys.stderr)
+            continue
+        if completed.returncode != 0:
+            print(f"{server} benchmark failed with exit code {completed.returncode}", file=sys.stderr)
+            continue
+        results.extend(json.loads(completed.stdout.strip().splitlines()[-1]))
+    return results
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.compare:
+        with open(args.compare[0]) as before, open(args.compare[1]) as after:
+            print(compare(json.load(before), json.load(after)))
+        return
+
+    if args.child:
+        # Results go to stdout as one JSON line, server logs stay on stderr
+        print(json.dumps(asyncio.run(run_child(args))))
+        return
+
+    results = run_parent(args)
+    print(format_table(results))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,548 @@
+"""
+Local Database Stand-ins
+
+In-process replacements for the database servers, so benchmarks run without MySQL, PostgreSQL,
+Redis or a multidb server:
+
+- SqliteDatabase: shared in-memory SQLite database that understands the MySQL (%s, SHOW TABLES,
+  DESCRIBE, the information_schema table details) and PostgreSQL ($1, information_schema, the pg_catalog table
+  listing and table details) dialects used by the
+  servers, and answers EXPLAIN in the format of each dialect from SQLite's query plan
+- fake_aiomysql / fake_asyncpg: driver modules with the pool, connection and cursor API the
+  servers use, installed into sys.modules before the server code is imported
+- MultiDBStub: HTTP server answering the multidb client's POST requests from SQLite
+- install_fakeredis: points the Redis server's connection pool at a fakeredis server
+
+A configurable per-statement latency stands in for the network round trip and server time. Every
+round trip is counted, including BEGIN, COMMIT and ROLLBACK, so the runner can report round trips per call.
+"""
+import asyncio
+import datetime
+import decimal
+import itertools
+import json
+import re
+import sqlite3
+import threading
+import types
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+# Values the database drivers bind natively, stored as text by SQLite
+for _type in (decimal.Decimal, datetime.date, datetime.datetime, datetime.time, datetime.timedelta, uuid.UUID):
+    sqlite3.register_adapter(_type, str)
+
+_MYSQL_NAMED_PARAM = re.compile(r"%\((\w+)\)s")
+_PG_PARAM = re.compile(r"\$(\d+)")
+_PG_CAST = re.compile(r"::\w+")
+_PG_PUBLIC = re.compile(r'(?<![\w"])"?public"?\.')
+_PG_CATALOG_TABLES = re.compile(r"\bfrom\s+pg_catalog\.pg_class\b", re.IGNORECASE)
+_PG_TABLE_DETAILS = re.compile(r"^\s*with\s+requested\b", re.IGNORECASE)
+_MYSQL_QUALIFIER = re.compile(r"`\w+`\.(?=`)")
+_MYSQL_TABLE_DETAILS = re.compile(r"'column'\s+AS\s+kind\b", re.IGNORECASE)
+_SHOW_TABLES = re.compile(r"^\s*show\s+tables\s*;?\s*$", re.IGNORECASE)
+_DESCRIBE = re.compile(r"^\s*(?:describe|desc)\s+[`\"]?([\w.]+?)[`\"]?\s*;?\s*$", re.IGNORECASE)
+_EXPLAIN = re.compile(r"^\s*explain\s+(?:\(\s*format\s+json\s*\)\s+)?", re.IGNORECASE)
+_PLAN_STEP = re.compile(r"^(SCAN|SEARCH) (?:TABLE )?(\w+)")
+
+
+class SqliteDatabase:
+    """Shared in-memory SQLite database, one per benchmark process"""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000
+        self.conn = sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("ATTACH DATABASE ':memory:' AS information_schema")
+        self.lock = threading.Lock()
+        self._catalog_version = -1
+        self._schema_version = 0
+        self.round_trips = 0
+
+    def schema_changed(self):
+        """Mark the information_schema stand-in stale after DDL run directly on conn"""
+        self._schema_version += 1
+
+    async def round_trip(self):
+        """Simulated network and server time of one statement"""
+        self.round_trips += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def execute(self, sql: str, params: Union[Sequence, Dict, None], dialect: str) -> Tuple[List[Dict[str, Any]], int, bool]:
+        """
+        Run one statement
+
+        Args:
+            sql (str): Statement in the MySQL or PostgreSQL dialect
+            params (list | dict, optional): Bound values
+            dialect (str): "mysql" or "postgresql"
+
+        Returns:
+            Tuple[List[Dict[str, Any]], int, bool]: Rows, affected row count and whether the statement returns rows
+        """
+        with self.lock:
+            if dialect == "mysql":
+                if _SHOW_TABLES.match(sql):
+                    return self._show_tables(), 0, True
+                describe = _DESCRIBE.match(sql)
+                if describe:
+                    return self._describe(describe.group(1).split(".")[-1]), 0, True
+                if _MYSQL_TABLE_DETAILS.search(sql):
+                    return self._mysql_table_details(params), 0, True
+                if sql.strip().lower().startswith("kill"):
+                    return [], 0, False
+                sql = _MYSQL_QUALIFIER.sub("", sql)
+                sql = _MYSQL_NAMED_PARAM.sub(r":\1", sql).replace("%s", "?")
+            else:
+                if _PG_TABLE_DETAILS.match(sql):
+                    return self._pg_table_details(*params), 0, True
+                if _PG_CATALOG_TABLES.search(sql):
+                    return self._pg_catalog_tables(), 0, True
+                sql = _PG_PUBLIC.sub("", _PG_CAST.sub("", _PG_PARAM.sub(r"?\1", sql)))
+                if "information_schema" in sql.lower():
+                    self._refresh_catalog()
+            explain = _EXPLAIN.match(sql)
+            if explain:
+                return self._explain(sql[explain.end():], params, dialect), 0, True
+
+            cursor = self.conn.execute(sql, params or ())
+            if cursor.description is None:
+                if sql.lstrip().lower().startswith(("create", "drop", "alter")):
+                    self.schema_changed()
+                return [], cursor.rowcount, False
+            return [dict(row) for row in cursor.fetchall()], cursor.rowcount, True
+
+    def _table_names(self) -> List[str]:
+        rows = self.conn.execute(
+            "SELECT name FROM main.sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")
+        return [row["name"] for row in rows]
+
+    def _show_tables(self) -> List[Dict[str, Any]]:
+        return [{"Tables_in_bench": name} for name in self._table_names()]
+
+    def _describe(self, table: str) -> List[Dict[str, Any]]:
+        return [{
+            "Field": column["name"],
+            "Type": column["type"].lower(),
+            "Null": "NO" if column["notnull"] or column["pk"] else "YES",
+            "Key": "PRI" if column["pk"] else "",
+            "Default": column["dflt_value"],
+            "Extra": "",
+        } for column in self.conn.execute(f'PRAGMA table_info("{table}")')]
+
+    def _mysql_table_details(self, params) -> List[Dict[str, Any]]:
+        """Rows of the MySQL server's table details query: columns, indexes and row count of each table"""
+        # The (schema, table) pairs are bound once for each of the four parts of the query
+        pairs = list(params[:len(params) // 4])
+        names = set(self._table_names())
+        rows = []
+        empty = dict.fromkeys(("object_name", "column_name", "data_type", "nullable", "default_value", "column_key",
+                               "extra", "non_unique", "referenced_schema", "referenced_table", "referenced_column",
+                               "cardinality"))
+        for schema, table in zip(pairs[::2], pairs[1::2]):
+            if table not in names:
+                continue
+            count = self.conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+            rows.append({**empty, "kind": "table", "table_schema": schema, "table_name": table, "position": 0,
+                         "data_type": "InnoDB", "cardinality": count})
+            for column in self.conn.execute(f'PRAGMA table_info("{table}")').fetchall():
+                integer_key = column["pk"] and column["type"].lower() == "integer"
+                rows.append({**empty, "kind": "column", "table_schema": schema, "table_name": table,
+                             "position": column["cid"] + 1, "column_name": column["name"],
+                             "data_type": column["type"].lower(),
+                             "nullable": "NO" if column["notnull"] or column["pk"] else "YES",
+                             "default_value": column["dflt_value"], "column_key": "PRI" if column["pk"] else "",
+                             "extra": "auto_increment" if integer_key else ""})
+                if column["pk"]:
+                    rows.append({**empty, "kind": "index", "table_schema": schema, "table_name": table,
+                                 "object_name": "PRIMARY", "position": column["pk"], "column_name": column["name"],
+                                 "data_type": "BTREE", "non_unique": 0, "cardinality": count})
+            for index in self.conn.execute(f'PRAGMA index_list("{table}")').fetchall():
+                if index["origin"] == "pk":
+                    continue
+                for column in self.conn.execute(f'PRAGMA index_info("{index["name"]}")').fetchall():
+                    rows.append({**empty, "kind": "index", "table_schema": schema, "table_name": table,
+                                 "object_name": index["name"], "position": column["seqno"] + 1,
+                                 "column_name": column["name"], "data_type": "BTREE",
+                                 "non_unique": 0 if index["unique"] else 1, "cardinality": None})
+        return rows
+
+    def _explain(self, sql: str, params, dialect: str) -> List[Dict[str, Any]]:
+        """EXPLAIN rows of the dialect built from SQLite's plan: a SCAN reads the whole table, a SEARCH one row"""
+        steps = []
+        for step in self.conn.execute(f"EXPLAIN QUERY PLAN {sql}", params or ()).fetchall():
+            match = _PLAN_STEP.match(step["detail"])
+            if match:
+                rows = 1
+                if match.group(1) == "SCAN":
+                    rows = self.conn.execute(f'SELECT COUNT(*) FROM "{match.group(2)}"').fetchone()[0]
+                steps.append((match.group(2), rows))
+        if dialect == "mysql":
+            return [{"id": 1, "select_type": "SIMPLE", "table": table, "type": "ALL" if rows > 1 else "const",
+                     "rows": rows, "filtered": 100.0, "Extra": ""} for table, rows in steps]
+        plan = {"Node Type": "Result", "Plan Rows": 1, "Total Cost": 0.01}
+        for table, rows in steps:
+            plan = {"Node Type": "Seq Scan" if rows > 1 else "Index Scan", "Relation Name": table,
+                    "Plan Rows": rows, "Total Cost": rows * 0.01 + 0.29}
+        return [{"QUERY PLAN": json.dumps([{"Plan": plan}])}]
+
+    def _pg_catalog_tables(self) -> List[Dict[str, Any]]:
+        """Rows of the PostgreSQL server's pg_catalog table listing, one per column, row estimates are exact"""
+        rows = []
+        for table in self._table_names():
+            count = self.conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+            for column in self.conn.execute(f'PRAGMA table_info("{table}")').fetchall():
+                rows.append({
+                    "schema_name": "public", "table_name": table, "estimated_rows": count, "search_path_position": 1,
+                    "Field": column["name"], "Type": column["type"].lower(),
+                    "Null": "NO" if column["notnull"] or column["pk"] else "YES",
+                    "Default": column["dflt_value"], "Key": "PRI" if column["pk"] else "",
+                    "Extra": "identity by default" if column["pk"] and column["type"].lower() == "integer" else "",
+                })
+        return rows
+
+    def _pg_table_details(self, schemas, tables) -> List[Dict[str, Any]]:
+        """Index rows of the PostgreSQL server's table details query, foreign keys and statistics are left out"""
+        rows = []
+        empty = dict.fromkeys(("referenced_table", "referenced_columns", "column_name", "null_frac", "n_distinct"))
+        for schema, table in zip(schemas, tables):
+            primary_key = [column["name"] for column in self.conn.execute(f'PRAGMA table_info("{table}")').fetchall()
+                           if column["pk"]]
+            if primary_key:
+                rows.append({**empty, "kind": "index", "schema_name": schema, "table_name": table,
+                             "object_name": f"{table}_pkey", "column_names": primary_key, "is_unique": True,
+                             "method": "btree"})
+            for index in self.conn.execute(f'PRAGMA index_list("{table}")').fetchall():
+                if index["origin"] == "pk":
+                    continue
+                columns = [column["name"] for column in self.conn.execute(f'PRAGMA index_info("{index["name"]}")')]
+                rows.append({**empty, "kind": "index", "schema_name": schema, "table_name": table,
+                             "object_name": index["name"], "column_names": columns, "is_unique": bool(index["unique"]),
+                             "method": "btree"})
+        return rows
+
+    def _refresh_catalog(self):
+        """Rebuild the information_schema tables the PostgreSQL server queries, after DDL"""
+        if self._catalog_version == self._schema_version:
+            return
+        self.conn.executescript("""
+            DROP TABLE IF EXISTS information_schema.tables;
+            DROP TABLE IF EXISTS information_schema.columns;
+            DROP TABLE IF EXISTS information_schema.key_column_usage;
+            CREATE TABLE information_schema.tables (table_schema TEXT, table_name TEXT, table_type TEXT);
+            CREATE TABLE information_schema.columns (table_schema TEXT, table_name TEXT, column_name TEXT,
+                data_type TEXT, is_nullable TEXT, column_default TEXT, ordinal_position INTEGER);
+            CREATE TABLE information_schema.key_column_usage (table_schema TEXT, table_name TEXT, column_name TEXT);
+        """)
+        for table in self._table_names():
+            self.conn.execute("INSERT INTO information_schema.tables VALUES ('public', ?, 'BASE TABLE')", (table,))
+            for column in self.conn.execute(f'PRAGMA table_info("{table}")').fetchall():
+                self.conn.execute(
+                    "INSERT INTO information_schema.columns VALUES ('public', ?, ?, ?, ?, ?, ?)",
+                    (table, column["name"], column["type"].lower(), "NO" if column["notnull"] else "YES",
+                     column["dflt_value"], column["cid"] + 1))
+                if column["pk"]:
+                    self.conn.execute("INSERT INTO information_schema.key_column_usage VALUES ('public', ?, ?)",
+                                      (table, column["name"]))
+        self._catalog_version = self._schema_version
+
+
+# ==================== aiomysql ====================
+
+def fake_aiomysql(database: SqliteDatabase) -> types.ModuleType:
+    """Build an aiomysql module backed by the SQLite stand-in"""
+    module = types.ModuleType("aiomysql")
+    thread_ids = itertools.count(1)
+
+    class DictCursor:
+        pass
+
+    class Cursor:
+        def __init__(self, connection):
+            self._connection = connection
+            self._result_rows: List[Dict[str, Any]] = []
+            self.rowcount = -1
+
+        async def execute(self, sql, params=None):
+            await database.round_trip()
+            verb = sql.lstrip()[:5].lower()
+            if verb in ("begin", "start"):
+                self._connection._in_transaction = True
+            elif verb in ("commi", "rollb"):
+                self._connection._in_transaction = False
+            if verb in ("begin", "start", "commi", "rollb"):
+                # Statements share one SQLite connection, transactions are only tracked
+                self._result_rows, self.rowcount = [], 0
+                return 0
+            self._result_rows, self.rowcount, _ = database.execute(sql, params, "mysql")
+            return self.rowcount
+
+        async def executemany(self, sql, seq_of_params):
+            # aiomysql sends INSERT ... VALUES for all parameter sets as one multi-row statement
+            await database.round_trip()
+            rowcount = 0
+            for params in seq_of_params:
+                _, affected, _ = database.execute(sql, params, "mysql")
+                rowcount += affected
+            self._result_rows, self.rowcount = [], rowcount
+            return rowcount
+
+        async def fetchall(self):
+            rows, self._result_rows = self._result_rows, []
+            return rows
+
+        async def nextset(self):
+            return None
+
+        async def close(self):
+            pass
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            await self.close()
+
+    class Connection:
+        def __init__(self):
+            self._thread_id = next(thread_ids)
+            self._in_transaction = False
+            self.closed = False
+
+        def thread_id(self):
+            return self._thread_id
+
+        def get_transaction_status(self):
+            return self._in_transaction
+
+        async def cursor(self, cursor_class=None):
+            return Cursor(self)
+
+        async def begin(self):
+            await database.round_trip()
+            self._in_transaction = True
+
+        async def commit(self):
+            await database.round_trip()
+            self._in_transaction = False
+
+        async def rollback(self):
+            await database.round_trip()
+            self._in_transaction = False
+
+        def close(self):
+            self.closed = True
+
+    class Pool:
+        def __init__(self, minsize, maxsize, **kwargs):
+            self.minsize = minsize
+            self.maxsize = maxsize
+            self._free = [Connection() for _ in range(minsize)]
+            self._used = set()
+            self._cond = asyncio.Condition()
+
+        @property
+        def size(self):
+            return len(self._free) + len(self._used)
+
+        @property
+        def freesize(self):
+            return len(self._free)
+
+        async def acquire(self):
+            async with self._cond:
+                while not self._free and self.size >= self.maxsize:
+                    await self._cond.wait()
+                conn = self._free.pop() if self._free else Connection()
+                self._used.add(conn)
+                return conn
+
+        def release(self, conn):
+            self._used.discard(conn)
+            if not conn.closed:
+                self._free.append(conn)
+            asyncio.ensure_future(self._notify())
+
+        async def _notify(self):
+            async with self._cond:
+                self._cond.notify()
+
+        def close(self):
+            self._free.clear()
+
+        async def wait_closed(self):
+            pass
+
+    async def create_pool(minsize=1, maxsize=10, **kwargs):
+        return Pool(minsize, maxsize, **kwargs)
+
+    async def connect(**kwargs):
+        return Connection()
+
+    module.DictCursor = DictCursor
+    module.create_pool = create_pool
+    module.connect = connect
+    return module
+
+
+# ==================== asyncpg ====================
+
+def fake_asyncpg(database: SqliteDatabase) -> types.ModuleType:
+    """Build an asyncpg module backed by the SQLite stand-in"""
+    module = types.ModuleType("asyncpg")
+    server_pids = itertools.count(1000)
+
+    class Connection:
+        def __init__(self):
+            self._pid = next(server_pids)
+
+        def get_server_pid(self):
+            return self._pid
+
+        async def fetch(self, sql, *args, timeout=None):
+            await database.round_trip()
+            rows, _, _ = database.execute(sql, args, "postgresql")
+            return rows
+
+        async def fetchval(self, sql, *args, column=0, timeout=None):
+            rows = await self.fetch(sql, *args, timeout=timeout)
+            return list(rows[0].values())[column] if rows else None
+
+        async def copy_records_to_table(self, table_name, *, records, columns=None, schema_name=None, timeout=None):
+            # One round trip for all records, as COPY streams them with a single statement
+            await database.round_trip()
+            names = ", ".join('"%s"' % column for column in columns)
+            sql = f'INSERT INTO "{table_name}" ({names}) VALUES ({", ".join("?" * len(columns))})'
+            with database.lock:
+                database.conn.executemany(sql, records)
+            return f"COPY {len(records)}"
+
+        async def execute(self, sql, *args, timeout=None):
+            await database.round_trip()
+            _, rowcount, _ = database.execute(sql, args, "postgresql")
+            verb = sql.split(None, 1)[0].upper()
+            if verb == "INSERT":
+                return f"INSERT 0 {rowcount}"
+            if verb in ("UPDATE", "DELETE"):
+                return f"{verb} {rowcount}"
+            return verb
+
+    class Pool:
+        def __init__(self, min_size, max_size):
+            self._min_size = min_size
+            self._max_size = max_size
+            self._free = [Connection() for _ in range(min_size)]
+            self._used = set()
+            self._semaphore = asyncio.Semaphore(max_size)
+
+        async def acquire(self, timeout=None):
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=timeout)
+            conn = self._free.pop() if self._free else Connection()
+            self._used.add(conn)
+            return conn
+
+        async def release(self, conn):
+            self._used.discard(conn)
+            self._free.append(conn)
+            self._semaphore.release()
+
+        def get_size(self):
+            return len(self._free) + len(self._used)
+
+        def get_idle_size(self):
+            return len(self._free)
+
+        def get_min_size(self):
+            return self._min_size
+
+        def get_max_size(self):
+            return self._max_size
+
+        async def close(self):
+            self._free.clear()
+
+    async def create_pool(min_size=1, max_size=10, **kwargs):
+        return Pool(min_size, max_size)
+
+    module.create_pool = create_pool
+    module.Connection = Connection
+    module.Record = dict
+    return module
+
+
+# ==================== multidb server ====================
+
+class MultiDBStub:
+    """HTTP stand-in for multiDBServer, executes the posted SQL on the SQLite stand-in in a daemon thread"""
+
+    def __init__(self, database: SqliteDatabase, host: str = "127.0.0.1", port: int = 0):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                body = json.dumps(stub.answer(request), default=str).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.database = database
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="multidb-stub", daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/mcp/executeQuery"
+
+    def answer(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        if self.database.latency:
+            threading.Event().wait(self.database.latency)
+        try:
+            rows, rowcount, returns_rows = self.database.execute(request["sql"], request.get("params"), "mysql")
+        except sqlite3.Error as e:
+            return {"code": 500, "message": str(e), "data": []}
+        return {"code": 200, "message": "success", "data": rows if returns_rows else rowcount}
+
+    def close(self):
+        self.server.shutdown()
+
+
+# ==================== Redis ====================
+
+def install_fakeredis(connection_pool_module) -> Optional[Any]:
+    """
+    Make the Redis server's InstrumentedConnectionPool open fakeredis connections
+
+    Args:
+        connection_pool_module: The server's src.utils.connection_pool module, imported before the first pool
+
+    Returns:
+        fakeredis.FakeServer: The shared in-process Redis server
+    """
+    import fakeredis
+    from fakeredis.aioredis import FakeConnection
+
+    server = fakeredis.FakeServer()
+    pool_class = connection_pool_module.InstrumentedConnectionPool
+    original_init = pool_class.__init__
+
+    def __init__(self, metrics, **kwargs):
+        # Only the connection class changes, pool bookkeeping and instrumentation stay real
+        # fakeredis answers the PING of a health check with an error, the in-process server needs none
+        for key in ("host", "port", "password", "ssl", "ssl_check_hostname", "ssl_cert_reqs", "health_check_interval"):
+            kwargs.pop(key, None)
+        original_init(self, metrics, connection_class=FakeConnection, server=server, **kwargs)
+
+    pool_class.__init__ = __init__
+    return server
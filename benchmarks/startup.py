@@ -0,0 +1,218 @@
+"""
+Startup Benchmark
+
+Measures how quickly each server can answer an MCP host. Two numbers per server:
+
+- import profile: `python -X importtime` of src.server, summarised per top-level package, and the
+  list of database drivers loaded by the import (there should be none, drivers load with the first pool)
+- cold start: wall time from spawning `python src/server.py` to the stdio `initialize` response and to
+  the first `tools/list` response, the median over --runs fresh processes, checked against --target-ms
+
+No database is contacted, pools are only created by the first tool call.
+
+Usage:
+    python benchmarks/startup.py                          # all servers
+    python benchmarks/startup.py --server mysql --runs 20
+    python benchmarks/startup.py --target-ms 500 --output startup.json
+"""
+import argparse
+import json
+import os
+import selectors
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+BENCHMARKS_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS_PATH)
+
+from harness import percentile, render_table
+from run import REPO_PATH, SERVERS, add_standin_arguments, write_config
+
+# Modules that must not be loaded before the first tool call
+DRIVER_MODULES = ("aiomysql", "pymysql", "asyncpg", "redis", "aiohttp")
+
+PROTOCOL_VERSION = "2025-06-18"
+
+# Imports src.server, then reports the driver modules it pulled in on the last stderr line
+IMPORT_PROBE = ("import json, sys; import src.server; "
+                f"print(json.dumps([m for m in {DRIVER_MODULES!r} if m in sys.modules]), file=sys.stderr)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import time and stdio cold start of the MCP servers")
+    parser.add_argument("--server", default="all", help=f"all or a comma separated list of {', '.join(SERVERS)}")
+    parser.add_argument("--runs", type=int, default=10, help="cold starts per server, the median is reported")
+    parser.add_argument("--target-ms", type=float, default=1000.0,
+                        help="cold start target for the initialize response, exit code 1 when a server misses it")
+    parser.add_argument("--top", type=int, default=10, help="packages listed in the import profile")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds to wait for a server response")
+    add_standin_arguments(parser)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def parse_importtime(stderr: str) -> Dict[str, Any]:
+    """
+    Summarise `-X importtime` output
+
+    Each line is "import time: self [us] | cumulative | imported package", nested imports are indented.
+
+    Returns:
+        Dict[str, Any]: Total import time of src.server and the cumulative time of each top-level package, in ms
+    """
+    packages: Dict[str, float] = {}
+    total_us = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue
+        module = name.strip()
+        cumulative_us = int(cumulative)
+        if module == "src.server":
+            total_us = cumulative_us
+        # The package line itself carries the time of everything it imported
+        if "." not in module:
+            packages[module] = max(packages.get(module, 0), cumulative_us / 1000)
+    return {"total_ms": round(total_us / 1000, 1), "packages": packages}
+
+
+def profile_imports(package_path: str, env: Dict[str, str], top: int) -> Dict[str, Any]:
+    """Run the import probe under -X importtime in a fresh interpreter"""
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", IMPORT_PROBE], cwd=package_path,
+                               env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    drivers = [line for line in completed.stderr.splitlines() if line.startswith("[")]
+    if completed.returncode != 0 or not drivers:
+        raise RuntimeError(f"Importing src.server failed:\n{completed.stderr[-2000:]}")
+    profile = parse_importtime(completed.stderr)
+    packages = sorted(profile["packages"].items(), key=lambda item: item[1], reverse=True)
+    return {
+        "import_ms": profile["total_ms"],
+        "top_imports": [{"package": name, "cumulative_ms": round(ms, 1)} for name, ms in packages[:top]],
+        "drivers_loaded": json.loads(drivers[-1]),
+    }
+
+
+def _request(request_id: int, method: str, params: Optional[Dict[str, Any]] = None) -> bytes:
+    message = {"jsonrpc": "2.0", "id": request_id, "method": method}
+    if params is not None:
+        message["params"] = params
+    return (json.dumps(message) + "\n").encode("utf-8")
+
+
+def _read_response(process: subprocess.Popen, request_id: int, timeout: float) -> Dict[str, Any]:
+    """Read stdout lines until the JSON-RPC response with request_id arrives, stdout is unbuffered so select sees every line"""
+    selector = selectors.DefaultSelector()
+    selector.register(process.stdout, selectors.EVENT_READ)
+    deadline = time.monotonic() + timeout
+    try:
+        while time.monotonic() < deadline:
+            if not selector.select(deadline - time.monotonic()):
+                break
+            line = process.stdout.readline()
+            if not line:
+                raise RuntimeError(f"Server exited with code {process.poll()} before responding")
+            message = json.loads(line)
+            if message.get("id") == request_id:
+                return message
+    finally:
+        selector.close()
+    raise TimeoutError(f"No response to request {request_id} within {timeout}s")
+
+
+def cold_start(package_path: str, env: Dict[str, str], timeout: float) -> Dict[str, float]:
+    """
+    Spawn the server once and time the stdio handshake
+
+    Returns:
+        Dict[str, float]: Milliseconds from spawn to the initialize response and to the tools/list response
+    """
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join("src", "server.py")], cwd=package_path, env=env,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                               bufsize=0)
+    try:
+        process.stdin.write(_request(1, "initialize", {
+            "protocolVersion": PROTOCOL_VERSION,
+            "capabilities": {},
+            "clientInfo": {"name": "startup-benchmark", "version": "1.0"},
+        }))
+        process.stdin.flush()
+        _read_response(process, 1, timeout)
+        initialize_ms = (time.perf_counter() - started) * 1000
+
+        process.stdin.write(json.dumps({"jsonrpc": "2.0", "method": "notifications/initialized"}).encode() + b"\n")
+        process.stdin.write(_request(2, "tools/list", {}))
+        process.stdin.flush()
+        _read_response(process, 2, timeout)
+        tools_list_ms = (time.perf_counter() - started) * 1000
+    finally:
+        process.stdin.close()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+    return {"initialize_ms": initialize_ms, "tools_list_ms": tools_list_ms}
+
+
+def measure_server(args, server: str) -> Dict[str, Any]:
+    package, kind = SERVERS[server]
+    package_path = os.path.join(REPO_PATH, package)
+    directory = tempfile.mkdtemp(prefix=f"startup_{server}_")
+    # The multidb server is never called, the handshake does not reach it
+    config = write_config(args, kind, directory, multidb_url="http://127.0.0.1:9/")
+    # Not every server.py adds its package to sys.path before its first src import
+    python_path = os.pathsep.join(filter(None, [package_path, os.environ.get("PYTHONPATH")]))
+    env = {**os.environ, "config_file": config, "PYTHONPATH": python_path}
+
+    try:
+        result = {"server": server, **profile_imports(package_path, env, args.top)}
+        runs = [cold_start(package_path, env, args.timeout) for _ in range(args.runs)]
+    except (RuntimeError, TimeoutError, OSError, ValueError) as e:
+        # One broken server is reported, the others are still measured
+        print(f"{server} startup failed: {e}", file=sys.stderr)
+        return {"server": server, "error": str(e)}
+    for key in ("initialize_ms", "tools_list_ms"):
+        values = sorted(run[key] for run in runs)
+        result[f"{key[:-3]}_p50_ms"] = round(percentile(values, 0.50), 1)
+        result[f"{key[:-3]}_max_ms"] = round(values[-1], 1)
+    result["target_ms"] = args.target_ms
+    result["within_target"] = result["initialize_p50_ms"] <= args.target_ms
+    return result
+
+
+def format_report(results: List[Dict[str, Any]]) -> str:
+    columns = ("server", "import_ms", "initialize_p50_ms", "initialize_max_ms", "tools_list_p50_ms",
+               "within_target", "drivers_loaded")
+    lines = [render_table(columns, [[str(r.get(c, "-")) for c in columns] for r in results])]
+    for r in results:
+        if "error" in r:
+            lines.append(f"{r['server']} failed: {r['error'].splitlines()[0] if r['error'] else ''}")
+            continue
+        top = ", ".join(f"{i['package']} {i['cumulative_ms']}" for i in r["top_imports"])
+        lines.append(f"{r['server']} slowest imports (ms): {top}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    servers = list(SERVERS) if args.server == "all" else args.server.split(",")
+    results = []
+    for server in servers:
+        print(f"Measuring {server} startup ...", file=sys.stderr)
+        results.append(measure_server(args, server))
+    print(format_report(results))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if not all("error" not in r and r["within_target"] and not r["drivers_loaded"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
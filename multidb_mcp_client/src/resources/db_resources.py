@@ -1,4 +1,5 @@
 from src.utils.db_config import load_activate_db_config
+from src.utils.db_session import current_instance_id
 from src.utils.db_operate import execute_sql
 from src.utils.logger_util import logger
 
@@ -34,7 +35,7 @@ async def generate_database_tables():
 
 def generate_database_config():
 
-    active_db, db_config = load_activate_db_config()
+    active_db, db_config = load_activate_db_config(current_instance_id.get())
 
     # Hide sensitive information
     safe_config = {
@@ -5,34 +5,104 @@ Main entry point for MySQL/MariaDB/TiDB/AWS OceanBase/RDS/Aurora MySQL DataSourc
 """
 import os
 import sys
-from typing import List
-from fastmcp import FastMCP
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Union
+from fastmcp import Context, FastMCP
+from fastmcp.server.middleware import Middleware, MiddlewareContext
 from src import get_base_package_info
 
 project_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 # Add current directory to Python module search path
 sys.path.insert(0, project_path)
-from src.utils.logger_util import logger, db_config_path
+from src.utils.logger_util import logger, db_config_path, log_logging_config, sample_query_log
 from src.utils.db_operate import execute_sql
+from src.utils.tracing import configure_tracing, start_span, tracer
+from src.utils.runtime_monitor import configure_runtime_monitor, runtime_monitor
+from src.utils.db_config import config_watcher
+from src.utils.db_session import current_instance_id, session_registry
 from src.utils import load_activate_db_config
 from src.tools.db_tool import generate_test_data
 from src.resources.db_resources import generate_database_config, generate_database_tables
 
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    """Start the runtime monitor and the configuration file watcher on the server's event loop"""
+    log_logging_config()
+    runtime_monitor.start()
+    config_watcher.start()
+    yield {}
+
 # Create global MCP server instance
-mcp = FastMCP("DataSource MCP Client Server")
+mcp = FastMCP("DataSource MCP Client Server", lifespan=lifespan)
+
+
+class SessionInstanceMiddleware(Middleware):
+    """Makes the database instance selected by the calling session current while its request is handled"""
+
+    async def on_request(self, context: MiddlewareContext, call_next):
+        fastmcp_context = context.fastmcp_context
+        session_id = fastmcp_context.session_id if fastmcp_context is not None else None
+        token = current_instance_id.set(session_registry.selected(session_id))
+        try:
+            return await call_next(context)
+        finally:
+            current_instance_id.reset(token)
+
+
+mcp.add_middleware(SessionInstanceMiddleware())
+
+
+async def _run_sql(sql: str, params: Optional[Union[List[Any], Dict[str, Any]]] = None, tool: str = "sql_exec"):
+    """Execute SQL through the multidb server and return its result, traced as a span named after the calling tool"""
+    with start_span(f"mcp.tool {tool}", {"mcp.tool.name": tool}) as span:
+        result = await _execute_tool_sql(sql, params)
+        if isinstance(result, dict) and result.get("success") is False:
+            span.set_error(result["error"])
+        return result
+
+
+async def _execute_tool_sql(sql: str, params: Optional[Union[List[Any], Dict[str, Any]]]):
+    """Execute SQL and convert errors into a failed tool response"""
+    # Per-query INFO lines are sampled (logSampleRate) and formatted only when a sink accepts them
+    sampled = sample_query_log()
+    if sampled:
+        logger.info("MCP tool executing SQL: {}", sql)
+    if params:
+        logger.debug("MCP tool SQL params: {}", params)
+    try:
+        result = await execute_sql(sql, params)
+
+        # Record execution results
+        if sampled:
+            if isinstance(result, list):
+                logger.info("SQL execution successful, returned {} rows of data", len(result))
+            else:
+                logger.info("SQL execution successful, affected {} rows", result)
+
+        return result
+    except Exception as e:
+        error_msg = str(e)
+        logger.error(f"MCP tool SQL execution failed: {error_msg}")
+        return {
+            "success": False,
+            "error": error_msg,
+            "message": "SQL execution failed"
+        }
 
 
 @mcp.tool()
-async def sql_exec(sql: str):
+async def sql_exec(sql: str, params: Optional[Union[List[Any], Dict[str, Any]]] = None):
     """
     Universal SQL execution tool
 
     Function description:
     Execute any type of SQL statement, including SELECT, INSERT, UPDATE, DELETE, CREATE, DROP, etc.
     Supports query and modification operations, automatically handles transaction commit and rollback
+    params are forwarded to the multidb server and bound there instead of being inlined into the SQL text
 
     Parameter description:
-    - sql (str): SQL statement to execute, supports parameterized queries
+    - sql (str): SQL statement to execute, use placeholders for parameterized queries
+    - params (list | dict, optional): Values bound to the placeholders, a list for positional or a dict for named placeholders
 
     Return value:
     - dict: Dictionary containing execution results
@@ -43,29 +113,12 @@ async def sql_exec(sql: str):
 
     Usage examples:
     - Query: SELECT * FROM users WHERE age > 18
+    - Parameterized query: sql="SELECT * FROM users WHERE age > %s", params=[18]
     - Insert: INSERT INTO users (name, age) VALUES ('John', 25)
     - Update: UPDATE users SET age = 26 WHERE name = 'John'
     - Delete: DELETE FROM users WHERE age < 18
     """
-    logger.info(f"MCP tool executing SQL: {sql}")
-    try:
-        result = await execute_sql(sql)
-
-        # Record execution results
-        if isinstance(result, list):
-            logger.info(f"SQL execution successful, returned {len(result)} rows of data")
-        else:
-            logger.info(f"SQL execution successful, affected {result} rows")
-
-        return result
-    except Exception as e:
-        error_msg = str(e)
-        logger.error(f"MCP tool SQL execution failed: {error_msg}")
-        return {
-            "success": False,
-            "error": error_msg,
-            "message": "SQL execution failed"
-        }
+    return await _run_sql(sql, params)
 
 
 @mcp.tool()
@@ -94,7 +147,7 @@ async def describe_table(table_name: str):
     ]
     """
     logger.info(f"MCP tool: Describe table structure - {table_name}")
-    return await sql_exec(f"DESCRIBE {table_name};")
+    return await _run_sql(f"DESCRIBE {table_name};", tool="describe_table")
 
 
 @mcp.tool()
@@ -132,9 +185,79 @@ async def generate_demo_data(table_name: str, columns_name: List[str], num: int)
     - Large data generation may take considerable time
     """
     logger.info(f"MCP tool: Generate test data - {table_name}")
-    return await generate_test_data(table_name, columns_name, num)
+    with start_span("mcp.tool generate_demo_data", {"mcp.tool.name": "generate_demo_data"}):
+        return await generate_test_data(table_name, columns_name, num)
+
+
+@mcp.tool()
+async def runtime_stats():
+    """
+    Runtime statistics tool
+
+    Function description:
+    Shows what blocks the server's event loop and stalls concurrent tool calls
+
+    Return value:
+    - dict: Dictionary containing statistics
+        - success (bool): Whether the statistics were collected
+        - result (dict): Runtime statistics
+            - loop_lag: Event loop lag percentiles of the recent probes (last_ms, p50_ms, p99_ms, max_ms)
+            - stalls: Times the loop was blocked longer than loopStallThresholdMs, with the stack of the blocking code
+            - slow_callbacks: Callbacks slower than slowCallbackMs (asyncio debug mode, off by default)
+            - tasks, threads: Running asyncio tasks and threads
+
+    Usage examples:
+    - runtime_stats()
+    """
+    logger.info("MCP tool: Runtime statistics")
+    return {
+        "success": True,
+        "result": runtime_monitor.stats(),
+        "message": "Runtime statistics collected successfully"
+    }
 
 
+@mcp.tool()
+async def use_instance(ctx: Context, db_instance_id: Optional[str] = None):
+    """
+    Instance selection tool
+    
+    Function description:
+    Selects the database instance used by the calling MCP session. Over HTTP many clients share one server,
+    each session keeps its own selection and the other sessions are not affected
+    
+    Parameter description:
+    - db_instance_id (str, optional): dbInstanceId of an instance with dbActive true in dbList,
+      omit to return to the first active instance
+    
+    Return value:
+    - dict: Dictionary containing the selected instance
+        - success (bool): Whether the instance was selected
+        - result (dict): db_instance_id, db_host, db_port, db_database and db_type of the selected instance
+        - message (str): Selection status description
+        - error (str): Error message on failure (only exists when success=False)
+    
+    Usage examples:
+    - use_instance(db_instance_id="reporting_replica")
+    - use_instance()
+    """
+    logger.info(f"MCP tool: Use instance - {db_instance_id or 'default'}")
+    try:
+        db_instance = session_registry.select(ctx.session_id, db_instance_id)
+    except ValueError as e:
+        return {"success": False, "error": str(e), "message": "Failed to select database instance"}
+    return {
+        "success": True,
+        "result": {
+            "db_instance_id": db_instance.db_instance_id,
+            "db_host": db_instance.db_host,
+            "db_port": db_instance.db_port,
+            "db_database": db_instance.db_database,
+            "db_type": db_instance.db_type,
+        },
+        "message": f"Session now uses database instance {db_instance.db_instance_id}"
+    }
+
 @mcp.resource("database://tables")
 async def get_database_tables():
     """
@@ -171,7 +294,8 @@ async def get_database_tables():
     """
     logger.info("Getting database table information")
     # Get all table names
-    return await generate_database_tables()
+    with start_span("mcp.resource database://tables"):
+        return await generate_database_tables()
 
 
 @mcp.resource("database://config")
@@ -232,6 +356,38 @@ async def get_database_config():
     }
 
 
+@mcp.resource("database://traces")
+async def get_traces():
+    """
+    Request traces resource
+
+    Function description:
+    Provides the most recent request traces, each split into spans for the MCP tool handler, the HTTP call
+    to multiDBServer, reading the response and decoding it, to attribute tail latency to network or database time.
+    The traceparent header sent to multiDBServer carries the same trace id, so its own spans can be joined
+
+    Resource URI:
+    - database://traces - Represents recent request traces resource
+
+    Return data content:
+    List of the 20 most recent traces, newest first:
+    - traceId: W3C trace id
+    - root: Name of the first span, usually "mcp.tool <tool name>"
+    - durationMs: Duration of the whole trace
+    - spans: Spans in start order, in the OpenTelemetry (OTLP JSON) span shape
+
+    Notes:
+    - Tracing is enabled with "traceExporter": "memory" or "stderr" in dbconfig.json, stderr also writes every span as a JSON line
+    """
+    logger.info("Getting recent request traces")
+
+    return {
+        "uri": "database://traces",
+        "mimeType": "application/json",
+        "text": str(tracer.recent_traces())
+    }
+
+
 # ==================== Server Startup Related ====================
 
 # When using fastmcp run, FastMCP CLI automatically handles server startup
@@ -246,8 +402,23 @@ def main():
 
     active_db, db_config = load_activate_db_config()
     logger.info(f"Current database instance configuration: {active_db}")
-    # When using fastmcp run, just call mcp.run() directly
-    mcp.run(transport='stdio')
+    configure_tracing(db_config.trace_exporter)
+    configure_runtime_monitor(db_config.loop_monitor_interval_ms, db_config.loop_stall_threshold_ms,
+                              db_config.slow_callback_ms)
+    if db_config.transport == "stdio":
+        # When using fastmcp run, just call mcp.run() directly
+        mcp.run(transport='stdio')
+        return
+
+    # One long-lived server for many MCP clients, all sessions share the connection pools
+    uvicorn_config = {"timeout_keep_alive": int(db_config.http_keep_alive_timeout)}
+    if db_config.http_limit_concurrency:
+        uvicorn_config["limit_concurrency"] = int(db_config.http_limit_concurrency)
+    transport_kwargs = {"host": db_config.http_host, "port": int(db_config.http_port), "uvicorn_config": uvicorn_config}
+    if db_config.http_path:
+        transport_kwargs["path"] = db_config.http_path
+    logger.info(f"Serving MCP over {db_config.transport} on {db_config.http_host}:{db_config.http_port}")
+    mcp.run(transport=db_config.transport, **transport_kwargs)
 
 
 if __name__ == "__main__":
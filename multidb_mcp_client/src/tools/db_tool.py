@@ -5,19 +5,23 @@ Provides database utility functions related to SQL execution.
 """
 
 from src.utils.db_operate import execute_sql
-from src.utils.logger_util import logger
+from src.utils.logger_util import logger, sample_query_log
 import random, string
 
 
 
-async def sql_exec(sql: str):
+async def sql_exec(sql: str, params=None):
     """
     Execute any SQL statement (SELECT/INSERT/UPDATE/DELETE)
     """
-    logger.info(f"Executing SQL: {sql}")
+    sampled = sample_query_log()
+    if sampled:
+        logger.info("Executing SQL: {}", sql)
     try:
-        result = await execute_sql(sql)
-        logger.info(f"SQL executed successfully, returned {len(result) if isinstance(result, list) else result} rows/affected rows")
+        result = await execute_sql(sql, params)
+        if sampled:
+            logger.info("SQL executed successfully, returned {} rows/affected rows",
+                        len(result) if isinstance(result, list) else result)
         return {"success": True, "result": result}
     except Exception as e:
         logger.error(f"SQL execution failed: {e}")
@@ -37,7 +41,7 @@ async def generate_test_data(table, columns, num):
         placeholders = ','.join(['%s'] * len(columns))
         sql = f"INSERT INTO {table} ({','.join(columns)}) VALUES ({placeholders})"
 
-        logger.debug(f"Inserting row {i + 1}/{num}: {dict(zip(columns, values))}")
+        logger.opt(lazy=True).debug("Inserting row {}/{}: {}", lambda: i + 1, lambda: num, lambda: dict(zip(columns, values)))
         result=await execute_sql(sql, values)
 
     logger.info(f"Successfully generated {num} test records for table '{table}'")
\ No newline at end of file
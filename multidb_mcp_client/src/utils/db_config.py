@@ -4,13 +4,17 @@ Database Configuration Module
 Uses singleton pattern to handle database configuration loading and management.
 """
 
+import asyncio
 import json
 import os
+import threading
+import time
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple
-from .logger_util import logger, db_config_path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from . import logger_util
+from .logger_util import logger, db_config_path, read_config_file
 
-@dataclass
+@dataclass(frozen=True)
 class DatabaseInstance:
     """Database instance configuration"""
     db_instance_id: str
@@ -23,14 +27,56 @@ class DatabaseInstance:
     db_version: str
     db_active: bool
 
+    def to_payload(self) -> Dict[str, Any]:
+        """Database instance as sent to the multidb server"""
+        return {
+            "dbInstanceId": self.db_instance_id,
+            "dbHost": self.db_host,
+            "dbPort": self.db_port,
+            "dbDatabase": self.db_database,
+            "dbUsername": self.db_username,
+            "dbPassword": self.db_password,
+            "dbType": self.db_type,
+            "dbActive": self.db_active
+        }
 
-@dataclass
+
+@dataclass(frozen=True)
 class DatabaseInstanceConfig:
     """Database configuration, includes connection pool settings and database instance list"""
-    db_instances_list: List[DatabaseInstance]
+    db_instances_list: Tuple[DatabaseInstance, ...]
     log_path: str
     log_level: str
     multidb_server: str
+    log_trace_payloads: bool = False
+    trace_exporter: str = "none"
+    loop_monitor_interval_ms: int = 100
+    loop_stall_threshold_ms: int = 200
+    slow_callback_ms: int = 0
+    config_reload_interval: float = 5
+    transport: str = "stdio"
+    http_host: str = "127.0.0.1"
+    http_port: int = 8000
+    http_path: str = ""
+    http_limit_concurrency: int = 0
+    http_keep_alive_timeout: int = 5
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """One parsed version of the configuration file, replaced as a whole when the file changes"""
+    config: DatabaseInstanceConfig
+    active_database: Optional[DatabaseInstance]
+    # Request form of each active instance by id, built once instead of on every query
+    instance_payloads: Dict[str, Dict[str, Any]]
+    mtime_ns: int
+
+    def get_instance(self, db_instance_id: str) -> Optional[DatabaseInstance]:
+        """Active (dbActive) instance with this id, None when it is not configured or not active"""
+        for db in self.config.db_instances_list:
+            if db.db_instance_id == db_instance_id and db.db_active:
+                return db
+        return None
 
 
 class DatabaseInstanceConfigLoader:
@@ -56,14 +102,15 @@ class DatabaseInstanceConfigLoader:
         """
         if not self._initialized:
             self.config_json_file = db_config_path
-            self._config: Optional[DatabaseInstanceConfig] = None
+            self._snapshot: Optional[ConfigSnapshot] = None
+            self._failed_mtime_ns = 0
             self._initialized = True
             logger.debug(f"Database instance configuration loader initialized, configuration file: {self.config_json_file}")
 
     @property
     def load_config(self) -> DatabaseInstanceConfig:
         """
-        Load database configuration from JSON file
+        Load database configuration from JSON file and make it the current snapshot
 
         Returns:
             DatabaseInstanceConfig: Loaded configuration object
@@ -79,8 +126,7 @@ class DatabaseInstanceConfigLoader:
             raise FileNotFoundError(error_msg)
 
         try:
-            with open(self.config_json_file, 'r', encoding='utf-8') as f:
-                config_data = json.load(f)
+            config_data, mtime_ns = self._read_config_file()
             logger.debug(f"Successfully read configuration file: {self.config_json_file}")
         except json.JSONDecodeError as e:
             error_msg = f"Configuration file JSON format error: {e}"
@@ -123,15 +169,51 @@ class DatabaseInstanceConfigLoader:
             logger.debug(f"Parsed database instance: {db_instance.db_instance_id} ({db_instance.db_host}:{db_instance.db_port})")
 
         # Create configuration object
-        self._config = DatabaseInstanceConfig(
-            db_instances_list=db_instances,
+        config = DatabaseInstanceConfig(
+            db_instances_list=tuple(db_instances),
             log_path=config_data['logPath'],
             log_level=config_data['logLevel'],
             multidb_server=config_data['multiDBServer'],
+            log_trace_payloads=bool(config_data.get('logTracePayloads', False)),
+            trace_exporter=config_data.get('traceExporter', "none"),
+            loop_monitor_interval_ms=config_data.get('loopMonitorIntervalMs', 100),
+            loop_stall_threshold_ms=config_data.get('loopStallThresholdMs', 200),
+            slow_callback_ms=config_data.get('slowCallbackMs', 0),
+            config_reload_interval=config_data.get('configReloadInterval', 5),
+            transport=config_data.get('transport', "stdio"),
+            http_host=config_data.get('httpHost', "127.0.0.1"),
+            http_port=config_data.get('httpPort', 8000),
+            http_path=config_data.get('httpPath', ""),
+            http_limit_concurrency=config_data.get('httpLimitConcurrency', 0),
+            http_keep_alive_timeout=config_data.get('httpKeepAliveTimeout', 5),
         )
 
+        active_database = next((db for db in db_instances if db.db_active), None)
+        if active_database is None:
+            logger.warning("No active database instance found")
+        payloads = {db.db_instance_id: db.to_payload() for db in db_instances if db.db_active}
+        # A single reference assignment, readers see either the old or the new snapshot
+        self._snapshot = ConfigSnapshot(config, active_database, payloads, mtime_ns)
         logger.debug(f"Configuration loading completed, total {len(db_instances)} database instances")
-        return self._config
+        return config
+
+    def _read_config_file(self) -> Tuple[Dict[str, Any], int]:
+        """Parse the configuration file, reusing the parse done for the log settings while the file is unchanged"""
+        mtime_ns = os.stat(self.config_json_file).st_mtime_ns
+        if logger_util.config_file_data is not None and mtime_ns == logger_util.config_file_mtime_ns:
+            return logger_util.config_file_data, mtime_ns
+        return read_config_file(self.config_json_file)
+
+    def get_snapshot(self) -> ConfigSnapshot:
+        """
+        Get the current configuration snapshot, automatically load if not loaded
+
+        Returns:
+            ConfigSnapshot: Configuration and active database instance, never re-read from disk
+        """
+        if self._snapshot is None:
+            self.load_config
+        return self._snapshot
 
     def get_config(self) -> DatabaseInstanceConfig:
         """
@@ -140,9 +222,7 @@ class DatabaseInstanceConfigLoader:
         Returns:
             DatabaseInstanceConfig: Configuration object
         """
-        if self._config is None:
-            return self.load_config
-        return self._config
+        return self.get_snapshot().config
 
     def get_active_database(self) -> Optional[DatabaseInstance]:
         """
@@ -151,13 +231,86 @@ class DatabaseInstanceConfigLoader:
         Returns:
             Optional[DatabaseInstance]: First active database instance, returns None if no active instance found
         """
-        config = self.get_config()
-        for db in config.db_instances_list:
-            if db.db_active:
-                logger.debug(f"Found first active database: {db}")
-                return db
-        logger.warning("No active database instance found")
-        return None
+        return self.get_snapshot().active_database
+
+    def reload_if_changed(self) -> Optional[Tuple[ConfigSnapshot, ConfigSnapshot]]:
+        """
+        Load the configuration file again when its modification time changed
+
+        An invalid file is logged once and the current snapshot stays in use.
+
+        Returns:
+            Optional[Tuple[ConfigSnapshot, ConfigSnapshot]]: Old and new snapshot, None when nothing changed
+        """
+        old = self.get_snapshot()
+        try:
+            mtime_ns = os.stat(self.config_json_file).st_mtime_ns
+        except OSError:
+            return None
+        if mtime_ns in (old.mtime_ns, self._failed_mtime_ns):
+            return None
+
+        try:
+            self.load_config
+        except Exception as e:
+            self._failed_mtime_ns = mtime_ns
+            logger.error(f"Configuration file changed but could not be loaded, keeping the current configuration: {e}")
+            return None
+        logger.info(f"Configuration file reloaded: {self.config_json_file}")
+        return old, self._snapshot
+
+
+ConfigListener = Callable[[ConfigSnapshot, ConfigSnapshot], Awaitable[None]]
+
+
+class ConfigWatcher:
+    """Polls the configuration file modification time and swaps in a new snapshot when it changes"""
+
+    def __init__(self):
+        self._listeners: List[ConfigListener] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def add_listener(self, listener: ConfigListener):
+        """
+        Register a coroutine function called on the event loop with the old and new snapshot after each reload
+
+        Args:
+            listener (ConfigListener): Coroutine function taking (old, new)
+        """
+        self._listeners.append(listener)
+
+    def start(self):
+        """Start polling from a background thread, a no-op when already watching the running event loop"""
+        loop = asyncio.get_running_loop()
+        interval = float(DatabaseInstanceConfigLoader().get_config().config_reload_interval)
+        if interval <= 0 or self._loop is loop:
+            return
+        self._loop = loop
+        # File reads and JSON parsing stay off the event loop
+        threading.Thread(target=self._watch, args=(loop, interval), name="config-watcher", daemon=True).start()
+        logger.info(f"Configuration watcher started, polling every {interval}s")
+
+    def _watch(self, loop: asyncio.AbstractEventLoop, interval: float):
+        loader = DatabaseInstanceConfigLoader()
+        while True:
+            time.sleep(interval)
+            if loop.is_closed():
+                return
+            change = loader.reload_if_changed()
+            if change is None:
+                continue
+            for listener in self._listeners:
+                asyncio.run_coroutine_threadsafe(self._notify(listener, *change), loop)
+
+    @staticmethod
+    async def _notify(listener: ConfigListener, old: ConfigSnapshot, new: ConfigSnapshot):
+        try:
+            await listener(old, new)
+        except Exception as e:
+            logger.error(f"Failed to apply configuration change in {getattr(listener, '__qualname__', listener)}: {e}")
+
+
+config_watcher = ConfigWatcher()
 
 
 def load_db_config() -> DatabaseInstanceConfig:
@@ -168,20 +321,26 @@ def load_db_config() -> DatabaseInstanceConfig:
         DatabaseInstanceConfig: Loaded configuration object
     """
     loader = DatabaseInstanceConfigLoader()
-    return loader.load_config
+    return loader.get_config()
 
 
-def load_activate_db_config() -> tuple[DatabaseInstance, DatabaseInstanceConfig]:
+def load_activate_db_config(db_instance_id: Optional[str] = None) -> tuple[DatabaseInstance, DatabaseInstanceConfig]:
     """
     Convenience function to load database configuration and active database instance
 
+    Args:
+        db_instance_id (str, optional): Instance selected by the session, None for the first active instance
+
     Returns:
         tuple[DatabaseInstance, DatabaseInstanceConfig]: Tuple of active database instance and configuration object
     """
-    loader = DatabaseInstanceConfigLoader()
-    config = loader.get_config()
-    active_database = loader.get_active_database()
-    if active_database is None:
-        logger.error(f"No active database instance found. config: {config}")
+    snapshot = DatabaseInstanceConfigLoader().get_snapshot()
+    if db_instance_id is not None:
+        db_instance = snapshot.get_instance(db_instance_id)
+        if db_instance is None:
+            raise ValueError(f"Database instance '{db_instance_id}' is not configured or not active")
+        return db_instance, snapshot.config
+    if snapshot.active_database is None:
+        logger.error(f"No active database instance found among {len(snapshot.config.db_instances_list)} configured instances")
         raise ValueError("No active database instance found")
-    return active_database, config
+    return snapshot.active_database, snapshot.config
@@ -5,46 +5,85 @@ Provides database operation functions with HTTP proxy support.
 """
 
 import json
-from typing import Any, Dict, Optional
+import time
+from typing import Any, Dict, List, Optional, Union
 
-from .db_config import load_activate_db_config
+from .db_config import DatabaseInstanceConfigLoader
+from .db_session import current_instance_id
 from .http_util import http_post
 from .logger_util import logger
 
-async def execute_sql(sql: str, params: Optional[Dict] = None) -> Any:
-    """Execute SQL statement (asynchronous version, using remote HTTP call)"""
+# Longest SQL text kept in request summaries
+SQL_SUMMARY_LIMIT = 200
+# Placeholder that replaces the database password in logged payloads
+MASKED_PASSWORD = "***hidden***"
 
-    # Load active database configuration
-    active_db, config = load_activate_db_config()
+
+def _summarize_sql(sql: str) -> str:
+    """Shorten the SQL text to SQL_SUMMARY_LIMIT characters for logging"""
+    return sql if len(sql) <= SQL_SUMMARY_LIMIT else f"{sql[:SQL_SUMMARY_LIMIT]}... ({len(sql)} chars)"
+
+
+def _mask_request(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of the request body with the database password masked"""
+    return {**data, "databaseInstance": {**data["databaseInstance"], "dbPassword": MASKED_PASSWORD}}
+
+
+def _summarize_response(result: Any) -> str:
+    """Row count or affected rows of the remote result, without touching the rows themselves"""
+    if isinstance(result, list):
+        return f"{len(result)} rows"
+    return f"result {result!r}"[:SQL_SUMMARY_LIMIT]
+
+
+async def execute_sql(sql: str, params: Optional[Union[List, Dict]] = None) -> Any:
+    """
+    Execute SQL statement (asynchronous version, using remote HTTP call)
+
+    Only size-bounded summaries (SQL prefix, param count, rows, duration) are logged.
+    Full request and response payloads, with the password masked, are logged at DEBUG
+    only when logTracePayloads is enabled.
+
+    Args:
+        sql (str): SQL statement, placeholders are resolved by the multidb server
+        params (list | dict, optional): Values bound to the placeholders, forwarded unchanged
+    """
+
+    # Current configuration snapshot, replaced as a whole when dbconfig.json changes
+    snapshot = DatabaseInstanceConfigLoader().get_snapshot()
+    config = snapshot.config
+    selected = current_instance_id.get()
+    active_db = snapshot.active_database if selected is None else snapshot.get_instance(selected)
+    if active_db is None:
+        raise ValueError(f"Database instance '{selected}' is not configured or not active" if selected
+                         else "No active database instance found")
 
     # Remote server API endpoint
     url = config.multidb_server
 
-    # Prepare request data and convert the database instance to a dictionary
-    active_db_dict = {
-        "dbInstanceId": active_db.db_instance_id,
-        "dbHost": active_db.db_host,
-        "dbPort": active_db.db_port,
-        "dbDatabase": active_db.db_database,
-        "dbUsername": active_db.db_username,
-        "dbPassword": active_db.db_password,
-        "dbType": active_db.db_type,
-        "dbActive": active_db.db_active
-    }
-
     data = {
         "sql": sql,
         "params": params,
-        "databaseInstance": active_db_dict
+        "databaseInstance": snapshot.instance_payloads[active_db.db_instance_id]
     }
 
-    json_str=json.dumps(data, indent=4)
-    logger.debug(f"Preparing to execute remote SQL via HTTP POST to {url}, data: {json_str}")
+    logger.opt(lazy=True).debug("Preparing to execute remote SQL via HTTP POST to {} on {}: {} params:{}",
+                                lambda: url, lambda: active_db.db_instance_id, lambda: _summarize_sql(sql),
+                                lambda: len(params) if params else 0)
+    if config.log_trace_payloads:
+        logger.opt(lazy=True).debug("Remote SQL request payload: {}",
+                                    lambda: json.dumps(_mask_request(data), default=str))
 
+    started = time.perf_counter()
     try:
         response = await http_post(url, data=data)
-        logger.info(f"Remote SQL executed successfully, result: {response}")
-        return response.get("data", [])
+        result = response.get("data", [])
+        logger.opt(lazy=True).debug("Remote SQL executed successfully in {:.1f} ms, {}",
+                                    lambda: (time.perf_counter() - started) * 1000,
+                                    lambda: _summarize_response(result))
+        if config.log_trace_payloads:
+            logger.opt(lazy=True).debug("Remote SQL response payload: {}", lambda: json.dumps(response, default=str))
+        return result
     except Exception as e:
-        logger.error(f"Remote SQL execution failed: {e}")
-        raise
\ No newline at end of file
+        logger.error(f"Remote SQL execution failed after {(time.perf_counter() - started) * 1000:.1f} ms: {e}")
+        raise
@@ -5,22 +5,33 @@ Provides asynchronous HTTP GET and POST request functions.
 """
 
 import asyncio
-from typing import Dict, Optional
-
-import aiohttp
+import json
+import time
+from typing import TYPE_CHECKING, Dict, Optional
 
 from .logger_util import logger
+from .tracing import current_traceparent, start_span
+
+if TYPE_CHECKING:
+    import aiohttp
+
+
+def _client_session() -> "aiohttp.ClientSession":
+    """New client session, aiohttp is imported on the first request instead of at server startup"""
+    import aiohttp
+    return aiohttp.ClientSession()
+
 
 async def http_get(url: str, headers: Optional[Dict[str, str]] = None, params: Optional[Dict[str, str]] = None) -> Dict:
     """
     Asynchronously execute HTTP GET request
     """
-    logger.info(f"Executing GET request to {url}, params: {params}")
+    logger.debug("Executing GET request to {}", url)
     try:
-        async with aiohttp.ClientSession() as session:
+        async with _client_session() as session:
             async with session.get(url, headers=headers, params=params) as response:
                 response.raise_for_status()
-                return await response.json()
+                return await _read_json(response)
     except Exception as e:
         logger.error(f"GET request failed: {e}")
         raise
@@ -28,13 +39,33 @@ async def http_get(url: str, headers: Optional[Dict[str, str]] = None, params: O
 async def http_post(url: str, headers: Optional[Dict[str, str]] = None, data: Optional[Dict] = None) -> Dict:
     """
     Asynchronously execute HTTP POST request
+
+    The request body is not logged here, callers log a summary of it instead.
+    The W3C traceparent of the request span is sent along, so the remote server can continue the trace.
     """
-    logger.info(f"Executing POST request to {url}, data: {data}")
+    logger.debug("Executing POST request to {}", url)
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, json=data) as response:
-                response.raise_for_status()
-                return await response.json()
+        with start_span("http.client POST", {"http.request.method": "POST", "url.full": url}) as span:
+            traceparent = current_traceparent()
+            if traceparent:
+                headers = {**(headers or {}), "traceparent": traceparent}
+            async with _client_session() as session:
+                async with session.post(url, headers=headers, json=data) as response:
+                    span.set_attribute("http.response.status_code", response.status)
+                    response.raise_for_status()
+                    return await _read_json(response)
     except Exception as e:
         logger.error(f"POST request failed: {e}")
-        raise
\ No newline at end of file
+        raise
+
+async def _read_json(response: "aiohttp.ClientResponse") -> Dict:
+    """Read and decode the JSON body, logging its size and transfer time"""
+    started = time.perf_counter()
+    with start_span("db.fetch") as span:
+        body = await response.read()
+        span.set_attribute("http.response.body.size", len(body))
+    logger.opt(lazy=True).debug("HTTP {} response from {}: {} bytes read in {:.1f} ms",
+                                lambda: response.status, lambda: response.url, lambda: len(body),
+                                lambda: (time.perf_counter() - started) * 1000)
+    with start_span("db.serialise"):
+        return json.loads(body)
@@ -6,6 +6,7 @@ Unified logging configuration module. All other modules should import logger fro
 
 import json
 import os
+import random
 import sys
 from loguru import logger
 
@@ -55,18 +56,46 @@ def normalize_log_path(log_path: str) -> str:
     logger.debug(f"log_path : {log_path}")
     return log_path
 
-def get_log_config() -> tuple[str, str]:
+def read_config_file(config_file: str) -> tuple[dict, int]:
+    """
+    Read and parse the configuration file
+
+    Returns:
+        tuple[dict, int]: Parsed configuration and the file modification time in nanoseconds
+
+    Raises:
+        OSError: Configuration file cannot be read
+        json.JSONDecodeError: Invalid JSON format
+    """
+    mtime_ns = os.stat(config_file).st_mtime_ns
+    with open(config_file, 'r', encoding='utf-8') as f:
+        return json.load(f), mtime_ns
+
+
+# Parsed once at import, shared by the log settings and the first database configuration snapshot
+try:
+    config_file_data, config_file_mtime_ns = read_config_file(db_config_path)
+except (OSError, json.JSONDecodeError):
+    config_file_data, config_file_mtime_ns = None, 0
+
+
+def get_log_config(config: dict = None) -> tuple[str, str, bool, float]:
     """Get log path and log level from configuration file
 
+    Args:
+        config (dict): Parsed configuration file, None when it is missing or invalid
+
     Returns:
-        tuple[str, str]: A tuple containing (log_path, log_level)
+        tuple[str, str, bool, float]: A tuple containing (log_path, log_level, log_enqueue, log_sample_rate)
             - log_path (str): Path to the log directory
             - log_level (str): Log level (TRACE, DEBUG, INFO, SUCCESS, WARNING, ERROR, CRITICAL)
+            - log_enqueue (bool): Whether sinks are written by a background thread instead of the caller
+            - log_sample_rate (float): Fraction of per-query INFO lines that are written, between 0 and 1
     """
-    config_file = db_config_path
+    if config is None:
+        # If configuration file doesn't exist or parsing fails, use default values
+        return os.path.join(project_path, "logs"), "INFO", False, 1.0
     try:
-        with open(config_file, 'r', encoding='utf-8') as f:
-            config = json.load(f)
 
         # Get log path
         log_path = config.get('logPath')
@@ -84,17 +113,26 @@ def get_log_config() -> tuple[str, str]:
             if log_level not in loglevel_array:
                 log_level = "INFO"
 
-        return log_path, log_level
+        # Write sinks from a background thread, so file and stderr I/O never blocks the event loop
+        log_enqueue = bool(config.get('logEnqueue', False))
+
+        # Keep only a sample of the per-query INFO lines on busy servers
+        try:
+            log_sample_rate = min(max(float(config.get('logSampleRate', 1.0)), 0.0), 1.0)
+        except (TypeError, ValueError):
+            log_sample_rate = 1.0
+
+        return log_path, log_level, log_enqueue, log_sample_rate
     except (FileNotFoundError, json.JSONDecodeError, KeyError):
         # If configuration file doesn't exist or parsing fails, use default values
-        return os.path.join(project_path, "logs"), "INFO"
+        return os.path.join(project_path, "logs"), "INFO", False, 1.0
 
 
-log_path, log_level = get_log_config()
+log_path, log_level, log_enqueue, log_sample_rate = get_log_config(config_file_data)
 log_file = os.path.join(log_path, "mcp_server.log")
 
 
-def setup_logger(log_file: str, log_level: str):
+def setup_logger(log_file: str, log_level: str, enqueue: bool = False):
     """Configure logging output"""
     # Remove default logger configuration
     logger.remove()
@@ -103,27 +141,43 @@ def setup_logger(log_file: str, log_level: str):
     logger.add(
         sys.stderr,
         level=log_level,
-        format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {name}:{function}:{line} | {message}"
+        format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {name}:{function}:{line} | {message}",
+        enqueue=enqueue
     )
 
-    # Also output to file
-    if not os.path.exists(log_path):
-        os.makedirs(log_path, exist_ok=True)
-
+    # Also output to file, opened (and its directory created) by the first record instead of at import
     logger.add(
         log_file,
         rotation="10 MB",
         retention="7 days",
+        delay=True,
         level=log_level,
-        format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {name}:{function}:{line} | {message}"
+        format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {name}:{function}:{line} | {message}",
+        enqueue=enqueue
     )
 
-    logger.info(f"Logging configuration completed, log level: {log_level}, log file path: {log_file}")
     return logger
 
 
+def log_logging_config():
+    """Log the logging configuration, called once the server runs so that importing a module opens no log file"""
+    logger.info(f"Logging configuration completed, log level: {log_level}, log file path: {log_file}, "
+                f"background writer: {log_enqueue}, query log sample rate: {log_sample_rate}")
+
+
 # Initialize logging configuration
-setup_logger(log_file, log_level)
+setup_logger(log_file, log_level, log_enqueue)
+
+
+def sample_query_log() -> bool:
+    """
+    Whether a per-query INFO line should be written, according to logSampleRate
+
+    Returns:
+        bool: True for roughly logSampleRate of the calls, always True when the rate is 1
+    """
+    return log_sample_rate >= 1.0 or random.random() < log_sample_rate
+
 
 # Export logger for use by other modules
-__all__ = ['logger']
+__all__ = ['logger', 'log_logging_config', 'sample_query_log']
@@ -0,0 +1,184 @@
+"""
+Runtime Monitor Module
+
+Finds what blocks the asyncio event loop. A probe task measures how late the loop wakes it (loop lag),
+a watchdog thread captures the stack of the loop thread while the loop is stalled, and the optional
+asyncio debug mode reports every callback that ran longer than slow_callback_duration.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from .logger_util import logger
+
+# Loop lag samples kept for the percentiles, one per probe interval
+LAG_SAMPLE_SIZE = 600
+# Stalls and slow callbacks kept with their stacks
+EVENT_BUFFER_SIZE = 50
+# Innermost frames kept of a captured stack
+STACK_DEPTH = 30
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+
+class _SlowCallbackHandler(logging.Handler):
+    """Receives the "Executing <Handle> took N seconds" warnings of asyncio debug mode"""
+
+    def __init__(self, monitor: "RuntimeMonitor"):
+        super().__init__(logging.WARNING)
+        self.monitor = monitor
+
+    def emit(self, record: logging.LogRecord):
+        if record.getMessage().startswith("Executing "):
+            self.monitor.record_slow_callback(record.getMessage())
+
+
+class RuntimeMonitor:
+    """Event loop lag probe, stall watchdog and slow callback collector"""
+
+    def __init__(self):
+        self.interval_ms = 100
+        self.stall_threshold_ms = 200
+        self.slow_callback_ms = 0
+        self._lags: deque = deque(maxlen=LAG_SAMPLE_SIZE)
+        self._max_lag_ms = 0.0
+        self._stalls: deque = deque(maxlen=EVENT_BUFFER_SIZE)
+        self._stall_count = 0
+        self._slow_callbacks: deque = deque(maxlen=EVENT_BUFFER_SIZE)
+        self._slow_callback_count = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat = 0.0
+        self._probe_task: Optional[asyncio.Task] = None
+        self._slow_callback_handler: Optional[_SlowCallbackHandler] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._probe_task is not None and not self._probe_task.done()
+
+    def configure(self, interval_ms: int, stall_threshold_ms: int, slow_callback_ms: int):
+        """
+        Set the monitor thresholds, applied when the monitor starts
+
+        Args:
+            interval_ms (int): Loop lag probe interval, 0 disables the monitor
+            stall_threshold_ms (int): Capture the loop thread stack when the loop is blocked this long, 0 disables the watchdog
+            slow_callback_ms (int): Enable asyncio debug mode and record callbacks running longer than this, 0 disables it
+        """
+        self.interval_ms = max(int(interval_ms or 0), 0)
+        self.stall_threshold_ms = max(int(stall_threshold_ms or 0), 0)
+        self.slow_callback_ms = max(int(slow_callback_ms or 0), 0)
+        logger.info(f"Runtime monitor: probe interval {self.interval_ms} ms, stall threshold "
+                    f"{self.stall_threshold_ms} ms, slow callback threshold {self.slow_callback_ms} ms")
+
+    def start(self):
+        """Start monitoring the running event loop, a no-op when already running on it"""
+        loop = asyncio.get_running_loop()
+        if self.interval_ms <= 0 or (self.running and self._loop is loop):
+            return
+        self._loop = loop
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._probe_task = loop.create_task(self._probe())
+
+        if self.stall_threshold_ms > 0:
+            threading.Thread(target=self._watch, args=(loop,), name="loop-watchdog", daemon=True).start()
+
+        if self.slow_callback_ms > 0:
+            # Debug mode adds per-callback bookkeeping, so it is only enabled on request
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.slow_callback_ms / 1000
+            if self._slow_callback_handler is None:
+                self._slow_callback_handler = _SlowCallbackHandler(self)
+                logging.getLogger("asyncio").addHandler(self._slow_callback_handler)
+        logger.info("Runtime monitor started")
+
+    async def _probe(self):
+        interval = self.interval_ms / 1000
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            lag_ms = max(now - started - interval, 0.0) * 1000
+            self._heartbeat = now
+            with self._lock:
+                self._lags.append(lag_ms)
+                if lag_ms > self._max_lag_ms:
+                    self._max_lag_ms = lag_ms
+
+    def _watch(self, loop: asyncio.AbstractEventLoop):
+        """Watchdog thread: a stale probe heartbeat means the loop thread is stuck in a callback"""
+        interval = self.interval_ms / 1000
+        threshold = self.stall_threshold_ms / 1000
+        reported = 0.0
+        while not loop.is_closed():
+            time.sleep(threshold / 2)
+            heartbeat = self._heartbeat
+            blocked = time.monotonic() - heartbeat - interval
+            if blocked < threshold or heartbeat == reported or not loop.is_running():
+                continue
+            # One capture per stall, taken while the blocking code is still on the stack
+            reported = heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)[-STACK_DEPTH:]) if frame is not None else ""
+            with self._lock:
+                self._stall_count += 1
+                self._stalls.append({
+                    "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "blocked_ms": round(blocked * 1000, 1),
+                    "stack": stack,
+                })
+            logger.warning(f"Event loop blocked for more than {blocked * 1000:.0f} ms:\n{stack}")
+
+    def record_slow_callback(self, message: str):
+        with self._lock:
+            self._slow_callback_count += 1
+            self._slow_callbacks.append({"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "callback": message[:1000]})
+
+    def stats(self) -> Dict[str, Any]:
+        """Loop lag percentiles, recent stalls with stacks and recent slow callbacks"""
+        with self._lock:
+            lags = sorted(self._lags)
+            last_lag = self._lags[-1] if self._lags else 0.0
+            stalls = list(self._stalls)
+            slow_callbacks = list(self._slow_callbacks)
+            stall_count, slow_callback_count, max_lag = self._stall_count, self._slow_callback_count, self._max_lag_ms
+        try:
+            tasks = len(asyncio.all_tasks())
+        except RuntimeError:
+            tasks = 0
+        return {
+            "running": self.running,
+            "interval_ms": self.interval_ms,
+            "stall_threshold_ms": self.stall_threshold_ms,
+            "slow_callback_ms": self.slow_callback_ms,
+            "loop_lag": {
+                "samples": len(lags),
+                "last_ms": round(last_lag, 3),
+                "p50_ms": round(_percentile(lags, 0.50), 3),
+                "p99_ms": round(_percentile(lags, 0.99), 3),
+                "max_ms": round(max_lag, 3),
+            },
+            "stalls": {"count": stall_count, "recent": stalls[::-1]},
+            "slow_callbacks": {"count": slow_callback_count, "recent": slow_callbacks[::-1]},
+            "tasks": tasks,
+            "threads": threading.active_count(),
+        }
+
+
+runtime_monitor = RuntimeMonitor()
+
+
+def configure_runtime_monitor(interval_ms: int, stall_threshold_ms: int, slow_callback_ms: int):
+    """Set the monitor thresholds, see RuntimeMonitor.configure"""
+    runtime_monitor.configure(interval_ms, stall_threshold_ms, slow_callback_ms)
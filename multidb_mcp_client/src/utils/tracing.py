@@ -0,0 +1,222 @@
+"""
+Tracing Module
+
+Lightweight OpenTelemetry compatible request tracing. Spans carry W3C trace context
+(32 hex digit trace id, 16 hex digit span id, traceparent header), follow the call through
+awaits and tasks via a context variable, and are exported in the OTLP JSON span shape to an
+in-memory buffer or to stderr, so no collector is needed.
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from .logger_util import logger
+
+# none disables tracing, memory keeps recent spans for database://traces, stderr also writes one JSON line per span
+TRACE_EXPORTERS = ("none", "memory", "stderr")
+# Finished spans kept by the in-memory exporter
+SPAN_BUFFER_SIZE = 4096
+
+_TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed operation of a trace"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes", "start_ns", "end_ns",
+                 "status", "status_message")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.status = "UNSET"
+        self.status_message = ""
+
+    @property
+    def traceparent(self) -> str:
+        """W3C traceparent header value identifying this span"""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_error(self, message: str):
+        """Mark the span as failed"""
+        self.status = "ERROR"
+        self.status_message = str(message)[:200]
+
+    def record_error(self, error: BaseException):
+        """Mark the span as failed by an exception"""
+        self.set_error(str(error))
+        self.attributes["exception.type"] = type(error).__name__
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Span in the OTLP JSON shape, plus its duration in milliseconds"""
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "durationMs": round(self.duration_ms, 3),
+            "attributes": dict(self.attributes),
+            "status": {"code": self.status, "message": self.status_message},
+        }
+
+
+class _NoopSpan:
+    """Returned while tracing is disabled, so callers never need to check"""
+
+    traceparent = None
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_error(self, message: str):
+        pass
+
+    def record_error(self, error: BaseException):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """Creates spans and hands finished ones to the configured exporter"""
+
+    def __init__(self):
+        self.exporter = "none"
+        self._spans: deque = deque(maxlen=SPAN_BUFFER_SIZE)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter != "none"
+
+    def configure(self, exporter: Optional[str]):
+        """
+        Select the span exporter
+
+        Args:
+            exporter (str): One of TRACE_EXPORTERS, unknown values disable tracing
+        """
+        exporter = (exporter or "none").lower()
+        if exporter not in TRACE_EXPORTERS:
+            logger.warning(f"Unknown trace exporter '{exporter}', tracing is disabled")
+            exporter = "none"
+        self.exporter = exporter
+        logger.info(f"Tracing exporter: {exporter}")
+
+    @contextmanager
+    def start_span(self, name: str, attributes: Optional[Dict[str, Any]] = None,
+                   traceparent: Optional[str] = None) -> Iterator[Any]:
+        """
+        Time a block as a span, child of the current span or of a remote traceparent
+
+        Args:
+            name (str): Span name
+            attributes (dict, optional): Span attributes, named after the OpenTelemetry semantic conventions
+            traceparent (str, optional): W3C traceparent of a remote parent, used when there is no current span
+
+        Yields:
+            Span: The active span, or a no-op span while tracing is disabled
+        """
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+
+        parent = _current_span.get()
+        if parent is not None:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        else:
+            remote = _TRACEPARENT_PATTERN.match(traceparent or "")
+            trace_id, parent_id = (remote.group(1), remote.group(2)) if remote else (os.urandom(16).hex(), None)
+
+        span = Span(name, trace_id, parent_id, dict(attributes or {}))
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+            self._export(span)
+
+    def _export(self, span: Span):
+        with self._lock:
+            self._spans.append(span)
+        if self.exporter == "stderr":
+            # stdout belongs to the stdio transport
+            sys.stderr.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+    def recent_traces(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Get the most recent traces from the in-memory buffer
+
+        Args:
+            limit (int): Number of traces to return
+
+        Returns:
+            List[Dict[str, Any]]: Newest first, each with its root span name, duration and spans in start order
+        """
+        with self._lock:
+            spans = list(self._spans)
+
+        traces: "OrderedDict[str, List[Span]]" = OrderedDict()
+        for span in reversed(spans):
+            if span.trace_id not in traces and len(traces) >= limit:
+                continue
+            traces.setdefault(span.trace_id, []).append(span)
+
+        result = []
+        for trace_id, trace_spans in traces.items():
+            trace_spans.sort(key=lambda s: s.start_ns)
+            root = trace_spans[0]
+            result.append({
+                "traceId": trace_id,
+                "root": root.name,
+                "durationMs": round((max(s.end_ns for s in trace_spans) - root.start_ns) / 1e6, 3),
+                "spans": [s.to_dict() for s in trace_spans],
+            })
+        return result
+
+
+tracer = Tracer()
+
+
+def configure_tracing(exporter: Optional[str]):
+    """Select the span exporter, see Tracer.configure"""
+    tracer.configure(exporter)
+
+
+def start_span(name: str, attributes: Optional[Dict[str, Any]] = None, traceparent: Optional[str] = None):
+    """Time a block as a span, see Tracer.start_span"""
+    return tracer.start_span(name, attributes, traceparent)
+
+
+def current_traceparent() -> Optional[str]:
+    """W3C traceparent of the current span, None outside a span or while tracing is disabled"""
+    span = _current_span.get()
+    return span.traceparent if span is not None else None
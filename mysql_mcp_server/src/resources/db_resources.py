@@ -1,22 +1,28 @@
+from src.utils.catalog_cache import catalog_cache
+from src.utils.cost_guard import cost_guard
 from src.utils.db_config import load_activate_db_config
+from src.utils.db_session import current_instance_id
+from src.utils.db_admission import METADATA_LANE, collect_admission_stats, get_admission_controller
+from src.utils.db_metrics import render_prometheus
 from src.utils.db_operate import execute_sql
+from src.utils.db_pool import collect_pool_stats, get_db_pool
 from src.utils.logger_util import logger
 
 
 async def generate_database_tables():
     try:
         # Get all table names
-        tables_result = execute_sql("SHOW TABLES")
+        tables_result = await execute_sql("SHOW TABLES", lane=METADATA_LANE)
         tables_info = []
 
         for table_row in tables_result:
             table_name = list(table_row.values())[0]  # Get table name
 
             # Get table structure
-            describe_result = execute_sql(f"DESCRIBE {table_name}")
+            describe_result = await execute_sql(f"DESCRIBE {table_name}", lane=METADATA_LANE)
 
             # Get table record count
-            count_result = execute_sql(f"SELECT COUNT(*) as count FROM {table_name}")
+            count_result = await execute_sql(f"SELECT COUNT(*) as count FROM {table_name}", lane=METADATA_LANE)
             record_count = count_result[0]['count'] if count_result else 0
 
             tables_info.append({
@@ -41,7 +47,7 @@ async def generate_database_tables():
 
 async def generate_database_config():
 
-    active_db, db_config = load_activate_db_config()
+    active_db, db_config = load_activate_db_config(current_instance_id.get())
 
     # Hide sensitive information
     safe_config = {
@@ -56,7 +62,26 @@ async def generate_database_config():
         "pool_size": db_config.db_pool_size,
         "max_overflow": db_config.db_max_overflow,
         "pool_timeout":db_config.db_pool_timeout,
+        "pool_recycle": db_config.db_pool_recycle,
+        "query_timeout_ms": db_config.db_query_timeout_ms,
     }
     logger.info("Successfully obtained database configuration information")
     logger.info(f"Database configuration: {safe_config}")
-    return safe_config
\ No newline at end of file
+    return safe_config
+
+async def generate_pool_stats():
+    """Get connection pool metrics and admission lane state"""
+    pool = await get_db_pool()
+    pool_stats = {
+        "pools": [pool.stats()],
+        "admission": get_admission_controller().snapshot(),
+        "cost_guard": cost_guard.snapshot(),
+        "catalog_cache": catalog_cache.snapshot(),
+    }
+    logger.debug(f"Connection pool statistics: {pool_stats}")
+    return pool_stats
+
+
+def generate_prometheus_metrics() -> str:
+    """Render connection pool and admission metrics in Prometheus text format"""
+    return render_prometheus(collect_pool_stats(), collect_admission_stats())
@@ -13,6 +13,8 @@ from .db_config import (
     load_activate_db_config
 )
 from .db_operate import execute_sql
+from .sql_fingerprint import normalize_sql, fingerprint_sql, statement_registry
+from .sql_classifier import SqlClassification, classify_sql
 
 
 __all__ = [
@@ -27,4 +29,11 @@ __all__ = [
     "load_activate_db_config",
     # Database operations
     "execute_sql",
+    # Statement fingerprints
+    "normalize_sql",
+    "fingerprint_sql",
+    "statement_registry",
+    # Statement classification
+    "SqlClassification",
+    "classify_sql",
 ]
\ No newline at end of file
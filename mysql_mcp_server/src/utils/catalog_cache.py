@@ -0,0 +1,202 @@
+"""
+Catalog Cache Module
+
+Columns, indexes, foreign keys and statistics of tables, read for any number of tables with one UNION ALL query
+over information_schema (COLUMNS, STATISTICS, KEY_COLUMN_USAGE and TABLES) and kept per database instance for
+dbCatalogCacheTtl seconds, so describe_table answers repeated lookups without a catalog round trip. Schema
+changing statements run through sql_exec drop the entries of their instance.
+"""
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.utils.db_admission import METADATA_LANE
+from src.utils.db_config import load_activate_db_config
+from src.utils.db_operate import execute_sql
+from src.utils.db_session import current_instance_id
+from src.utils.logger_util import logger
+from src.utils.sql_classifier import classify_sql
+
+# Writes that change rows only, every other statement that is not read-only may change the catalog
+DATA_STATEMENTS = frozenset(("insert", "update", "delete", "replace", "load"))
+# Tables one describe_table call accepts
+MAX_DESCRIBE_TABLES = 100
+
+# One row per column, index column, foreign key column and table, {filter} is the (schema, table) condition
+TABLE_DETAILS_SQL = """
+    SELECT 'column' AS kind, TABLE_SCHEMA AS table_schema, TABLE_NAME AS table_name, NULL AS object_name,
+           ORDINAL_POSITION AS position, COLUMN_NAME AS column_name, COLUMN_TYPE AS data_type,
+           IS_NULLABLE AS nullable, COLUMN_DEFAULT AS default_value, COLUMN_KEY AS column_key, EXTRA AS extra,
+           NULL AS non_unique, NULL AS referenced_schema, NULL AS referenced_table, NULL AS referenced_column,
+           NULL AS cardinality
+    FROM information_schema.COLUMNS WHERE {filter}
+    UNION ALL
+    SELECT 'index', TABLE_SCHEMA, TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX, COLUMN_NAME, INDEX_TYPE,
+           NULL, NULL, NULL, NULL, NON_UNIQUE, NULL, NULL, NULL, CARDINALITY
+    FROM information_schema.STATISTICS WHERE {filter}
+    UNION ALL
+    SELECT 'foreign_key', TABLE_SCHEMA, TABLE_NAME, CONSTRAINT_NAME, ORDINAL_POSITION, COLUMN_NAME, NULL,
+           NULL, NULL, NULL, NULL, NULL, REFERENCED_TABLE_SCHEMA, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME, NULL
+    FROM information_schema.KEY_COLUMN_USAGE WHERE REFERENCED_TABLE_NAME IS NOT NULL AND ({filter})
+    UNION ALL
+    SELECT 'table', TABLE_SCHEMA, TABLE_NAME, NULL, 0, NULL, ENGINE,
+           NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL, TABLE_ROWS
+    FROM information_schema.TABLES WHERE {filter}
+    ORDER BY table_schema, table_name, kind, object_name, position
+"""
+
+# "table", "database.table", each part plain or backquoted
+_NAME = r"`(?:[^`]|``)+`|[^.`]+"
+_TABLE_NAME_RE = re.compile(rf"\s*(?:(?P<schema>{_NAME})\s*\.\s*)?(?P<table>{_NAME})\s*\Z")
+
+
+def changes_catalog(sql: str) -> bool:
+    """Whether a statement may create, alter or drop tables or their indexes"""
+    classification = classify_sql(sql)
+    if classification.read_only:
+        return False
+    return classification.statement_count > 1 or classification.statement_type not in DATA_STATEMENTS
+
+
+def _unquote(name: str) -> str:
+    name = name.strip()
+    return name[1:-1].replace("``", "`") if name.startswith("`") else name
+
+
+def split_table_name(table_name: str) -> Tuple[Optional[str], str]:
+    """(database or None, table) of a "table" or "database.table" name, backquotes around either part are removed"""
+    match = _TABLE_NAME_RE.match(table_name)
+    if match is None:
+        return None, table_name
+    schema = match.group("schema")
+    return (_unquote(schema) if schema else None), _unquote(match.group("table"))
+
+
+def _table_details(rows: List[Dict[str, Any]]) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """Compact description of each table in the rows of TABLE_DETAILS_SQL, keyed by lower case (schema, table)"""
+    tables: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for row in rows:
+        key = (str(row["table_schema"]).lower(), str(row["table_name"]).lower())
+        table = tables.get(key)
+        if table is None:
+            table = tables[key] = {"table": f"{row['table_schema']}.{row['table_name']}", "rows": None,
+                                   "columns": [], "indexes": [], "foreign_keys": []}
+        kind = row["kind"]
+        if kind == "table":
+            table["rows"] = row["cardinality"]
+        elif kind == "column":
+            column = {"name": row["column_name"], "type": row["data_type"], "nullable": row["nullable"] == "YES"}
+            for field, value in (("default", row["default_value"]), ("key", row["column_key"]), ("extra", row["extra"])):
+                if value not in (None, ""):
+                    column[field] = value
+            table["columns"].append(column)
+        elif kind == "index":
+            indexes = table["indexes"]
+            if not indexes or indexes[-1]["name"] != row["object_name"]:
+                indexes.append({"name": row["object_name"], "columns": [], "unique": not int(row["non_unique"]),
+                                "type": row["data_type"]})
+            indexes[-1]["columns"].append(row["column_name"])
+            # The cardinality of an index prefix is the number of distinct values of its columns
+            indexes[-1]["cardinality"] = row["cardinality"]
+        else:
+            foreign_keys = table["foreign_keys"]
+            if not foreign_keys or foreign_keys[-1]["name"] != row["object_name"]:
+                foreign_keys.append({"name": row["object_name"], "columns": [],
+                                     "references": f"{row['referenced_schema']}.{row['referenced_table']}",
+                                     "referenced_columns": []})
+            foreign_keys[-1]["columns"].append(row["column_name"])
+            foreign_keys[-1]["referenced_columns"].append(row["referenced_column"])
+
+    for table in tables.values():
+        # Distinct values of a column, from the index it leads
+        distinct = {}
+        for index in table["indexes"]:
+            if len(index["columns"]) == 1 and index["cardinality"] is not None:
+                distinct.setdefault(index["columns"][0], index["cardinality"])
+        for column in table["columns"]:
+            if column["name"] in distinct:
+                column["distinct"] = distinct[column["name"]]
+    return tables
+
+
+class CatalogCache:
+    """Table descriptions of each database instance, loaded on demand and kept for dbCatalogCacheTtl seconds"""
+
+    def __init__(self):
+        self._entries: Dict[str, Dict[Tuple[str, str], Tuple[float, Dict[str, Any]]]] = {}
+        self._generations: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def describe(self, table_names: List[str]) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """
+        Compact descriptions of tables, the tables missing from the cache are read with one query
+
+        A name without database refers to the database of the active instance. Each description has table,
+        rows (estimate), columns (name, type, nullable, and default, key, extra and distinct when set), indexes
+        (name, columns, unique, type, cardinality) and foreign_keys (name, columns, references, referenced_columns).
+        The descriptions are shared between callers and must not be modified.
+
+        Returns:
+            Tuple[List[dict], List[str]]: Descriptions in the order of the names, and the names of missing tables
+        """
+        active_db, db_config = load_activate_db_config(current_instance_id.get())
+        instance = active_db.db_instance_id
+        entries = self._entries.setdefault(instance, {})
+        # Names as given for the query, in lower case for the cache (table names are case-insensitive on some systems)
+        names: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        keys = []
+        for table_name in table_names:
+            schema, name = split_table_name(table_name)
+            schema = schema or active_db.db_database
+            key = (schema.lower(), name.lower())
+            names.setdefault(key, (schema, name))
+            keys.append(key)
+
+        now = time.monotonic()
+        found: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        wanted = []
+        for key, name in names.items():
+            cached = entries.get(key)
+            if cached is not None and cached[0] > now:
+                self.hits += 1
+                found[key] = cached[1]
+            else:
+                wanted.append(name)
+
+        if wanted:
+            self.misses += len(wanted)
+            generation = self._generations.get(instance, 0)
+            condition = " OR ".join(["(TABLE_SCHEMA = %s AND TABLE_NAME = %s)"] * len(wanted))
+            params = [part for name in wanted for part in name]
+            rows = await execute_sql(TABLE_DETAILS_SQL.format(filter=condition), params * 4, lane=METADATA_LANE)
+            loaded = _table_details(rows)
+            found.update(loaded)
+            ttl = float(db_config.db_catalog_cache_ttl)
+            # A schema change while the query ran leaves the result out of the cache
+            if ttl > 0 and self._generations.get(instance, 0) == generation:
+                expires = time.monotonic() + ttl
+                entries.update((key, (expires, table)) for key, table in loaded.items())
+            logger.debug(f"Catalog of {len(loaded)} tables of database instance {instance} loaded")
+
+        tables = [found[key] for key in keys if key in found]
+        missing = [table_name for table_name, key in zip(table_names, keys) if key not in found]
+        return tables, missing
+
+    def invalidate(self):
+        """Drop the cached tables of the database instance of the current session"""
+        active_db, _ = load_activate_db_config(current_instance_id.get())
+        instance = active_db.db_instance_id
+        self._generations[instance] = self._generations.get(instance, 0) + 1
+        if self._entries.pop(instance, None):
+            self.invalidations += 1
+            logger.debug(f"Catalog cache of database instance {instance} invalidated")
+
+    def snapshot(self) -> Dict[str, int]:
+        """Counters of the cache"""
+        return {"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations,
+                "cached_tables": sum(len(entries) for entries in self._entries.values())}
+
+
+catalog_cache = CatalogCache()
@@ -0,0 +1,224 @@
+"""
+Query Cost Guard Module
+
+Optional pre-flight of the statements agents send: EXPLAIN estimates how many rows a statement examines,
+and statements over dbCostGuardMaxRows are rejected, or for queries in "limit" mode run with a LIMIT,
+before they tie up the database. Estimates are cached per statement fingerprint for dbCostGuardCacheTtl
+seconds, so a repeated statement costs no extra round trip.
+
+The EXPLAIN output of MySQL / MariaDB (rows and filtered per table), TiDB (estRows per operator) and
+OceanBase (EST.ROWS column of the plan text) is understood.
+"""
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.utils.db_config import load_activate_db_config
+from src.utils.db_session import current_instance_id
+from src.utils.logger_util import logger
+from src.utils.sql_classifier import blank_literals, classify_sql, strip_trailing_semicolons
+from src.utils.sql_fingerprint import fingerprint_sql
+
+# Guard modes (dbCostGuard)
+GUARD_OFF = "off"
+GUARD_REJECT = "reject"
+GUARD_LIMIT = "limit"
+
+# Statements EXPLAIN can estimate
+GUARDED_STATEMENTS = frozenset(("select", "table", "update", "delete", "insert", "replace"))
+# Statements a LIMIT can be appended to
+LIMITABLE_STATEMENTS = frozenset(("select", "table"))
+
+# Plan estimates kept, least recently used first out
+ESTIMATE_CACHE_SIZE = 1024
+# Error code of a statement stopped by KILL QUERY
+ER_QUERY_INTERRUPTED = 1317
+
+_PARENS_RE = re.compile(r"\([^()]*\)")
+# LIMIT count, LIMIT offset, count and LIMIT count OFFSET offset
+_LIMIT_RE = re.compile(r"\blimit\s+(?:(\d+)(?:\s*,\s*(\d+)|\s+offset\s+(\d+))?|\S)", re.I)
+
+
+class QueryCostRejectedError(Exception):
+    """Raised when the plan estimate of a statement is over the cost guard thresholds"""
+
+
+@dataclass(frozen=True)
+class PlanEstimate:
+    """Estimate of one statement from its EXPLAIN output"""
+    rows: float
+    sorts: bool
+
+
+def _top_level_limit(sql: str) -> Tuple[bool, Optional[int]]:
+    """
+    Whether the statement has a LIMIT outside parentheses, and the rows it lets through (offset + count)
+
+    Returns:
+        Tuple[bool, Optional[int]]: (has a LIMIT, offset + count or None when the LIMIT is a placeholder)
+    """
+    text = blank_literals(sql)
+    previous = None
+    while previous != text:
+        previous, text = text, _PARENS_RE.sub(" ", text)
+    match = None
+    for match in _LIMIT_RE.finditer(text):
+        pass
+    if match is None:
+        return False, None
+    first, count, offset = match.group(1), match.group(2), match.group(3)
+    if first is None:
+        return True, None
+    if count is not None:
+        return True, int(first) + int(count)
+    return True, int(first) + int(offset or 0)
+
+
+def _number(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _plan_text_rows(text: str) -> Optional[float]:
+    """Largest EST.ROWS of an OceanBase plan table, None when the text has no such column"""
+    column = None
+    rows = None
+    for line in text.splitlines():
+        cells = [cell.strip() for cell in line.split("|")]
+        if column is None:
+            names = [re.sub(r"[\s.]", "", cell).upper() for cell in cells]
+            if "ESTROWS" in names:
+                column = names.index("ESTROWS")
+            continue
+        if len(cells) > column and re.fullmatch(r"\d+(?:\.\d+)?", cells[column]):
+            rows = max(rows or 0.0, float(cells[column]))
+    return rows
+
+
+def estimate_plan(plan: List[Dict[str, Any]]) -> Optional[PlanEstimate]:
+    """
+    Rows a statement examines according to its EXPLAIN rows, None when the format is not understood
+
+    MySQL and MariaDB list one row per table: tables of the same select id are joined in nested loops, so each
+    is scanned once per row the tables before it produce (rows * filtered%). TiDB and OceanBase report an
+    estimate per operator, the largest one is taken.
+    """
+    if not plan:
+        return None
+    first = plan[0]
+    if "rows" in first:
+        examined = 0.0
+        produced: Dict[Any, float] = {}
+        for row in plan:
+            rows = _number(row.get("rows")) or 1.0
+            filtered = _number(row.get("filtered")) or 100.0
+            before = produced.get(row.get("id"), 1.0)
+            examined += before * rows
+            produced[row.get("id")] = before * rows * filtered / 100
+        extra = " ".join(str(row.get("Extra") or "") for row in plan).lower()
+        return PlanEstimate(examined, "filesort" in extra or "temporary" in extra)
+    if "estRows" in first:
+        return PlanEstimate(max(_number(row.get("estRows")) for row in plan), False)
+    rows = _plan_text_rows("\n".join(str(value) for row in plan for value in row.values()))
+    return PlanEstimate(rows, False) if rows is not None else None
+
+
+class CostGuard:
+    """EXPLAIN based pre-flight check with plan estimates cached per statement fingerprint"""
+
+    def __init__(self, max_entries: int = ESTIMATE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._estimates: "OrderedDict[Tuple[Optional[str], str], Tuple[float, Optional[PlanEstimate]]]" = OrderedDict()
+        self.checks = 0
+        self.cache_hits = 0
+        self.rejected = 0
+        self.limited = 0
+
+    async def check(self, cursor, sql: str, params: Any) -> str:
+        """
+        Check a statement against the cost guard before it is executed on the cursor's connection
+
+        Args:
+            cursor: Cursor of the connection the statement runs on, used for EXPLAIN on a cache miss
+            sql (str): The statement
+            params: Values bound to the statement
+
+        Returns:
+            str: The statement to execute, with a LIMIT appended when the guard limited it
+
+        Raises:
+            QueryCostRejectedError: The estimate is over dbCostGuardMaxRows and the statement cannot be limited
+        """
+        _, db_config = load_activate_db_config()
+        mode = db_config.db_cost_guard
+        max_rows = int(db_config.db_cost_guard_max_rows)
+        if mode not in (GUARD_REJECT, GUARD_LIMIT) or max_rows <= 0:
+            return sql
+        classification = classify_sql(sql)
+        if classification.statement_count != 1 or classification.statement_type not in GUARDED_STATEMENTS:
+            return sql
+
+        self.checks += 1
+        estimate = await self._estimate(cursor, sql, params, float(db_config.db_cost_guard_cache_ttl))
+        if estimate is None:
+            return sql
+        has_limit, limit_rows = _top_level_limit(sql)
+        rows = estimate.rows
+        if has_limit and limit_rows is not None and not estimate.sorts:
+            # Without a sort the scan stops once the LIMIT is reached
+            rows = min(rows, limit_rows)
+        if rows <= max_rows:
+            return sql
+
+        fingerprint = fingerprint_sql(sql)
+        if mode == GUARD_LIMIT and not has_limit and classification.returns_rows and classification.read_only \
+                and classification.statement_type in LIMITABLE_STATEMENTS:
+            self.limited += 1
+            limit = int(db_config.db_cost_guard_limit)
+            logger.warning(f"SQL [{fingerprint}] examines an estimated {rows:.0f} rows, over dbCostGuardMaxRows "
+                           f"{max_rows}, running it with LIMIT {limit}")
+            # The newline ends a trailing line comment
+            return f"{strip_trailing_semicolons(sql)}\nLIMIT {limit}"
+        self.rejected += 1
+        logger.warning(f"SQL [{fingerprint}] rejected, it examines an estimated {rows:.0f} rows, "
+                       f"over dbCostGuardMaxRows {max_rows}")
+        raise QueryCostRejectedError(f"Statement rejected by the cost guard: it examines an estimated {rows:.0f} "
+                                     f"rows, the limit is {max_rows}. Add a selective WHERE clause or a LIMIT")
+
+    async def _estimate(self, cursor, sql: str, params: Any, ttl: float) -> Optional[PlanEstimate]:
+        key = (current_instance_id.get(), fingerprint_sql(sql))
+        now = time.monotonic()
+        cached = self._estimates.get(key)
+        if cached is not None and cached[0] > now:
+            self._estimates.move_to_end(key)
+            self.cache_hits += 1
+            return cached[1]
+
+        try:
+            await cursor.execute(f"EXPLAIN {sql}", params if params else None)
+            estimate = estimate_plan(await cursor.fetchall())
+        except Exception as e:
+            if e.args and e.args[0] == ER_QUERY_INTERRUPTED:
+                # The call timed out during EXPLAIN
+                raise
+            # The statement itself reports the error, the guard does not stand in its way. The failure is
+            # cached like an estimate, so a statement EXPLAIN cannot handle is not explained on every call
+            logger.debug(f"EXPLAIN for the cost guard failed: {e}")
+            estimate = None
+        self._estimates[key] = (now + ttl, estimate)
+        self._estimates.move_to_end(key)
+        if len(self._estimates) > self.max_entries:
+            self._estimates.popitem(last=False)
+        return estimate
+
+    def snapshot(self) -> Dict[str, int]:
+        """Counters of the guard"""
+        return {"checks": self.checks, "cache_hits": self.cache_hits, "rejected": self.rejected,
+                "limited": self.limited, "cached_estimates": len(self._estimates)}
+
+
+cost_guard = CostGuard()
@@ -0,0 +1,466 @@
+"""
+Synthetic Data Generator Module
+
+Rows for generate_demo_data, generated a column at a time with NumPy instead of a Python call per value. Each
+column follows its catalog type (range of the integer type, DECIMAL precision and scale, string length, ENUM and
+SET members, dates, times, JSON), columns with a single-column unique index get distinct values and foreign key
+columns take values of the referenced table. Per-column options set ranges, distributions, value lists, string
+cardinality and NULL fractions. load_rows writes the batches of a run concurrently on several pooled connections.
+"""
+import asyncio
+import datetime
+import decimal
+import re
+import secrets
+import string
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.utils.logger_util import logger
+
+# Rows generated and written per batch, the event loop serves other calls between batches
+BATCH_ROWS = 5000
+# Seconds between two progress reports of a load
+PROGRESS_INTERVAL = 2.0
+# Distinct values of a non-unique string column, unless the cardinality option sets it
+STRING_POOL_SIZE = 4096
+# Longest generated string and binary value, longer columns (TEXT, ...) get values of this length
+MAX_STRING_LENGTH = 32
+BINARY_LENGTH = 16
+# Values referenced by a foreign key column are sampled from at most this many rows of the referenced table
+MAX_REFERENCED_VALUES = 10000
+# Ranges used unless min / max options are given, narrowed to the range of the column type
+DEFAULT_INT_RANGE = (0, 1000000)
+DEFAULT_FLOAT_RANGE = (0.0, 10000.0)
+DEFAULT_DATETIME_RANGE = ("2020-01-01T00:00:00", "2026-01-01T00:00:00")
+DEFAULT_SKEW = 1.5
+
+DISTRIBUTIONS = frozenset(("uniform", "normal", "zipf", "sequence"))
+OPTION_KEYS = frozenset(("min", "max", "distribution", "skew", "null_fraction", "unique", "values", "length",
+                         "cardinality"))
+
+_EPOCH = np.datetime64("1970-01-01T00:00:00", "s")
+_DAY = 86400
+_ALPHABET = np.frombuffer((string.ascii_letters + string.digits).encode("ascii"), dtype="S1")
+_TYPE_RE = re.compile(r"\s*(\w+)\s*(?:\((.*)\))?\s*(unsigned)?", re.I)
+_MEMBER_RE = re.compile(r"'((?:[^']|'')*)'")
+_INT_BITS = {"tinyint": 8, "smallint": 16, "mediumint": 24, "int": 32, "integer": 32, "bigint": 64}
+_BINARY_TYPES = frozenset(("binary", "varbinary", "tinyblob", "blob", "mediumblob", "longblob"))
+# Kinds generated as integers: the value, units of 10^-scale, or seconds since 1970
+_INTEGER_KINDS = frozenset(("int", "decimal", "date", "datetime", "time"))
+_RANGE_KINDS = _INTEGER_KINDS | {"float"}
+
+
+@dataclass
+class ColumnSpec:
+    """How the values of one column are generated"""
+    name: str
+    kind: str = "string"
+    nullable: bool = False
+    unique: bool = False
+    # Range of the column type, and the range set by the min / max options
+    bounds: Tuple[Any, Any] = (None, None)
+    low: Any = None
+    high: Any = None
+    length: int = MAX_STRING_LENGTH
+    scale: int = 0
+    values: Optional[List[Any]] = None
+    distribution: str = "uniform"
+    skew: float = DEFAULT_SKEW
+    null_fraction: float = 0.0
+    cardinality: int = STRING_POOL_SIZE
+    # First value of a sequence, set above the largest existing value of a unique column
+    start: Optional[int] = None
+    # (table, column) of a single-column foreign key
+    reference: Optional[Tuple[str, str]] = None
+
+    @property
+    def sequential(self) -> bool:
+        """Whether the distinct values of the column are a sequence that continues after the existing rows"""
+        return self.unique and self.values is None and self.kind in _RANGE_KINDS
+
+    @property
+    def step(self) -> int:
+        """Distance of two sequence values, in the integers the kind is generated as"""
+        return _DAY if self.kind == "date" else 1
+
+    def to_integer(self, value: Any) -> int:
+        """A value of the column as the integer it is generated as"""
+        if self.kind == "decimal":
+            return int(decimal.Decimal(str(value)).scaleb(self.scale).to_integral_value(decimal.ROUND_FLOOR))
+        if self.kind == "time":
+            if not isinstance(value, datetime.timedelta):
+                value = np.datetime64(f"1970-01-01T{value}", "s") - _EPOCH
+            return int(value / np.timedelta64(1, "s")) if isinstance(value, np.timedelta64) \
+                else int(value.total_seconds())
+        if self.kind in ("date", "datetime"):
+            return int((np.datetime64(value, "s") - _EPOCH) / np.timedelta64(1, "s"))
+        return int(value)
+
+    def continue_after(self, value: Any):
+        """Start the sequence of a unique column after the largest existing value"""
+        if value is not None:
+            self.start = self.to_integer(value) + self.step
+
+
+def column_spec(column: Dict[str, Any], unique: bool = False) -> ColumnSpec:
+    """
+    Generator of a column described by describe_table (name, type, nullable)
+
+    Types the generator does not know (spatial types, ...) are filled with strings.
+    """
+    match = _TYPE_RE.match(column["type"])
+    base, args, unsigned = match.group(1).lower(), match.group(2), bool(match.group(3))
+    spec = ColumnSpec(column["name"], nullable=column["nullable"], unique=unique)
+    if base in ("bool", "boolean") or base == "tinyint" and args == "1" and not unique \
+            or base == "bit" and args in (None, "1"):
+        spec.kind = "bool"
+    elif base in _INT_BITS or base == "bit":
+        bits = _INT_BITS.get(base) or int(args)
+        spec.kind = "int"
+        spec.bounds = (0, 2 ** bits - 1) if unsigned or base == "bit" else (-2 ** (bits - 1), 2 ** (bits - 1) - 1)
+    elif base == "year":
+        spec.kind = "int"
+        spec.bounds = (1901, 2155)
+    elif base in ("decimal", "numeric", "dec", "fixed"):
+        precision, _, scale = (args or "10,0").partition(",")
+        spec.kind = "decimal"
+        spec.scale = int(scale or 0)
+        largest = 10 ** int(precision) - 1
+        spec.bounds = (0 if unsigned else -largest, largest)
+    elif base in ("float", "double", "real"):
+        spec.kind = "float"
+        spec.bounds = (0.0 if unsigned else float("-inf"), float("inf"))
+    elif base in ("date", "datetime", "timestamp"):
+        spec.kind = "date" if base == "date" else "datetime"
+        low, high = ("1970-01-02", "2038-01-18") if base == "timestamp" else ("1000-01-01", "9999-12-31")
+        spec.bounds = (spec.to_integer(low), spec.to_integer(high))
+    elif base == "time":
+        spec.kind = "time"
+        spec.bounds = (0, _DAY - 1)
+    elif base in ("char", "varchar"):
+        spec.length = int(args or 1)
+    elif base in _BINARY_TYPES:
+        spec.kind = "binary"
+        spec.length = int(args) if args else BINARY_LENGTH
+    elif base in ("enum", "set"):
+        spec.values = [member.replace("''", "'") for member in _MEMBER_RE.findall(args or "")]
+    elif base == "json":
+        spec.kind = "json"
+    return spec
+
+
+def table_columns(description: Dict[str, Any], column_names: Optional[List[str]] = None) -> List[ColumnSpec]:
+    """
+    Generators of the columns of a table described by describe_table
+
+    Without column names these are the columns an INSERT sets, auto-increment and generated columns are left to
+    the database.
+
+    Raises:
+        ValueError: A named column is not a column of the table
+    """
+    columns = {column["name"].lower(): column for column in description["columns"]}
+    if column_names is None:
+        selected = [column for column in description["columns"]
+                    if not any(word in column.get("extra", "").lower() for word in ("auto_increment", "generated"))]
+    else:
+        unknown = [name for name in column_names if name.lower() not in columns]
+        if unknown:
+            raise ValueError(f"Column(s) {', '.join(unknown)} not found in table {description['table']}")
+        selected = [columns[name.lower()] for name in column_names]
+
+    unique = {index["columns"][0].lower() for index in description["indexes"]
+              if index["unique"] and len(index["columns"]) == 1}
+    references = {foreign_key["columns"][0].lower(): (foreign_key["references"], foreign_key["referenced_columns"][0])
+                  for foreign_key in description["foreign_keys"] if len(foreign_key["columns"]) == 1}
+    specs = []
+    for column in selected:
+        spec = column_spec(column, column["name"].lower() in unique)
+        spec.reference = references.get(column["name"].lower())
+        specs.append(spec)
+    return specs
+
+
+def apply_options(spec: ColumnSpec, options: Dict[str, Any]):
+    """
+    Apply the generate_demo_data options of a column
+
+    Raises:
+        ValueError: An option is unknown or its value does not fit the column
+    """
+    unknown = set(options) - OPTION_KEYS
+    if unknown:
+        raise ValueError(f"Unknown option(s) {', '.join(sorted(unknown))} for column '{spec.name}', "
+                         f"use {', '.join(sorted(OPTION_KEYS))}")
+    spec.distribution = options.get("distribution", spec.distribution)
+    if spec.distribution not in DISTRIBUTIONS:
+        raise ValueError(f"Unknown distribution '{spec.distribution}' for column '{spec.name}', "
+                         f"use {', '.join(sorted(DISTRIBUTIONS))}")
+    spec.skew = float(options.get("skew", spec.skew))
+    if spec.skew <= 1:
+        raise ValueError(f"skew of column '{spec.name}' must be greater than 1")
+    spec.unique = bool(options.get("unique", spec.unique))
+    spec.null_fraction = float(options.get("null_fraction", spec.null_fraction))
+    if not 0 <= spec.null_fraction <= 1 or spec.null_fraction and not spec.nullable:
+        raise ValueError(f"null_fraction of column '{spec.name}' must be between 0 and 1, and 0 for NOT NULL")
+    if "values" in options:
+        if not options["values"]:
+            raise ValueError(f"values of column '{spec.name}' must not be empty")
+        spec.values = list(options["values"])
+        spec.reference = None
+    if "cardinality" in options:
+        spec.cardinality = max(int(options["cardinality"]), 1)
+    if "length" in options:
+        spec.length = max(min(int(options["length"]), spec.length), 1)
+    if "min" in options or "max" in options:
+        if spec.kind not in _RANGE_KINDS:
+            raise ValueError(f"min and max apply to numeric, date and time columns, not to column '{spec.name}'")
+        convert = float if spec.kind == "float" else spec.to_integer
+        for bound, attribute in (("min", "low"), ("max", "high")):
+            if bound in options:
+                value = convert(options[bound])
+                if spec.bounds[0] is not None and not spec.bounds[0] <= value <= spec.bounds[1]:
+                    raise ValueError(f"{bound} {options[bound]} is out of the range of column '{spec.name}'")
+                setattr(spec, attribute, value)
+
+
+def value_range(spec: ColumnSpec) -> Tuple[Any, Any]:
+    """Range of the generated values, the min / max options or else the default range narrowed to the column type"""
+    if spec.kind == "float":
+        default = DEFAULT_FLOAT_RANGE
+    elif spec.kind == "decimal":
+        default = tuple(value * 10 ** spec.scale for value in DEFAULT_INT_RANGE)
+    elif spec.kind in ("date", "datetime"):
+        default = tuple(spec.to_integer(value) for value in DEFAULT_DATETIME_RANGE)
+    elif spec.kind == "time":
+        default = (0, _DAY - 1)
+    else:
+        default = DEFAULT_INT_RANGE
+    low, high = spec.bounds
+    low = spec.low if spec.low is not None else default[0] if low is None else max(default[0], low)
+    high = spec.high if spec.high is not None else default[1] if high is None else min(default[1], high)
+    if low > high:
+        raise ValueError(f"Column '{spec.name}' has an empty range")
+    return low, high
+
+
+class RowGenerator:
+    """
+    Rows of a run of row_count rows for a list of column generators
+
+    Every batch has a random generator of its own, seeded with the seed of the run and the position of the batch,
+    so a seed reproduces the same rows whatever order and on whatever connection the batches are generated.
+    """
+
+    def __init__(self, specs: Sequence[ColumnSpec], seed: Optional[int] = None, row_count: int = BATCH_ROWS):
+        self.specs = list(specs)
+        self.seed = secrets.randbits(63) if seed is None else int(seed)
+        self.rng = np.random.default_rng([self.seed, 0])
+        self._start = 0
+        self._ranges = {spec.name: value_range(spec) for spec in self.specs
+                        if spec.values is None and spec.kind in _RANGE_KINDS}
+        # Unique strings start with a token of the run, so they differ from the strings of runs with another seed
+        self._token = self._strings(1, 4)[0]
+        self._pools: Dict[str, np.ndarray] = {}
+        for spec in self.specs:
+            if spec.values is not None:
+                pool = self._pools[spec.name] = np.empty(len(spec.values), dtype=object)
+                pool[:] = spec.values
+            elif spec.kind == "string" and not spec.unique and spec.distribution != "sequence":
+                self._pools[spec.name] = self._string_pool(spec, min(spec.cardinality, max(row_count, 1)))
+
+    def rows(self, start: int, count: int) -> List[Tuple[Any, ...]]:
+        """Rows start to start + count of the run, one tuple per row with the values in the order of the columns"""
+        self.rng = np.random.default_rng([self.seed, 1, start])
+        self._start = start
+        columns = [self._column(spec, count) for spec in self.specs]
+        return list(zip(*columns))
+
+    def _column(self, spec: ColumnSpec, count: int) -> List[Any]:
+        if spec.values is not None:
+            values = self._pick(spec, count)
+        elif spec.kind in _INTEGER_KINDS:
+            values = self._convert(spec, self._integers(spec, count))
+        else:
+            values = getattr(self, f"_{spec.kind}")(spec, count)
+        if spec.null_fraction:
+            for i in np.flatnonzero(self.rng.random(count) < spec.null_fraction).tolist():
+                values[i] = None
+        return values
+
+    def _indexes(self, spec: ColumnSpec, size: int, count: int) -> np.ndarray:
+        """count positions in a list of size values, in the distribution of the column"""
+        if spec.distribution == "zipf":
+            return (self.rng.zipf(spec.skew, count) - 1) % size
+        if spec.distribution == "sequence":
+            return (self._start + np.arange(count)) % size
+        if spec.distribution == "normal":
+            return np.clip(np.rint(self.rng.normal((size - 1) / 2, size / 6, count)), 0, size - 1).astype(np.int64)
+        return self.rng.integers(0, size, count)
+
+    def _pick(self, spec: ColumnSpec, count: int) -> List[Any]:
+        if spec.unique:
+            if self._start + count > len(spec.values):
+                raise ValueError(f"Column '{spec.name}' is unique but has only {len(spec.values)} values to use")
+            return spec.values[self._start:self._start + count]
+        pool = self._pools[spec.name]
+        return pool[self._indexes(spec, len(pool), count)].tolist()
+
+    def _sequence(self, spec: ColumnSpec, count: int, low: int) -> np.ndarray:
+        start = spec.start if spec.start is not None else low
+        return start + (self._start + np.arange(count, dtype=np.int64)) * spec.step
+
+    def _numbers(self, spec: ColumnSpec, count: int, low, high) -> np.ndarray:
+        """count numbers from low to high in the distribution of the column, integers unless low is a float"""
+        integer = not isinstance(low, float)
+        if spec.distribution == "normal":
+            values = np.clip(self.rng.normal((low + high) / 2, (high - low) / 6, count), low, high)
+            return np.rint(values).astype(np.int64) if integer else values
+        if spec.distribution == "zipf":
+            values = low + np.minimum(self.rng.zipf(spec.skew, count) - 1, high - low)
+            return values.astype(np.int64 if integer else np.float64)
+        if integer:
+            return self.rng.integers(low, high, count, endpoint=True, dtype=np.int64)
+        return self.rng.uniform(low, high, count)
+
+    def _integers(self, spec: ColumnSpec, count: int) -> np.ndarray:
+        low, high = self._ranges[spec.name]
+        if spec.kind == "date":
+            low, high = -(-low // _DAY) * _DAY, high // _DAY * _DAY
+        if spec.unique or spec.distribution == "sequence":
+            values = self._sequence(spec, count, low)
+            if count and spec.bounds[1] is not None and values[-1] > spec.bounds[1]:
+                raise ValueError(f"Column '{spec.name}' has no distinct values left")
+            return values
+        values = self._numbers(spec, count, low, high)
+        return values // _DAY * _DAY if spec.kind == "date" else values
+
+    def _convert(self, spec: ColumnSpec, values: np.ndarray) -> List[Any]:
+        """Integers generated for a column as values of its kind"""
+        if spec.kind == "decimal":
+            return [decimal.Decimal(value).scaleb(-spec.scale) for value in values.tolist()]
+        if spec.kind == "datetime":
+            return (_EPOCH + values.astype("timedelta64[s]")).tolist()
+        if spec.kind == "date":
+            return (_EPOCH + values.astype("timedelta64[s]")).astype("datetime64[D]").tolist()
+        if spec.kind == "time":
+            return values.astype("timedelta64[s]").tolist()
+        return values.tolist()
+
+    def _float(self, spec: ColumnSpec, count: int) -> List[float]:
+        low, high = self._ranges[spec.name]
+        if spec.unique or spec.distribution == "sequence":
+            return self._sequence(spec, count, int(low)).astype(np.float64).tolist()
+        return np.round(self._numbers(spec, count, float(low), float(high)), 4).tolist()
+
+    def _bool(self, spec: ColumnSpec, count: int) -> List[bool]:
+        return (self.rng.random(count) < 0.5).tolist()
+
+    def _strings(self, count: int, length: int) -> List[str]:
+        """count random strings of length characters, cut from one character matrix"""
+        characters = _ALPHABET[self.rng.integers(0, len(_ALPHABET), (count, length))]
+        return characters.view(f"S{length}").ravel().astype(f"U{length}").tolist()
+
+    def _string_pool(self, spec: ColumnSpec, size: int) -> np.ndarray:
+        """Strings a column picks from, their lengths from half the column length up to it"""
+        length = min(spec.length, MAX_STRING_LENGTH)
+        lengths = self.rng.integers((length + 1) // 2, length, size, endpoint=True).tolist()
+        return np.array([value[:cut] for value, cut in zip(self._strings(size, length), lengths)], dtype=object)
+
+    def _string(self, spec: ColumnSpec, count: int) -> List[str]:
+        if spec.unique or spec.distribution == "sequence":
+            return self._unique_strings(spec, count, min(spec.length, MAX_STRING_LENGTH))
+        pool = self._pools[spec.name]
+        return pool[self._indexes(spec, len(pool), count)].tolist()
+
+    def _unique_strings(self, spec: ColumnSpec, count: int, length: int) -> List[str]:
+        """Token of the run followed by the row number in base 62"""
+        if not count:
+            return []
+        numbers = self._sequence(spec, count, 0)
+        digits = 1
+        while len(_ALPHABET) ** digits <= numbers[-1]:
+            digits += 1
+        if digits > length:
+            raise ValueError(f"Column '{spec.name}' holds {length} characters, too few for {numbers[-1] + 1} "
+                             f"distinct values")
+        token = self._token[:length - digits]
+        positions = []
+        for _ in range(digits):
+            numbers, remainder = np.divmod(numbers, len(_ALPHABET))
+            positions.append(remainder)
+        characters = _ALPHABET[np.stack(positions[::-1], axis=1)]
+        return [token + value for value in characters.view(f"S{digits}").ravel().astype(f"U{digits}").tolist()]
+
+    def _binary(self, spec: ColumnSpec, count: int) -> List[bytes]:
+        length = min(spec.length, BINARY_LENGTH)
+        data = self.rng.bytes(count * length)
+        return [data[i:i + length] for i in range(0, count * length, length)]
+
+    def _json(self, spec: ColumnSpec, count: int) -> List[str]:
+        return ['{"id": %d}' % value for value in self.rng.integers(*DEFAULT_INT_RANGE, count).tolist()]
+
+
+async def load_rows(generator: RowGenerator, row_count: int, write: Callable[[List[Tuple[Any, ...]]], Awaitable[int]],
+                    connections: int = 1, progress: Optional[Callable[[int, int], Awaitable[None]]] = None
+                    ) -> Dict[str, Any]:
+    """
+    Generate row_count rows and write them in batches of BATCH_ROWS, up to connections batches at a time
+
+    Each writer takes the next batch, generates it and writes it on a pooled connection of its own, so one batch is
+    generated while others are on the network. If a batch fails the other writers are cancelled, the batches
+    written before stay in the table.
+
+    Args:
+        generator (RowGenerator): Rows of the run
+        row_count (int): Number of rows
+        write: Writes one batch on a pooled connection and returns the number of rows written
+        connections (int): Batches written at once
+        progress (optional): Called with (rows written, row_count) every PROGRESS_INTERVAL seconds and at the end
+
+    Returns:
+        dict: rows, seconds, rows_per_second, connections and seed of the run
+    """
+    starts = iter(range(0, row_count, BATCH_ROWS))
+    started = time.perf_counter()
+    written = 0
+    reported = started
+
+    async def writer():
+        nonlocal written, reported
+        # The writers share one iterator, each batch is taken by exactly one of them
+        for start in starts:
+            count = await write(generator.rows(start, min(BATCH_ROWS, row_count - start)))
+            written += count
+            now = time.perf_counter()
+            if now - reported >= PROGRESS_INTERVAL:
+                reported = now
+                logger.info(f"Generated {written} of {row_count} rows, {written / (now - started):.0f} rows/s")
+                if progress is not None:
+                    await progress(written, row_count)
+
+    connections = max(1, min(connections, -(-row_count // BATCH_ROWS)))
+    tasks = [asyncio.ensure_future(writer()) for _ in range(connections)]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.error(f"Data generation stopped after {written} of {row_count} rows")
+        raise
+
+    seconds = time.perf_counter() - started
+    if progress is not None:
+        await progress(written, row_count)
+    return {
+        "rows": written,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(written / seconds) if seconds > 0 else None,
+        "connections": connections,
+        "seed": generator.seed,
+    }
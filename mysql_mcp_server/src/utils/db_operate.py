@@ -4,9 +4,26 @@ Database Operations Module
 Provides database operation functions with HTTP proxy support.
 """
 
+import asyncio
+import time
+
+from src.utils.cost_guard import cost_guard
+from src.utils.db_admission import QUERY_LANE, get_admission_controller
 from src.utils.db_pool import get_db_pool
 from src.utils.logger_util import logger
-import aiomysql
+from src.utils.query_timing import QueryTiming, log_slow_query
+from src.utils.sql_classifier import classify_sql
+from src.utils.sql_fingerprint import statement_registry
+from src.utils.tracing import start_span
+
+
+class QueryTimeoutError(TimeoutError):
+    """Raised when a statement exceeds its timeout and has been cancelled on the server"""
+
+
+# Seconds to wait for a killed statement to return its error before the connection is discarded
+CANCEL_GRACE_SECONDS = 5
+
 
 async def get_pooled_connection():
     """Get database connection from connection pool"""
@@ -17,55 +34,213 @@ async def get_pooled_connection():
     except Exception as e:
         logger.error(f"Failed to get connection from pool: {e}")
         raise
-async def execute_sql(sql, params=None):
-    """Execute SQL statement (asynchronous version, using connection pool)"""
-    conn = None
-    cursor = None
-    try:
-        logger.debug("Getting database connection from connection pool...")
-        conn = await get_pooled_connection()
-        cursor = await conn.cursor(aiomysql.DictCursor)
 
-        # Execute SQL
-        logger.debug(f"Preparing to execute asynchronous SQL: {sql}  params:{params}")
-        await cursor.execute(sql, params or ())
 
-        # Handle different types of SQL statements
-        sql_lower = sql.strip().lower()
-        if sql_lower.startswith(("select", "show", "describe", "desc")):
+def resolve_timeout(timeout_ms, default_timeout_ms):
+    """
+    Resolve the effective statement timeout
+
+    Args:
+        timeout_ms (int, optional): Per-call timeout in milliseconds, None uses the configured default
+        default_timeout_ms (int): Configured default timeout in milliseconds
+
+    Returns:
+        Optional[float]: Timeout in seconds, None when the timeout is disabled (0 or negative)
+    """
+    if timeout_ms is None:
+        timeout_ms = default_timeout_ms
+    return timeout_ms / 1000 if timeout_ms and timeout_ms > 0 else None
+
+
+async def _run_statement(conn, cursor, sql, params, timing):
+    """Execute the statement and collect its result"""
+    classification = classify_sql(sql)
+    with start_span("db.execute"):
+        # Without params the statement is sent as-is, so literal '%' characters need no escaping.
+        # The pool runs in autocommit mode, the statement commits on the server without a COMMIT round trip
+        await cursor.execute(sql, params if params else None)
+    timing.lap("execute")
+
+    # Handle different types of SQL statements
+    if classification.returns_rows:
+        with start_span("db.fetch") as span:
             result = await cursor.fetchall()
-            logger.debug(f"Asynchronous query returned {len(result)} rows of data")
+            logger.debug("Asynchronous query returned {} rows of data", len(result))
             # Consume all result sets
             try:
                 while await cursor.nextset():
                     await cursor.fetchall()
             except:
                 pass
-        elif sql_lower.startswith(("insert", "update", "delete")):
-            result = cursor.rowcount
-            await conn.commit()
-            logger.debug(f"Asynchronous query affected {result} rows of data")
-        else:
-            # For other statements (such as CREATE, DROP, etc.)
-            result = "Query executed successfully"
-            await conn.commit()
-            logger.debug("Asynchronous DDL query executed successfully")
-
-        logger.debug(f"Asynchronous SQL executed successfully: result:{result}")
+            span.set_attribute("db.response.rows", len(result))
+        timing.lap("fetch")
+    elif classification.is_dml:
+        result = cursor.rowcount
+        logger.debug("Asynchronous query affected {} rows of data", result)
+    else:
+        # For other statements (such as CREATE, DROP, etc.)
+        result = "Query executed successfully"
+        logger.debug("Asynchronous DDL query executed successfully")
+    return result
+
+
+async def _run_guarded_statement(conn, cursor, sql, params, timing):
+    """Check the statement against the cost guard on the same connection, then execute it"""
+    sql = await cost_guard.check(cursor, sql, params)
+    return await _run_statement(conn, cursor, sql, params, timing)
+
+
+async def _run_batch(conn, cursor, sql, params_list, timing):
+    """Execute the statement for every parameter set inside one transaction"""
+    with start_span("db.execute", {"db.batch.size": len(params_list)}):
+        await conn.begin()
+        # aiomysql sends INSERT ... VALUES for all parameter sets as multi-row INSERT statements
+        await cursor.executemany(sql, params_list)
+        await conn.commit()
+    timing.lap("execute")
+    logger.debug("Asynchronous batch affected {} rows of data", cursor.rowcount)
+    return cursor.rowcount
+
+
+async def _cancel_statement(pool, conn, task):
+    """
+    Kill a timed out statement on the server and wait for the connection to become usable again
+
+    If the statement does not return after KILL QUERY the connection is closed, so the pool
+    discards it instead of handing out a connection in an unknown protocol state.
+    """
+    try:
+        await pool.cancel_query(conn)
+        await asyncio.wait_for(task, timeout=CANCEL_GRACE_SECONDS)
+    except Exception as e:
+        # The killed statement normally ends with "Query execution was interrupted"
+        logger.debug(f"Cancelled statement finished with: {e}")
+
+    if not task.done():
+        task.cancel()
+        conn.close()
+        logger.warning("Cancelled statement did not return in time, connection has been discarded")
+
+
+async def execute_sql(sql, params=None, timeout_ms=None, lane=QUERY_LANE):
+    """
+    Execute SQL statement (asynchronous version, using connection pool)
+
+    Args:
+        sql (str): SQL statement, using %s or %(name)s placeholders for bound values
+        params (list | tuple | dict, optional): Values bound to the placeholders
+        timeout_ms (int, optional): Statement timeout in milliseconds, defaults to dbQueryTimeoutMs, 0 disables it
+        lane (str): Admission lane, METADATA_LANE for schema lookups, QUERY_LANE otherwise
+
+    Raises:
+        AdmissionRejectedError: The server is saturated, the statement did not run and can be retried
+        QueryTimeoutError: The statement exceeded its timeout and was killed on the server
+        QueryCostRejectedError: The cost guard (dbCostGuard) estimated the statement over its thresholds, it did not run
+    """
+    # Metadata lookups are the server's own statements, only the query lane is guarded
+    run = _run_guarded_statement if lane == QUERY_LANE else _run_statement
+    return await _execute(sql, params, timeout_ms, lane, run)
+
+
+async def execute_batch(sql, params_list, timeout_ms=None, lane=QUERY_LANE):
+    """
+    Execute one statement for every parameter set in a single explicit transaction (BEGIN ... COMMIT)
+
+    Single statements run in autocommit mode, batch tools use this so that all rows are written or none.
+
+    Args:
+        sql (str): SQL statement, using %s or %(name)s placeholders for bound values
+        params_list (list): One list, tuple or dict of values per execution
+        timeout_ms (int, optional): Timeout of the whole batch in milliseconds, defaults to dbQueryTimeoutMs, 0 disables it
+        lane (str): Admission lane, METADATA_LANE for schema lookups, QUERY_LANE otherwise
+
+    Returns:
+        int: Affected rows of all executions
+
+    Raises:
+        AdmissionRejectedError: The server is saturated, the batch did not run and can be retried
+        QueryTimeoutError: The batch exceeded its timeout, was killed on the server and rolled back
+    """
+    return await _execute(sql, params_list, timeout_ms, lane, _run_batch)
+
+
+async def _execute(sql, params, timeout_ms, lane, run):
+    """Admit the call, then execute it with run on a pooled connection"""
+    timing = QueryTiming()
+    with start_span("db.query", {"db.system": "mysql", "db.admission.lane": lane}) as span:
+        async with get_admission_controller().admit(lane):
+            # Time spent queueing for admission, the rest of the acquire phase is the pool acquire span
+            span.set_attribute("db.admission.wait_ms", round((time.perf_counter() - timing.started) * 1000, 3))
+            return await _execute_admitted(sql, params, timeout_ms, timing, span, run)
+
+
+async def _execute_admitted(sql, params, timeout_ms, timing, span, run):
+    """Execute SQL statement on a pooled connection once the call has been admitted"""
+    pool = None
+    conn = None
+    cursor = None
+    statement = statement_registry.record(sql, params)
+    span.set_attribute("db.statement.fingerprint", statement.fingerprint)
+    span.set_attribute("db.operation", classify_sql(sql).statement_type)
+    try:
+        logger.debug("Getting database connection from connection pool...")
+        pool = await get_db_pool()
+        conn = await get_pooled_connection()
+        # Already loaded by the pool, a local import keeps the driver off the startup path
+        from aiomysql import DictCursor
+        cursor = await conn.cursor(DictCursor)
+        timeout = resolve_timeout(timeout_ms, pool.query_timeout_ms)
+        timing.lap("acquire")
+
+        # Execute SQL
+        logger.debug("Preparing to execute asynchronous SQL [{}]: {}  params:{}  timeout:{}s", statement.fingerprint, sql, params, timeout)
+        task = asyncio.ensure_future(run(conn, cursor, sql, params, timing))
+        try:
+            # Shield the statement so a timeout does not abandon the connection mid-protocol
+            result = await asyncio.wait_for(asyncio.shield(task), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"SQL [{statement.fingerprint}] exceeded timeout of {timeout}s, cancelling on server")
+            await _cancel_statement(pool, conn, task)
+            raise QueryTimeoutError(f"Query exceeded timeout of {int(timeout * 1000)} ms and was cancelled")
+        except asyncio.CancelledError:
+            # The caller went away, do not leave the statement running on a released connection
+            await _cancel_statement(pool, conn, task)
+            raise
+
+        timing.measure_result(result)
+        logger.debug("Asynchronous SQL executed successfully: result:{}", result)
         return result
 
     except Exception as e:
+        timing.failed = True
         logger.error(f"Asynchronous SQL execution failed: {e}")
         logger.debug(f"Failed asynchronous SQL: {sql}")
         if conn:
-            await conn.rollback()
-            logger.debug("Asynchronous transaction has been rolled back")
+            # Acquire failures are already counted by the pool
+            pool.metrics.record_error(e)
         raise
     finally:
-        if cursor:
+        # The server status flag is tracked locally, checking it costs no round trip. A transaction cannot span
+        # calls, the next call may get another connection, so one left open by a failure or by the SQL is rolled back
+        if conn and not conn.closed and conn.get_transaction_status():
+            await conn.rollback()
+            logger.debug("Asynchronous transaction has been rolled back")
+        if cursor and not conn.closed:
             await cursor.close()
             logger.debug("Asynchronous cursor has been closed")
         if conn:
             pool = await get_db_pool()
             await pool.release_connection(conn)
-            logger.debug("Asynchronous connection has been released back to pool")
\ No newline at end of file
+            logger.debug("Asynchronous connection has been released back to pool")
+        _record_timing(pool, statement, timing)
+
+
+def _record_timing(pool, statement, timing):
+    """Aggregate the call into its fingerprint and write it to the slow query log when over the threshold"""
+    timing.finish()
+    slow = pool is not None and 0 < pool.slow_query_threshold_ms <= timing.total_ms
+    statement.add_timing(timing, slow)
+    if slow:
+        log_slow_query(statement, timing)
+    logger.opt(lazy=True).debug("SQL [{}] finished in {:.1f} ms, phases: {}",
+                                lambda: statement.fingerprint, lambda: timing.total_ms, timing.to_dict)
\ No newline at end of file
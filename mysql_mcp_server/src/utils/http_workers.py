@@ -0,0 +1,184 @@
+"""
+HTTP Workers Module
+
+Pre-fork worker mode of the HTTP transport. One event loop spends most of its time encoding large results
+to JSON, so with httpWorkers > 1 a supervisor process forks that many workers. Every worker binds its own
+listening socket to httpHost:httpPort with SO_REUSEPORT, the kernel spreads new connections across them,
+and serves the MCP app with its own event loop and its share of the connection pool limits. The supervisor
+restarts workers that exit unexpectedly and stops all of them on SIGTERM or SIGINT.
+"""
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+from src.utils.db_config import DatabaseInstanceConfig, set_worker_share
+from src.utils.logger_util import logger
+
+# A worker restarted more often than this within RESTART_WINDOW seconds is crash looping, the supervisor gives up
+MAX_RESTARTS = 5
+RESTART_WINDOW = 60
+# Seconds before a restart, doubled for every recent restart of the same worker
+RESTART_BACKOFF = 0.5
+LISTEN_BACKLOG = 2048
+
+# Index of this process when it is a worker, None in the supervisor and in single process mode
+worker_index: Optional[int] = None
+
+
+def bind_reuseport(host: str, port: int) -> socket.socket:
+    """
+    Listening socket on host:port that the other workers bind as well
+
+    Raises:
+        RuntimeError: The platform has no SO_REUSEPORT
+    """
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise RuntimeError("httpWorkers > 1 needs SO_REUSEPORT, which this platform does not support")
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((host, port))
+        sock.listen(LISTEN_BACKLOG)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+class WorkerSupervisor:
+    """Forks the worker processes, restarts the ones that exit unexpectedly and stops them on a signal"""
+
+    def __init__(self, workers: int, run_worker: Callable[[int], None]):
+        """
+        Args:
+            workers (int): Number of worker processes
+            run_worker (Callable[[int], None]): Called with the worker index in each forked process, serves until stopped
+        """
+        self.workers = workers
+        self.run_worker = run_worker
+        self._pids: Dict[int, int] = {}
+        self._restarts: Dict[int, List[float]] = {}
+        self._stopping = False
+
+    def run(self) -> int:
+        """
+        Fork the workers and supervise them until they are stopped
+
+        Returns:
+            int: Exit code of the supervisor, 1 when a worker was crash looping
+        """
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for index in range(self.workers):
+            self._spawn(index)
+
+        exit_code = 0
+        while self._pids:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            index = self._pids.pop(pid, None)
+            if index is None or self._stopping:
+                continue
+            logger.error(f"HTTP worker {index} (pid {pid}) exited with code {os.waitstatus_to_exitcode(status)}")
+
+            now = time.monotonic()
+            recent = [t for t in self._restarts.get(index, []) if now - t < RESTART_WINDOW]
+            if len(recent) >= MAX_RESTARTS:
+                logger.error(f"HTTP worker {index} restarted {len(recent)} times within {RESTART_WINDOW}s, "
+                             f"stopping all workers")
+                exit_code = 1
+                self._stop()
+                continue
+            self._restarts[index] = recent + [now]
+            time.sleep(RESTART_BACKOFF * 2 ** len(recent))
+            if not self._stopping:
+                self._spawn(index)
+        logger.info("All HTTP workers stopped")
+        return exit_code
+
+    def _spawn(self, index: int):
+        pid = os.fork()
+        if pid == 0:
+            self._run_child(index)
+        self._pids[pid] = index
+        logger.info(f"HTTP worker {index} started, pid {pid}")
+
+    def _run_child(self, index: int):
+        """Body of a forked worker, never returns"""
+        global worker_index
+        worker_index = index
+        exit_code = 1
+        try:
+            # The server of the worker installs its own graceful shutdown handlers
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            self.run_worker(index)
+            exit_code = 0
+        except BaseException as e:
+            logger.exception(f"HTTP worker {index} failed: {e}")
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)
+
+    def _stop(self, signum=None, frame=None):
+        if not self._stopping:
+            logger.info(f"Stopping {len(self._pids)} HTTP workers")
+        self._stopping = True
+        for pid in list(self._pids):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+
+def serve_http_workers(mcp, db_config: DatabaseInstanceConfig) -> int:
+    """
+    Serve the MCP app over streamable HTTP from db_config.http_workers pre-forked processes
+
+    A request may reach any worker, so the workers run the stateless HTTP transport. dbPoolSize,
+    dbMaxOverflow and httpLimitConcurrency are divided across the workers.
+
+    Args:
+        mcp (FastMCP): The server app
+        db_config (DatabaseInstanceConfig): Configuration read at startup
+
+    Returns:
+        int: Exit code of the supervisor
+
+    Raises:
+        ValueError: The transport is not http, an SSE stream and its messages must reach the same process
+            or there are more workers than connections in dbPoolSize + dbMaxOverflow
+        RuntimeError: The platform cannot fork
+    """
+    workers = int(db_config.http_workers)
+    if db_config.transport != "http":
+        raise ValueError(f"httpWorkers > 1 needs transport http, {db_config.transport} sessions are bound to one process")
+    if not hasattr(os, "fork"):
+        raise RuntimeError("httpWorkers > 1 needs os.fork, which this platform does not support")
+    connections = int(db_config.db_pool_size) + int(db_config.db_max_overflow)
+    if workers > connections:
+        raise ValueError(f"httpWorkers {workers} exceeds dbPoolSize + dbMaxOverflow ({connections}), "
+                         f"every worker needs at least one connection")
+    host, port = db_config.http_host, int(db_config.http_port)
+    limit_concurrency = int(db_config.http_limit_concurrency)
+
+    def run_worker(index: int):
+        import asyncio
+        import uvicorn
+
+        set_worker_share(index, workers)
+        sock = bind_reuseport(host, port)
+        app = mcp.http_app(path=db_config.http_path or None, transport="http", stateless_http=True)
+        config = uvicorn.Config(app, lifespan="on", timeout_keep_alive=int(db_config.http_keep_alive_timeout),
+                                limit_concurrency=max(limit_concurrency // workers, 1) if limit_concurrency else None)
+        asyncio.run(uvicorn.Server(config).serve(sockets=[sock]))
+
+    logger.info(f"Serving MCP over http on {host}:{port} with {workers} worker processes")
+    return WorkerSupervisor(workers, run_worker).run()
@@ -0,0 +1,344 @@
+"""
+Query Plan Module
+
+Turns the EXPLAIN output of a statement into findings an agent can act on: full table scans, full index
+scans, filesorts and temporary tables are flagged, and for every scanned table with a predicate a candidate
+index is derived from the predicate columns, equality columns first, then the ORDER BY columns when the query
+sorts a single table, then one range column.
+
+EXPLAIN FORMAT=JSON of MySQL and MariaDB, the JSON plan of OceanBase and the tabular EXPLAIN of MySQL,
+MariaDB, TiDB (estRows per operator) and OceanBase (plan text) are understood.
+"""
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from src.utils.keyset_pagination import single_table
+from src.utils.sql_classifier import blank_literals, classify_sql, quote_identifier, strip_trailing_semicolons, \
+    unquote_identifier
+
+# Statements EXPLAIN accepts
+EXPLAINABLE_STATEMENTS = frozenset(("select", "table", "update", "delete", "insert", "replace"))
+# Columns of a suggested index
+MAX_INDEX_COLUMNS = 5
+# Longest index name MySQL accepts
+MAX_INDEX_NAME_LENGTH = 64
+
+# Issue types
+FULL_SCAN = "full_scan"
+FULL_INDEX_SCAN = "full_index_scan"
+FILESORT = "filesort"
+TEMPORARY_TABLE = "temporary_table"
+
+_PARENS_RE = re.compile(r"\([^()]*\)")
+_IDENTIFIER = r"`(?:[^`]|``)+`|[A-Za-z_$][\w$]*"
+_IDENTIFIER_RE = re.compile(_IDENTIFIER)
+# Column reference with up to two qualifiers: column, table.column or schema.table.column
+_COLUMN = rf"(?:(?:{_IDENTIFIER})\s*\.\s*){{0,2}}(?:{_IDENTIFIER})"
+_COMPARISON_RE = re.compile(rf"""
+    (?<![\w$`.])(?P<left>{_COLUMN})\s*
+    (?P<op><=>|<=|>=|<>|!=|=|<|>|\bnot\s+in\b|\bin\b|\bnot\s+between\b|\bbetween\b|\bnot\s+like\b|\blike\b
+    |\bis\s+not\s+null\b|\bis\s+null\b)
+    (?:\s*(?P<wildcard>\?%)|\s*(?P<right>{_COLUMN})(?![\w$`]|\s*[(.]))?
+""", re.I | re.X)
+_TABLE_RE = re.compile(rf"\b(?:from|join|update|into)\s+(?P<first>{_IDENTIFIER})(?:\s*\.\s*(?P<second>{_IDENTIFIER}))?"
+                       rf"(?:\s+(?:as\s+)?(?P<alias>{_IDENTIFIER}))?", re.I)
+_ORDER_BY_RE = re.compile(r"\border\s+by\s+(?P<items>.+?)(?=\blimit\b|\bfor\b|\block\b|\Z)", re.I | re.S)
+_ORDER_ITEM_RE = re.compile(rf"\s*(?P<column>{_COLUMN})(?:\s+(?P<direction>asc|desc))?\s*", re.I)
+
+_EQUALITY_OPERATORS = frozenset(("=", "<=>", "in", "is null"))
+_RANGE_OPERATORS = frozenset(("<", ">", "<=", ">=", "between", "like"))
+# Words the comparison pattern can take for a column
+_KEYWORDS = frozenset(("and", "or", "not", "xor", "null", "true", "false", "unknown", "end", "then", "else", "when",
+                       "case", "is", "in", "like", "between", "exists", "any", "all", "some", "binary", "interval",
+                       "select", "where", "on", "having"))
+# Words that follow a table reference instead of an alias
+_NOT_ALIASES = _KEYWORDS | {"join", "inner", "left", "right", "cross", "natural", "straight_join", "outer", "using",
+                            "group", "order", "limit", "set", "values", "value", "partition", "force", "use",
+                            "ignore", "union", "for", "lock", "window", "select", "as"}
+
+
+@dataclass(frozen=True)
+class PlanIssue:
+    """A finding in a plan, condition is the predicate the plan applies to the table when it reports one"""
+    type: str
+    table: Optional[str]
+    rows: Optional[float]
+    detail: str
+    condition: Optional[str] = None
+
+
+def check_explain_query(sql: str) -> str:
+    """
+    Validate that sql is one statement EXPLAIN accepts and strip its trailing semicolon
+
+    Raises:
+        ValueError: The text is not a single SELECT, INSERT, UPDATE, DELETE or REPLACE
+    """
+    classification = classify_sql(sql)
+    if classification.statement_count != 1 or classification.statement_type not in EXPLAINABLE_STATEMENTS:
+        raise ValueError("explain_query needs a single SELECT, INSERT, UPDATE, DELETE or REPLACE statement")
+    return strip_trailing_semicolons(sql)
+
+
+def json_plan(rows: List[Dict[str, Any]]) -> Optional[Any]:
+    """Document of an EXPLAIN FORMAT=JSON result, None when the server returned something else"""
+    if not rows or len(rows[0]) != 1:
+        return None
+    value = next(iter(rows[0].values()))
+    try:
+        return json.loads(value) if isinstance(value, (str, bytes)) else None
+    except ValueError:
+        return None
+
+
+def _reference(text: str) -> List[str]:
+    return [unquote_identifier(part) for part in _IDENTIFIER_RE.findall(text)]
+
+
+def _number(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _comparisons(text: str) -> Iterator[Tuple[List[str], str]]:
+    """Column references compared in a predicate, with "equality" or "range" for the index use they allow"""
+    for match in _COMPARISON_RE.finditer(blank_literals(text)):
+        operator = " ".join(match.group("op").lower().split())
+        if operator in _EQUALITY_OPERATORS:
+            kind = "equality"
+        elif operator in _RANGE_OPERATORS and not (operator == "like" and match.group("wildcard")):
+            kind = "range"
+        else:
+            continue
+        for side in ("left", "right"):
+            if match.group(side):
+                reference = _reference(match.group(side))
+                if reference[-1].lower() not in _KEYWORDS:
+                    yield reference, kind
+
+
+def _table_references(sql: str) -> Dict[str, Tuple[Optional[str], str]]:
+    """Tables named in the statement by lower-cased alias and name: (schema or None, table)"""
+    tables: Dict[str, Tuple[Optional[str], str]] = {}
+    for match in _TABLE_RE.finditer(blank_literals(sql)):
+        if match.group("second"):
+            table = (unquote_identifier(match.group("first")), unquote_identifier(match.group("second")))
+        else:
+            table = (None, unquote_identifier(match.group("first")))
+        if table[1].lower() in _NOT_ALIASES:
+            continue
+        tables.setdefault(table[1].lower(), table)
+        alias = match.group("alias")
+        if alias and alias.lower() not in _NOT_ALIASES:
+            tables.setdefault(unquote_identifier(alias).lower(), table)
+    return tables
+
+
+def _order_by_columns(sql: str) -> List[str]:
+    """Columns of the top-level ORDER BY when it only names columns in one direction, otherwise none"""
+    text = blank_literals(sql)
+    previous = None
+    while previous != text:
+        previous, text = text, _PARENS_RE.sub(" ", text)
+    match = None
+    for match in _ORDER_BY_RE.finditer(text):
+        pass
+    if match is None:
+        return []
+    columns, directions = [], set()
+    for item in match.group("items").split(","):
+        item_match = _ORDER_ITEM_RE.fullmatch(item)
+        if item_match is None:
+            return []
+        columns.append(_reference(item_match.group("column"))[-1])
+        directions.add((item_match.group("direction") or "asc").lower())
+    return columns if len(directions) == 1 else []
+
+
+def _json_issues(node: Any) -> Iterator[PlanIssue]:
+    """Issues of an EXPLAIN FORMAT=JSON document, MySQL and MariaDB name tables, OceanBase names operators"""
+    if isinstance(node, list):
+        for item in node:
+            yield from _json_issues(item)
+        return
+    if not isinstance(node, dict):
+        return
+    if "access_type" in node and "table_name" in node:
+        access = str(node["access_type"]).upper()
+        rows = _number(node.get("rows_examined_per_scan", node.get("rows")))
+        condition = node.get("attached_condition") or ""
+        if access == "ALL":
+            keys = node.get("possible_keys")
+            detail = "Reads every row of the table" + (f", possible keys {', '.join(keys)} were not used" if keys else "")
+            yield PlanIssue(FULL_SCAN, node["table_name"], rows, detail, condition)
+        elif access == "INDEX":
+            yield PlanIssue(FULL_INDEX_SCAN, node["table_name"], rows,
+                            f"Reads every entry of index {node.get('key')}", condition)
+    operator = node.get("OPERATOR")
+    if isinstance(operator, str):
+        operator = operator.upper()
+        rows = _number(node.get("EST.ROWS"))
+        if "FULL SCAN" in operator:
+            yield PlanIssue(FULL_SCAN, node.get("NAME"), rows, f"{operator} reads every row of the table")
+        elif "SORT" in operator:
+            yield PlanIssue(FILESORT, None, rows, f"{operator} sorts the rows instead of reading them in index order")
+        elif "MATERIAL" in operator:
+            yield PlanIssue(TEMPORARY_TABLE, None, rows, f"{operator} stores intermediate rows")
+    # MySQL marks the operation with using_filesort / using_temporary_table, MariaDB nests a filesort / temporary_table
+    if node.get("using_filesort") is True or isinstance(node.get("filesort"), dict):
+        yield PlanIssue(FILESORT, None, None, "Sorts the rows instead of reading them in index order")
+    if node.get("using_temporary_table") is True or isinstance(node.get("temporary_table"), dict):
+        yield PlanIssue(TEMPORARY_TABLE, None, None, "Materializes rows in a temporary table")
+    for value in node.values():
+        if isinstance(value, (dict, list)):
+            yield from _json_issues(value)
+
+
+def _plan_text_table(text: str) -> List[Dict[str, str]]:
+    """Rows of an OceanBase plan table, keyed by the upper-case column names without spaces and dots"""
+    names = None
+    rows = []
+    for line in text.splitlines():
+        cells = [cell.strip() for cell in line.strip().strip("|").split("|")]
+        if names is None:
+            upper = [re.sub(r"[\s.]", "", cell).upper() for cell in cells]
+            if "OPERATOR" in upper:
+                names = upper
+            continue
+        if len(cells) == len(names) and not set("".join(cells)) <= set("-="):
+            rows.append(dict(zip(names, cells)))
+    return rows
+
+
+def _row_issues(rows: List[Dict[str, Any]]) -> Iterator[PlanIssue]:
+    """Issues of a tabular EXPLAIN"""
+    for row in rows:
+        if "type" in row and "table" in row:
+            # MySQL / MariaDB: one row per table
+            access = str(row.get("type") or "").upper()
+            table, estimate, extra = row.get("table"), _number(row.get("rows")), str(row.get("Extra") or "")
+            if access == "ALL":
+                yield PlanIssue(FULL_SCAN, table, estimate, "Reads every row of the table")
+            elif access == "INDEX":
+                yield PlanIssue(FULL_INDEX_SCAN, table, estimate, f"Reads every entry of index {row.get('key')}")
+            if "using filesort" in extra.lower():
+                yield PlanIssue(FILESORT, table, estimate, "Sorts the rows instead of reading them in index order")
+            if "using temporary" in extra.lower():
+                yield PlanIssue(TEMPORARY_TABLE, table, estimate, "Materializes rows in a temporary table")
+        elif "estRows" in row:
+            # TiDB: one row per operator, the id is the operator name and a number below the tree drawing
+            operator = re.sub(r"^[^A-Za-z]+", "", str(row.get("id") or "")).split("_")[0]
+            access_object = str(row.get("access object") or "")
+            table = access_object.split(",")[0][6:] if access_object.startswith("table:") else None
+            estimate = _number(row.get("estRows"))
+            if operator == "TableFullScan":
+                yield PlanIssue(FULL_SCAN, table, estimate, "TableFullScan reads every row of the table")
+            elif operator == "IndexFullScan":
+                yield PlanIssue(FULL_INDEX_SCAN, table, estimate, "IndexFullScan reads every entry of an index")
+            elif operator == "Sort":
+                yield PlanIssue(FILESORT, None, estimate, "Sort sorts the rows instead of reading them in index order")
+        else:
+            # OceanBase: the plan is a text table
+            text = "\n".join(str(value) for value in row.values())
+            for step in _plan_text_table(text):
+                yield from _json_issues({"OPERATOR": re.sub(r"^[^A-Za-z]+", "", step.get("OPERATOR", "")),
+                                         "NAME": step.get("NAME"), "EST.ROWS": step.get("ESTROWS")})
+
+
+def _index_name(table: str, columns: List[str]) -> str:
+    name = re.sub(r"\W+", "_", "_".join(["idx", table] + columns))
+    return name[:MAX_INDEX_NAME_LENGTH]
+
+
+def suggest_indexes(sql: str, issues: List[PlanIssue], plan_conditions: bool) -> List[Dict[str, Any]]:
+    """
+    Candidate indexes for the tables read by full scans
+
+    Args:
+        sql (str): The explained statement
+        issues (List[PlanIssue]): Issues of its plan
+        plan_conditions (bool): The plan reports the predicate of every table, otherwise the statement text is used
+
+    Returns:
+        List[Dict[str, Any]]: table, columns, reason and the CREATE INDEX statement of each candidate
+    """
+    tables = _table_references(sql)
+    single = single_table(sql)
+    sorts = any(issue.type == FILESORT for issue in issues)
+    order_columns = _order_by_columns(sql) if single is not None and sorts else []
+    candidates: Dict[Tuple[Optional[str], str], Dict[str, List[str]]] = {}
+    for issue in issues:
+        if issue.type not in (FULL_SCAN, FULL_INDEX_SCAN) or not issue.table:
+            continue
+        schema, table = tables.get(issue.table.lower(), (None, issue.table))
+        names = {issue.table.lower(), table.lower()}
+        owns_unqualified = single is not None or plan_conditions
+        candidate = candidates.setdefault((schema, table), {"equality": [], "order": [], "range": []})
+        for reference, kind in _comparisons(issue.condition if plan_conditions else sql):
+            qualifier = reference[-2].lower() if len(reference) > 1 else None
+            if (qualifier is None and owns_unqualified) or qualifier in names:
+                if reference[-1] not in candidate[kind]:
+                    candidate[kind].append(reference[-1])
+        if single is not None and single[1].lower() == table.lower():
+            candidate["order"] = order_columns
+
+    suggestions = []
+    for (schema, table), candidate in candidates.items():
+        columns = list(candidate["equality"])
+        reason = [f"equality on {', '.join(columns)}"] if columns else []
+        order = [column for column in candidate["order"] if column not in columns]
+        if order:
+            columns += order
+            reason.append(f"ORDER BY {', '.join(order)}")
+        # A range ends the usable prefix of the index, the ORDER BY columns must come first
+        range_column = next((column for column in candidate["range"] if column not in columns), None)
+        if range_column:
+            columns.append(range_column)
+            reason.append(f"range on {range_column}")
+        if not columns:
+            continue
+        columns = columns[:MAX_INDEX_COLUMNS]
+        relation = f"{quote_identifier(schema)}.{quote_identifier(table)}" if schema else quote_identifier(table)
+        suggestions.append({
+            "table": f"{schema}.{table}" if schema else table,
+            "columns": columns,
+            "reason": "; ".join(reason),
+            "ddl": f"CREATE INDEX {quote_identifier(_index_name(table, columns))} ON {relation} "
+                   f"({', '.join(quote_identifier(column) for column in columns)})"
+        })
+    return suggestions
+
+
+def analyze_plan(sql: str, plan_format: str, plan: Any) -> Dict[str, Any]:
+    """
+    Flagged issues and candidate indexes of a plan
+
+    Args:
+        sql (str): The explained statement
+        plan_format (str): "json" for an EXPLAIN FORMAT=JSON document, "table" for the rows of a tabular EXPLAIN
+        plan: The plan
+
+    Returns:
+        Dict[str, Any]: format, plan, issues and index_suggestions
+    """
+    found = list(_json_issues(plan) if plan_format == "json" else _row_issues(plan))
+    issues, seen = [], set()
+    for issue in found:
+        key = (issue.type, issue.table, issue.detail)
+        if key not in seen:
+            seen.add(key)
+            issues.append(issue)
+    # MySQL and MariaDB JSON plans attach the predicate to each table, OceanBase JSON plans do not
+    plan_conditions = plan_format == "json" and all(issue.condition is not None for issue in issues
+                                                    if issue.type in (FULL_SCAN, FULL_INDEX_SCAN))
+    return {
+        "format": plan_format,
+        "plan": plan,
+        "issues": [{"type": issue.type, "table": issue.table, "estimated_rows": issue.rows, "detail": issue.detail}
+                   for issue in issues],
+        "index_suggestions": suggest_indexes(sql, issues, plan_conditions)
+    }
@@ -0,0 +1,98 @@
+"""
+Query Timing Module
+
+Splits every execute_sql call into acquire, execute, fetch and size_estimate phases and writes
+statements slower than dbSlowQueryThresholdMs to the slow query log.
+"""
+import json
+import random
+import time
+from typing import Any
+
+from src.utils.logger_util import logger
+from src.utils.tracing import start_span
+
+PHASES = ("acquire", "execute", "fetch", "size_estimate")
+# Rows encoded to estimate the size of a larger result set, the client encodes the full result anyway
+SIZE_SAMPLE_ROWS = 16
+
+# Slow statements are bound with this flag so only the slow query sink picks them up
+slow_query_logger = logger.bind(slow_query=True)
+
+
+class QueryTiming:
+    """
+    Stopwatch for one execute_sql call
+
+    - acquire: admission wait and connection pool checkout
+    - execute: statement round trip, including commit for writes
+    - fetch: reading the result set from the cursor
+    - size_estimate: estimating the JSON size of the result from a sample of its rows, the result is not encoded
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._mark = self.started
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.total_ms = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.failed = False
+
+    def lap(self, phase: str):
+        """Attribute the time since the previous lap to a phase"""
+        now = time.perf_counter()
+        self.phases[phase] += (now - self._mark) * 1000
+        self._mark = now
+
+    def measure_result(self, result: Any):
+        """Count rows and estimate the serialised bytes of the result, timed as the size_estimate phase"""
+        self._mark = time.perf_counter()
+        with start_span("db.size_estimate") as span:
+            if isinstance(result, list):
+                self.rows = len(result)
+            elif isinstance(result, int):
+                self.rows = result
+            self.bytes = estimate_size(result)
+            span.set_attribute("db.response.bytes", self.bytes)
+        self.lap("size_estimate")
+
+    def finish(self):
+        """Stop the stopwatch"""
+        self.total_ms = (time.perf_counter() - self.started) * 1000
+
+    def to_dict(self) -> dict:
+        timing = {f"{phase}_ms": round(elapsed_ms, 3) for phase, elapsed_ms in self.phases.items()}
+        timing["total_ms"] = round(self.total_ms, 3)
+        return timing
+
+
+def estimate_size(result: Any) -> int:
+    """Size of the result as JSON in bytes, exact up to SIZE_SAMPLE_ROWS rows, else from a random sample of rows"""
+    # ensure_ascii keeps the payload ASCII, so its length is its size in bytes
+    if not isinstance(result, list) or len(result) <= SIZE_SAMPLE_ROWS:
+        return len(json.dumps(result, default=str))
+    # Evenly spaced rows would follow any period in the data, random ones estimate the mean row size without bias
+    sample = random.sample(result, SIZE_SAMPLE_ROWS)
+    return round(len(json.dumps(sample, default=str)) * len(result) / SIZE_SAMPLE_ROWS)
+
+
+def log_slow_query(statement, timing: QueryTiming):
+    """
+    Write one slow statement to the slow query log as a JSON line
+
+    Only the normalized SQL is logged, literal values and bound params never reach the slow query log.
+
+    Args:
+        statement (StatementStats): Fingerprint of the statement
+        timing (QueryTiming): Finished timing of the execution
+    """
+    entry = {
+        "fingerprint": statement.fingerprint,
+        "normalized_sql": statement.normalized_sql,
+        "rows": timing.rows,
+        "bytes": timing.bytes,
+        "failed": timing.failed,
+    }
+    entry.update(timing.to_dict())
+    slow_query_logger.warning(json.dumps(entry))
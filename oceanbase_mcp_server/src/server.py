@@ -6,31 +6,149 @@ Main entry point for OceanBase DataSource MCP Client server.
 """
 import os
 import sys
-from typing import List
-from fastmcp import FastMCP
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Union
+from fastmcp import Context, FastMCP
+from fastmcp.server.middleware import Middleware, MiddlewareContext
+from starlette.requests import Request
+from starlette.responses import Response
 
 project_path=os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 # Add current directory to Python module search path
 sys.path.insert(0,project_path)
-from src.utils.logger_util import logger, db_config_path
+from src.utils.logger_util import logger, db_config_path, log_logging_config, sample_query_log
 from src.utils.db_operate import execute_sql
-from src.resources.db_resources import generate_database_tables, generate_database_config
+from src.utils.db_admission import QUERY_LANE, AdmissionRejectedError
+from src.utils.cost_guard import QueryCostRejectedError
+from src.resources.db_resources import generate_database_tables, generate_database_config, generate_pool_stats, \
+    generate_prometheus_metrics
+from src.utils.db_metrics import PROMETHEUS_CONTENT_TYPE, start_metrics_server
+from src.utils.sql_fingerprint import statement_registry
+from src.utils.tracing import configure_tracing, start_span, tracer
+from src.utils.runtime_monitor import configure_runtime_monitor, runtime_monitor
+from src.utils.db_config import config_watcher
+from src.utils.db_session import current_instance_id, session_registry
+from src.utils import http_workers
 from src.utils import load_activate_db_config
-from src.tools.db_tool import generate_test_data
+from src.tools.db_tool import describe_tables, explain_query as explain_query_plan, generate_test_data, \
+    paginate_query as paginate_query_rows
+from src.utils.catalog_cache import catalog_cache, changes_catalog
+from src.utils.keyset_pagination import DEFAULT_PAGE_SIZE
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    """Start the runtime monitor and the configuration file watcher on the server's event loop"""
+    log_logging_config()
+    runtime_monitor.start()
+    config_watcher.start()
+    yield {}
+
 # Create global MCP server instance
-mcp = FastMCP("DataSource MCP Client Server")
+mcp = FastMCP("DataSource MCP Client Server", lifespan=lifespan)
+
+
+class SessionInstanceMiddleware(Middleware):
+    """Makes the database instance selected by the calling session current while its request is handled"""
+
+    async def on_request(self, context: MiddlewareContext, call_next):
+        fastmcp_context = context.fastmcp_context
+        session_id = fastmcp_context.session_id if fastmcp_context is not None else None
+        token = current_instance_id.set(session_registry.selected(session_id))
+        try:
+            return await call_next(context)
+        finally:
+            current_instance_id.reset(token)
+
+
+mcp.add_middleware(SessionInstanceMiddleware())
+
+async def _run_sql(sql: str, params: Optional[Union[List[Any], Dict[str, Any]]] = None, timeout_ms: Optional[int] = None,
+                   lane: str = QUERY_LANE, tool: str = "sql_exec"):
+    """Execute SQL and wrap the outcome in the tool response format, traced as a span named after the calling tool"""
+    with start_span(f"mcp.tool {tool}", {"mcp.tool.name": tool}) as span:
+        response = await _execute_tool_sql(sql, params, timeout_ms, lane)
+        if not response["success"]:
+            span.set_error(response["error"])
+        return response
+
+
+def _busy_response(e: AdmissionRejectedError) -> Dict[str, Any]:
+    """Failed tool response of a call rejected by admission control, the client may retry it"""
+    return {
+        "success": False,
+        "error": str(e),
+        "retryable": True,
+        "message": "SQL execution rejected, server is busy"
+    }
+
+
+async def _execute_tool_sql(sql: str, params: Optional[Union[List[Any], Dict[str, Any]]], timeout_ms: Optional[int],
+                            lane: str):
+    """Execute SQL and convert errors into a failed tool response"""
+    # Per-query INFO lines are sampled (logSampleRate) and formatted only when a sink accepts them
+    sampled = sample_query_log()
+    if sampled:
+        logger.info("MCP tool executing SQL: {}", sql)
+    if params:
+        logger.debug("MCP tool SQL params: {}", params)
+    try:
+        result = await execute_sql(sql, params, timeout_ms=timeout_ms, lane=lane)
+        if changes_catalog(sql):
+            # The next describe_table call reads the catalog again
+            catalog_cache.invalidate()
+        
+        # Record execution results
+        if sampled:
+            if isinstance(result, list):
+                logger.info("SQL execution successful, returned {} rows of data", len(result))
+            else:
+                logger.info("SQL execution successful, affected {} rows", result)
+            
+        return {
+            "success": True, 
+            "result": result,
+            "message": "SQL executed successfully"
+        }
+    except AdmissionRejectedError as e:
+        return _busy_response(e)
+    except QueryCostRejectedError as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "message": "SQL execution rejected by the cost guard"
+        }
+    except Exception as e:
+        error_msg = str(e)
+        logger.error(f"MCP tool SQL execution failed: {error_msg}")
+        return {
+            "success": False, 
+            "error": error_msg,
+            "message": "SQL execution failed"
+        }
 
 @mcp.tool()
-async def sql_exec(sql: str):
+async def sql_exec(sql: str, params: Optional[Union[List[Any], Dict[str, Any]]] = None, timeout_ms: Optional[int] = None):
     """
     OceanBase SQL execution tool
     
     Function description:
     Execute any type of SQL statement, including SELECT, INSERT, UPDATE, DELETE, CREATE, DROP, etc.
-    Supports query and modification operations, automatically handles transaction commit and rollback
+    Supports query and modification operations, each statement runs in autocommit mode and commits on its own,
+    a transaction the SQL leaves open is rolled back when the call ends
+    Values passed through params are bound by the driver instead of being inlined into the SQL text,
+    so repeated statements keep the same shape and can be grouped and reused
     
     Parameter description:
-    - sql (str): SQL statement to execute, supports parameterized queries
+    - sql (str): SQL statement to execute, use %s (positional) or %(name)s (named) placeholders for parameterized queries
+    - params (list | dict, optional): Values bound to the placeholders, a list for %s or a dict for %(name)s
+    - timeout_ms (int, optional): Statement timeout in milliseconds, defaults to dbQueryTimeoutMs, 0 disables it.
+      A statement that runs longer is killed on the server with KILL QUERY and the call fails
+    
+    Cost guard (dbCostGuard "reject" or "limit"):
+    SELECT, UPDATE, DELETE and INSERT statements are checked with EXPLAIN first, the estimate is cached per statement
+    shape. A statement estimated to examine more than dbCostGuardMaxRows rows is rejected, in "limit" mode a SELECT
+    without LIMIT runs with LIMIT dbCostGuardLimit instead
     
     Return value:
     - dict: Dictionary containing execution results
@@ -38,101 +156,360 @@ async def sql_exec(sql: str):
         - result: Execution result (query returns data list, modification returns affected rows)
         - message (str): Execution status description
         - error (str): Error message on failure (only exists when success=False)
+        - retryable (bool): True when the call was rejected because the server is busy and can be retried
     
     Usage examples:
     - Query: SELECT * FROM users WHERE age > 18
-    - Insert: INSERT INTO users (name, age) VALUES ('John', 25)
+    - Parameterized query: sql="SELECT * FROM users WHERE age > %s", params=[18]
+    - Named parameters: sql="SELECT * FROM users WHERE name = %(name)s", params={"name": "John"}
+    - Insert: sql="INSERT INTO users (name, age) VALUES (%s, %s)", params=["John", 25]
     - Update: UPDATE users SET age = 26 WHERE name = 'John'
     - Delete: DELETE FROM users WHERE age < 18
     """
-    logger.info(f"MCP tool executing SQL: {sql}")
-    try:
-        result = await execute_sql(sql)
-        
-        # Record execution results
-        if isinstance(result, list):
-            logger.info(f"SQL execution successful, returned {len(result)} rows of data")
-        else:
-            logger.info(f"SQL execution successful, affected {result} rows")
-            
-        return {
-            "success": True, 
-            "result": result,
-            "message": "SQL executed successfully"
-        }
-    except Exception as e:
-        error_msg = str(e)
-        logger.error(f"MCP tool SQL execution failed: {error_msg}")
-        return {
-            "success": False, 
-            "error": error_msg,
-            "message": "SQL execution failed"
-        }
+    return await _run_sql(sql, params, timeout_ms)
 
 @mcp.tool()
-async def describe_table(table_name: str):
+async def paginate_query(sql: str, params: Optional[Union[List[Any], Dict[str, Any]]] = None,
+                         page_size: int = DEFAULT_PAGE_SIZE, key: Optional[List[str]] = None,
+                         cursor: Optional[str] = None, timeout_ms: Optional[int] = None):
+    """
+    OceanBase Paginated query tool
+    
+    Function description:
+    Return one page of a SELECT, ordered by a unique key, and a cursor for the next page
+    The query is rewritten into keyset (seek) pagination: each page continues after the key of the last row
+    of the previous page, so with an index on the key every page costs the same, however deep it is,
+    instead of an OFFSET scan that reads every earlier row
+    
+    Parameter description:
+    - sql (str): A single SELECT without LIMIT, with %s or %(name)s placeholders like sql_exec. Its own ORDER BY is
+      replaced by the key order. Result columns need distinct names, alias the duplicates of a join. DISTINCT, GROUP BY,
+      aggregate and UNION queries are evaluated in full for every page, so only a plain SELECT pages at constant cost
+    - params (list | dict, optional): Values bound to the placeholders, pass the same values with every page
+    - page_size (int): Rows per page, 1 to 10000, default 100
+    - key (List[str], optional): Unique, non-null columns of the result to page by. Defaults to the primary key
+      (or a unique NOT NULL index) of the table when the query reads a single table. The columns must be in the select list
+    - cursor (str, optional): next_cursor of the previous page, omit for the first page
+    - timeout_ms (int, optional): Statement timeout of each page in milliseconds, defaults to dbQueryTimeoutMs
+    
+    Return value:
+    - dict: Same return format as sql_exec tool, plus
+        - next_cursor (str | None): Cursor of the next page, None on the last page
+    
+    Usage examples:
+    - First page: paginate_query(sql="SELECT * FROM orders WHERE status = %s", params=["paid"], page_size=500)
+    - Next page: paginate_query(sql="SELECT * FROM orders WHERE status = %s", params=["paid"], page_size=500, cursor="eyJ2Ijox...")
+    - Explicit key: paginate_query(sql="SELECT o.id, o.total, c.name FROM orders o JOIN customers c ON c.id = o.customer_id", key=["id"])
+    """
+    with start_span("mcp.tool paginate_query", {"mcp.tool.name": "paginate_query"}) as span:
+        try:
+            rows, next_cursor = await paginate_query_rows(sql, params, page_size, key, cursor, timeout_ms)
+            response = {
+                "success": True,
+                "result": rows,
+                "next_cursor": next_cursor,
+                "message": f"Returned {len(rows)} rows" + (", more rows available" if next_cursor else ", last page")
+            }
+        except AdmissionRejectedError as e:
+            response = _busy_response(e)
+        except Exception as e:
+            logger.error(f"MCP tool paginated query failed: {e}")
+            response = {"success": False, "error": str(e), "message": "Paginated query failed"}
+        if not response["success"]:
+            span.set_error(response["error"])
+        return response
+
+@mcp.tool()
+async def explain_query(sql: str, params: Optional[Union[List[Any], Dict[str, Any]]] = None,
+                        timeout_ms: Optional[int] = None):
+    """
+    OceanBase Query plan tool
+    
+    Function description:
+    Explain a statement without executing it and point out what makes it slow
+    The plan is read with EXPLAIN FORMAT=JSON where the server supports it, otherwise with the tabular EXPLAIN
+    (TiDB, OceanBase plan text). Full table scans, full index scans, filesorts and temporary tables are flagged,
+    and for every fully scanned table with a predicate a candidate index is suggested: equality columns first,
+    then the ORDER BY columns of a single-table query, then one range column
+    
+    Parameter description:
+    - sql (str): A single SELECT, INSERT, UPDATE, DELETE or REPLACE, with %s or %(name)s placeholders like sql_exec
+    - params (list | dict, optional): Values bound to the placeholders
+    - timeout_ms (int, optional): Timeout of the EXPLAIN in milliseconds, defaults to dbQueryTimeoutMs
+    
+    Return value:
+    - dict: Same return format as sql_exec tool, result contains
+        - format (str): "json" or "table", the EXPLAIN format of plan
+        - plan: The EXPLAIN FORMAT=JSON document or the rows of the tabular EXPLAIN
+        - issues (list): type (full_scan, full_index_scan, filesort, temporary_table), table, estimated_rows, detail
+        - index_suggestions (list): table, columns, reason and ddl (CREATE INDEX statement) of each candidate index
+    
+    Usage examples:
+    - explain_query(sql="SELECT * FROM orders WHERE status = %s ORDER BY created_at DESC LIMIT 20", params=["paid"])
+    - explain_query(sql="UPDATE users SET active = 0 WHERE last_login < %s", params=["2024-01-01"])
+    
+    Suggestions are candidates derived from the predicates, check them against the existing indexes of the table
+    """
+    with start_span("mcp.tool explain_query", {"mcp.tool.name": "explain_query"}) as span:
+        try:
+            result = await explain_query_plan(sql, params, timeout_ms)
+            response = {
+                "success": True,
+                "result": result,
+                "message": f"{len(result['issues'])} plan issues, {len(result['index_suggestions'])} index suggestions"
+            }
+        except AdmissionRejectedError as e:
+            response = _busy_response(e)
+        except Exception as e:
+            logger.error(f"MCP tool explain query failed: {e}")
+            response = {"success": False, "error": str(e), "message": "Explain query failed"}
+        if not response["success"]:
+            span.set_error(response["error"])
+        return response
+
+@mcp.tool()
+async def describe_table(table_name: Union[str, List[str]]):
     """
    OceanBase Table structure description tool
     
     Function description:
-    Get detailed structure information of the specified table, including column names, data types, NULL allowance, default values, key types, etc.
-    Equivalent to executing DESCRIBE table_name or SHOW COLUMNS FROM table_name
+    Get the columns, indexes, foreign keys and statistics of one or more tables in one call
+    All requested tables are read with one information_schema query (COLUMNS, STATISTICS, KEY_COLUMN_USAGE, TABLES)
+    and kept in the catalog cache for dbCatalogCacheTtl seconds, schema changes made through sql_exec refresh it
     
     Parameter description:
-    - table_name (str): Table name to describe, supports database.table format
+    - table_name (str | List[str]): Table name or list of up to 100 table names, supports database.table format
     
     Return value:
-    - dict: Same return format as sql_exec tool, result contains table structure information list
+    - dict: Same return format as sql_exec tool, plus
+        - result (list): One compact description per table found, in the order requested
+        - missing (list): Names of the requested tables that do not exist
+    
+    Each description contains:
+    - table: database.table
+    - rows: Estimated number of rows (information_schema.TABLES)
+    - columns: name, type, nullable, and default, key (PRI, UNI, MUL), extra and distinct (index cardinality) when set
+    - indexes: name, columns, unique, type and cardinality
+    - foreign_keys: name, columns, references (database.table) and referenced_columns
     
     Usage examples:
     - describe_table("users")
-    - describe_table("mydb.users")
+    - describe_table(["mydb.orders", "mydb.order_items", "users"])
     
     Return data example:
     [
-        {"Field": "id", "Type": "int(11)", "Null": "NO", "Key": "PRI", "Default": null, "Extra": "auto_increment"},
-        {"Field": "name", "Type": "varchar(100)", "Null": "NO", "Key": "", "Default": null, "Extra": ""}
+        {"table": "mydb.users", "rows": 1200,
+         "columns": [{"name": "id", "type": "int", "nullable": false, "key": "PRI", "extra": "auto_increment", "distinct": 1200},
+                     {"name": "name", "type": "varchar(100)", "nullable": false}],
+         "indexes": [{"name": "PRIMARY", "columns": ["id"], "unique": true, "type": "BTREE", "cardinality": 1200}],
+         "foreign_keys": []}
     ]
     """
     logger.info(f"MCP tool: Describe table structure - {table_name}")
-    return await sql_exec(f"DESCRIBE {table_name};")
+    with start_span("mcp.tool describe_table", {"mcp.tool.name": "describe_table"}) as span:
+        try:
+            tables, missing = await describe_tables(table_name)
+            if tables:
+                response = {
+                    "success": True,
+                    "result": tables,
+                    "missing": missing,
+                    "message": f"Described {len(tables)} tables" + (f", {len(missing)} not found" if missing else "")
+                }
+            else:
+                response = {
+                    "success": False,
+                    "error": f"Table(s) {', '.join(missing)} do not exist",
+                    "message": "Describe table failed"
+                }
+        except AdmissionRejectedError as e:
+            response = _busy_response(e)
+        except Exception as e:
+            logger.error(f"MCP tool describe table failed: {e}")
+            response = {"success": False, "error": str(e), "message": "Describe table failed"}
+        if not response["success"]:
+            span.set_error(response["error"])
+        return response
 
 @mcp.tool()
-async def generate_demo_data(table_name: str, columns_name: List[str], num: int):
+async def generate_demo_data(table_name: str, columns_name: Optional[List[str]], num: int,
+                             column_options: Optional[Dict[str, Dict[str, Any]]] = None, seed: Optional[int] = None,
+                             connections: Optional[int] = None, ctx: Context = None):
     """
     OceanBase Test data generation tool
 
     Function description:
     Generate specified amount of test data for specified tables and columns
-    Automatically generates random strings as test data for development and testing environments
+    Values follow the column types read from the catalog, so integer, decimal, date, time, enum and json columns get valid values
     
     Parameter description:
-    - table_name (str): Table name to generate test data for
-    - columns_name (List[str]): List of column names to fill with data
+    - table_name (str): Table name to generate test data for, optionally qualified with the database
+    - columns_name (List[str], optional): Columns to fill, null fills every column except auto-increment and generated columns
     - num (int): Number of test records to generate
+    - column_options (Dict[str, dict], optional): Options per column name
+        - min, max: Range of numeric, date and time values
+        - distribution (str): uniform (default), normal, zipf or sequence
+        - skew (float): Exponent of the zipf distribution, default 1.5
+        - null_fraction (float): Share of NULL values of a nullable column, 0 to 1
+        - unique (bool): Distinct values, set for columns with a single-column unique index
+        - values (list): Values to pick from
+        - length (int): Longest string, up to the column length
+        - cardinality (int): Distinct values of a string column, default 4096
+    - seed (int, optional): Seed of the run, the same seed generates the same rows; a random seed is used and returned when omitted
+    - connections (int, optional): Batches written at once on separate pooled connections, default all query slots of the pool but one
     
     Return value:
-    - dict: Same return format as generate_test_data function
+    - dict: Dictionary containing generation results
         - success (bool): Whether data generation was successful
-        - result: Generation result information
+        - result (dict): rows, seconds, rows_per_second, connections and seed of the run
         - error (str): Error message on failure (only exists when success=False)
     
     Data generation rules:
-    - Each record generates 8-character random letter strings for each column
-    - Uses INSERT statements for batch data insertion
-    - Supports any number of columns and data types (string type)
+    - Integer columns stay in the range of their type, decimals keep their precision and scale, strings fit the column length
+    - Columns with a single-column unique index get distinct values, numeric ones continue after the largest existing value
+    - Columns of a single-column foreign key take values that exist in the referenced table
+    - Rows are generated with NumPy and written in batches of 5000, one multi-row INSERT transaction per batch
+    - Several batches are written at once, each on its own pooled connection; progress is reported to the client
     
     Usage examples:
+    - generate_demo_data("users", None, 10000)
     - generate_demo_data("users", ["name", "email", "phone"], 100)
-    - generate_demo_data("products", ["product_name", "category"], 50)
+    - generate_demo_data("orders", None, 50000, {"amount": {"min": 1, "max": 500, "distribution": "normal"},
+                                                 "note": {"null_fraction": 0.3}})
+    - generate_demo_data("events", None, 50000000, seed=42, connections=8)
     
     Notes:
     - Only suitable for development and testing environments
-    - Generated data consists of random strings, no business logic included
-    - Large data generation may take considerable time
+    - Generated data is random, no business logic included
+    - Rows of batches written before a failure stay in the table
     """
     logger.info(f"MCP tool: Generate test data - {table_name}")
-    return await generate_test_data(table_name, columns_name, num)
+    with start_span("mcp.tool generate_demo_data", {"mcp.tool.name": "generate_demo_data"}) as span:
+        try:
+            # Progress notifications reach clients that sent a progress token with the call
+            progress = None if ctx is None else lambda written, total: ctx.report_progress(progress=written, total=total)
+            result = await generate_test_data(table_name, columns_name, num, column_options, seed, connections,
+                                              progress)
+            response = {
+                "success": True,
+                "result": result,
+                "message": f"Generated {result['rows']} rows in table {table_name}, {result['rows_per_second']} rows/s"
+            }
+        except AdmissionRejectedError as e:
+            response = _busy_response(e)
+        except Exception as e:
+            logger.error(f"MCP tool generate test data failed: {e}")
+            response = {"success": False, "error": str(e), "message": "Generate test data failed"}
+        if not response["success"]:
+            span.set_error(response["error"])
+        return response
+
+@mcp.tool()
+async def query_stats(limit: int = 10):
+    """
+    OceanBase Query statistics tool
+    
+    Function description:
+    Returns the statement fingerprints that consumed the most database time since the server started.
+    Statements are grouped by their normalized shape, so the same query with different values counts as one fingerprint
+    
+    Parameter description:
+    - limit (int): Number of fingerprints to return, at least 1, default 10
+    
+    Return value:
+    - dict: Dictionary containing statistics
+        - success (bool): Whether the statistics were collected
+        - result (list): Fingerprints ordered by total time, each with
+            - fingerprint, normalized_sql: Statement shape without literal values
+            - executions, errors, slow_executions: Execution counters
+            - total_ms, avg_ms, p50_ms, p95_ms, p99_ms, max_ms: Latency of the statement
+            - phase_ms: Total time spent in acquire, execute, fetch and size_estimate (the result size estimate)
+            - rows, bytes: Rows returned or affected and estimated serialised result size
+    
+    Usage examples:
+    - query_stats()
+    - query_stats(limit=20)
+    """
+    logger.info(f"MCP tool: Query statistics - top {limit}")
+    if limit < 1:
+        return {"success": False, "error": "limit must be at least 1", "message": "Query statistics not collected"}
+    return {
+        "success": True,
+        "result": statement_registry.top_by_total_time(limit),
+        "message": "Query statistics collected successfully"
+    }
+
+@mcp.tool()
+async def runtime_stats():
+    """
+    OceanBase Runtime statistics tool
+    
+    Function description:
+    Shows what blocks the server's event loop and stalls concurrent tool calls
+    
+    Return value:
+    - dict: Dictionary containing statistics
+        - success (bool): Whether the statistics were collected
+        - result (dict): Runtime statistics
+            - loop_lag: Event loop lag percentiles of the recent probes (last_ms, p50_ms, p99_ms, max_ms)
+            - stalls: Times the loop was blocked longer than loopStallThresholdMs, with the stack of the blocking code
+            - slow_callbacks: Callbacks slower than slowCallbackMs (asyncio debug mode, off by default)
+            - tasks, threads: Running asyncio tasks and threads
+    
+    Usage examples:
+    - runtime_stats()
+    """
+    logger.info("MCP tool: Runtime statistics")
+    return {
+        "success": True,
+        "result": runtime_monitor.stats(),
+        "message": "Runtime statistics collected successfully"
+    }
+
+@mcp.tool()
+async def use_instance(ctx: Context, db_instance_id: Optional[str] = None):
+    """
+    OceanBase Instance selection tool
+    
+    Function description:
+    Selects the database instance used by the calling MCP session. Over HTTP many clients share one server,
+    each session keeps its own selection and the other sessions are not affected
+    
+    Parameter description:
+    - db_instance_id (str, optional): dbInstanceId of an instance with dbActive true in dbList,
+      omit to return to the first active instance
+    
+    Return value:
+    - dict: Dictionary containing the selected instance
+        - success (bool): Whether the instance was selected
+        - result (dict): db_instance_id, db_host, db_port, db_database and db_type of the selected instance
+        - message (str): Selection status description
+        - error (str): Error message on failure (only exists when success=False)
+    
+    Usage examples:
+    - use_instance(db_instance_id="reporting_replica")
+    - use_instance()
+    """
+    logger.info(f"MCP tool: Use instance - {db_instance_id or 'default'}")
+    if http_workers.worker_index is not None:
+        return {"success": False, "error": "Instance selection is not available with httpWorkers > 1, "
+                "the requests of a session can reach any worker", "message": "Failed to select database instance"}
+    try:
+        db_instance = session_registry.select(ctx.session_id, db_instance_id)
+    except ValueError as e:
+        return {"success": False, "error": str(e), "message": "Failed to select database instance"}
+    return {
+        "success": True,
+        "result": {
+            "db_instance_id": db_instance.db_instance_id,
+            "db_host": db_instance.db_host,
+            "db_port": db_instance.db_port,
+            "db_database": db_instance.db_database,
+            "db_type": db_instance.db_type,
+        },
+        "message": f"Session now uses database instance {db_instance.db_instance_id}"
+    }
+
 @mcp.resource("database://tables")
 async def get_database_tables():
     """
@@ -169,7 +546,8 @@ async def get_database_tables():
     """
     logger.info("Getting database table information")
     # Get all table names
-    tables_info = await generate_database_tables()
+    with start_span("mcp.resource database://tables"):
+        tables_info = await generate_database_tables()
 
     return {
         "uri": "database://tables",
@@ -235,6 +613,80 @@ async def get_database_config():
         "text": str(safe_config)
     }
 
+
+@mcp.resource("database://pool_stats")
+async def get_pool_stats():
+    """
+    OceanBase Connection pool statistics resource
+    
+    Function description:
+    Provides live saturation and latency metrics of the connection pool and the admission lanes in front of it,
+    used to size dbPoolSize, dbMaxOverflow and dbMetadataSlots for real traffic
+    
+    Resource URI:
+    - database://pool_stats - Represents connection pool statistics resource
+    
+    Return data content:
+    - pools: One entry per connection pool
+        - pool: Database instance id
+        - size / in_use / idle / min_size / max_size: Current pool state
+        - waiters: Callers waiting for a connection
+        - acquired: Successful connection acquires
+        - acquire_latency_ms: Acquire latency histogram (count, sum, avg, p50, p95, p99, max, cumulative buckets)
+        - connection_age_seconds: Age of the physical connections (min, avg, max)
+        - connections_opened / connections_recycled: Physical connections opened and retired by the pool
+        - errors: Acquire and statement errors by exception type
+    - admission: In-flight, waiting and rejected calls per admission lane
+    
+    Notes:
+    - The same metrics are served in Prometheus text format on http://dbMetricsHost:dbMetricsPort/metrics when dbMetricsPort is set
+    """
+    logger.info("Getting connection pool statistics")
+
+    pool_stats = await generate_pool_stats()
+
+    return {
+        "uri": "database://pool_stats",
+        "mimeType": "application/json",
+        "text": str(pool_stats)
+    }
+
+
+@mcp.resource("database://traces")
+async def get_traces():
+    """
+    OceanBase Request traces resource
+    
+    Function description:
+    Provides the most recent request traces, each split into spans for the MCP tool handler, admission,
+    pool acquire, driver execute, fetch and result size estimate, to attribute tail latency to queueing or database time
+    
+    Resource URI:
+    - database://traces - Represents recent request traces resource
+    
+    Return data content:
+    List of the 20 most recent traces, newest first:
+    - traceId: W3C trace id
+    - root: Name of the first span, usually "mcp.tool <tool name>"
+    - durationMs: Duration of the whole trace
+    - spans: Spans in start order, in the OpenTelemetry (OTLP JSON) span shape
+    
+    Notes:
+    - Tracing is enabled with "traceExporter": "memory" or "stderr" in dbconfig.json, stderr also writes every span as a JSON line
+    """
+    logger.info("Getting recent request traces")
+
+    return {
+        "uri": "database://traces",
+        "mimeType": "application/json",
+        "text": str(tracer.recent_traces())
+    }
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_endpoint(request: Request) -> Response:
+    """Prometheus metrics on the MCP HTTP port when transport is http or sse"""
+    return Response(generate_prometheus_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 # ==================== Server Startup Related ====================
 
 # When using fastmcp run, FastMCP CLI automatically handles server startup
@@ -248,8 +700,31 @@ def main():
 
     active_db, db_config = load_activate_db_config()
     logger.info(f"Current database instance configuration: {active_db}")
-    # When using fastmcp run, just call mcp.run() directly
-    mcp.run(transport='stdio')
+    configure_tracing(db_config.trace_exporter)
+    configure_runtime_monitor(db_config.loop_monitor_interval_ms, db_config.loop_stall_threshold_ms,
+                              db_config.slow_callback_ms)
+    multi_worker = db_config.transport != "stdio" and int(db_config.http_workers) > 1
+    if multi_worker and db_config.db_metrics_port:
+        logger.warning("dbMetricsPort is ignored with httpWorkers > 1, every worker serves its own /metrics on the HTTP port")
+    elif db_config.db_metrics_port:
+        start_metrics_server(db_config.db_metrics_host, int(db_config.db_metrics_port), generate_prometheus_metrics)
+    if db_config.transport == "stdio":
+        # When using fastmcp run, just call mcp.run() directly
+        mcp.run(transport='stdio')
+        return
+
+    if multi_worker:
+        sys.exit(http_workers.serve_http_workers(mcp, db_config))
+
+    # One long-lived server for many MCP clients, all sessions share the connection pools
+    uvicorn_config = {"timeout_keep_alive": int(db_config.http_keep_alive_timeout)}
+    if db_config.http_limit_concurrency:
+        uvicorn_config["limit_concurrency"] = int(db_config.http_limit_concurrency)
+    transport_kwargs = {"host": db_config.http_host, "port": int(db_config.http_port), "uvicorn_config": uvicorn_config}
+    if db_config.http_path:
+        transport_kwargs["path"] = db_config.http_path
+    logger.info(f"Serving MCP over {db_config.transport} on {db_config.http_host}:{db_config.http_port}")
+    mcp.run(transport=db_config.transport, **transport_kwargs)
 
 if __name__ == "__main__":
     main()
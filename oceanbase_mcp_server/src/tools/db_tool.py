@@ -3,40 +3,222 @@ Database Utility Functions
 
 Provides database utility functions related to SQL execution.
 """
-from src.utils.db_operate import execute_sql
-from src.utils.logger_util import logger
-import random, string
+from src.utils.catalog_cache import MAX_DESCRIBE_TABLES, catalog_cache
+from src.utils.db_admission import METADATA_LANE, QUERY_LANE, AdmissionRejectedError, get_admission_controller
+from src.utils.db_operate import QueryTimeoutError, execute_batch, execute_sql
+from src.utils.keyset_pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, build_page_query, check_page_query, \
+    decode_cursor, encode_cursor, single_table
+from src.utils.logger_util import logger, sample_query_log
+from src.utils.query_plan import analyze_plan, check_explain_query, json_plan
+from src.utils.sql_classifier import quote_identifier
 
 
-async def sql_exec(sql: str):
+async def sql_exec(sql: str, params=None):
     """
     Execute any SQL statement (SELECT/INSERT/UPDATE/DELETE)
     """
-    logger.info(f"Executing SQL: {sql}")
+    sampled = sample_query_log()
+    if sampled:
+        logger.info("Executing SQL: {}", sql)
     try:
-        result = await execute_sql(sql)
-        logger.info(f"SQL executed successfully, returned {len(result) if isinstance(result, list) else result} rows/affected rows")
+        result = await execute_sql(sql, params)
+        if sampled:
+            logger.info("SQL executed successfully, returned {} rows/affected rows",
+                        len(result) if isinstance(result, list) else result)
         return {"success": True, "result": result}
     except Exception as e:
         logger.error(f"SQL execution failed: {e}")
         return {"success": False, "error": str(e)}
 
 
-async def generate_test_data(table, columns, num):
-    logger.info(f"Starting to generate {num} test records for table '{table}'")
-    logger.debug(f"Target table {table} columns: {columns}")
+async def infer_page_key(sql):
+    """
+    Unique key to page a single-table SELECT by: the primary key, otherwise the first unique index
+    whose columns are all NOT NULL
+
+    Raises:
+        ValueError: The query reads more than one table or the table has no such key
+    """
+    table = single_table(sql)
+    if table is None:
+        raise ValueError("Cannot infer a key for a query that does not read exactly one table, pass key")
+    schema, name = table
+    rows = await execute_sql(
+        "SELECT INDEX_NAME AS index_name, COLUMN_NAME AS column_name, NULLABLE AS nullable "
+        "FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = COALESCE(%s, DATABASE()) AND TABLE_NAME = %s AND NON_UNIQUE = 0 "
+        "ORDER BY INDEX_NAME <> 'PRIMARY', INDEX_NAME, SEQ_IN_INDEX",
+        [schema, name], lane=METADATA_LANE)
+    indexes = {}
+    for row in rows:
+        indexes.setdefault(row["index_name"], []).append(row)
+    for columns in indexes.values():
+        if all(not column["nullable"] for column in columns):
+            return [column["column_name"] for column in columns]
+    raise ValueError(f"Table '{name}' has no primary key or unique NOT NULL index to page by, pass key")
+
+
+async def paginate_query(sql, params=None, page_size=DEFAULT_PAGE_SIZE, key=None, cursor=None, timeout_ms=None):
+    """
+    One page of a SELECT in keyset order
+
+    Returns:
+        tuple: (rows of the page, cursor of the next page or None on the last page)
+    """
+    page_size = int(page_size)
+    if not 0 < page_size <= MAX_PAGE_SIZE:
+        raise ValueError(f"page_size must be between 1 and {MAX_PAGE_SIZE}")
+    sql = check_page_query(sql)
+    after = None
+    if cursor:
+        key, after = decode_cursor(cursor, sql, params)
+    elif key:
+        key = [key] if isinstance(key, str) else list(key)
+    else:
+        key = await infer_page_key(sql)
+        logger.debug("Paging by inferred key {}", key)
+
+    page_sql, page_params = build_page_query(sql, params, key, after, page_size)
+    rows = await execute_sql(page_sql, page_params, timeout_ms=timeout_ms)
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(sql, params, key, rows[-1])
+
+
+async def describe_tables(table_names):
+    """
+    Columns, indexes, foreign keys and statistics of one or more tables, from the catalog cache
+
+    Returns:
+        tuple: (descriptions of the tables found, names of the tables that do not exist)
+
+    Raises:
+        ValueError: No table name or more than MAX_DESCRIBE_TABLES names were given
+    """
+    names = [table_names] if isinstance(table_names, str) else list(table_names or [])
+    if not names or len(names) > MAX_DESCRIBE_TABLES:
+        raise ValueError(f"Pass 1 to {MAX_DESCRIBE_TABLES} table names")
+    return await catalog_cache.describe(names)
+
+
+async def explain_query(sql, params=None, timeout_ms=None):
+    """
+    Plan of a statement with its full scans, filesorts and temporary tables flagged and candidate indexes
+
+    EXPLAIN FORMAT=JSON is used where the server supports it, otherwise the tabular EXPLAIN. The statement
+    itself is not executed.
 
-    for i in range(num):
-        values = []
-        for col in columns:
-            # Simple example: all use 8-character random strings
-            random_value = ''.join(random.choices(string.ascii_letters, k=8))
-            values.append(random_value)
+    Returns:
+        dict: format, plan, issues and index_suggestions
+    """
+    sql = check_explain_query(sql)
+    try:
+        plan = json_plan(await execute_sql(f"EXPLAIN FORMAT=JSON {sql}", params, timeout_ms=timeout_ms))
+    except (AdmissionRejectedError, QueryTimeoutError):
+        raise
+    except Exception as e:
+        # TiDB before 6.5 and some OceanBase versions have no FORMAT=JSON, the tabular EXPLAIN reports the error
+        # of a statement that cannot be explained at all
+        logger.debug(f"EXPLAIN FORMAT=JSON failed, using the tabular EXPLAIN: {e}")
+        plan = None
+    if plan is not None:
+        return analyze_plan(sql, "json", plan)
+    return analyze_plan(sql, "table", await execute_sql(f"EXPLAIN {sql}", params, timeout_ms=timeout_ms))
+
+
+async def _prepare_columns(table, specs):
+    """Values of foreign key columns from the referenced tables, sequences of unique columns after their largest value"""
+    from src.utils.data_generator import MAX_REFERENCED_VALUES
+
+    for spec in specs:
+        if spec.reference is None or spec.values is not None:
+            continue
+        referenced_table, referenced_column = spec.reference
+        column = quote_identifier(referenced_column)
+        # Ordered, so the same seed picks the same referenced values on every run
+        rows = await execute_sql(f"SELECT DISTINCT {column} AS value FROM "
+                                 f"{'.'.join(map(quote_identifier, referenced_table.split('.', 1)))} "
+                                 f"WHERE {column} IS NOT NULL ORDER BY {column} LIMIT {MAX_REFERENCED_VALUES}")
+        if rows:
+            spec.values = [row["value"] for row in rows]
+        elif spec.nullable:
+            spec.values, spec.null_fraction = [None], 0.0
+        else:
+            raise ValueError(f"Column '{spec.name}' references {referenced_table}, which has no rows")
+
+    sequences = [spec for spec in specs if spec.sequential]
+    if sequences:
+        columns = ", ".join(f"MAX({quote_identifier(spec.name)}) AS max{i}" for i, spec in enumerate(sequences))
+        row = (await execute_sql(f"SELECT {columns} FROM {table}"))[0]
+        for i, spec in enumerate(sequences):
+            spec.continue_after(row[f"max{i}"])
+
+
+def _load_connections(connections):
+    """Connections a load writes on, bounded by the query lane, by default all of its slots but one"""
+    capacity = get_admission_controller().lane(QUERY_LANE).concurrency
+    if connections is None:
+        return max(1, capacity - 1)
+    if connections < 1:
+        raise ValueError("connections must be at least 1")
+    return min(int(connections), capacity)
+
+
+async def generate_test_data(table, columns=None, num=0, column_options=None, seed=None, connections=None,
+                             progress=None):
+    """
+    Insert generated rows into a table, with values of the types the catalog reports for its columns
+
+    Rows are generated BATCH_ROWS at a time and each batch is written in one transaction as a multi-row INSERT,
+    several batches at once on separate pooled connections.
+
+    Args:
+        table (str): Table name, optionally qualified with the database
+        columns (list, optional): Columns to fill, by default every column except auto-increment and generated ones
+        num (int): Number of rows
+        column_options (dict, optional): Options per column name, see data_generator.OPTION_KEYS
+        seed (int, optional): Seed of the run, the same seed generates the same rows
+        connections (int, optional): Batches written at once, at most the query lane concurrency
+        progress (optional): Coroutine function called with (rows written, num) while the rows are written
+
+    Returns:
+        dict: rows, seconds, rows_per_second, connections and seed of the run
+
+    Raises:
+        ValueError: The table or a column does not exist, or an option does not fit its column
+    """
+    # Imported with the first generation, not at server startup, NumPy takes most of its import time
+    from src.utils.data_generator import RowGenerator, apply_options, load_rows, table_columns
+
+    logger.info(f"Starting to generate {num} test records for table '{table}'")
+    tables, missing = await describe_tables(table)
+    if missing:
+        raise ValueError(f"Table {table} does not exist")
+    description = tables[0]
+    specs = table_columns(description, columns)
+    if not specs:
+        raise ValueError(f"Table {table} has no columns to fill")
+    options = {name.lower(): value for name, value in (column_options or {}).items()}
+    unknown = set(options) - {spec.name.lower() for spec in specs}
+    if unknown:
+        raise ValueError(f"Options given for column(s) {', '.join(sorted(unknown))}, which are not filled")
+    for spec in specs:
+        apply_options(spec, options.get(spec.name.lower(), {}))
 
-        placeholders = ','.join(['%s'] * len(columns))
-        sql = f"INSERT INTO {table} ({','.join(columns)}) VALUES ({placeholders})"
+    target = ".".join(map(quote_identifier, description["table"].split(".", 1)))
+    await _prepare_columns(target, specs)
+    logger.debug(f"Target table {target} columns: {[(spec.name, spec.kind) for spec in specs]}")
+    generator = RowGenerator(specs, seed, num)
+    sql = (f"INSERT INTO {target} ({','.join(quote_identifier(spec.name) for spec in specs)}) "
+           f"VALUES ({','.join(['%s'] * len(specs))})")
 
-        logger.debug(f"Inserting row {i + 1}/{num}: {dict(zip(columns, values))}")
-        result=await execute_sql(sql, values)
+    async def write(rows):
+        # One transaction per batch: BEGIN, multi-row INSERT, COMMIT instead of a round trip per row
+        await execute_batch(sql, rows)
+        return len(rows)
 
-    logger.info(f"Successfully generated {num} test records for table '{table}'")
\ No newline at end of file
+    result = await load_rows(generator, num, write, _load_connections(connections), progress)
+    logger.info(f"Successfully generated {result['rows']} test records for table '{table}' in {result['seconds']}s "
+                f"on {result['connections']} connections, {result['rows_per_second']} rows/s, seed {result['seed']}")
+    return result
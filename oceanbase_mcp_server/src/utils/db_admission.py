@@ -0,0 +1,228 @@
+"""
+Admission Control Module
+
+Bounds how many calls may use a connection pool at once and how many may wait for it.
+Calls are split into lanes, so cheap metadata lookups keep reserved capacity even when
+heavy queries saturate the pool. Every pool has its own lanes, so a session that selected
+another instance with use_instance neither takes nor waits for slots of the default pool.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional, Tuple
+
+from src.utils.db_config import ConfigSnapshot, DatabaseInstanceConfig, config_watcher, load_activate_db_config
+from src.utils.db_pool import current_pool_key
+from src.utils.logger_util import logger
+
+# Lane for schema and configuration lookups (describe_table, database://tables)
+METADATA_LANE = "metadata"
+# Lane for agent SQL and data generation
+QUERY_LANE = "query"
+
+
+class AdmissionRejectedError(Exception):
+    """Raised when a call is not admitted, the call did not run and can be retried later"""
+
+    retryable = True
+
+    def __init__(self, lane: str, reason: str):
+        self.lane = lane
+        self.reason = reason
+        super().__init__(f"Server busy, {lane} call rejected: {reason}. Retry later")
+
+
+class AdmissionLane:
+    """Concurrency limit with a bounded wait queue for one class of calls"""
+
+    def __init__(self, name: str, concurrency: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # Slots removed by resize while they were in use, dropped instead of released
+        self._retiring = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+
+    @asynccontextmanager
+    async def admit(self):
+        """
+        Hold one slot of the lane for the duration of the block
+
+        Raises:
+            AdmissionRejectedError: The wait queue is full or no slot was freed within max_wait seconds
+        """
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                self.rejected_queue_full += 1
+                logger.warning(f"Admission lane '{self.name}' rejected a call, {self.waiting} calls already waiting")
+                raise AdmissionRejectedError(self.name, f"wait queue is full ({self.max_queue} waiting)")
+
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.max_wait)
+            except asyncio.TimeoutError:
+                self.rejected_timeout += 1
+                logger.warning(f"Admission lane '{self.name}' rejected a call after waiting {self.max_wait}s")
+                raise AdmissionRejectedError(self.name, f"no capacity within {self.max_wait}s")
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+
+        self.in_flight += 1
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            if self._retiring:
+                self._retiring -= 1
+            else:
+                self._semaphore.release()
+
+    async def resize(self, concurrency: int, max_queue: int, max_wait: float):
+        """
+        Apply new limits in place, calls already admitted keep their slots
+
+        Free slots are removed at once and slots in use when their call ends, so the lane never
+        admits a call while it holds as many calls as the new concurrency.
+        """
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        change = concurrency - self.concurrency
+        self.concurrency = concurrency
+        if change >= 0:
+            kept = min(change, self._retiring)
+            self._retiring -= kept
+            for _ in range(change - kept):
+                self._semaphore.release()
+            return
+        retire = -change
+        while retire and not self._semaphore.locked():
+            # A free slot is taken without waiting
+            await self._semaphore.acquire()
+            retire -= 1
+        self._retiring += retire
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get the current state and counters of the lane"""
+        return {
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_queue": self.max_queue,
+            "max_wait": self.max_wait,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+        }
+
+
+def _lane_limits(db_config: DatabaseInstanceConfig) -> Dict[str, Tuple[int, int, float]]:
+    """Concurrency, wait queue size and wait timeout of each lane"""
+    pool_capacity = int(db_config.db_pool_size) + int(db_config.db_max_overflow)
+    # Metadata slots are carved out of the pool, so both lanes together never exceed its capacity
+    metadata_slots = max(1, min(int(db_config.db_metadata_slots), pool_capacity - 1))
+    query_slots = max(1, pool_capacity - metadata_slots)
+    max_queue = int(db_config.db_max_queue_size)
+    max_wait = float(db_config.db_queue_timeout)
+    return {
+        METADATA_LANE: (metadata_slots, max_queue, max_wait),
+        QUERY_LANE: (query_slots, max_queue, max_wait),
+    }
+
+
+class AdmissionController:
+    """Admission controller in front of one connection pool - one instance per pool"""
+
+    _instances: Dict[Optional[str], "AdmissionController"] = {}
+
+    @classmethod
+    def get_instance(cls, db_instance_id: Optional[str] = None) -> "AdmissionController":
+        """
+        Get the admission controller of a database instance's pool
+
+        Args:
+            db_instance_id (str, optional): Instance id, None for the first active instance
+
+        Returns:
+            AdmissionController: Controller keyed like the connection pools
+        """
+        instance = cls._instances.get(db_instance_id)
+        if instance is None:
+            instance = cls._instances[db_instance_id] = AdmissionController(db_instance_id)
+        return instance
+
+    def __init__(self, db_instance_id: Optional[str] = None):
+        db_instance, db_config = load_activate_db_config(db_instance_id)
+        self.db_instance_id = db_instance_id
+        self.name = db_instance.db_instance_id
+        self._lanes = {name: AdmissionLane(name, *limits) for name, limits in _lane_limits(db_config).items()}
+        self._log_limits("initialized")
+
+    def _log_limits(self, action: str):
+        query, metadata = self._lanes[QUERY_LANE], self._lanes[METADATA_LANE]
+        logger.info(f"Admission control {action} for {self.name}, query slots: {query.concurrency}, "
+                    f"metadata slots: {metadata.concurrency}, max queue: {query.max_queue}, "
+                    f"max queue wait: {query.max_wait}s")
+
+    async def apply_config(self, snapshot: ConfigSnapshot):
+        """Resize the lanes to a reloaded configuration, calls already admitted finish in their slots"""
+        if self.db_instance_id is None:
+            db_instance = snapshot.active_database
+        else:
+            db_instance = snapshot.get_instance(self.db_instance_id)
+        if db_instance is not None:
+            self.name = db_instance.db_instance_id
+        for name, limits in _lane_limits(snapshot.config).items():
+            await self._lanes[name].resize(*limits)
+        self._log_limits("resized")
+
+    def admit(self, lane: str = QUERY_LANE):
+        """
+        Admit a call into a lane
+
+        Args:
+            lane (str): METADATA_LANE or QUERY_LANE
+
+        Returns:
+            Async context manager holding one slot of the lane
+        """
+        return self._lanes[lane].admit()
+
+    def lane(self, lane: str) -> AdmissionLane:
+        """Get a lane by name"""
+        return self._lanes[lane]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Get the state of every lane"""
+        return {name: lane.snapshot() for name, lane in self._lanes.items()}
+
+
+def get_admission_controller() -> AdmissionController:
+    """Get the admission controller of the pool of the instance selected by the current session"""
+    return AdmissionController.get_instance(current_pool_key())
+
+
+def collect_admission_stats() -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Get the lane state of the admission controllers created so far, keyed by pool name"""
+    return {controller.name: controller.snapshot() for controller in AdmissionController._instances.values()}
+
+
+# Settings the lanes are sized from
+LANE_SETTINGS = ("db_pool_size", "db_max_overflow", "db_metadata_slots", "db_max_queue_size", "db_queue_timeout")
+
+
+async def _on_config_change(old: ConfigSnapshot, new: ConfigSnapshot):
+    """Resize the lanes in place, replacing them would let old and new lanes admit calls side by side"""
+    if any(getattr(old.config, name) != getattr(new.config, name) for name in LANE_SETTINGS):
+        for controller in list(AdmissionController._instances.values()):
+            await controller.apply_config(new)
+
+
+config_watcher.add_listener(_on_config_change)
@@ -0,0 +1,298 @@
+"""
+Connection Pool Metrics Module
+
+Collects saturation and latency metrics for connection pools and renders them as JSON
+snapshots (database://pool_stats) or Prometheus text format.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional
+
+from src.utils.logger_util import logger
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+# Acquire latency bucket upper bounds in milliseconds
+ACQUIRE_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+# Statement latency bucket upper bounds in milliseconds
+QUERY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """Fixed bucket histogram, quantiles are estimated as the upper bound of the bucket they fall in"""
+
+    def __init__(self, bounds: Iterable[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        """Record one observation"""
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate a quantile
+
+        Args:
+            q (float): Quantile between 0 and 1
+
+        Returns:
+            float: Upper bound of the bucket holding the quantile, the largest observation for the overflow bucket
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get count, sum, quantile estimates and cumulative bucket counts"""
+        cumulative = 0
+        buckets = {}
+        for bound, bucket_count in zip(self.bounds + ("+Inf",), list(self.counts)):
+            cumulative += bucket_count
+            buckets[str(bound)] = cumulative
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "avg": round(self.sum / self.count, 3) if self.count else 0.0,
+            "p50": round(self.quantile(0.50), 3),
+            "p95": round(self.quantile(0.95), 3),
+            "p99": round(self.quantile(0.99), 3),
+            "max": round(self.max, 3),
+            "buckets": buckets,
+        }
+
+
+class PoolMetrics:
+    """
+    Saturation and latency counters of one connection pool
+
+    Physical connections are tracked by their server session id in least recently used order.
+    When more sessions are known than the pool holds, the least recently used ones have been
+    retired by the pool (recycled after dbPoolRecycle, or discarded after an error) and are
+    counted as recycled.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.acquire_latency_ms = Histogram(ACQUIRE_BUCKETS_MS)
+        self.waiters = 0
+        self.acquired = 0
+        self.connections_opened = 0
+        self.connections_recycled = 0
+        self.errors: Dict[str, int] = {}
+        self._sessions: "OrderedDict[Any, float]" = OrderedDict()
+
+    def acquire_started(self) -> float:
+        """Mark a caller as waiting for a connection, returns the start time to pass to acquire_finished"""
+        self.waiters += 1
+        return time.perf_counter()
+
+    def acquire_finished(self, started: float, session_id: Any = None, pool_size: Optional[int] = None):
+        """
+        Record a successful acquire
+
+        Args:
+            started (float): Value returned by acquire_started
+            session_id: Server side id of the physical connection (thread id, backend pid)
+            pool_size (int, optional): Connections currently held by the pool
+        """
+        self.waiters -= 1
+        self.acquired += 1
+        self.acquire_latency_ms.observe((time.perf_counter() - started) * 1000)
+        if session_id is not None:
+            self._track_session(session_id, pool_size)
+
+    def acquire_failed(self, started: float, error: Optional[BaseException] = None):
+        """Record a failed acquire, the error is counted unless the caller counts it elsewhere"""
+        self.waiters -= 1
+        self.acquire_latency_ms.observe((time.perf_counter() - started) * 1000)
+        if error is not None:
+            self.record_error(error)
+
+    def record_error(self, error: BaseException):
+        """Count an error by its exception type"""
+        error_type = type(error).__name__
+        self.errors[error_type] = self.errors.get(error_type, 0) + 1
+
+    def _track_session(self, session_id: Any, pool_size: Optional[int]):
+        if session_id in self._sessions:
+            self._sessions.move_to_end(session_id)
+            return
+
+        self._sessions[session_id] = time.time()
+        self.connections_opened += 1
+        while pool_size is not None and len(self._sessions) > max(pool_size, 1):
+            self._sessions.popitem(last=False)
+            self.connections_recycled += 1
+
+    def connection_ages(self) -> Dict[str, Any]:
+        """Get the age in seconds of the tracked physical connections"""
+        now = time.time()
+        ages = [now - opened_at for opened_at in list(self._sessions.values())]
+        if not ages:
+            return {"tracked": 0, "min": 0.0, "avg": 0.0, "max": 0.0}
+        return {
+            "tracked": len(ages),
+            "min": round(min(ages), 1),
+            "avg": round(sum(ages) / len(ages), 1),
+            "max": round(max(ages), 1),
+        }
+
+    def snapshot(self, state: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Get all pool metrics
+
+        Args:
+            state (dict, optional): Driver reported pool state (size, in_use, idle, min_size, max_size)
+
+        Returns:
+            Dict[str, Any]: Pool state merged with the collected counters
+        """
+        snapshot = {"pool": self.name}
+        snapshot.update(state or {})
+        snapshot.update({
+            "waiters": self.waiters,
+            "acquired": self.acquired,
+            "acquire_latency_ms": self.acquire_latency_ms.snapshot(),
+            "connection_age_seconds": self.connection_ages(),
+            "connections_opened": self.connections_opened,
+            "connections_recycled": self.connections_recycled,
+            "errors": dict(self.errors),
+        })
+        return snapshot
+
+
+def _escape_label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render_prometheus(pools: List[Dict[str, Any]],
+                      admission: Optional[Dict[str, Dict[str, Dict[str, Any]]]] = None) -> str:
+    """
+    Render pool snapshots and admission lanes in Prometheus text exposition format
+
+    Args:
+        pools (List[Dict[str, Any]]): Snapshots returned by PoolMetrics.snapshot
+        admission (dict, optional): Admission lane snapshots keyed by pool name, then lane name
+
+    Returns:
+        str: Prometheus text format metrics
+    """
+    lines = []
+
+    def metric(name, metric_type, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{_escape_label(val)}"' for key, val in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}")
+
+    gauges = [
+        ("size", "Connections currently held by the pool"),
+        ("in_use", "Connections currently checked out"),
+        ("idle", "Idle connections available in the pool"),
+        ("max_size", "Maximum connections the pool may hold"),
+        ("waiters", "Callers waiting for a connection"),
+    ]
+    for key, help_text in gauges:
+        metric(f"mcp_db_pool_{key}", "gauge", help_text,
+               [({"pool": p["pool"]}, p[key]) for p in pools if key in p])
+
+    metric("mcp_db_pool_acquired_total", "counter", "Successful connection acquires",
+           [({"pool": p["pool"]}, p["acquired"]) for p in pools])
+    metric("mcp_db_pool_connections_opened_total", "counter", "Physical connections seen by the pool",
+           [({"pool": p["pool"]}, p["connections_opened"]) for p in pools])
+    metric("mcp_db_pool_connections_recycled_total", "counter", "Physical connections retired and replaced",
+           [({"pool": p["pool"]}, p["connections_recycled"]) for p in pools])
+    metric("mcp_db_pool_connection_age_max_seconds", "gauge", "Age of the oldest tracked connection",
+           [({"pool": p["pool"]}, p["connection_age_seconds"]["max"]) for p in pools])
+    metric("mcp_db_pool_errors_total", "counter", "Pool and statement errors by exception type",
+           [({"pool": p["pool"], "type": error_type}, count)
+            for p in pools for error_type, count in p["errors"].items()])
+
+    name = "mcp_db_pool_acquire_latency_ms"
+    lines.append(f"# HELP {name} Time spent waiting for a connection in milliseconds")
+    lines.append(f"# TYPE {name} histogram")
+    for p in pools:
+        histogram = p["acquire_latency_ms"]
+        pool_label = _escape_label(p["pool"])
+        for bound, count in histogram["buckets"].items():
+            lines.append(f'{name}_bucket{{pool="{pool_label}",le="{bound}"}} {count}')
+        lines.append(f'{name}_sum{{pool="{pool_label}"}} {histogram["sum"]}')
+        lines.append(f'{name}_count{{pool="{pool_label}"}} {histogram["count"]}')
+
+    if admission:
+        lanes = [(pool, lane, s) for pool, pool_lanes in admission.items() for lane, s in pool_lanes.items()]
+        metric("mcp_admission_in_flight", "gauge", "Calls admitted and running per lane",
+               [({"pool": pool, "lane": lane}, s["in_flight"]) for pool, lane, s in lanes])
+        metric("mcp_admission_waiting", "gauge", "Calls waiting for admission per lane",
+               [({"pool": pool, "lane": lane}, s["waiting"]) for pool, lane, s in lanes])
+        metric("mcp_admission_rejected_total", "counter", "Calls rejected by admission control",
+               [({"pool": pool, "lane": lane, "reason": reason}, s[f"rejected_{reason}"])
+                for pool, lane, s in lanes for reason in ("queue_full", "timeout")])
+
+    return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(host: str, port: int, render: Callable[[], str]) -> "ThreadingHTTPServer":
+    """
+    Serve Prometheus metrics on http://host:port/metrics from a daemon thread
+
+    The stdio transport has no HTTP listener of its own, so metrics are exposed on a separate port.
+    Rendering only copies counters, so it is safe to run next to the event loop.
+
+    Args:
+        host (str): Listen address
+        port (int): Listen port
+        render (Callable[[], str]): Returns the metrics text
+
+    Returns:
+        ThreadingHTTPServer: The running server
+    """
+    # Only imported when the exporter is enabled, http.server is not needed on the stdio startup path
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            try:
+                body = render().encode("utf-8")
+            except Exception as e:
+                logger.error(f"Failed to render Prometheus metrics: {e}")
+                self.send_error(500)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Keep scrapes out of stderr, the stdio transport owns stdout and clients often capture stderr
+            logger.trace(f"Metrics request: {format % args}")
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True)
+    thread.start()
+    logger.info(f"Prometheus metrics endpoint listening on http://{host}:{port}/metrics")
+    return server
@@ -3,41 +3,85 @@ Database Connection Pool Management Module
 Provides asynchronous OceanBase connection pool functionality
 """
 import asyncio
-import aiomysql
+from typing import Dict, Optional
+
 from src.utils.logger_util import logger
-from src.utils.db_config import load_activate_db_config
+from src.utils.db_config import ConfigSnapshot, DatabaseInstanceConfigLoader, config_watcher, load_activate_db_config
+from src.utils.db_session import current_instance_id
+from src.utils.db_metrics import PoolMetrics
+from src.utils.tracing import start_span
+
+# Settings that only take effect when the pool is created, a change rebuilds the pool
+POOL_SETTINGS = ("db_pool_size", "db_max_overflow", "db_pool_recycle")
 
 
 class DatabasePool:
     """Database connection pool management class"""
 
-    _instance = None
+    # Pools by selected instance id, None is the pool of the first active instance
+    _instances: Dict[Optional[str], "DatabasePool"] = {}
+    # Pools being created, concurrent first calls for an instance wait for the same one
+    _starting: Dict[Optional[str], "asyncio.Future[DatabasePool]"] = {}
     _pool = None
     _config = None
+    _db_instance = None
+
+    def __init__(self, db_instance_id: Optional[str] = None):
+        # None follows the first active instance across configuration reloads
+        self.db_instance_id = db_instance_id
+        self.metrics = PoolMetrics("oceanbase")
+        # Held while the pool is created, so a pool dropped by close_pool is reopened once
+        self._initializing = asyncio.Lock()
+        # Pool each checked out connection came from, so a rebuild never mixes up releases
+        self._owners = {}
+
+    @classmethod
+    async def get_instance(cls, db_instance_id: Optional[str] = None):
+        """Get the pool of a database instance, created on first use, None for the first active instance"""
+        instance = cls._instances.get(db_instance_id)
+        if instance is not None:
+            return instance
+        starting = cls._starting.get(db_instance_id)
+        if starting is None:
+            starting = cls._starting[db_instance_id] = asyncio.ensure_future(cls._start(db_instance_id))
+            starting.add_done_callback(lambda _: cls._starting.pop(db_instance_id, None))
+        # A cancelled caller does not cancel the creation the other callers wait for
+        return await asyncio.shield(starting)
 
     @classmethod
-    async def get_instance(cls):
-        """Get singleton instance"""
-        if cls._instance is None:
-            cls._instance = DatabasePool()
-            await cls._instance._initialize()
-        return cls._instance
+    async def _start(cls, db_instance_id: Optional[str]):
+        """Create the pool of an instance and register it once it is initialized"""
+        instance = DatabasePool(db_instance_id)
+        await instance._initialize()
+        # Statistics and configuration reloads only see initialized pools
+        cls._instances[db_instance_id] = instance
+        return instance
 
     async def _initialize(self):
-        """Initialize connection pool"""
-        if self._pool is not None:
-            return
+        """Initialize connection pool, concurrent calls create a single pool"""
+        async with self._initializing:
+            if self._pool is not None:
+                return
+
+            # Get active database instance and configuration
+            db_instance, db_config = load_activate_db_config(self.db_instance_id)
+            self._pool = await self._create_pool(db_instance, db_config)
 
-        # Get active database instance and configuration
-        db_instance, db_config = load_activate_db_config()
+    async def _create_pool(self, db_instance, db_config):
+        """Create a connection pool for a database instance and make the instance and configuration current"""
         self._config = db_config
+        self._db_instance = db_instance
+        self.metrics.name = db_instance.db_instance_id
 
         try:
+            # The driver is imported with the first pool, not at server startup
+            import aiomysql
             pool_size = int(db_config.db_pool_size)
             max_overflow = int(db_config.db_max_overflow)
             pool_timeout = int(db_config.db_pool_timeout)
+            pool_recycle = int(db_config.db_pool_recycle)
             max_size=pool_size + max_overflow
-            self._pool = await aiomysql.create_pool(
+            pool = await aiomysql.create_pool(
                 host=db_instance.db_host,
                 port=int(db_instance.db_port),
                 user=db_instance.db_username,
@@ -45,28 +89,97 @@ class DatabasePool:
                 db=db_instance.db_database,
                 minsize=pool_size,
                 maxsize=max_size,
-                pool_recycle=pool_timeout,
+                pool_recycle=pool_recycle,
                 autocommit=True  # Keep consistent with synchronous version
             )
-            logger.info(f"Database connection pool initialized successfully, pool minsize: {pool_size}, maxsize: {max_size}, pool timeout:{pool_timeout}s")
+            logger.info(f"Database connection pool initialized successfully, pool minsize: {pool_size}, maxsize: {max_size}, "
+                        f"pool timeout:{pool_timeout}s, pool recycle:{pool_recycle}s, query timeout:{db_config.db_query_timeout_ms}ms")
             logger.info(
                 f"Database connection pool Config: {db_instance}")
+            return pool
         except Exception as e:
             logger.error(f"Database connection pool initialization failed: {str(e)}")
+            self.metrics.record_error(e)
             raise
 
+    @property
+    def query_timeout_ms(self) -> int:
+        """Default per-statement timeout in milliseconds, 0 disables the timeout"""
+        return int(self._config.db_query_timeout_ms) if self._config else 0
+
+    @property
+    def slow_query_threshold_ms(self) -> int:
+        """Statements running at least this many milliseconds go to the slow query log, 0 disables it"""
+        return int(self._config.db_slow_query_threshold_ms) if self._config else 0
+
     async def get_connection(self):
-        """Get database connection"""
+        """Get database connection, waiting at most dbPoolTimeout seconds for a free one"""
         if self._pool is None:
             await self._initialize()
 
+        pool_timeout = int(self._config.db_pool_timeout)
+        with start_span("db.pool.acquire", {"db.pool.name": self.metrics.name,
+                                            "db.pool.waiters": self.metrics.waiters}):
+            started = self.metrics.acquire_started()
+            try:
+                conn = await asyncio.wait_for(self._pool.acquire(), timeout=pool_timeout)
+            except asyncio.TimeoutError:
+                logger.error(f"Timed out after {pool_timeout}s waiting for a connection from pool")
+                error = TimeoutError(f"No database connection available within {pool_timeout}s")
+                self.metrics.acquire_failed(started, error)
+                raise error
+            except BaseException as e:
+                logger.error(f"Failed to get connection from pool: {str(e)}")
+                self.metrics.acquire_failed(started, e)
+                raise
+
+            self.metrics.acquire_finished(started, conn.thread_id(), self._pool.size)
+            self._owners[id(conn)] = self._pool
+        logger.debug("Successfully obtained connection from pool")
+        return conn
+
+    def stats(self) -> dict:
+        """
+        Get pool state and metrics
+
+        Returns:
+            dict: Pool size, in-use, idle, waiters, acquire latency histogram, connection ages, recycle count and errors by type
+        """
+        state = {}
+        if self._pool is not None:
+            state = {
+                "size": self._pool.size,
+                "in_use": self._pool.size - self._pool.freesize,
+                "idle": self._pool.freesize,
+                "min_size": self._pool.minsize,
+                "max_size": self._pool.maxsize,
+            }
+        return self.metrics.snapshot(state)
+
+    async def cancel_query(self, conn):
+        """
+        Cancel the statement currently running on a pooled connection
+
+        KILL QUERY is sent over a separate short-lived connection, so cancellation still works
+        when every pooled connection is busy. The target connection stays open and usable.
+        """
+        import aiomysql
+        thread_id = conn.thread_id()
+        db_instance = self._db_instance
+        killer = await aiomysql.connect(
+            host=db_instance.db_host,
+            port=int(db_instance.db_port),
+            user=db_instance.db_username,
+            password=db_instance.db_password,
+            db=db_instance.db_database,
+            autocommit=True
+        )
         try:
-            conn = await self._pool.acquire()
-            logger.debug("Successfully obtained connection from pool")
-            return conn
-        except Exception as e:
-            logger.error(f"Failed to get connection from pool: {str(e)}")
-            raise
+            async with killer.cursor() as cursor:
+                await cursor.execute("KILL QUERY %s", (thread_id,))
+            logger.warning(f"Sent KILL QUERY for connection thread {thread_id}")
+        finally:
+            killer.close()
 
     async def release_connection(self, conn):
         """Release database connection back to connection pool"""
@@ -75,11 +188,46 @@ class DatabasePool:
             return
 
         try:
-            self._pool.release(conn)
+            self._owners.pop(id(conn), self._pool).release(conn)
             logger.debug("Successfully released connection back to pool")
         except Exception as e:
             logger.error(f"Failed to release connection back to pool: {str(e)}")
 
+    async def apply_config(self, snapshot: ConfigSnapshot):
+        """
+        Switch to a new configuration snapshot
+
+        Timeouts apply to the next call. A changed instance or pool size builds a new pool first,
+        then the old pool is closed once its checked out connections are released.
+        """
+        db_config = snapshot.config
+        if self.db_instance_id is None:
+            db_instance = snapshot.active_database
+        else:
+            db_instance = snapshot.get_instance(self.db_instance_id)
+        if db_instance is None:
+            logger.error("No active database instance in the new configuration, keeping the current pool")
+            return
+
+        rebuild = db_instance != self._db_instance or any(
+            getattr(db_config, name) != getattr(self._config, name) for name in POOL_SETTINGS)
+        if not rebuild or self._pool is None:
+            self._config = db_config
+            return
+
+        old_pool, old_config, old_instance = self._pool, self._config, self._db_instance
+        try:
+            self._pool = await self._create_pool(db_instance, db_config)
+        except Exception:
+            self._config, self._db_instance = old_config, old_instance
+            self.metrics.name = old_instance.db_instance_id
+            logger.error("Keeping the current connection pool, the new configuration could not be applied")
+            return
+
+        logger.info(f"Database connection pool rebuilt for {db_instance.db_instance_id}, closing the previous pool")
+        old_pool.close()
+        asyncio.ensure_future(old_pool.wait_closed())
+
     async def close_pool(self):
         """Close connection pool"""
         if self._pool is None:
@@ -97,8 +245,36 @@ class DatabasePool:
 
 # Export connection pool getter function
 async def get_db_pool():
-    """Get database connection pool instance"""
-    return await DatabasePool.get_instance()
+    """Get the connection pool of the instance selected by the current session"""
+    return await DatabasePool.get_instance(current_pool_key())
+
+
+def current_pool_key() -> Optional[str]:
+    """Key of the pool of the instance selected by the current session, None for the first active instance"""
+    db_instance_id = current_instance_id.get()
+    if db_instance_id is not None and db_instance_id == _active_instance_id():
+        # Sessions that select the first active instance share its pool
+        db_instance_id = None
+    return db_instance_id
+
+
+def _active_instance_id() -> Optional[str]:
+    active_database = DatabaseInstanceConfigLoader().get_active_database()
+    return active_database.db_instance_id if active_database else None
+
+
+async def _on_config_change(old: ConfigSnapshot, new: ConfigSnapshot):
+    """Apply a reloaded configuration to the pools created so far"""
+    for pool in list(DatabasePool._instances.values()):
+        await pool.apply_config(new)
+
+
+config_watcher.add_listener(_on_config_change)
+
+
+def collect_pool_stats() -> list:
+    """Get metrics of the connection pools created so far, without creating one"""
+    return [pool.stats() for pool in DatabasePool._instances.values()]
 
 if __name__ == "__main__":
     # Test connection pool
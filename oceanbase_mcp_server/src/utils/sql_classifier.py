@@ -0,0 +1,228 @@
+"""
+SQL Classifier Module
+
+Decides how a statement is run from its tokens instead of its first characters: comments, string
+literals and quoted identifiers are skipped, CTEs are resolved to the statement they feed and
+parenthesized queries to the query inside. The classification decides whether rows are fetched,
+whether the statement needs a commit and whether it only reads. The same lexical rules blank out
+literals, strip trailing semicolons and quote identifiers for the modules that match patterns over SQL.
+"""
+import hashlib
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Tuple
+
+# Classifications kept, least recently used first out. Keyed by a digest so long statements are not retained
+CLASSIFICATION_CACHE_SIZE = 4096
+
+_COMMENTS = r"--[^\n]*|\#[^\n]*|/\*.*?(?:\*/|\Z)"
+# Contents of '...' and "..." strings (double quotes are strings unless ANSI_QUOTES is set)
+_SINGLE = r"(?:[^'\\]|\\.|'')*"
+_DOUBLE = r'(?:[^"\\]|\\.|"")*'
+# Strings and `identifiers`
+_QUOTED = rf"""'{_SINGLE}'|"{_DOUBLE}"|`(?:[^`]|``)*`"""
+# Inside a parenthesis without nested parentheses, such as one row of a large INSERT
+_FLAT = rf"""(?:[^'"`()\#/\-]+|{_QUOTED}|{_COMMENTS}|/(?!\*)|-(?!-))*+"""
+# Whitespace, comments (including /*! versioned */ ones), quoted text, numbers, operators and parentheses
+# without a leading word carry nothing that decides the statement kind
+_SKIP = rf"""\s+|{_COMMENTS}|{_QUOTED}|\((?:\s|{_COMMENTS})*+(?![A-Za-z_]){_FLAT}\)|\d\w*|[^\w'"`()\#/\-;]+|/(?!\*)|-(?!-)"""
+# Every match consumes the skipped text in the regex engine and returns the next significant token, or the end
+# of the text. A parenthesis without nested parentheses is one token that keeps only its first word
+_TOKEN_RE = re.compile(rf"""
+    (?:{_SKIP})*+
+    (?:(?P<group>\((?:\s|{_COMMENTS})*+(?P<lead>[A-Za-z_][\w$]*){_FLAT}\))
+    |(?P<word>[A-Za-z_][\w$]*)
+    |(?P<open>\()
+    |(?P<close>\))
+    |(?P<end>;)
+    |\Z)
+""", re.S | re.X)
+
+# Comments and string literals, with the contents of the strings
+_LITERALS_RE = re.compile(rf"""(?P<comment>{_COMMENTS})|'(?P<single>{_SINGLE})'|"(?P<double>{_DOUBLE})\"""", re.S)
+_TRAILING_SEMICOLONS_RE = re.compile(r"[\s;]+\Z")
+
+# Statements whose shape decides whether they return rows
+_QUERY_VERBS = frozenset(("select", "values", "table"))
+_DML_VERBS = frozenset(("insert", "update", "delete", "replace"))
+# Verbs a CTE list or EXPLAIN leads into
+_MAIN_VERBS = _QUERY_VERBS | _DML_VERBS | {"with"}
+# Other statements returning a result set, and the ones among them that change nothing
+_ROW_VERBS = frozenset(("show", "describe", "desc", "explain", "help", "call", "analyze", "check", "checksum",
+                        "optimize", "repair", "handler"))
+_READ_ONLY_ROW_VERBS = frozenset(("show", "describe", "desc", "explain", "help", "check", "checksum"))
+
+Words = List[Tuple[str, int]]
+
+
+@dataclass(frozen=True)
+class SqlClassification:
+    """How a SQL text is executed, for multi-statement text the first statement decides the result handling"""
+    statement_type: str
+    returns_rows: bool
+    is_dml: bool
+    read_only: bool
+    statement_count: int = 1
+
+
+_EMPTY = SqlClassification("", returns_rows=False, is_dml=False, read_only=True, statement_count=0)
+
+
+def _split_statements(sql: str) -> List[Words]:
+    """
+    Tokenize into statements, keeping for each the words that decide its kind
+
+    Kept are the words outside parentheses and the first word inside each parenthesis, with their depth,
+    so the values of a large INSERT are skipped instead of collected.
+    """
+    statements: List[Words] = []
+    words: Words = []
+    depth = 0
+    after_open = False
+    for match in _TOKEN_RE.finditer(sql):
+        kind = match.lastgroup
+        if kind == "group":
+            words.append((match.group("lead").lower(), depth + 1))
+        elif kind == "word":
+            if depth == 0 or after_open:
+                words.append((match.group("word").lower(), depth))
+        elif kind == "open":
+            depth += 1
+        elif kind == "close":
+            depth = max(depth - 1, 0)
+        elif depth == 0 and words:
+            statements.append(words)
+            words = []
+        after_open = kind == "open"
+    if words:
+        statements.append(words)
+    return statements
+
+
+def _main_verb(words: Words) -> str:
+    """Leading verb of a statement, for WITH the verb of the statement the CTEs feed"""
+    verb = words[0][0]
+    if verb == "with":
+        return next((w for w, d in words[1:] if d == 0 and w in _MAIN_VERBS and w != "with"), "select")
+    return verb
+
+
+def _has_locking_clause(top_words: List[str]) -> bool:
+    """SELECT ... FOR UPDATE / FOR SHARE / LOCK IN SHARE MODE"""
+    for i, word in enumerate(top_words[:-1]):
+        if (word == "for" and top_words[i + 1] in ("update", "share")) or (word == "lock" and top_words[i + 1] == "in"):
+            return True
+    return False
+
+
+def _classify_statement(words: Words) -> SqlClassification:
+    verb = _main_verb(words)
+    top_words = [w for w, d in words if d == 0]
+    # A write inside parentheses, such as a data-modifying CTE, makes the statement a write
+    nested_write = any(d > 0 and w in _DML_VERBS for w, d in words)
+
+    if verb in _QUERY_VERBS:
+        if verb == "select" and "into" in top_words:
+            # SELECT ... INTO @var / OUTFILE stores the rows instead of returning them
+            return SqlClassification(verb, returns_rows=False, is_dml=False, read_only=False)
+        read_only = not nested_write and not _has_locking_clause(top_words)
+        return SqlClassification(verb, returns_rows=True, is_dml=False, read_only=read_only)
+    if verb in _DML_VERBS:
+        # MariaDB supports INSERT / REPLACE / DELETE ... RETURNING
+        return SqlClassification(verb, returns_rows="returning" in top_words, is_dml=True, read_only=False)
+    if verb == "explain":
+        # EXPLAIN ANALYZE runs the statement it explains
+        inner = next((i for i, (w, _) in enumerate(words) if i > 0 and w in _MAIN_VERBS), None)
+        analyze = any(w == "analyze" for w, _ in words[1:inner])
+        writes = inner is not None and _main_verb(words[inner:]) in _DML_VERBS
+        return SqlClassification(verb, returns_rows=True, is_dml=False, read_only=not (analyze and writes))
+    if verb in _ROW_VERBS:
+        return SqlClassification(verb, returns_rows=True, is_dml=False, read_only=verb in _READ_ONLY_ROW_VERBS)
+    return SqlClassification(verb, returns_rows=False, is_dml=False, read_only=False)
+
+
+def _classify(sql: str) -> SqlClassification:
+    statements = _split_statements(sql)
+    if not statements:
+        return _EMPTY
+    first = _classify_statement(statements[0])
+    if len(statements) == 1:
+        return first
+    read_only = first.read_only and all(_classify_statement(words).read_only for words in statements[1:])
+    return SqlClassification(first.statement_type, first.returns_rows, first.is_dml, read_only, len(statements))
+
+
+_cache: "OrderedDict[bytes, SqlClassification]" = OrderedDict()
+
+
+def classify_sql(sql: str) -> SqlClassification:
+    """
+    Classify a SQL text, cached by a digest of the text
+
+    Args:
+        sql (str): One or more SQL statements
+
+    Returns:
+        SqlClassification: Statement type, whether it returns rows, whether it is INSERT / UPDATE / DELETE / REPLACE
+        and whether every statement only reads
+    """
+    key = hashlib.blake2b(sql.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    classification = _cache.get(key)
+    if classification is not None:
+        _cache.move_to_end(key)
+        return classification
+    classification = _classify(sql)
+    _cache[key] = classification
+    if len(_cache) > CLASSIFICATION_CACHE_SIZE:
+        _cache.popitem(last=False)
+    return classification
+
+
+def _blank_literal(match: "re.Match") -> str:
+    if match.group("comment") is not None:
+        return " "
+    value = match.group("single") if match.group("single") is not None else match.group("double")
+    return "?%" if value[:1] in ("%", "_") else "?"
+
+
+def blank_literals(sql: str) -> str:
+    """
+    Replace comments by a space and string literals by ?, or by ?% when they start with a LIKE wildcard,
+    so patterns over the text only match keywords, identifiers and operators
+    """
+    return _LITERALS_RE.sub(_blank_literal, sql)
+
+
+def strip_trailing_semicolons(sql: str) -> str:
+    """Statement without the semicolons and whitespace it ends with"""
+    return _TRAILING_SEMICOLONS_RE.sub("", sql)
+
+
+def top_level_words(sql: str) -> List[Tuple[str, int]]:
+    """
+    Words outside parentheses, strings, quoted identifiers and comments, lower-cased, with their offset in sql
+
+    Offsets index the original text, so a clause found by its keywords can be cut from it.
+    """
+    words: List[Tuple[str, int]] = []
+    depth = 0
+    for match in _TOKEN_RE.finditer(sql):
+        kind = match.lastgroup
+        if kind == "word" and depth == 0:
+            words.append((match.group("word").lower(), match.start("word")))
+        elif kind == "open":
+            depth += 1
+        elif kind == "close":
+            depth = max(depth - 1, 0)
+    return words
+
+
+def quote_identifier(name: str) -> str:
+    """Quote a table or column name for MySQL"""
+    return "`" + name.replace("`", "``") + "`"
+
+
+def unquote_identifier(name: str) -> str:
+    """Name of a plain or backquoted identifier"""
+    return name[1:-1].replace("``", "`") if name.startswith("`") else name
@@ -0,0 +1,237 @@
+"""
+SQL Fingerprint Module
+
+Normalizes SQL statements into literal-free shapes and tracks how often each shape is executed,
+so repeated statements can be grouped regardless of the values they carry.
+"""
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import wraps
+from typing import Any, Dict, List, Optional
+
+from src.utils.db_metrics import QUERY_BUCKETS_MS, Histogram
+from src.utils.logger_util import logger
+
+# Comments: -- line, # line (MySQL) and /* block */
+_COMMENT_RE = re.compile(r"--[^\n]*|#[^\n]*|/\*.*?\*/", re.S)
+# Quoted string literals (MySQL treats double quotes as strings unless ANSI_QUOTES is set)
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"", re.S)
+# Hex and numeric literals that are not part of an identifier
+_NUMBER_RE = re.compile(r"\b0x[0-9a-f]+\b|(?<![\w.])[-+]?\d+(?:\.\d+)?(?:e[-+]?\d+)?\b", re.I)
+# Driver placeholders: %s and %(name)s
+_PLACEHOLDER_RE = re.compile(r"%\(\w+\)s|%s")
+# IN lists of placeholders collapse into a single token
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Executions of the same inlined-literal shape before a parameterization hint is logged
+PARAMETERIZE_HINT_THRESHOLD = 20
+# Results kept per function, least recently used first out. Keyed by a digest so the SQL text is not retained
+SHAPE_CACHE_SIZE = 2048
+# Longer statements (bulk INSERTs, generated SQL) are normalized on every call, their shapes are not kept either
+SHAPE_CACHE_MAX_LENGTH = 16384
+
+
+def _digest_cached(function):
+    """Cache a function of a SQL text by a digest of the text, as classify_sql does"""
+    cache: "OrderedDict[bytes, Any]" = OrderedDict()
+
+    @wraps(function)
+    def cached(sql: str):
+        if len(sql) > SHAPE_CACHE_MAX_LENGTH:
+            return function(sql)
+        key = hashlib.blake2b(sql.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        result = cache[key] = function(sql)
+        if len(cache) > SHAPE_CACHE_SIZE:
+            cache.popitem(last=False)
+        return result
+
+    return cached
+
+
+@_digest_cached
+def normalize_sql(sql: str) -> str:
+    """
+    Reduce a SQL statement to its shape: comments removed, literals and placeholders replaced by '?',
+    whitespace collapsed and keywords lower-cased
+
+    Args:
+        sql (str): SQL statement
+
+    Returns:
+        str: Normalized SQL text
+    """
+    normalized = _COMMENT_RE.sub(" ", sql)
+    normalized = _STRING_RE.sub("?", normalized)
+    normalized = _PLACEHOLDER_RE.sub("?", normalized)
+    normalized = _NUMBER_RE.sub("?", normalized)
+    normalized = _IN_LIST_RE.sub("(?+)", normalized)
+    normalized = _WHITESPACE_RE.sub(" ", normalized).strip().rstrip(";").strip()
+    return normalized.lower()
+
+
+@_digest_cached
+def fingerprint_sql(sql: str) -> str:
+    """
+    Get a stable fingerprint for the shape of a SQL statement
+
+    Args:
+        sql (str): SQL statement
+
+    Returns:
+        str: 16 hex character fingerprint of the normalized statement
+    """
+    return hashlib.sha1(normalize_sql(sql).encode("utf-8")).hexdigest()[:16]
+
+
+@_digest_cached
+def has_inline_literals(sql: str) -> bool:
+    """Whether the statement carries literal values instead of placeholders"""
+    stripped = _COMMENT_RE.sub(" ", sql)
+    return bool(_STRING_RE.search(stripped) or _NUMBER_RE.search(_STRING_RE.sub("", stripped)))
+
+
+@dataclass
+class StatementStats:
+    """Execution counters for one statement fingerprint"""
+    fingerprint: str
+    normalized_sql: str
+    executions: int = 0
+    parameterized_executions: int = 0
+    inline_literal_executions: int = 0
+    first_seen: float = 0.0
+    last_seen: float = 0.0
+    total_ms: float = 0.0
+    phase_ms: Dict[str, float] = field(default_factory=dict)
+    rows: int = 0
+    bytes: int = 0
+    errors: int = 0
+    slow_executions: int = 0
+    latency_ms: Histogram = field(default_factory=lambda: Histogram(QUERY_BUCKETS_MS))
+
+    def add_timing(self, timing, slow: bool = False):
+        """
+        Aggregate the timing of one finished execution
+
+        Args:
+            timing (QueryTiming): Phase timings, rows and bytes of the execution
+            slow (bool): Whether the execution exceeded the slow query threshold
+        """
+        self.total_ms += timing.total_ms
+        self.latency_ms.observe(timing.total_ms)
+        for phase, elapsed_ms in timing.phases.items():
+            self.phase_ms[phase] = self.phase_ms.get(phase, 0.0) + elapsed_ms
+        self.rows += timing.rows
+        self.bytes += timing.bytes
+        if timing.failed:
+            self.errors += 1
+        if slow:
+            self.slow_executions += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        latency = self.latency_ms.snapshot()
+        return {
+            "fingerprint": self.fingerprint,
+            "normalized_sql": self.normalized_sql,
+            "executions": self.executions,
+            "parameterized_executions": self.parameterized_executions,
+            "inline_literal_executions": self.inline_literal_executions,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "total_ms": round(self.total_ms, 3),
+            "avg_ms": latency["avg"],
+            "p50_ms": latency["p50"],
+            "p95_ms": latency["p95"],
+            "p99_ms": latency["p99"],
+            "max_ms": latency["max"],
+            "phase_ms": {phase: round(elapsed_ms, 3) for phase, elapsed_ms in self.phase_ms.items()},
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "errors": self.errors,
+            "slow_executions": self.slow_executions,
+        }
+
+
+class StatementRegistry:
+    """Bounded registry of statement fingerprints, least recently seen entries are evicted first"""
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._statements: "OrderedDict[str, StatementStats]" = OrderedDict()
+
+    def record(self, sql: str, params: Optional[Any] = None) -> StatementStats:
+        """
+        Record one execution of a statement
+
+        Args:
+            sql (str): Executed SQL statement
+            params: Parameters bound to the statement, None for inlined statements
+
+        Returns:
+            StatementStats: Counters of the statement fingerprint
+        """
+        fingerprint = fingerprint_sql(sql)
+        now = time.time()
+        stats = self._statements.get(fingerprint)
+        if stats is None:
+            stats = StatementStats(fingerprint, normalize_sql(sql), first_seen=now)
+            self._statements[fingerprint] = stats
+            if len(self._statements) > self.max_entries:
+                self._statements.popitem(last=False)
+        else:
+            self._statements.move_to_end(fingerprint)
+
+        stats.executions += 1
+        stats.last_seen = now
+        if params:
+            stats.parameterized_executions += 1
+        elif has_inline_literals(sql):
+            stats.inline_literal_executions += 1
+            if stats.inline_literal_executions == PARAMETERIZE_HINT_THRESHOLD:
+                logger.info(f"Statement {fingerprint} executed {PARAMETERIZE_HINT_THRESHOLD} times with inline literals, "
+                            f"pass values through params to reuse the statement: {stats.normalized_sql[:200]}")
+        return stats
+
+    def get(self, fingerprint: str) -> Optional[StatementStats]:
+        """Get counters of a fingerprint, None if it has not been seen"""
+        return self._statements.get(fingerprint)
+
+    def top(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Get the most frequently executed statement fingerprints
+
+        Args:
+            limit (int): Maximum number of fingerprints to return
+
+        Returns:
+            List[Dict[str, Any]]: Statement counters ordered by execution count
+        """
+        ordered = sorted(self._statements.values(), key=lambda s: s.executions, reverse=True)
+        return [stats.to_dict() for stats in ordered[:max(int(limit), 0)]]
+
+    def top_by_total_time(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Get the statement fingerprints that consumed the most database time
+
+        Args:
+            limit (int): Maximum number of fingerprints to return
+
+        Returns:
+            List[Dict[str, Any]]: Statement counters and latency percentiles ordered by total time
+        """
+        ordered = sorted(self._statements.values(), key=lambda s: s.total_ms, reverse=True)
+        return [stats.to_dict() for stats in ordered[:max(int(limit), 0)]]
+
+    def clear(self):
+        """Forget all recorded fingerprints"""
+        self._statements.clear()
+
+
+# Process wide statement registry
+statement_registry = StatementRegistry()
@@ -1,71 +1,82 @@
+import asyncio
+
+from src.utils.catalog_cache import catalog_cache, filter_tables
+from src.utils.cost_guard import cost_guard
 from src.utils.db_config import load_activate_db_config
+from src.utils.db_session import current_instance_id
+from src.utils.db_admission import METADATA_LANE, collect_admission_stats, get_admission_controller
+from src.utils.db_metrics import render_prometheus
 from src.utils.db_operate import execute_sql
+from src.utils.db_pool import collect_pool_stats, get_db_pool
 from src.utils.logger_util import logger
+from src.utils.sql_classifier import quote_identifier
+
+
+async def _exact_counts(tables_info, concurrency):
+    """Exact row counts of the tables, at most concurrency COUNT(*) queries at a time"""
+    semaphore = asyncio.Semaphore(max(int(concurrency), 1))
+
+    async def count(table):
+        relation = f"{quote_identifier(table['schema'])}.{quote_identifier(table['name'])}"
+        async with semaphore:
+            try:
+                result = await execute_sql(f"SELECT count(*) AS count FROM {relation}", lane=METADATA_LANE)
+                table["record_count"] = result[0]["count"]
+                table["record_count_exact"] = True
+            except Exception as e:
+                # The estimate is kept for a table that cannot be counted
+                logger.warning(f"Failed to count the rows of {relation}: {e}")
+
+    await asyncio.gather(*(count(table) for table in tables_info))
+
+
+async def generate_database_tables(schema=None, table=None):
+    """
+    Columns, keys and row counts of the tables of all user schemas, or of those matching the glob patterns
 
+    The tables come from the catalog cache, one pg_catalog query returns every table and column when it is empty
+    or expired. Row counts are the planner estimates (pg_class.reltuples, None for a table never analyzed). With
+    dbTablesExactCount set they are replaced by COUNT(*) results, run concurrently with at most
+    dbTablesCountConcurrency at a time.
 
-async def generate_database_tables():
+    Args:
+        schema (str, optional): Glob pattern of the schema names, e.g. "sales_*"
+        table (str, optional): Glob pattern of the table names, e.g. "order*"
+    """
+    uri = "/".join(["database://tables"] + [part for part in (schema, table) if part])
     try:
-        # Get all table names from PostgreSQL information_schema
-        tables_result = await execute_sql("""
-            SELECT table_name 
-            FROM information_schema.tables 
-            WHERE table_schema = 'public' 
-            AND table_type = 'BASE TABLE'
-        """)
-        tables_info = []
-
-        for table_row in tables_result:
-            table_name = table_row['table_name']
-
-            # Get table structure using PostgreSQL information_schema
-            describe_result = await execute_sql(f"""
-                SELECT 
-                    column_name as "Field",
-                    data_type as "Type",
-                    is_nullable as "Null",
-                    column_default as "Default",
-                    CASE 
-                        WHEN column_name IN (
-                            SELECT column_name 
-                            FROM information_schema.key_column_usage 
-                            WHERE table_name = '{table_name}' 
-                            AND table_schema = 'public'
-                        ) THEN 'PRI'
-                        ELSE ''
-                    END as "Key"
-                FROM information_schema.columns 
-                WHERE table_name = '{table_name}' 
-                AND table_schema = 'public'
-                ORDER BY ordinal_position
-            """)
-
-            # Get table record count
-            count_result = await execute_sql(f'SELECT COUNT(*) as count FROM "{table_name}"')
-            record_count = count_result[0]['count'] if count_result else 0
-
-            tables_info.append({
-                "name": table_name,
-                "columns": describe_result,
-                "record_count": record_count
-            })
+        _, db_config = load_activate_db_config(current_instance_id.get())
+        tables_info = [
+            {
+                "schema": entry["schema"],
+                "name": entry["name"],
+                "columns": entry["columns"],
+                "record_count": entry["estimated_rows"],
+                "record_count_exact": False
+            }
+            for entry in filter_tables(await catalog_cache.tables(), schema, table)
+        ]
+
+        if db_config.db_tables_exact_count:
+            await _exact_counts(tables_info, db_config.db_tables_count_concurrency)
 
         logger.info(f"Successfully obtained information for {len(tables_info)} tables")
         return {
-            "uri": "database://tables",
+            "uri": uri,
             "mimeType": "application/json",
             "text": str(tables_info)
         }
     except Exception as e:
         logger.error(f"Failed to get database table information: {e}")
         return {
-            "uri": "database://tables",
+            "uri": uri,
             "mimeType": "application/json",
             "text": f"Error: {str(e)}"
         }
 
 async def generate_database_config():
 
-    active_db, db_config = load_activate_db_config()
+    active_db, db_config = load_activate_db_config(current_instance_id.get())
 
     # Hide sensitive information
     safe_config = {
@@ -80,7 +91,26 @@ async def generate_database_config():
         "pool_size": db_config.db_pool_size,
         "max_overflow": db_config.db_max_overflow,
         "pool_timeout": db_config.db_pool_timeout,
+        "query_timeout_ms": db_config.db_query_timeout_ms,
     }
     logger.info("Successfully obtained database configuration information")
     logger.info(f"Database configuration: {safe_config}")
-    return safe_config
\ No newline at end of file
+    return safe_config
+
+
+async def generate_pool_stats():
+    """Get connection pool metrics and admission lane state"""
+    pool = await get_db_pool()
+    pool_stats = {
+        "pools": [pool.stats()],
+        "admission": get_admission_controller().snapshot(),
+        "cost_guard": cost_guard.snapshot(),
+        "catalog_cache": catalog_cache.snapshot(),
+    }
+    logger.debug(f"Connection pool statistics: {pool_stats}")
+    return pool_stats
+
+
+def generate_prometheus_metrics() -> str:
+    """Render connection pool and admission metrics in Prometheus text format"""
+    return render_prometheus(collect_pool_stats(), collect_admission_stats())
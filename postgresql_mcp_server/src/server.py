@@ -6,31 +6,147 @@ Main entry point for PostgreSQL DataSource MCP Client server.
 """
 import os
 import sys
-from typing import List
-from fastmcp import FastMCP
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Union
+from fastmcp import Context, FastMCP
+from fastmcp.server.middleware import Middleware, MiddlewareContext
+from starlette.requests import Request
+from starlette.responses import Response
 
 project_path=os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 # Add current directory to Python module search path
 sys.path.insert(0,project_path)
-from src.utils.logger_util import logger, db_config_path
+from src.utils.logger_util import logger, db_config_path, log_logging_config, sample_query_log
 from src.utils.db_operate import execute_sql
-from src.resources.db_resources import generate_database_tables, generate_database_config
+from src.utils.db_admission import QUERY_LANE, AdmissionRejectedError
+from src.utils.cost_guard import QueryCostRejectedError
+from src.resources.db_resources import generate_database_tables, generate_database_config, generate_pool_stats, \
+    generate_prometheus_metrics
+from src.utils.db_metrics import PROMETHEUS_CONTENT_TYPE, start_metrics_server
+from src.utils.sql_fingerprint import statement_registry
+from src.utils.tracing import configure_tracing, start_span, tracer
+from src.utils.runtime_monitor import configure_runtime_monitor, runtime_monitor
+from src.utils.db_config import config_watcher
+from src.utils.db_session import current_instance_id, session_registry
+from src.utils import http_workers
 from src.utils import load_activate_db_config
-from src.tools.db_tool import generate_test_data
+from src.tools.db_tool import describe_tables, explain_query as explain_query_plan, \
+    generate_test_data, list_tables as list_table_page, paginate_query as paginate_query_rows
+from src.utils.catalog_cache import catalog_cache, changes_catalog
+from src.utils.keyset_pagination import DEFAULT_PAGE_SIZE
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    """Start the runtime monitor and the configuration file watcher on the server's event loop"""
+    log_logging_config()
+    runtime_monitor.start()
+    config_watcher.start()
+    yield {}
+
 # Create global MCP server instance
-mcp = FastMCP("DataSource MCP Client Server")
+mcp = FastMCP("DataSource MCP Client Server", lifespan=lifespan)
+
+
+class SessionInstanceMiddleware(Middleware):
+    """Makes the database instance selected by the calling session current while its request is handled"""
+
+    async def on_request(self, context: MiddlewareContext, call_next):
+        fastmcp_context = context.fastmcp_context
+        session_id = fastmcp_context.session_id if fastmcp_context is not None else None
+        token = current_instance_id.set(session_registry.selected(session_id))
+        try:
+            return await call_next(context)
+        finally:
+            current_instance_id.reset(token)
+
+
+mcp.add_middleware(SessionInstanceMiddleware())
+
+async def _run_sql(sql: str, params: Optional[List[Any]] = None, timeout_ms: Optional[int] = None,
+                   lane: str = QUERY_LANE, tool: str = "sql_exec"):
+    """Execute SQL and wrap the outcome in the tool response format, traced as a span named after the calling tool"""
+    with start_span(f"mcp.tool {tool}", {"mcp.tool.name": tool}) as span:
+        response = await _execute_tool_sql(sql, params, timeout_ms, lane)
+        if not response["success"]:
+            span.set_error(response["error"])
+        return response
+
+
+def _busy_response(e: AdmissionRejectedError) -> Dict[str, Any]:
+    """Failed tool response of a call rejected by admission control, the client may retry it"""
+    return {
+        "success": False,
+        "error": str(e),
+        "retryable": True,
+        "message": "SQL execution rejected, server is busy"
+    }
+
+
+async def _execute_tool_sql(sql: str, params: Optional[List[Any]], timeout_ms: Optional[int], lane: str):
+    """Execute SQL and convert errors into a failed tool response"""
+    # Per-query INFO lines are sampled (logSampleRate) and formatted only when a sink accepts them
+    sampled = sample_query_log()
+    if sampled:
+        logger.info("MCP tool executing SQL: {}", sql)
+    if params:
+        logger.debug("MCP tool SQL params: {}", params)
+    try:
+        result = await execute_sql(sql, params, timeout_ms=timeout_ms, lane=lane)
+        if changes_catalog(sql):
+            # The next list_tables, describe_table or database://tables call reads the catalog again
+            catalog_cache.invalidate()
+        
+        # Record execution results
+        if sampled:
+            if isinstance(result, list):
+                logger.info("SQL execution successful, returned {} rows of data", len(result))
+            else:
+                logger.info("SQL execution successful, affected {} rows", result)
+            
+        return {
+            "success": True, 
+            "result": result,
+            "message": "SQL executed successfully"
+        }
+    except AdmissionRejectedError as e:
+        return _busy_response(e)
+    except QueryCostRejectedError as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "message": "SQL execution rejected by the cost guard"
+        }
+    except Exception as e:
+        error_msg = str(e)
+        logger.error(f"MCP tool SQL execution failed: {error_msg}")
+        return {
+            "success": False, 
+            "error": error_msg,
+            "message": "SQL execution failed"
+        }
 
 @mcp.tool()
-async def sql_exec(sql: str):
+async def sql_exec(sql: str, params: Optional[List[Any]] = None, timeout_ms: Optional[int] = None):
     """
     PostgreSQL SQL execution tool
     
     Function description:
     Execute any type of SQL statement, including SELECT, INSERT, UPDATE, DELETE, CREATE, DROP, etc.
     Supports query and modification operations, automatically handles transaction commit and rollback
+    Values passed through params are bound by the driver instead of being inlined into the SQL text,
+    so the prepared statement and its plan are reused from the connection statement cache
     
     Parameter description:
-    - sql (str): SQL statement to execute, supports parameterized queries
+    - sql (str): SQL statement to execute, use $1, $2, ... placeholders for parameterized queries
+    - params (list, optional): Values bound to the placeholders, in placeholder order
+    - timeout_ms (int, optional): Statement timeout in milliseconds, defaults to dbQueryTimeoutMs, 0 disables it.
+      A statement that runs longer is cancelled on the server and the call fails
+    
+    Cost guard (dbCostGuard "reject" or "limit"):
+    SELECT, INSERT, UPDATE, DELETE and MERGE statements are checked with EXPLAIN (FORMAT JSON) first, the estimate is
+    cached per statement shape. A statement estimated to read more than dbCostGuardMaxRows rows or to cost more than
+    dbCostGuardMaxCost is rejected, in "limit" mode a SELECT without LIMIT runs with LIMIT dbCostGuardLimit instead
     
     Return value:
     - dict: Dictionary containing execution results
@@ -38,152 +154,438 @@ async def sql_exec(sql: str):
         - result: Execution result (query returns data list, modification returns affected rows)
         - message (str): Execution status description
         - error (str): Error message on failure (only exists when success=False)
+        - retryable (bool): True when the call was rejected because the server is busy and can be retried
     
     Usage examples:
     - Query: SELECT * FROM users WHERE age > 18
-    - Insert: INSERT INTO users (name, age) VALUES ('John', 25)
+    - Parameterized query: sql="SELECT * FROM users WHERE age > $1", params=[18]
+    - Insert: sql="INSERT INTO users (name, age) VALUES ($1, $2)", params=["John", 25]
     - Update: UPDATE users SET age = 26 WHERE name = 'John'
     - Delete: DELETE FROM users WHERE age < 18
     """
-    logger.info(f"MCP tool executing SQL: {sql}")
-    try:
-        result = await execute_sql(sql)
-        
-        # Record execution results
-        if isinstance(result, list):
-            logger.info(f"SQL execution successful, returned {len(result)} rows of data")
-        else:
-            logger.info(f"SQL execution successful, affected {result} rows")
-            
-        return {
-            "success": True, 
-            "result": result,
-            "message": "SQL executed successfully"
-        }
-    except Exception as e:
-        error_msg = str(e)
-        logger.error(f"MCP tool SQL execution failed: {error_msg}")
-        return {
-            "success": False, 
-            "error": error_msg,
-            "message": "SQL execution failed"
-        }
+    return await _run_sql(sql, params, timeout_ms)
+
+@mcp.tool()
+async def paginate_query(sql: str, params: Optional[List[Any]] = None,
+                         page_size: int = DEFAULT_PAGE_SIZE, key: Optional[List[str]] = None,
+                         cursor: Optional[str] = None, timeout_ms: Optional[int] = None):
+    """
+    PostgreSQL Paginated query tool
+    
+    Function description:
+    Return one page of a SELECT, ordered by a unique key, and a cursor for the next page
+    The query is rewritten into keyset (seek) pagination: each page continues after the key of the last row
+    of the previous page, so with an index on the key every page costs the same, however deep it is,
+    instead of an OFFSET scan that reads every earlier row
+    
+    Parameter description:
+    - sql (str): A single SELECT without LIMIT, OFFSET or FETCH, with $1, $2, ... placeholders like sql_exec. Its own ORDER BY is
+      replaced by the key order. Result columns need distinct names, alias the duplicates of a join. DISTINCT, GROUP BY,
+      aggregate and UNION queries are evaluated in full for every page, so only a plain SELECT pages at constant cost
+    - params (list, optional): Values bound to the placeholders, pass the same values with every page
+    - page_size (int): Rows per page, 1 to 10000, default 100
+    - key (List[str], optional): Unique, non-null columns of the result to page by. Defaults to the primary key
+      (or a unique NOT NULL index) of the table when the query reads a single table. The columns must be in the select list
+    - cursor (str, optional): next_cursor of the previous page, omit for the first page
+    - timeout_ms (int, optional): Statement timeout of each page in milliseconds, defaults to dbQueryTimeoutMs
+    
+    Return value:
+    - dict: Same return format as sql_exec tool, plus
+        - next_cursor (str | None): Cursor of the next page, None on the last page
+    
+    Usage examples:
+    - First page: paginate_query(sql="SELECT * FROM orders WHERE status = $1", params=["paid"], page_size=500)
+    - Next page: paginate_query(sql="SELECT * FROM orders WHERE status = $1", params=["paid"], page_size=500, cursor="eyJ2Ijox...")
+    - Explicit key: paginate_query(sql="SELECT o.id, o.total, c.name FROM orders o JOIN customers c ON c.id = o.customer_id", key=["id"])
+    """
+    with start_span("mcp.tool paginate_query", {"mcp.tool.name": "paginate_query"}) as span:
+        try:
+            rows, next_cursor = await paginate_query_rows(sql, params, page_size, key, cursor, timeout_ms)
+            response = {
+                "success": True,
+                "result": rows,
+                "next_cursor": next_cursor,
+                "message": f"Returned {len(rows)} rows" + (", more rows available" if next_cursor else ", last page")
+            }
+        except AdmissionRejectedError as e:
+            response = _busy_response(e)
+        except Exception as e:
+            logger.error(f"MCP tool paginated query failed: {e}")
+            response = {"success": False, "error": str(e), "message": "Paginated query failed"}
+        if not response["success"]:
+            span.set_error(response["error"])
+        return response
+
+@mcp.tool()
+async def explain_query(sql: str, params: Optional[List[Any]] = None, analyze: bool = False,
+                        timeout_ms: Optional[int] = None):
+    """
+    PostgreSQL Query plan tool
+    
+    Function description:
+    Explain a statement with EXPLAIN (FORMAT JSON) and point out what makes it slow
+    Sequential scans, sorts and nodes writing temporary files are flagged, with analyze also row estimates that are
+    more than 10 times off, and for every sequentially scanned table with a filter a candidate index is suggested:
+    equality columns first, then the ORDER BY columns of a single-table query, then one range column
+    
+    Parameter description:
+    - sql (str): A single SELECT, INSERT, UPDATE, DELETE or MERGE, with $1, $2, ... placeholders like sql_exec
+    - params (list, optional): Values bound to the placeholders, in placeholder order
+    - analyze (bool): Execute the query with EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) for actual row counts, timings
+      and buffer usage, default False. Only read-only queries can be analyzed
+    - timeout_ms (int, optional): Timeout of the EXPLAIN in milliseconds, defaults to dbQueryTimeoutMs
+    
+    Return value:
+    - dict: Same return format as sql_exec tool, result contains
+        - format (str): "json"
+        - analyzed (bool): Whether the plan carries actual row counts
+        - plan: The EXPLAIN (FORMAT JSON) document
+        - issues (list): type (full_scan, sort, temporary_files, row_misestimate), table, estimated_rows, detail
+        - index_suggestions (list): table, columns, reason and ddl (CREATE INDEX statement) of each candidate index
+    
+    Usage examples:
+    - explain_query(sql="SELECT * FROM orders WHERE status = $1 ORDER BY created_at DESC LIMIT 20", params=["paid"])
+    - explain_query(sql="SELECT count(*) FROM events WHERE created_at > now() - interval '1 day'", analyze=True)
+    
+    Suggestions are candidates derived from the filters, check them against the existing indexes of the table
+    """
+    with start_span("mcp.tool explain_query", {"mcp.tool.name": "explain_query"}) as span:
+        try:
+            result = await explain_query_plan(sql, params, analyze, timeout_ms)
+            response = {
+                "success": True,
+                "result": result,
+                "message": f"{len(result['issues'])} plan issues, {len(result['index_suggestions'])} index suggestions"
+            }
+        except AdmissionRejectedError as e:
+            response = _busy_response(e)
+        except Exception as e:
+            logger.error(f"MCP tool explain query failed: {e}")
+            response = {"success": False, "error": str(e), "message": "Explain query failed"}
+        if not response["success"]:
+            span.set_error(response["error"])
+        return response
+
+@mcp.tool()
+async def list_tables(schema: Optional[str] = None, table: Optional[str] = None, page_size: int = DEFAULT_PAGE_SIZE,
+                      cursor: Optional[str] = None, include_columns: bool = False):
+    """
+    PostgreSQL Table listing tool
+    
+    Function description:
+    List the tables of all user schemas, or of the schemas and tables matching glob patterns, one page at a time
+    Served from the catalog cache (dbCatalogCacheTtl), so paging through thousands of tables costs no catalog query per page
+    
+    Parameter description:
+    - schema (str, optional): Glob pattern of the schema names, e.g. "public" or "sales_*", omit for all user schemas
+    - table (str, optional): Glob pattern of the table names, e.g. "order*", omit for all tables
+    - page_size (int): Tables per page, 1 to 10000, default 100
+    - cursor (str, optional): next_cursor of the previous page, pass the same patterns with every page
+    - include_columns (bool): Include the columns (Field, Type, Null, Default, Key) of each table, default False
+    
+    Return value:
+    - dict: Same return format as sql_exec tool, plus
+        - result (list): schema, name, estimated_rows and column_count of each table, ordered by schema and name
+        - next_cursor (str | None): Cursor of the next page, None on the last page
+    
+    Usage examples:
+    - list_tables()
+    - list_tables(schema="sales_*", table="order*", page_size=500)
+    - list_tables(schema="sales_*", table="order*", page_size=500, cursor="eyJ2Ijox...")
+    """
+    with start_span("mcp.tool list_tables", {"mcp.tool.name": "list_tables"}) as span:
+        try:
+            tables, next_cursor = await list_table_page(schema, table, page_size, cursor, include_columns)
+            response = {
+                "success": True,
+                "result": tables,
+                "next_cursor": next_cursor,
+                "message": f"Returned {len(tables)} tables" + (", more tables available" if next_cursor else ", last page")
+            }
+        except AdmissionRejectedError as e:
+            response = _busy_response(e)
+        except Exception as e:
+            logger.error(f"MCP tool list tables failed: {e}")
+            response = {"success": False, "error": str(e), "message": "List tables failed"}
+        if not response["success"]:
+            span.set_error(response["error"])
+        return response
 
 @mcp.tool()
-async def describe_table(table_name: str):
+async def describe_table(table_name: Union[str, List[str]]):
     """
     PostgreSQL Table structure description tool
     
     Function description:
-    Get detailed structure information of the specified table, including column names, data types, NULL allowance, default values, key types, etc.
-    Uses PostgreSQL information_schema for compatibility
+    Get the columns, indexes, foreign keys and column statistics (pg_stats) of one or more tables in one call
+    Columns come from the catalog cache (dbCatalogCacheTtl), the indexes, foreign keys and statistics of all requested
+    tables are read with one pg_catalog query and cached the same way. A table missing from the cache is looked up in
+    pg_catalog again before it is reported missing
     
     Parameter description:
-    - table_name (str): Table name to describe, supports schema.table format
+    - table_name (str | List[str]): Table name or list of up to 100 table names, supports schema.table format and
+      double-quoted names. A name without schema is resolved through the search_path, like an unqualified table name in a query
     
     Return value:
-    - dict: Same return format as sql_exec tool, result contains table structure information list
+    - dict: Same return format as sql_exec tool, plus
+        - result (list): One compact description per table found, in the order requested
+        - missing (list): Names of the requested tables that do not exist or are not visible
+    
+    Each description contains:
+    - table: schema.table
+    - rows: Planner estimate of the number of rows (pg_class.reltuples), None for a table never analyzed
+    - columns: name, type, nullable, and default, key (PRI, UNI, MUL), extra (identity), null_frac and distinct (pg_stats) when set
+    - indexes: name, columns (expressions for expression indexes), unique and type (btree, hash, gin, ...)
+    - foreign_keys: name, columns, references (schema.table) and referenced_columns
     
     Usage examples:
     - describe_table("users")
-    - describe_table("public.users")
+    - describe_table(["sales.orders", "sales.order_items", '"Sales"."Returns"'])
     
     Return data example:
     [
-        {"Field": "id", "Type": "integer", "Null": "NO", "Key": "PRI", "Default": "nextval('users_id_seq'::regclass)", "Extra": ""},
-        {"Field": "name", "Type": "character varying", "Null": "NO", "Key": "", "Default": null, "Extra": ""}
+        {"table": "public.users", "rows": 1200,
+         "columns": [{"name": "id", "type": "integer", "nullable": false, "default": "nextval('users_id_seq'::regclass)",
+                      "key": "PRI", "null_frac": 0.0, "distinct": 1200},
+                     {"name": "name", "type": "character varying(100)", "nullable": false, "null_frac": 0.0, "distinct": 950}],
+         "indexes": [{"name": "users_pkey", "columns": ["id"], "unique": true, "type": "btree"}],
+         "foreign_keys": []}
     ]
     """
     logger.info(f"MCP tool: Describe table structure - {table_name}")
-    
-    # Handle schema.table format or default to public schema
-    if '.' in table_name:
-        schema_name, table_name = table_name.split('.', 1)
-    else:
-        schema_name = 'public'
-    
-    sql = f"""
-        SELECT 
-            column_name as "Field",
-            data_type as "Type",
-            is_nullable as "Null",
-            column_default as "Default",
-            CASE 
-                WHEN column_name IN (
-                    SELECT column_name 
-                    FROM information_schema.key_column_usage 
-                    WHERE table_name = '{table_name}' 
-                    AND table_schema = '{schema_name}'
-                ) THEN 'PRI'
-                ELSE ''
-            END as "Key",
-            '' as "Extra"
-        FROM information_schema.columns 
-        WHERE table_name = '{table_name}' 
-        AND table_schema = '{schema_name}'
-        ORDER BY ordinal_position
-    """
-    
-    return await sql_exec(sql)
+    with start_span("mcp.tool describe_table", {"mcp.tool.name": "describe_table"}) as span:
+        try:
+            tables, missing = await describe_tables(table_name)
+            if tables:
+                response = {
+                    "success": True,
+                    "result": tables,
+                    "missing": missing,
+                    "message": f"Described {len(tables)} tables" + (f", {len(missing)} not found" if missing else "")
+                }
+            else:
+                response = {
+                    "success": False,
+                    "error": f"Table(s) {', '.join(missing)} do not exist or are not visible on the search_path",
+                    "message": "Describe table failed"
+                }
+        except AdmissionRejectedError as e:
+            response = _busy_response(e)
+        except Exception as e:
+            logger.error(f"MCP tool describe table failed: {e}")
+            response = {"success": False, "error": str(e), "message": "Describe table failed"}
+        if not response["success"]:
+            span.set_error(response["error"])
+        return response
 
 @mcp.tool()
-async def generate_demo_data(table_name: str, columns_name: List[str], num: int):
+async def generate_demo_data(table_name: str, columns_name: Optional[List[str]], num: int,
+                             column_options: Optional[Dict[str, Dict[str, Any]]] = None, seed: Optional[int] = None,
+                             connections: Optional[int] = None, ctx: Context = None):
     """
     PostgreSQL Test data generation tool
     
     Function description:
     Generate specified amount of test data for specified tables and columns
-    Automatically generates random strings as test data for development and testing environments
+    Values follow the column types read from the catalog, so integer, numeric, date, timestamp, uuid and json columns get valid values
     
     Parameter description:
-    - table_name (str): Table name to generate test data for
-    - columns_name (List[str]): List of column names to fill with data
+    - table_name (str): Table name to generate test data for, optionally qualified with the schema
+    - columns_name (List[str], optional): Columns to fill, null fills every column except identity and serial columns
     - num (int): Number of test records to generate
+    - column_options (Dict[str, dict], optional): Options per column name
+        - min, max: Range of numeric, date and time values
+        - distribution (str): uniform (default), normal, zipf or sequence
+        - skew (float): Exponent of the zipf distribution, default 1.5
+        - null_fraction (float): Share of NULL values of a nullable column, 0 to 1
+        - unique (bool): Distinct values, set for columns with a single-column unique index
+        - values (list): Values to pick from, e.g. the labels of an enum type
+        - length (int): Longest string, up to the column length
+        - cardinality (int): Distinct values of a string column, default 4096
+    - seed (int, optional): Seed of the run, the same seed generates the same rows; a random seed is used and returned when omitted
+    - connections (int, optional): Batches written at once on separate pooled connections, default all query slots of the pool but one
     
     Return value:
-    - dict: Same return format as generate_test_data function
+    - dict: Dictionary containing generation results
         - success (bool): Whether data generation was successful
-        - result: Generation result information
+        - result (dict): rows, seconds, rows_per_second, connections and seed of the run
         - error (str): Error message on failure (only exists when success=False)
     
     Data generation rules:
-    - Each record generates 8-character random letter strings for each column
-    - Uses INSERT statements for batch data insertion
-    - Supports any number of columns and data types (string type)
+    - Integer columns stay in the range of their type, numerics keep their precision and scale, strings fit the column length
+    - Columns with a single-column unique index get distinct values, numeric ones continue after the largest existing value
+    - Columns of a single-column foreign key take values that exist in the referenced table
+    - Rows are generated with NumPy and written in batches of 5000, one binary COPY per batch
+    - Several batches are written at once, each on its own pooled connection; progress is reported to the client
     
     Usage examples:
+    - generate_demo_data("users", None, 10000)
     - generate_demo_data("users", ["name", "email", "phone"], 100)
-    - generate_demo_data("products", ["product_name", "category"], 50)
+    - generate_demo_data("sales.orders", None, 50000, {"amount": {"min": 1, "max": 500, "distribution": "normal"},
+                                                       "note": {"null_fraction": 0.3}})
+    - generate_demo_data("events", None, 50000000, seed=42, connections=8)
     
     Notes:
     - Only suitable for development and testing environments
-    - Generated data consists of random strings, no business logic included
-    - Large data generation may take considerable time
+    - Generated data is random, no business logic included
+    - Array, interval, geometric and user-defined type columns need values (JSON lists for arrays), nullable or defaulted ones are left out by default
+    - Rows of batches written before a failure stay in the table
     """
     logger.info(f"MCP tool: Generate test data - {table_name}")
-    return await generate_test_data(table_name, columns_name, num)
+    with start_span("mcp.tool generate_demo_data", {"mcp.tool.name": "generate_demo_data"}) as span:
+        try:
+            # Progress notifications reach clients that sent a progress token with the call
+            progress = None if ctx is None else lambda written, total: ctx.report_progress(progress=written, total=total)
+            result = await generate_test_data(table_name, columns_name, num, column_options, seed, connections,
+                                              progress)
+            response = {
+                "success": True,
+                "result": result,
+                "message": f"Generated {result['rows']} rows in table {table_name}, {result['rows_per_second']} rows/s"
+            }
+        except AdmissionRejectedError as e:
+            response = _busy_response(e)
+        except Exception as e:
+            logger.error(f"MCP tool generate test data failed: {e}")
+            response = {"success": False, "error": str(e), "message": "Generate test data failed"}
+        if not response["success"]:
+            span.set_error(response["error"])
+        return response
+
+@mcp.tool()
+async def query_stats(limit: int = 10):
+    """
+    PostgreSQL Query statistics tool
+    
+    Function description:
+    Returns the statement fingerprints that consumed the most database time since the server started.
+    Statements are grouped by their normalized shape, so the same query with different values counts as one fingerprint
+    
+    Parameter description:
+    - limit (int): Number of fingerprints to return, at least 1, default 10
+    
+    Return value:
+    - dict: Dictionary containing statistics
+        - success (bool): Whether the statistics were collected
+        - result (list): Fingerprints ordered by total time, each with
+            - fingerprint, normalized_sql: Statement shape without literal values
+            - executions, errors, slow_executions: Execution counters
+            - total_ms, avg_ms, p50_ms, p95_ms, p99_ms, max_ms: Latency of the statement
+            - phase_ms: Total time spent in acquire, execute, fetch and size_estimate (the result size estimate)
+            - rows, bytes: Rows returned or affected and estimated serialised result size
+    
+    Usage examples:
+    - query_stats()
+    - query_stats(limit=20)
+    """
+    logger.info(f"MCP tool: Query statistics - top {limit}")
+    if limit < 1:
+        return {"success": False, "error": "limit must be at least 1", "message": "Query statistics not collected"}
+    return {
+        "success": True,
+        "result": statement_registry.top_by_total_time(limit),
+        "message": "Query statistics collected successfully"
+    }
+
+@mcp.tool()
+async def runtime_stats():
+    """
+    PostgreSQL Runtime statistics tool
+    
+    Function description:
+    Shows what blocks the server's event loop and stalls concurrent tool calls
+    
+    Return value:
+    - dict: Dictionary containing statistics
+        - success (bool): Whether the statistics were collected
+        - result (dict): Runtime statistics
+            - loop_lag: Event loop lag percentiles of the recent probes (last_ms, p50_ms, p99_ms, max_ms)
+            - stalls: Times the loop was blocked longer than loopStallThresholdMs, with the stack of the blocking code
+            - slow_callbacks: Callbacks slower than slowCallbackMs (asyncio debug mode, off by default)
+            - tasks, threads: Running asyncio tasks and threads
+    
+    Usage examples:
+    - runtime_stats()
+    """
+    logger.info("MCP tool: Runtime statistics")
+    return {
+        "success": True,
+        "result": runtime_monitor.stats(),
+        "message": "Runtime statistics collected successfully"
+    }
+
+@mcp.tool()
+async def use_instance(ctx: Context, db_instance_id: Optional[str] = None):
+    """
+    PostgreSQL Instance selection tool
+    
+    Function description:
+    Selects the database instance used by the calling MCP session. Over HTTP many clients share one server,
+    each session keeps its own selection and the other sessions are not affected
+    
+    Parameter description:
+    - db_instance_id (str, optional): dbInstanceId of an instance with dbActive true in dbList,
+      omit to return to the first active instance
+    
+    Return value:
+    - dict: Dictionary containing the selected instance
+        - success (bool): Whether the instance was selected
+        - result (dict): db_instance_id, db_host, db_port, db_database and db_type of the selected instance
+        - message (str): Selection status description
+        - error (str): Error message on failure (only exists when success=False)
+    
+    Usage examples:
+    - use_instance(db_instance_id="reporting_replica")
+    - use_instance()
+    """
+    logger.info(f"MCP tool: Use instance - {db_instance_id or 'default'}")
+    if http_workers.worker_index is not None:
+        return {"success": False, "error": "Instance selection is not available with httpWorkers > 1, "
+                "the requests of a session can reach any worker", "message": "Failed to select database instance"}
+    try:
+        db_instance = session_registry.select(ctx.session_id, db_instance_id)
+    except ValueError as e:
+        return {"success": False, "error": str(e), "message": "Failed to select database instance"}
+    return {
+        "success": True,
+        "result": {
+            "db_instance_id": db_instance.db_instance_id,
+            "db_host": db_instance.db_host,
+            "db_port": db_instance.db_port,
+            "db_database": db_instance.db_database,
+            "db_type": db_instance.db_type,
+        },
+        "message": f"Session now uses database instance {db_instance.db_instance_id}"
+    }
+
 @mcp.resource("database://tables")
 async def get_database_tables():
     """
     PostgreSQL Database table information resource
     
     Function description:
-    Provides metadata information for all tables in the database, including table names, table structures, record counts, etc.
+    Provides metadata information for the tables of all user schemas, including table names, table structures, record counts, etc.
     This is a read-only resource for obtaining database schema information, not involving data modification operations
+    All tables, columns, keys and row estimates are read with one pg_catalog query and kept in the catalog cache
+    for dbCatalogCacheTtl seconds, schema changes made through sql_exec refresh it
     
     Resource URI:
     - database://tables - Represents database table collection resource
+    - database://tables/{schema} - Tables of the schemas matching a glob pattern, e.g. database://tables/sales_*
+    - database://tables/{schema}/{table} - Tables matching schema and table glob patterns, e.g. database://tables/public/order*
     
     Return value format:
-    - uri (str): Resource identifier "database://tables"
+    - uri (str): Resource identifier "database://tables", with the patterns for the filtered resources
     - mimeType (str): Content type "application/json"
     - text (str): JSON-formatted table information string
     
     Return data content:
     Contains detailed information list for all tables, each table includes:
+    - schema: Schema name
     - name: Table name
     - columns: Table structure information (column names, data types, constraints, etc.)
-    - record_count: Number of records in the table
+    - record_count: Planner estimate of the number of records, COUNT(*) with dbTablesExactCount
+    - record_count_exact: Whether record_count was counted
     
     Usage scenarios:
     - Database schema analysis
@@ -194,11 +596,12 @@ async def get_database_tables():
     Notes:
     - This is a read-only resource that will not modify database content
     - Returned information is based on current active database connection
-    - Databases with many tables may require longer response time
+    - Exact counts (dbTablesExactCount) scan every table, at most dbTablesCountConcurrency at a time
     """
     logger.info("Getting database table information")
     # Get all table names
-    tables_info = await generate_database_tables()
+    with start_span("mcp.resource database://tables"):
+        tables_info = await generate_database_tables()
 
     return {
         "uri": "database://tables",
@@ -207,6 +610,43 @@ async def get_database_tables():
     }
 
 
+@mcp.resource("database://tables/{schema}")
+async def get_schema_tables(schema: str):
+    """
+    PostgreSQL Table information resource of the schemas matching a glob pattern
+    
+    Same content as database://tables, limited to the schemas whose name matches schema (*, ?, [seq])
+    """
+    logger.info(f"Getting database table information of schema {schema}")
+    with start_span("mcp.resource database://tables"):
+        tables_info = await generate_database_tables(schema)
+
+    return {
+        "uri": f"database://tables/{schema}",
+        "mimeType": "application/json",
+        "text": str(tables_info)
+    }
+
+
+@mcp.resource("database://tables/{schema}/{table}")
+async def get_filtered_tables(schema: str, table: str):
+    """
+    PostgreSQL Table information resource of the tables matching schema and table glob patterns
+    
+    Same content as database://tables, limited to the tables whose schema matches schema and whose name matches
+    table (*, ?, [seq]), e.g. database://tables/*/order* for the order tables of every schema
+    """
+    logger.info(f"Getting database table information of {schema}.{table}")
+    with start_span("mcp.resource database://tables"):
+        tables_info = await generate_database_tables(schema, table)
+
+    return {
+        "uri": f"database://tables/{schema}/{table}",
+        "mimeType": "application/json",
+        "text": str(tables_info)
+    }
+
+
 @mcp.resource("database://config")
 async def get_database_config():
     """
@@ -264,6 +704,80 @@ async def get_database_config():
         "text": str(safe_config)
     }
 
+
+@mcp.resource("database://pool_stats")
+async def get_pool_stats():
+    """
+    PostgreSQL Connection pool statistics resource
+    
+    Function description:
+    Provides live saturation and latency metrics of the connection pool and the admission lanes in front of it,
+    used to size dbPoolSize, dbMaxOverflow and dbMetadataSlots for real traffic
+    
+    Resource URI:
+    - database://pool_stats - Represents connection pool statistics resource
+    
+    Return data content:
+    - pools: One entry per connection pool
+        - pool: Database instance id
+        - size / in_use / idle / min_size / max_size: Current pool state
+        - waiters: Callers waiting for a connection
+        - acquired: Successful connection acquires
+        - acquire_latency_ms: Acquire latency histogram (count, sum, avg, p50, p95, p99, max, cumulative buckets)
+        - connection_age_seconds: Age of the physical connections (min, avg, max)
+        - connections_opened / connections_recycled: Physical connections opened and retired by the pool
+        - errors: Acquire and statement errors by exception type
+    - admission: In-flight, waiting and rejected calls per admission lane
+    
+    Notes:
+    - The same metrics are served in Prometheus text format on http://dbMetricsHost:dbMetricsPort/metrics when dbMetricsPort is set
+    """
+    logger.info("Getting connection pool statistics")
+
+    pool_stats = await generate_pool_stats()
+
+    return {
+        "uri": "database://pool_stats",
+        "mimeType": "application/json",
+        "text": str(pool_stats)
+    }
+
+
+@mcp.resource("database://traces")
+async def get_traces():
+    """
+    PostgreSQL Request traces resource
+    
+    Function description:
+    Provides the most recent request traces, each split into spans for the MCP tool handler, admission,
+    pool acquire, driver execute, fetch and result size estimate, to attribute tail latency to queueing or database time
+    
+    Resource URI:
+    - database://traces - Represents recent request traces resource
+    
+    Return data content:
+    List of the 20 most recent traces, newest first:
+    - traceId: W3C trace id
+    - root: Name of the first span, usually "mcp.tool <tool name>"
+    - durationMs: Duration of the whole trace
+    - spans: Spans in start order, in the OpenTelemetry (OTLP JSON) span shape
+    
+    Notes:
+    - Tracing is enabled with "traceExporter": "memory" or "stderr" in dbconfig.json, stderr also writes every span as a JSON line
+    """
+    logger.info("Getting recent request traces")
+
+    return {
+        "uri": "database://traces",
+        "mimeType": "application/json",
+        "text": str(tracer.recent_traces())
+    }
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_endpoint(request: Request) -> Response:
+    """Prometheus metrics on the MCP HTTP port when transport is http or sse"""
+    return Response(generate_prometheus_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 # ==================== Server Startup Related ====================
 
 # When using fastmcp run, FastMCP CLI automatically handles server startup
@@ -276,9 +790,32 @@ def main():
     logger.info("PostgreSQL DataSource MCP Client server is ready to accept connections")
 
     active_db, db_config = load_activate_db_config()
+    configure_tracing(db_config.trace_exporter)
+    configure_runtime_monitor(db_config.loop_monitor_interval_ms, db_config.loop_stall_threshold_ms,
+                              db_config.slow_callback_ms)
+    multi_worker = db_config.transport != "stdio" and int(db_config.http_workers) > 1
+    if multi_worker and db_config.db_metrics_port:
+        logger.warning("dbMetricsPort is ignored with httpWorkers > 1, every worker serves its own /metrics on the HTTP port")
+    elif db_config.db_metrics_port:
+        start_metrics_server(db_config.db_metrics_host, int(db_config.db_metrics_port), generate_prometheus_metrics)
     logger.info(f"Current database instance configuration: {active_db}")
-    # When using fastmcp run, just call mcp.run() directly
-    mcp.run(transport='stdio')
+    if db_config.transport == "stdio":
+        # When using fastmcp run, just call mcp.run() directly
+        mcp.run(transport='stdio')
+        return
+
+    if multi_worker:
+        sys.exit(http_workers.serve_http_workers(mcp, db_config))
+
+    # One long-lived server for many MCP clients, all sessions share the connection pools
+    uvicorn_config = {"timeout_keep_alive": int(db_config.http_keep_alive_timeout)}
+    if db_config.http_limit_concurrency:
+        uvicorn_config["limit_concurrency"] = int(db_config.http_limit_concurrency)
+    transport_kwargs = {"host": db_config.http_host, "port": int(db_config.http_port), "uvicorn_config": uvicorn_config}
+    if db_config.http_path:
+        transport_kwargs["path"] = db_config.http_path
+    logger.info(f"Serving MCP over {db_config.transport} on {db_config.http_host}:{db_config.http_port}")
+    mcp.run(transport=db_config.transport, **transport_kwargs)
 
 if __name__ == "__main__":
     main()
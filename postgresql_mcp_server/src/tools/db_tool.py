@@ -3,55 +3,255 @@ Database Utility Functions
 
 Provides database utility functions related to SQL execution.
 """
-from src.utils.db_operate import execute_sql
-from src.utils.logger_util import logger
-import random, string
+from src.utils.catalog_cache import MAX_DESCRIBE_TABLES, catalog_cache, filter_tables, find_table
+from src.utils.db_admission import METADATA_LANE, QUERY_LANE, get_admission_controller
+from src.utils.db_operate import execute_copy, execute_sql
+from src.utils.keyset_pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, build_page_query, check_page_query, \
+    decode_cursor, encode_cursor, single_table
+from src.utils.logger_util import logger, sample_query_log
+from src.utils.query_plan import analyze_plan, check_explain_query, json_plan
+from src.utils.sql_classifier import quote_identifier
 
 
-async def sql_exec(sql: str):
+async def sql_exec(sql: str, params=None):
     """
     Execute any SQL statement (SELECT/INSERT/UPDATE/DELETE)
     """
-    logger.info(f"Executing SQL: {sql}")
+    sampled = sample_query_log()
+    if sampled:
+        logger.info("Executing SQL: {}", sql)
     try:
-        result = await execute_sql(sql)
-        logger.info(f"SQL executed successfully, returned {len(result) if isinstance(result, list) else result} rows/affected rows")
+        result = await execute_sql(sql, params)
+        if sampled:
+            logger.info("SQL executed successfully, returned {} rows/affected rows",
+                        len(result) if isinstance(result, list) else result)
         return {"success": True, "result": result}
     except Exception as e:
         logger.error(f"SQL execution failed: {e}")
         return {"success": False, "error": str(e)}
 
 
-async def generate_test_data(table, columns, num):
+async def infer_page_key(sql):
+    """
+    Unique key to page a single-table SELECT by: the primary key, otherwise the first unique index
+    on plain NOT NULL columns without a predicate
+
+    Raises:
+        ValueError: The query reads more than one table or the table has no such key
+    """
+    table = single_table(sql)
+    if table is None:
+        raise ValueError("Cannot infer a key for a query that does not read exactly one table, pass key")
+    schema, name = table
+    relation = f"{quote_identifier(schema)}.{quote_identifier(name)}" if schema else quote_identifier(name)
+    rows = await execute_sql(
+        "SELECT i.indexrelid AS index_id, a.attname AS column_name, a.attnotnull AS not_null "
+        "FROM pg_catalog.pg_index i "
+        "JOIN pg_catalog.pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey) "
+        "WHERE i.indrelid = to_regclass($1) AND i.indisunique AND i.indpred IS NULL AND i.indexprs IS NULL "
+        "ORDER BY NOT i.indisprimary, i.indexrelid, array_position(i.indkey::int2[], a.attnum)",
+        [relation], lane=METADATA_LANE)
+    indexes = {}
+    for row in rows:
+        indexes.setdefault(row["index_id"], []).append(row)
+    for columns in indexes.values():
+        if all(column["not_null"] for column in columns):
+            return [column["column_name"] for column in columns]
+    raise ValueError(f"Table '{name}' has no primary key or unique NOT NULL index to page by, pass key")
+
+
+async def paginate_query(sql, params=None, page_size=DEFAULT_PAGE_SIZE, key=None, cursor=None, timeout_ms=None):
+    """
+    One page of a SELECT in keyset order
+
+    Returns:
+        tuple: (rows of the page, cursor of the next page or None on the last page)
+    """
+    page_size = int(page_size)
+    if not 0 < page_size <= MAX_PAGE_SIZE:
+        raise ValueError(f"page_size must be between 1 and {MAX_PAGE_SIZE}")
+    sql = check_page_query(sql)
+    after = None
+    if cursor:
+        key, after = decode_cursor(cursor, sql, params)
+    elif key:
+        key = [key] if isinstance(key, str) else list(key)
+    else:
+        key = await infer_page_key(sql)
+        logger.debug("Paging by inferred key {}", key)
+
+    page_sql, page_params = build_page_query(sql, params, key, after, page_size)
+    rows = await execute_sql(page_sql, page_params, timeout_ms=timeout_ms)
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(sql, params, key, rows[-1])
+
+
+async def list_tables(schema=None, table=None, page_size=DEFAULT_PAGE_SIZE, cursor=None, include_columns=False):
+    """
+    One page of the tables whose schema and name match the glob patterns, ordered by schema and name
+
+    Served from the catalog cache, the cursor carries the schema and name of the last table of the page.
+
+    Returns:
+        tuple: (tables of the page, cursor of the next page or None on the last page)
+    """
+    page_size = int(page_size)
+    if not 0 < page_size <= MAX_PAGE_SIZE:
+        raise ValueError(f"page_size must be between 1 and {MAX_PAGE_SIZE}")
+    patterns = [schema, table]
+    tables = filter_tables(await catalog_cache.tables(), schema, table)
+    if cursor:
+        _, after = decode_cursor(cursor, "list_tables", patterns)
+        tables = [entry for entry in tables if (entry["schema"], entry["name"]) > tuple(after)]
+
+    page = []
+    for entry in tables[:page_size]:
+        item = {"schema": entry["schema"], "name": entry["name"], "estimated_rows": entry["estimated_rows"],
+                "column_count": len(entry["columns"])}
+        if include_columns:
+            item["columns"] = entry["columns"]
+        page.append(item)
+    if len(tables) <= page_size:
+        return page, None
+    return page, encode_cursor("list_tables", patterns, ["schema", "name"], page[-1])
+
+
+async def describe_tables(table_names):
+    """
+    Columns, indexes, foreign keys and column statistics of one or more tables, from the catalog cache
+
+    Names missing from the cached catalog are looked up in the catalog again before they are reported missing,
+    so a table created since the catalog was read is found.
+
+    Returns:
+        tuple: (descriptions of the tables found, names of the tables that do not exist or are not visible)
+
+    Raises:
+        ValueError: No table name or more than MAX_DESCRIBE_TABLES names were given
+    """
+    names = [table_names] if isinstance(table_names, str) else list(table_names or [])
+    if not names or len(names) > MAX_DESCRIBE_TABLES:
+        raise ValueError(f"Pass 1 to {MAX_DESCRIBE_TABLES} table names")
+    tables = await catalog_cache.tables()
+    entries = [find_table(tables, name) for name in names]
+    if None in entries:
+        tables = await catalog_cache.tables(refresh=True)
+        entries = [find_table(tables, name) for name in names]
+    found = [entry for entry in entries if entry is not None]
+    missing = [name for name, entry in zip(names, entries) if entry is None]
+    return (await catalog_cache.describe(found) if found else []), missing
+
+
+async def explain_query(sql, params=None, analyze=False, timeout_ms=None):
+    """
+    Plan of a statement with its sequential scans, sorts and temporary files flagged and candidate indexes
+
+    With analyze the query is executed, EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) adds actual row counts,
+    timings and buffer usage, so it is only accepted for read-only queries.
+
+    Returns:
+        dict: format, analyzed, plan, issues and index_suggestions
+    """
+    sql = check_explain_query(sql, analyze)
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+    plan = json_plan(await execute_sql(f"EXPLAIN ({options}) {sql}", params, timeout_ms=timeout_ms))
+    return analyze_plan(sql, plan, analyze)
+
+
+async def _prepare_columns(table, specs):
+    """Values of foreign key columns from the referenced tables, sequences of unique columns after their largest value"""
+    from src.utils.data_generator import MAX_REFERENCED_VALUES
+
+    for spec in specs:
+        if spec.reference is None or spec.values is not None:
+            continue
+        referenced_table, referenced_column = spec.reference
+        column = quote_identifier(referenced_column)
+        # Ordered, so the same seed picks the same referenced values on every run
+        rows = await execute_sql(f"SELECT DISTINCT {column} AS value FROM "
+                                 f"{'.'.join(map(quote_identifier, referenced_table.split('.', 1)))} "
+                                 f"WHERE {column} IS NOT NULL ORDER BY {column} LIMIT {MAX_REFERENCED_VALUES}")
+        if rows:
+            spec.values = [row["value"] for row in rows]
+        elif spec.nullable:
+            spec.values, spec.null_fraction = [None], 0.0
+        else:
+            raise ValueError(f"Column '{spec.name}' references {referenced_table}, which has no rows")
+
+    sequences = [spec for spec in specs if spec.sequential]
+    if sequences:
+        columns = ", ".join(f"MAX({quote_identifier(spec.name)}) AS max{i}" for i, spec in enumerate(sequences))
+        row = (await execute_sql(f"SELECT {columns} FROM {table}"))[0]
+        for i, spec in enumerate(sequences):
+            spec.continue_after(row[f"max{i}"])
+
+
+def _load_connections(connections):
+    """Connections a load writes on, bounded by the query lane, by default all of its slots but one"""
+    capacity = get_admission_controller().lane(QUERY_LANE).concurrency
+    if connections is None:
+        return max(1, capacity - 1)
+    if connections < 1:
+        raise ValueError("connections must be at least 1")
+    return min(int(connections), capacity)
+
+
+async def generate_test_data(table, columns=None, num=0, column_options=None, seed=None, connections=None,
+                             progress=None):
+    """
+    Insert generated rows into a table, with values of the types the catalog reports for its columns
+
+    Rows are generated BATCH_ROWS at a time and each batch is written with one binary COPY, several batches at once
+    on separate pooled connections.
+
+    Args:
+        table (str): Table name, optionally qualified with the schema
+        columns (list, optional): Columns to fill, by default every column except identity and serial columns
+        num (int): Number of rows
+        column_options (dict, optional): Options per column name, see data_generator.OPTION_KEYS
+        seed (int, optional): Seed of the run, the same seed generates the same rows
+        connections (int, optional): Batches written at once, at most the query lane concurrency
+        progress (optional): Coroutine function called with (rows written, num) while the rows are written
+
+    Returns:
+        dict: rows, seconds, rows_per_second, connections and seed of the run
+
+    Raises:
+        ValueError: The table or a column does not exist, an option does not fit its column, or a column of a type
+            the generator does not know has no values
+    """
+    # Imported with the first generation, not at server startup, NumPy takes most of its import time
+    from src.utils.data_generator import RowGenerator, apply_options, check_filled, load_rows, table_columns
+
     logger.info(f"Starting to generate {num} test records for table '{table}'")
-    logger.debug(f"Target table {table} columns: {columns}")
+    tables, missing = await describe_tables(table)
+    if missing:
+        raise ValueError(f"Table {table} does not exist")
+    description = tables[0]
+    specs = table_columns(description, columns)
+    if not specs:
+        raise ValueError(f"Table {table} has no columns to fill")
+    options = {name.lower(): value for name, value in (column_options or {}).items()}
+    unknown = set(options) - {spec.name.lower() for spec in specs}
+    if unknown:
+        raise ValueError(f"Options given for column(s) {', '.join(sorted(unknown))}, which are not filled")
+    for spec in specs:
+        apply_options(spec, options.get(spec.name.lower(), {}))
+    check_filled(specs)
 
-    try:
-        for i in range(num):
-            values = []
-            for _ in columns:
-                # Simple example: all use 8-character random strings
-                random_value = ''.join(random.choices(string.ascii_letters, k=8))
-                values.append(random_value)
-
-            # PostgreSQL uses $1, $2, $3... for placeholders
-            placeholders = ','.join([f'${j+1}' for j in range(len(columns))])
-            sql = f'INSERT INTO "{table}" ({",".join([f'"{col}"' for col in columns])}) VALUES ({placeholders})'
-
-            logger.debug(f"Inserting row {i + 1}/{num}: {dict(zip(columns, values))}")
-            await execute_sql(sql, values)
-
-        logger.info(f"Successfully generated {num} test records for table '{table}'")
-        return {
-            "success": True,
-            "result": f"Successfully generated {num} test records for table '{table}'",
-            "message": "Test data generation completed"
-        }
-    except Exception as e:
-        error_msg = str(e)
-        logger.error(f"Failed to generate test data for table '{table}': {error_msg}")
-        return {
-            "success": False,
-            "error": error_msg,
-            "message": "Test data generation failed"
-        }
\ No newline at end of file
+    schema_name, table_name = description["table"].split(".", 1)
+    await _prepare_columns(f"{quote_identifier(schema_name)}.{quote_identifier(table_name)}", specs)
+    logger.debug(f"Target table {description['table']} columns: {[(spec.name, spec.kind) for spec in specs]}")
+    generator = RowGenerator(specs, seed, num)
+    names = [spec.name for spec in specs]
+
+    async def write(rows):
+        # One COPY per batch instead of an INSERT round trip per row
+        return await execute_copy(schema_name, table_name, names, rows)
+
+    result = await load_rows(generator, num, write, _load_connections(connections), progress)
+    logger.info(f"Successfully generated {result['rows']} test records for table '{table}' in {result['seconds']}s "
+                f"on {result['connections']} connections, {result['rows_per_second']} rows/s, seed {result['seed']}")
+    return result
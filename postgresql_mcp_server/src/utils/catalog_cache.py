@@ -0,0 +1,314 @@
+"""
+Catalog Cache Module
+
+Tables and columns of every user schema, read with one pg_catalog query and kept per database instance for
+dbCatalogCacheTtl seconds, so database://tables, list_tables and describe_table are answered without a
+catalog round trip. Concurrent misses share one query, and schema changing statements run through sql_exec
+drop the entry of their instance, so the next call reads the catalog again.
+
+The indexes, foreign keys and column statistics (pg_stats) describe_table adds are read on demand, for any
+number of tables with one query, and cached the same way.
+"""
+import asyncio
+import re
+import time
+from fnmatch import fnmatchcase
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.utils.db_admission import METADATA_LANE
+from src.utils.db_config import load_activate_db_config
+from src.utils.db_operate import execute_sql
+from src.utils.db_session import current_instance_id
+from src.utils.logger_util import logger
+from src.utils.sql_classifier import classify_sql
+
+# Writes that change rows only, every other statement that is not read-only may change the catalog
+DATA_STATEMENTS = frozenset(("insert", "update", "delete", "merge", "copy"))
+
+# Columns of every user table with its row estimate, the keys each column is part of and the position of its schema
+# in the search_path (NULL when not on it), in one round trip
+TABLES_SQL = """
+    SELECT n.nspname AS schema_name,
+           c.relname AS table_name,
+           CASE WHEN c.reltuples < 0 THEN NULL ELSE c.reltuples::bigint END AS estimated_rows,
+           pg_catalog.array_position(pg_catalog.current_schemas(false), n.nspname::text) AS search_path_position,
+           a.attname AS "Field",
+           pg_catalog.format_type(a.atttypid, a.atttypmod) AS "Type",
+           CASE WHEN a.attnotnull THEN 'NO' ELSE 'YES' END AS "Null",
+           pg_catalog.pg_get_expr(d.adbin, d.adrelid) AS "Default",
+           CASE WHEN k.is_primary THEN 'PRI' WHEN k.is_unique THEN 'UNI' WHEN k.is_leading THEN 'MUL' ELSE '' END AS "Key",
+           CASE a.attidentity WHEN 'a' THEN 'identity always' WHEN 'd' THEN 'identity by default' ELSE '' END AS "Extra"
+    FROM pg_catalog.pg_class c
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_catalog.pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    LEFT JOIN pg_catalog.pg_attrdef d ON d.adrelid = c.oid AND d.adnum = a.attnum
+    LEFT JOIN (
+        SELECT i.indrelid, key.attnum,
+               bool_or(i.indisprimary) AS is_primary,
+               bool_or(i.indisunique AND i.indnatts = 1) AS is_unique,
+               bool_or(key.position = 1) AS is_leading
+        FROM pg_catalog.pg_index i
+        CROSS JOIN LATERAL unnest(i.indkey::int2[]) WITH ORDINALITY AS key(attnum, position)
+        GROUP BY i.indrelid, key.attnum
+    ) k ON k.indrelid = c.oid AND k.attnum = a.attnum
+    WHERE c.relkind IN ('r', 'p')
+      AND n.nspname NOT LIKE 'pg\\_%' AND n.nspname <> 'information_schema'
+      AND pg_catalog.has_table_privilege(c.oid, 'SELECT')
+    ORDER BY n.nspname, c.relname, a.attnum
+"""
+
+COLUMN_FIELDS = ("Field", "Type", "Null", "Default", "Key", "Extra")
+# Tables one describe_table call accepts
+MAX_DESCRIBE_TABLES = 100
+
+# Indexes, foreign keys and column statistics of the tables named by the schema ($1) and table ($2) arrays
+TABLE_DETAILS_SQL = """
+    WITH requested AS (
+        SELECT c.oid, c.relkind, r.schema_name, r.table_name
+        FROM unnest($1::text[], $2::text[]) AS r(schema_name, table_name)
+        JOIN pg_catalog.pg_namespace n ON n.nspname = r.schema_name
+        JOIN pg_catalog.pg_class c ON c.relnamespace = n.oid AND c.relname = r.table_name
+    )
+    SELECT 'index' AS kind, r.schema_name, r.table_name, ic.relname::text AS object_name,
+           ARRAY(SELECT pg_catalog.pg_get_indexdef(i.indexrelid, k, true)
+                 FROM generate_series(1, i.indnkeyatts) AS k ORDER BY k) AS column_names,
+           i.indisunique AS is_unique, am.amname::text AS method,
+           NULL::text AS referenced_table, NULL::text[] AS referenced_columns,
+           NULL::text AS column_name, NULL::real AS null_frac, NULL::real AS n_distinct
+    FROM requested r
+    JOIN pg_catalog.pg_index i ON i.indrelid = r.oid
+    JOIN pg_catalog.pg_class ic ON ic.oid = i.indexrelid
+    JOIN pg_catalog.pg_am am ON am.oid = ic.relam
+    UNION ALL
+    SELECT 'foreign_key', r.schema_name, r.table_name, con.conname::text,
+           ARRAY(SELECT a.attname::text FROM unnest(con.conkey) WITH ORDINALITY AS k(attnum, position)
+                 JOIN pg_catalog.pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+                 ORDER BY k.position),
+           NULL, NULL, fn.nspname || '.' || fc.relname,
+           ARRAY(SELECT a.attname::text FROM unnest(con.confkey) WITH ORDINALITY AS k(attnum, position)
+                 JOIN pg_catalog.pg_attribute a ON a.attrelid = con.confrelid AND a.attnum = k.attnum
+                 ORDER BY k.position),
+           NULL, NULL, NULL
+    FROM requested r
+    JOIN pg_catalog.pg_constraint con ON con.conrelid = r.oid AND con.contype = 'f'
+    JOIN pg_catalog.pg_class fc ON fc.oid = con.confrelid
+    JOIN pg_catalog.pg_namespace fn ON fn.oid = fc.relnamespace
+    UNION ALL
+    SELECT 'statistics', r.schema_name, r.table_name, NULL, NULL, NULL, NULL, NULL, NULL,
+           s.attname::text, s.null_frac, s.n_distinct
+    FROM requested r
+    JOIN pg_catalog.pg_stats s ON s.schemaname = r.schema_name AND s.tablename = r.table_name
+         AND s.inherited = (r.relkind = 'p')
+    ORDER BY 2, 3, 1, 4
+"""
+
+# "table", "schema.table", each part plain or double-quoted
+_NAME = r'"(?:[^"]|"")+"|[^."]+'
+_TABLE_NAME_RE = re.compile(rf'\s*(?:(?P<schema>{_NAME})\s*\.\s*)?(?P<table>{_NAME})\s*\Z')
+
+
+def changes_catalog(sql: str) -> bool:
+    """Whether a statement may create, alter or drop tables or change the privileges on them"""
+    classification = classify_sql(sql)
+    if classification.read_only:
+        return False
+    return classification.statement_count > 1 or classification.statement_type not in DATA_STATEMENTS
+
+
+def _unquote(name: str) -> str:
+    name = name.strip()
+    return name[1:-1].replace('""', '"') if name.startswith('"') else name
+
+
+def split_table_name(table_name: str) -> Tuple[Optional[str], str]:
+    """(schema or None, table) of a "table" or "schema.table" name, double quotes around either part are removed"""
+    match = _TABLE_NAME_RE.match(table_name)
+    if match is None:
+        return None, table_name
+    schema = match.group("schema")
+    return (_unquote(schema) if schema else None), _unquote(match.group("table"))
+
+
+def filter_tables(tables: List[Dict[str, Any]], schema: Optional[str] = None,
+                  table: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Tables whose schema and name match the glob patterns (*, ?, [seq]), a pattern left out matches everything"""
+    return [entry for entry in tables
+            if (not schema or fnmatchcase(entry["schema"], schema))
+            and (not table or fnmatchcase(entry["name"], table))]
+
+
+def find_table(tables: List[Dict[str, Any]], table_name: str) -> Optional[Dict[str, Any]]:
+    """
+    Table a name refers to
+
+    A "schema.table" name is looked up in that schema, a bare name is resolved through the search_path like an
+    unqualified name in a query. Names that match no table exactly are compared in lower case, the way PostgreSQL
+    folds unquoted identifiers.
+    """
+    schema, name = split_table_name(table_name)
+    for fold in (False, True):
+        matches = [entry for entry in tables
+                   if _same(entry["name"], name, fold) and (_same(entry["schema"], schema, fold) if schema
+                                                           else entry["search_path_position"] is not None)]
+        if matches:
+            return min(matches, key=lambda entry: entry["search_path_position"] or 0)
+    return None
+
+
+def _same(actual: str, wanted: str, fold: bool) -> bool:
+    return actual == (wanted.lower() if fold else wanted)
+
+
+def _describe(entry: Dict[str, Any], rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Compact description of a catalog table with its rows of TABLE_DETAILS_SQL"""
+    statistics = {row["column_name"]: row for row in rows if row["kind"] == "statistics"}
+    columns = []
+    for field in entry["columns"]:
+        column = {"name": field["Field"], "type": field["Type"], "nullable": field["Null"] == "YES"}
+        for name, value in (("default", field["Default"]), ("key", field["Key"]), ("extra", field["Extra"])):
+            if value not in (None, ""):
+                column[name] = value
+        stats = statistics.get(field["Field"])
+        if stats is not None:
+            column["null_frac"] = round(float(stats["null_frac"]), 4)
+            # A negative n_distinct is the fraction of the rows that are distinct
+            distinct = float(stats["n_distinct"])
+            if distinct < 0 and entry["estimated_rows"] is not None:
+                distinct = -distinct * entry["estimated_rows"]
+            if distinct >= 0:
+                column["distinct"] = round(distinct)
+        columns.append(column)
+    return {
+        "table": f"{entry['schema']}.{entry['name']}",
+        "rows": entry["estimated_rows"],
+        "columns": columns,
+        "indexes": [{"name": row["object_name"], "columns": list(row["column_names"]), "unique": row["is_unique"],
+                     "type": row["method"]} for row in rows if row["kind"] == "index"],
+        "foreign_keys": [{"name": row["object_name"], "columns": list(row["column_names"]),
+                          "references": row["referenced_table"], "referenced_columns": list(row["referenced_columns"])}
+                         for row in rows if row["kind"] == "foreign_key"]
+    }
+
+
+class CatalogCache:
+    """Catalog tables of each database instance, loaded on demand and kept for dbCatalogCacheTtl seconds"""
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
+        self._loading: Dict[str, "asyncio.Future[List[Dict[str, Any]]]"] = {}
+        self._details: Dict[str, Dict[Tuple[str, str], Tuple[float, Dict[str, Any]]]] = {}
+        self._generations: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def tables(self, refresh: bool = False) -> List[Dict[str, Any]]:
+        """
+        Tables of the database instance of the current session, ordered by schema and name
+
+        Each entry has schema, name, estimated_rows, search_path_position and columns (Field, Type, Null, Default,
+        Key). The entries are shared between callers and must not be modified.
+
+        Args:
+            refresh (bool): Read the catalog again even when the cached entry has not expired
+        """
+        active_db, db_config = load_activate_db_config(current_instance_id.get())
+        key = active_db.db_instance_id
+        cached = self._entries.get(key)
+        if cached is not None and not refresh and cached[0] > time.monotonic():
+            self.hits += 1
+            return cached[1]
+
+        loading = self._loading.get(key)
+        if loading is None:
+            # Callers missing at the same time wait for the same query
+            self.misses += 1
+            loading = asyncio.ensure_future(self._load(key, float(db_config.db_catalog_cache_ttl)))
+            self._loading[key] = loading
+            loading.add_done_callback(lambda _, key=key: self._loading.pop(key, None))
+        # A caller that is cancelled does not cancel the query the other callers wait for
+        return await asyncio.shield(loading)
+
+    async def _load(self, key: str, ttl: float) -> List[Dict[str, Any]]:
+        generation = self._generations.get(key, 0)
+        tables: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for row in await execute_sql(TABLES_SQL, lane=METADATA_LANE):
+            table_key = (row["schema_name"], row["table_name"])
+            table = tables.get(table_key)
+            if table is None:
+                table = tables[table_key] = {
+                    "schema": row["schema_name"],
+                    "name": row["table_name"],
+                    "estimated_rows": row["estimated_rows"],
+                    "search_path_position": row["search_path_position"],
+                    "columns": []
+                }
+            table["columns"].append({field: row[field] for field in COLUMN_FIELDS})
+        result = list(tables.values())
+        # A schema change while the query ran leaves the result out of the cache
+        if ttl > 0 and self._generations.get(key, 0) == generation:
+            self._entries[key] = (time.monotonic() + ttl, result)
+        logger.debug(f"Catalog of database instance {key} loaded, {len(result)} tables")
+        return result
+
+    async def describe(self, tables: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Compact descriptions of catalog tables with their indexes, foreign keys and column statistics, the tables
+        missing from the cache are read with one query
+
+        Each description has table, rows (estimate), columns (name, type, nullable, and default, key, extra,
+        null_frac and distinct when set), indexes (name, columns, unique, type) and foreign_keys (name, columns, references,
+        referenced_columns). The descriptions are shared between callers and must not be modified.
+
+        Args:
+            tables: Entries returned by tables()
+        """
+        active_db, db_config = load_activate_db_config(current_instance_id.get())
+        instance = active_db.db_instance_id
+        details = self._details.setdefault(instance, {})
+        now = time.monotonic()
+        found: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        wanted = {}
+        for entry in tables:
+            key = (entry["schema"], entry["name"])
+            cached = details.get(key)
+            if cached is not None and cached[0] > now:
+                self.hits += 1
+                found[key] = cached[1]
+            else:
+                wanted[key] = entry
+
+        if wanted:
+            self.misses += len(wanted)
+            generation = self._generations.get(instance, 0)
+            rows = await execute_sql(TABLE_DETAILS_SQL, [[key[0] for key in wanted], [key[1] for key in wanted]],
+                                     lane=METADATA_LANE)
+            grouped: Dict[Tuple[str, str], List[Dict[str, Any]]] = {key: [] for key in wanted}
+            for row in rows:
+                grouped[(row["schema_name"], row["table_name"])].append(row)
+            loaded = {key: _describe(entry, grouped[key]) for key, entry in wanted.items()}
+            found.update(loaded)
+            ttl = float(db_config.db_catalog_cache_ttl)
+            # A schema change while the query ran leaves the result out of the cache
+            if ttl > 0 and self._generations.get(instance, 0) == generation:
+                expires = time.monotonic() + ttl
+                details.update((key, (expires, table)) for key, table in loaded.items())
+        return [found[(entry["schema"], entry["name"])] for entry in tables]
+
+    def invalidate(self):
+        """Drop the cached catalog of the database instance of the current session"""
+        active_db, _ = load_activate_db_config(current_instance_id.get())
+        key = active_db.db_instance_id
+        self._generations[key] = self._generations.get(key, 0) + 1
+        self._details.pop(key, None)
+        if self._entries.pop(key, None) is not None:
+            self.invalidations += 1
+            logger.debug(f"Catalog cache of database instance {key} invalidated")
+
+    def snapshot(self) -> Dict[str, int]:
+        """Counters of the cache"""
+        return {"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations,
+                "cached_instances": len(self._entries)}
+
+
+catalog_cache = CatalogCache()
@@ -0,0 +1,175 @@
+"""
+Query Cost Guard Module
+
+Optional pre-flight of the statements agents send: EXPLAIN (FORMAT JSON) estimates the rows a statement
+reads and its total planner cost, and statements over dbCostGuardMaxRows or dbCostGuardMaxCost are
+rejected, or for queries in "limit" mode run with a LIMIT, before they tie up the database. Estimates
+are cached per statement fingerprint for dbCostGuardCacheTtl seconds, so a repeated statement costs no
+extra round trip.
+"""
+import asyncio
+import json
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from src.utils.db_config import load_activate_db_config
+from src.utils.db_session import current_instance_id
+from src.utils.logger_util import logger
+from src.utils.sql_classifier import blank_literals, classify_sql, strip_trailing_semicolons
+from src.utils.sql_fingerprint import fingerprint_sql
+
+# Guard modes (dbCostGuard)
+GUARD_OFF = "off"
+GUARD_REJECT = "reject"
+GUARD_LIMIT = "limit"
+
+# Statements EXPLAIN can estimate
+GUARDED_STATEMENTS = frozenset(("select", "table", "values", "update", "delete", "insert", "merge"))
+# Statements a LIMIT can be appended to
+LIMITABLE_STATEMENTS = frozenset(("select", "table", "values"))
+
+# Plan estimates kept, least recently used first out
+ESTIMATE_CACHE_SIZE = 1024
+
+_PARENS_RE = re.compile(r"\([^()]*\)")
+_LIMIT_RE = re.compile(r"\blimit\b|\bfetch\s+(?:first|next)\b", re.I)
+
+
+class QueryCostRejectedError(Exception):
+    """Raised when the plan estimate of a statement is over the cost guard thresholds"""
+
+
+@dataclass(frozen=True)
+class PlanEstimate:
+    """Estimate of one statement from its EXPLAIN output"""
+    rows: float
+    cost: float
+
+
+def _has_top_level_limit(sql: str) -> bool:
+    """Whether the statement has a LIMIT or FETCH FIRST outside parentheses"""
+    text = blank_literals(sql)
+    previous = None
+    while previous != text:
+        previous, text = text, _PARENS_RE.sub(" ", text)
+    return _LIMIT_RE.search(text) is not None
+
+
+def _plan_rows(node: Dict[str, Any]) -> float:
+    """Largest row estimate of a plan node and its children, a Limit node stops the scans below it early"""
+    rows = float(node.get("Plan Rows", 0))
+    if node.get("Node Type") == "Limit":
+        return rows
+    return max([rows] + [_plan_rows(child) for child in node.get("Plans", ())])
+
+
+def estimate_plan(explain: Any) -> Optional[PlanEstimate]:
+    """
+    Rows read and total cost from the output of EXPLAIN (FORMAT JSON), None when the output is not understood
+    """
+    try:
+        if isinstance(explain, str):
+            explain = json.loads(explain)
+        plan = explain[0]["Plan"]
+        return PlanEstimate(_plan_rows(plan), float(plan["Total Cost"]))
+    except (ValueError, TypeError, KeyError, IndexError):
+        return None
+
+
+class CostGuard:
+    """EXPLAIN based pre-flight check with plan estimates cached per statement fingerprint"""
+
+    def __init__(self, max_entries: int = ESTIMATE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._estimates: "OrderedDict[Tuple[Optional[str], str], Tuple[float, Optional[PlanEstimate]]]" = OrderedDict()
+        self.checks = 0
+        self.cache_hits = 0
+        self.rejected = 0
+        self.limited = 0
+
+    async def check(self, conn, sql: str, args: Sequence[Any], timeout: Optional[float]) -> str:
+        """
+        Check a statement against the cost guard before it is executed on conn
+
+        Args:
+            conn: Connection the statement runs on, used for EXPLAIN on a cache miss
+            sql (str): The statement
+            args (Sequence[Any]): Values bound to the statement
+            timeout (float, optional): Timeout of the EXPLAIN in seconds
+
+        Returns:
+            str: The statement to execute, with a LIMIT appended when the guard limited it
+
+        Raises:
+            QueryCostRejectedError: The estimate is over dbCostGuardMaxRows or dbCostGuardMaxCost and the statement
+            cannot be limited
+        """
+        _, db_config = load_activate_db_config()
+        mode = db_config.db_cost_guard
+        max_rows = int(db_config.db_cost_guard_max_rows)
+        max_cost = float(db_config.db_cost_guard_max_cost)
+        if mode not in (GUARD_REJECT, GUARD_LIMIT) or (max_rows <= 0 and max_cost <= 0):
+            return sql
+        classification = classify_sql(sql)
+        if classification.statement_count != 1 or classification.statement_type not in GUARDED_STATEMENTS:
+            return sql
+
+        self.checks += 1
+        estimate = await self._estimate(conn, sql, args, timeout, float(db_config.db_cost_guard_cache_ttl))
+        if estimate is None:
+            return sql
+        if max_rows > 0 and estimate.rows > max_rows:
+            reason = f"reads an estimated {estimate.rows:.0f} rows, the limit is dbCostGuardMaxRows {max_rows}"
+        elif max_cost > 0 and estimate.cost > max_cost:
+            reason = f"has an estimated cost of {estimate.cost:.0f}, the limit is dbCostGuardMaxCost {max_cost:g}"
+        else:
+            return sql
+
+        fingerprint = fingerprint_sql(sql)
+        if mode == GUARD_LIMIT and classification.returns_rows and classification.read_only \
+                and classification.statement_type in LIMITABLE_STATEMENTS and not _has_top_level_limit(sql):
+            self.limited += 1
+            limit = int(db_config.db_cost_guard_limit)
+            logger.warning(f"SQL [{fingerprint}] {reason}, running it with LIMIT {limit}")
+            # The newline ends a trailing line comment
+            return f"{strip_trailing_semicolons(sql)}\nLIMIT {limit}"
+        self.rejected += 1
+        logger.warning(f"SQL [{fingerprint}] rejected, it {reason}")
+        raise QueryCostRejectedError(f"Statement rejected by the cost guard: it {reason}. "
+                                     f"Add a selective WHERE clause or a LIMIT")
+
+    async def _estimate(self, conn, sql: str, args: Sequence[Any], timeout: Optional[float],
+                        ttl: float) -> Optional[PlanEstimate]:
+        key = (current_instance_id.get(), fingerprint_sql(sql))
+        now = time.monotonic()
+        cached = self._estimates.get(key)
+        if cached is not None and cached[0] > now:
+            self._estimates.move_to_end(key)
+            self.cache_hits += 1
+            return cached[1]
+
+        try:
+            estimate = estimate_plan(await conn.fetchval(f"EXPLAIN (FORMAT JSON) {sql}", *args, timeout=timeout))
+        except asyncio.TimeoutError:
+            raise
+        except Exception as e:
+            # The statement itself reports the error, the guard does not stand in its way. The failure is
+            # cached like an estimate, so a statement EXPLAIN cannot handle is not explained on every call
+            logger.debug(f"EXPLAIN for the cost guard failed: {e}")
+            estimate = None
+        self._estimates[key] = (now + ttl, estimate)
+        self._estimates.move_to_end(key)
+        if len(self._estimates) > self.max_entries:
+            self._estimates.popitem(last=False)
+        return estimate
+
+    def snapshot(self) -> Dict[str, int]:
+        """Counters of the guard"""
+        return {"checks": self.checks, "cache_hits": self.cache_hits, "rejected": self.rejected,
+                "limited": self.limited, "cached_estimates": len(self._estimates)}
+
+
+cost_guard = CostGuard()
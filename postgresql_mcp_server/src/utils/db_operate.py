@@ -1,6 +1,20 @@
+import asyncio
+import functools
+import time
+
+from src.utils.cost_guard import cost_guard
+from src.utils.db_admission import QUERY_LANE, get_admission_controller
 from src.utils.db_pool import get_db_pool
-from src.utils.logger_util import logger
-import asyncpg
+from src.utils.logger_util import logger, sample_query_log
+from src.utils.query_timing import QueryTiming, log_slow_query
+from src.utils.sql_classifier import classify_sql, quote_identifier
+from src.utils.sql_fingerprint import statement_registry
+from src.utils.tracing import start_span
+
+
+class QueryTimeoutError(TimeoutError):
+    """Raised when a statement exceeds its timeout and has been cancelled on the server"""
+
 
 async def get_pooled_connection():
     """Get database connection from connection pool"""
@@ -11,59 +25,192 @@ async def get_pooled_connection():
     except Exception as e:
         logger.error(f"Failed to get connection from PostgreSQL connection pool: {e}")
         raise
-async def execute_sql(sql, params=None):
-    """Execute SQL statement (asynchronous version, using connection pool)"""
+
+
+def resolve_timeout(timeout_ms, default_timeout_ms):
+    """
+    Resolve the effective statement timeout
+
+    Args:
+        timeout_ms (int, optional): Per-call timeout in milliseconds, None uses the configured default
+        default_timeout_ms (int): Configured default timeout in milliseconds
+
+    Returns:
+        Optional[float]: Timeout in seconds, None when the timeout is disabled (0 or negative)
+    """
+    if timeout_ms is None:
+        timeout_ms = default_timeout_ms
+    return timeout_ms / 1000 if timeout_ms and timeout_ms > 0 else None
+
+
+async def _run_statement(conn, sql, args, timeout, timing):
+    """Execute the statement and collect its result"""
+    # Handle different types of SQL statements
+    classification = classify_sql(sql)
+    if classification.returns_rows:
+        # For statements returning rows (queries, EXPLAIN, SHOW, ... RETURNING), return result set
+        with start_span("db.execute"):
+            result = await conn.fetch(sql, *args, timeout=timeout)
+        timing.lap("execute")
+        # Convert asyncpg.Record to dict list for compatibility
+        with start_span("db.fetch", {"db.response.rows": len(result)}):
+            result = [dict(row) for row in result]
+        timing.lap("fetch")
+        logger.debug("Async query returned {} rows of data", len(result))
+    elif classification.is_dml:
+        # For modification statements, return affected rows count
+        with start_span("db.execute"):
+            result = await conn.execute(sql, *args, timeout=timeout)
+        timing.lap("execute")
+        # Extract row count from returned status string (e.g. "UPDATE 5")
+        if isinstance(result, str) and ' ' in result:
+            try:
+                result = int(result.split()[-1])
+            except (ValueError, IndexError):
+                result = 0
+        logger.debug("Async query affected {} rows of data", result)
+    else:
+        # For other statements (like CREATE, DROP, etc.)
+        with start_span("db.execute"):
+            await conn.execute(sql, *args, timeout=timeout)
+        timing.lap("execute")
+        result = "Query executed successfully"
+        logger.debug("Async DDL query executed successfully")
+    return result
+
+
+async def _run_guarded_statement(conn, sql, args, timeout, timing):
+    """Check the statement against the cost guard on the same connection, then execute it"""
+    sql = await cost_guard.check(conn, sql, args, timeout)
+    return await _run_statement(conn, sql, args, timeout, timing)
+
+
+async def _run_copy(schema_name, table, columns, conn, sql, records, timeout, timing):
+    """Stream the records with the binary COPY protocol"""
+    with start_span("db.execute", {"db.batch.size": len(records)}):
+        status = await conn.copy_records_to_table(table, records=records, columns=columns, schema_name=schema_name,
+                                                  timeout=timeout)
+    timing.lap("execute")
+    # Status string of the COPY command, e.g. "COPY 5000"
+    result = int(status.split()[-1])
+    logger.debug("Async COPY wrote {} rows of data", result)
+    return result
+
+
+async def execute_sql(sql, params=None, timeout_ms=None, lane=QUERY_LANE):
+    """
+    Execute SQL statement (asynchronous version, using connection pool)
+
+    Args:
+        sql (str): SQL statement, using $1, $2, ... placeholders for bound values
+        params (list | tuple, optional): Values bound to the placeholders, in placeholder order
+        timeout_ms (int, optional): Statement timeout in milliseconds, defaults to dbQueryTimeoutMs, 0 disables it
+        lane (str): Admission lane, METADATA_LANE for schema lookups, QUERY_LANE otherwise
+
+    Raises:
+        ValueError: params is a dict, PostgreSQL placeholders are positional only
+        AdmissionRejectedError: The server is saturated, the statement did not run and can be retried
+        QueryTimeoutError: The statement exceeded its timeout and was cancelled on the server
+        QueryCostRejectedError: The cost guard (dbCostGuard) estimated the statement over its thresholds, it did not run
+    """
+    if isinstance(params, dict):
+        raise ValueError("PostgreSQL placeholders are positional ($1, $2, ...), pass params as a list")
+
+    # Metadata lookups are the server's own statements, only the query lane is guarded
+    run = _run_guarded_statement if lane == QUERY_LANE else _run_statement
+    return await _execute(sql, params or (), timeout_ms, lane, run)
+
+
+async def execute_copy(schema_name, table, columns, records, timeout_ms=None, lane=QUERY_LANE):
+    """
+    Write rows into a table with COPY ... FROM STDIN (binary format), one statement for all records
+
+    COPY is a single statement, so all records are written or none.
+
+    Args:
+        schema_name (str): Schema of the table
+        table (str): Table name
+        columns (list): Column names, in the order of the values of each record
+        records (list): One tuple of values per row
+        timeout_ms (int, optional): Timeout of the COPY in milliseconds, defaults to dbQueryTimeoutMs, 0 disables it
+        lane (str): Admission lane
+
+    Returns:
+        int: Rows written
+
+    Raises:
+        AdmissionRejectedError: The server is saturated, the COPY did not run and can be retried
+        QueryTimeoutError: The COPY exceeded its timeout and was cancelled on the server
+    """
+    # The statement asyncpg sends, for the statement statistics and traces
+    sql = (f"COPY {quote_identifier(schema_name)}.{quote_identifier(table)} "
+           f"({', '.join(map(quote_identifier, columns))}) FROM STDIN (FORMAT binary)")
+    return await _execute(sql, records, timeout_ms, lane, functools.partial(_run_copy, schema_name, table, list(columns)))
+
+
+async def _execute(sql, params, timeout_ms, lane, run):
+    """Admit the call, then execute it with run on a pooled connection"""
+    timing = QueryTiming()
+    with start_span("db.query", {"db.system": "postgresql", "db.admission.lane": lane}) as span:
+        async with get_admission_controller().admit(lane):
+            # Time spent queueing for admission, the rest of the acquire phase is the pool acquire span
+            span.set_attribute("db.admission.wait_ms", round((time.perf_counter() - timing.started) * 1000, 3))
+            return await _execute_admitted(sql, params, timeout_ms, timing, span, run)
+
+
+async def _execute_admitted(sql, params, timeout_ms, timing, span, run):
+    """Execute SQL statement on a pooled connection once the call has been admitted"""
+
+    pool = None
     conn = None
-    logger.debug(f"Preparing to execute async SQL: {sql}")
+    statement = statement_registry.record(sql, params)
+    span.set_attribute("db.statement.fingerprint", statement.fingerprint)
+    span.set_attribute("db.operation", classify_sql(sql).statement_type)
+    logger.debug("Preparing to execute async SQL [{}]: {}", statement.fingerprint, sql)
     try:
         logger.debug("Getting PostgreSQL connection pool connection...")
+        pool = await get_db_pool()
         conn = await get_pooled_connection()
+        timeout = resolve_timeout(timeout_ms, pool.query_timeout_ms)
+        timing.lap("acquire")
 
         # Execute SQL
-        logger.debug("Executing async SQL query...")
-
-        # Handle different types of SQL statements
-        sql_lower = sql.strip().lower()
-        if sql_lower.startswith(("select", "show", "describe", "desc")):
-            # For query statements, return result set
-            if params:
-                result = await conn.fetch(sql, *params)
-            else:
-                result = await conn.fetch(sql)
-            # Convert asyncpg.Record to dict list for compatibility
-            result = [dict(row) for row in result]
-            logger.debug(f"Async query returned {len(result)} rows of data")
-        elif sql_lower.startswith(("insert", "update", "delete")):
-            # For modification statements, return affected rows count
-            if params:
-                result = await conn.execute(sql, *params)
-            else:
-                result = await conn.execute(sql)
-            # Extract row count from returned status string (e.g. "UPDATE 5")
-            if isinstance(result, str) and ' ' in result:
-                try:
-                    result = int(result.split()[-1])
-                except (ValueError, IndexError):
-                    result = 0
-            logger.debug(f"Async query affected {result} rows of data")
-        else:
-            # For other statements (like CREATE, DROP, etc.)
-            if params:
-                await conn.execute(sql, *params)
-            else:
-                await conn.execute(sql)
-            result = "Query executed successfully"
-            logger.debug("Async DDL query executed successfully")
-
-        logger.info(f"Async SQL executed successfully: {sql[:200]}{'...' if len(sql) > 50 else ''}")
+        logger.debug("Executing async SQL query, timeout:{}s...", timeout)
+        try:
+            result = await run(conn, sql, params, timeout, timing)
+        except asyncio.TimeoutError:
+            # asyncpg sends a protocol level cancel request (as pg_cancel_backend does) when the timeout
+            # expires and waits for the backend to acknowledge it, so the connection goes back to the pool healthy
+            logger.warning(f"SQL [{statement.fingerprint}] exceeded timeout of {timeout}s and was cancelled")
+            raise QueryTimeoutError(f"Query exceeded timeout of {int(timeout * 1000)} ms and was cancelled")
+
+        timing.measure_result(result)
+        if sample_query_log():
+            logger.info("Async SQL executed successfully: {}{}", sql[:200], '...' if len(sql) > 200 else '')
         return result
 
     except Exception as e:
+        timing.failed = True
         logger.error(f"Async SQL execution failed: {e}")
         logger.debug(f"Failed async SQL: {sql}")
+        if conn:
+            # Acquire failures are already counted by the pool
+            pool.metrics.record_error(e)
         raise
     finally:
         if conn:
             pool = await get_db_pool()
             await pool.release_connection(conn)
-            logger.debug("Async connection has been released back to connection pool")
\ No newline at end of file
+            logger.debug("Async connection has been released back to connection pool")
+        _record_timing(pool, statement, timing)
+
+
+def _record_timing(pool, statement, timing):
+    """Aggregate the call into its fingerprint and write it to the slow query log when over the threshold"""
+    timing.finish()
+    slow = pool is not None and 0 < pool.slow_query_threshold_ms <= timing.total_ms
+    statement.add_timing(timing, slow)
+    if slow:
+        log_slow_query(statement, timing)
+    logger.opt(lazy=True).debug("SQL [{}] finished in {:.1f} ms, phases: {}",
+                                lambda: statement.fingerprint, lambda: timing.total_ms, timing.to_dict)
\ No newline at end of file
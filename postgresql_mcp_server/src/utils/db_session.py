@@ -0,0 +1,62 @@
+"""
+Database Session Module
+
+Database instance selected by each MCP session. Over stdio every client runs its own server process,
+over HTTP many sessions share one server and its pools, so the selection is kept per session id and
+made current for the request being handled through a context variable.
+"""
+import contextvars
+from collections import OrderedDict
+from typing import Optional
+
+from src.utils.db_config import DatabaseInstance, load_activate_db_config
+from src.utils.logger_util import logger
+
+# Sessions remembered, the least recently used selection is dropped beyond this
+MAX_SESSIONS = 10000
+
+# Instance selected by the session of the request being handled, None for the first active instance
+current_instance_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_instance_id", default=None)
+
+
+class SessionRegistry:
+    """Database instance selected by each MCP session"""
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._selected: "OrderedDict[str, str]" = OrderedDict()
+
+    def select(self, session_id: str, instance_id: Optional[str]) -> DatabaseInstance:
+        """
+        Select the database instance of a session
+
+        Args:
+            session_id (str): MCP session id
+            instance_id (str, optional): Id of an instance with dbActive true, None for the first active instance
+
+        Returns:
+            DatabaseInstance: The instance the session uses from now on
+
+        Raises:
+            ValueError: The instance is not configured or not active
+        """
+        instance, _ = load_activate_db_config(instance_id)
+        if instance_id is None:
+            self._selected.pop(session_id, None)
+        else:
+            self._selected[session_id] = instance_id
+            self._selected.move_to_end(session_id)
+            while len(self._selected) > self.max_sessions:
+                self._selected.popitem(last=False)
+        logger.info(f"Session {session_id} uses database instance {instance.db_instance_id}")
+        return instance
+
+    def selected(self, session_id: Optional[str]) -> Optional[str]:
+        """Instance id selected by a session, None when it uses the first active instance"""
+        instance_id = self._selected.get(session_id) if session_id is not None else None
+        if instance_id is not None:
+            self._selected.move_to_end(session_id)
+        return instance_id
+
+
+session_registry = SessionRegistry()
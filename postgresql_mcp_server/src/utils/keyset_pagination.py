@@ -0,0 +1,207 @@
+"""
+Keyset Pagination Module
+
+Rewrites a SELECT into keyset (seek) pagination: the query becomes a derived table filtered to the rows
+after the last key of the previous page, ordered by the key and limited to one page. PostgreSQL pulls the
+subquery up into the outer query and matches the row comparison to a btree index on the key, so every page
+is an index range scan of one page of rows, instead of an OFFSET scan that reads and discards every earlier row.
+A query with DISTINCT, GROUP BY, aggregates, window functions or UNION cannot be pulled up, it is evaluated
+in full for every page. Its result columns need distinct names, the duplicates of a join must be aliased.
+
+The continuation cursor is an opaque token carrying the key columns and the key values of the last row.
+It is bound to the query it was issued for, the values are always sent as bound parameters.
+"""
+import base64
+import datetime
+import decimal
+import hashlib
+import json
+import re
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from src.utils.sql_classifier import blank_literals, classify_sql, quote_identifier, strip_trailing_semicolons, \
+    top_level_words, unquote_identifier
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 10000
+CURSOR_VERSION = 1
+# Clauses that pick rows by the query's own order, which the key order replaces
+_ROW_LIMITS = frozenset(("limit", "offset", "fetch"))
+
+Params = Optional[List[Any]]
+
+_IDENTIFIER = r'"(?:[^"]|"")+"|[A-Za-z_][\w$]*'
+# FROM table, and whether another table follows it (comma join or JOIN)
+_FROM_RE = re.compile(rf"""
+    \bfrom\s+(?P<first>{_IDENTIFIER})(?:\s*\.\s*(?P<second>{_IDENTIFIER}))?
+    (?P<more>(?:\s+(?:as\s+)?[A-Za-z_][\w$]*)?\s*,
+    |\s+(?:(?:as\s+)?[A-Za-z_][\w$]*\s+)?(?:natural|inner|cross|left|right|full|join)\b)?
+""", re.I | re.X)
+_JOIN_RE = re.compile(r"\bjoin\b", re.I)
+
+
+class PageCursorError(ValueError):
+    """The cursor is malformed or was issued for another query"""
+
+
+def single_table(sql: str) -> Optional[Tuple[Optional[str], str]]:
+    """
+    Table a SELECT reads, when it reads exactly one table at the top level
+
+    Returns:
+        Optional[Tuple[Optional[str], str]]: (schema or None, table), None for joins, subqueries in FROM and
+        queries without a table
+    """
+    text = blank_literals(sql)
+    for match in _FROM_RE.finditer(text):
+        prefix = text[:match.start()]
+        if prefix.count("(") != prefix.count(")"):
+            continue
+        if match.group("more") or _JOIN_RE.search(text):
+            return None
+        if match.group("second"):
+            return unquote_identifier(match.group("first")), unquote_identifier(match.group("second"))
+        return None, unquote_identifier(match.group("first"))
+    return None
+
+
+def check_page_query(sql: str) -> str:
+    """
+    Validate that sql is one SELECT that only reads, and strip its trailing semicolon and its ORDER BY
+
+    Pages are ordered by the key, so a top-level ORDER BY of the query is dropped instead of sorting the
+    derived table for nothing. A top-level LIMIT, OFFSET or FETCH is rejected: it picks rows by the order that is dropped,
+    and page_size already bounds the rows.
+
+    Raises:
+        ValueError: The text is not a single read-only query, or it limits its rows
+    """
+    classification = classify_sql(sql)
+    if classification.statement_count != 1 or classification.statement_type not in ("select", "table", "values") \
+            or not classification.read_only:
+        raise ValueError("paginate_query needs a single read-only SELECT statement")
+    sql = strip_trailing_semicolons(sql)
+    words = top_level_words(sql)
+    order_by = None
+    for i, (word, offset) in enumerate(words):
+        if word in _ROW_LIMITS:
+            raise ValueError(f"paginate_query pages the whole result, remove {word.upper()} and set page_size")
+        if word == "order" and i + 1 < len(words) and words[i + 1][0] == "by":
+            order_by = offset
+    return sql if order_by is None else sql[:order_by].rstrip()
+
+
+def build_page_query(sql: str, params: Params, key: Sequence[str], after: Optional[Sequence[Any]],
+                     page_size: int) -> Tuple[str, Params]:
+    """
+    Rewrite a SELECT into one page of keyset pagination
+
+    One row more than page_size is fetched, its presence tells whether there is a next page.
+
+    Args:
+        sql (str): The SELECT, as validated by check_page_query
+        params (list, optional): Values bound to the $n placeholders of sql
+        key (Sequence[str]): Unique, non-null columns of the result to page by, in order
+        after (Sequence[Any], optional): Key values of the last row of the previous page, None for the first page
+        page_size (int): Rows per page
+
+    Returns:
+        Tuple[str, list]: The page query and its parameters
+    """
+    columns = ", ".join(quote_identifier(column) for column in key)
+    page_params = list(params or [])
+    condition = ""
+    if after is not None:
+        # A row comparison matches a multi-column btree index as one range
+        placeholders = ", ".join(f"${len(page_params) + i + 1}" for i in range(len(after)))
+        condition = f" WHERE ({columns}) > ({placeholders})"
+        page_params.extend(after)
+
+    page_sql = f"SELECT * FROM (\n{sql}\n) AS _page{condition} ORDER BY {columns} LIMIT {int(page_size) + 1}"
+    return page_sql, page_params or None
+
+
+def _query_digest(sql: str, params: Params) -> str:
+    text = json.dumps([sql, params], default=str, sort_keys=True)
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=8).hexdigest()
+
+
+def _encode_value(value: Any) -> Any:
+    """JSON form of a key value, types JSON cannot carry are tagged so they are bound with their own type again"""
+    if isinstance(value, datetime.datetime):
+        return {"$": "datetime", "v": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {"$": "date", "v": value.isoformat()}
+    if isinstance(value, datetime.time):
+        return {"$": "time", "v": value.isoformat()}
+    if isinstance(value, datetime.timedelta):
+        return {"$": "timedelta", "v": value.total_seconds()}
+    if isinstance(value, decimal.Decimal):
+        return {"$": "decimal", "v": str(value)}
+    if isinstance(value, (bytes, bytearray)):
+        return {"$": "bytes", "v": base64.b64encode(bytes(value)).decode("ascii")}
+    if isinstance(value, uuid.UUID):
+        return {"$": "uuid", "v": str(value)}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if not isinstance(value, dict):
+        return value
+    kind, text = value.get("$"), value.get("v")
+    if kind == "datetime":
+        return datetime.datetime.fromisoformat(text)
+    if kind == "date":
+        return datetime.date.fromisoformat(text)
+    if kind == "time":
+        return datetime.time.fromisoformat(text)
+    if kind == "timedelta":
+        return datetime.timedelta(seconds=text)
+    if kind == "decimal":
+        return decimal.Decimal(text)
+    if kind == "bytes":
+        return base64.b64decode(text)
+    if kind == "uuid":
+        return uuid.UUID(text)
+    raise PageCursorError(f"Unknown key value type in cursor: {kind}")
+
+
+def encode_cursor(sql: str, params: Params, key: Sequence[str], row: Dict[str, Any]) -> str:
+    """
+    Continuation cursor after row
+
+    Raises:
+        ValueError: A key column is missing from the row or is NULL
+    """
+    missing = [column for column in key if column not in row]
+    if missing:
+        raise ValueError(f"Key column(s) {', '.join(missing)} are not in the select list of the query")
+    values = [row[column] for column in key]
+    if any(value is None for value in values):
+        raise ValueError(f"Key column(s) {', '.join(key)} contain NULL, page by unique non-null columns")
+    payload = {"v": CURSOR_VERSION, "q": _query_digest(sql, params), "k": list(key),
+               "a": [_encode_value(value) for value in values]}
+    text = json.dumps(payload, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, sql: str, params: Params) -> Tuple[List[str], List[Any]]:
+    """
+    Key columns and last key values of a cursor issued by encode_cursor for the same query
+
+    Raises:
+        PageCursorError: The cursor is malformed or belongs to another query or parameters
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        key, values = payload["k"], payload["a"]
+        valid = payload.get("v") == CURSOR_VERSION and isinstance(key, list) and isinstance(values, list) \
+            and len(key) == len(values) and key and all(isinstance(column, str) for column in key)
+    except (ValueError, TypeError, KeyError) as e:
+        raise PageCursorError(f"Malformed pagination cursor: {e}") from None
+    if not valid:
+        raise PageCursorError("Malformed pagination cursor")
+    if payload.get("q") != _query_digest(sql, params):
+        raise PageCursorError("The cursor was issued for a different query or parameters")
+    return key, [_decode_value(value) for value in values]
@@ -0,0 +1,295 @@
+"""
+Query Plan Module
+
+Turns the EXPLAIN (FORMAT JSON) output of a statement into findings an agent can act on: sequential scans,
+sorts and nodes writing temporary files are flagged, with ANALYZE also row estimates that are far off, and
+for every sequentially scanned table with a filter a candidate index is derived from the filter columns,
+equality columns first, then the ORDER BY columns when the query sorts a single table, then one range column.
+"""
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from src.utils.keyset_pagination import single_table
+from src.utils.sql_classifier import blank_literals, classify_sql, quote_identifier, strip_trailing_semicolons, \
+    unquote_identifier
+
+# Statements EXPLAIN accepts
+EXPLAINABLE_STATEMENTS = frozenset(("select", "table", "values", "update", "delete", "insert", "merge"))
+# Columns of a suggested index
+MAX_INDEX_COLUMNS = 5
+# An actual row count this many times off the estimate is flagged, when either is at least MISESTIMATE_MIN_ROWS
+MISESTIMATE_FACTOR = 10
+MISESTIMATE_MIN_ROWS = 100
+
+# Issue types
+FULL_SCAN = "full_scan"
+SORT = "sort"
+TEMPORARY_FILES = "temporary_files"
+ROW_MISESTIMATE = "row_misestimate"
+
+_PARENS_RE = re.compile(r"\([^()]*\)")
+_IDENTIFIER = r'"(?:[^"]|"")+"|[A-Za-z_][\w$]*'
+_IDENTIFIER_RE = re.compile(_IDENTIFIER)
+# Column reference with up to two qualifiers: column, table.column or schema.table.column
+_COLUMN = rf"(?:(?:{_IDENTIFIER})\s*\.\s*){{0,2}}(?:{_IDENTIFIER})"
+# Casts printed in plan conditions, (status)::text
+_CAST_RE = re.compile(r"::(?:\"(?:[^\"]|\"\")+\"|[\w.]+)(?:\s+(?:with|without)\s+time\s+zone|\s+varying|\s+precision)?"
+                      r"(?:\[\])*")
+# Parentheses around a lone column, not the arguments of a function
+_WRAPPED_COLUMN_RE = re.compile(rf"(?<![\w$\"])\(\s*({_COLUMN})\s*\)")
+_COMPARISON_RE = re.compile(rf"""
+    (?<![\w$".])(?P<left>{_COLUMN})\s*
+    (?P<op><=|>=|<>|!=|=|<|>|~~(?!\*)|\bnot\s+in\b|\bin\b|\bnot\s+between\b|\bbetween\b|\bnot\s+like\b|\blike\b
+    |\bis\s+not\s+null\b|\bis\s+null\b)
+    (?:\s*(?P<wildcard>\?%)|\s*(?P<right>{_COLUMN})(?![\w$"]|\s*[(.]))?
+""", re.I | re.X)
+_TABLE_RE = re.compile(rf"\b(?:from|join|update|into)\s+(?:only\s+)?(?P<first>{_IDENTIFIER})"
+                       rf"(?:\s*\.\s*(?P<second>{_IDENTIFIER}))?(?:\s+(?:as\s+)?(?P<alias>{_IDENTIFIER}))?", re.I)
+_ORDER_BY_RE = re.compile(r"\border\s+by\s+(?P<items>.+?)(?=\blimit\b|\boffset\b|\bfetch\b|\bfor\b|\Z)", re.I | re.S)
+_ORDER_ITEM_RE = re.compile(rf"\s*(?P<column>{_COLUMN})(?:\s+(?P<direction>asc|desc))?\s*", re.I)
+
+_EQUALITY_OPERATORS = frozenset(("=", "in", "is null"))
+_RANGE_OPERATORS = frozenset(("<", ">", "<=", ">=", "between", "like", "~~"))
+# Nodes that read all their input before returning a row
+_BLOCKING_NODES = frozenset(("Sort", "Hash", "Aggregate", "Materialize", "WindowAgg", "SetOp"))
+# Words the comparison pattern can take for a column
+_KEYWORDS = frozenset(("and", "or", "not", "null", "true", "false", "unknown", "end", "then", "else", "when", "case",
+                       "is", "in", "like", "ilike", "between", "exists", "any", "all", "some", "interval", "select",
+                       "where", "on", "having"))
+# Words that follow a table reference instead of an alias
+_NOT_ALIASES = _KEYWORDS | {"join", "inner", "left", "right", "full", "cross", "natural", "outer", "using", "group",
+                            "order", "limit", "offset", "fetch", "set", "values", "union", "intersect", "except",
+                            "for", "window", "tablesample", "returning", "default", "as"}
+
+
+@dataclass(frozen=True)
+class PlanIssue:
+    """A finding in a plan, condition is the filter of a scanned table"""
+    type: str
+    table: Optional[str]
+    rows: Optional[float]
+    detail: str
+    condition: Optional[str] = None
+    relation: Optional[str] = None
+
+
+def check_explain_query(sql: str, analyze: bool) -> str:
+    """
+    Validate that sql is one statement EXPLAIN accepts and strip its trailing semicolon
+
+    Raises:
+        ValueError: The text is not a single SELECT, INSERT, UPDATE, DELETE or MERGE, or it writes and analyze is set
+    """
+    classification = classify_sql(sql)
+    if classification.statement_count != 1 or classification.statement_type not in EXPLAINABLE_STATEMENTS:
+        raise ValueError("explain_query needs a single SELECT, INSERT, UPDATE, DELETE or MERGE statement")
+    if analyze and not classification.read_only:
+        raise ValueError("analyze executes the statement, only read-only queries can be explained with analyze")
+    return strip_trailing_semicolons(sql)
+
+
+def json_plan(rows: List[Dict[str, Any]]) -> Any:
+    """
+    Document of an EXPLAIN (FORMAT JSON) result
+
+    Raises:
+        ValueError: The result is not a JSON plan
+    """
+    if not rows or len(rows[0]) != 1:
+        raise ValueError("EXPLAIN returned no plan")
+    value = next(iter(rows[0].values()))
+    return json.loads(value) if isinstance(value, (str, bytes)) else value
+
+
+def _reference(text: str) -> List[str]:
+    return [unquote_identifier(part) for part in _IDENTIFIER_RE.findall(text)]
+
+
+def _number(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _comparisons(text: str) -> Iterator[Tuple[List[str], str]]:
+    """Column references compared in a predicate, with "equality" or "range" for the index use they allow"""
+    text = _CAST_RE.sub("", blank_literals(text))
+    previous = None
+    while previous != text:
+        previous, text = text, _WRAPPED_COLUMN_RE.sub(r" \1 ", text)
+    for match in _COMPARISON_RE.finditer(text):
+        operator = " ".join(match.group("op").lower().split())
+        if operator in _EQUALITY_OPERATORS:
+            kind = "equality"
+        elif operator in _RANGE_OPERATORS and not (operator in ("like", "~~") and match.group("wildcard")):
+            kind = "range"
+        else:
+            continue
+        for side in ("left", "right"):
+            if match.group(side):
+                reference = _reference(match.group(side))
+                if reference[-1] not in _KEYWORDS:
+                    yield reference, kind
+
+
+def _table_references(sql: str) -> Dict[str, Tuple[Optional[str], str]]:
+    """Tables named in the statement by alias and name: (schema or None, table)"""
+    tables: Dict[str, Tuple[Optional[str], str]] = {}
+    for match in _TABLE_RE.finditer(blank_literals(sql)):
+        if match.group("second"):
+            table = (unquote_identifier(match.group("first")), unquote_identifier(match.group("second")))
+        else:
+            table = (None, unquote_identifier(match.group("first")))
+        if table[1] in _NOT_ALIASES:
+            continue
+        tables.setdefault(table[1], table)
+        alias = match.group("alias")
+        if alias and unquote_identifier(alias) not in _NOT_ALIASES:
+            tables.setdefault(unquote_identifier(alias), table)
+    return tables
+
+
+def _order_by_columns(sql: str) -> List[str]:
+    """Columns of the top-level ORDER BY when it only names columns in one direction, otherwise none"""
+    text = blank_literals(sql)
+    previous = None
+    while previous != text:
+        previous, text = text, _PARENS_RE.sub(" ", text)
+    match = None
+    for match in _ORDER_BY_RE.finditer(text):
+        pass
+    if match is None:
+        return []
+    columns, directions = [], set()
+    for item in match.group("items").split(","):
+        item_match = _ORDER_ITEM_RE.fullmatch(item)
+        if item_match is None:
+            return []
+        columns.append(_reference(item_match.group("column"))[-1])
+        directions.add((item_match.group("direction") or "asc").lower())
+    return columns if len(directions) == 1 else []
+
+
+def _plan_issues(node: Dict[str, Any], join_filter: str = "", limited: bool = False) -> Iterator[PlanIssue]:
+    """
+    Issues of a plan node and its children, the Join Filter of a Nested Loop applies to its inner scan
+
+    limited is set below a Limit node up to the next node that reads all its input, scans there stop early
+    and produce fewer rows than estimated.
+    """
+    node_type = node.get("Node Type")
+    rows = _number(node.get("Plan Rows"))
+    if node_type == "Seq Scan":
+        alias, relation = node.get("Alias"), node.get("Relation Name")
+        condition = " AND ".join(part for part in (node.get("Filter"), join_filter) if part)
+        yield PlanIssue(FULL_SCAN, alias or relation, rows, f"Sequential scan of {relation}", condition, relation)
+    elif node_type == "Sort":
+        keys = ", ".join(node.get("Sort Key") or ())
+        yield PlanIssue(SORT, None, rows, f"Sorts the rows by {keys}" + (
+            f" ({node['Sort Method']})" if node.get("Sort Method") else ""))
+
+    spill = None
+    if node.get("Sort Space Type") == "Disk":
+        spill = f"{node_type} spilled {node.get('Sort Space Used')} kB to disk, raise work_mem or sort fewer rows"
+    elif (_number(node.get("Hash Batches")) or 0) > 1:
+        spill = f"{node_type} split into {node['Hash Batches']} batches on disk, raise work_mem or hash fewer rows"
+    elif (_number(node.get("Temp Written Blocks")) or 0) > 0:
+        spill = f"{node_type} wrote {node['Temp Written Blocks']} temporary file blocks"
+    if spill:
+        yield PlanIssue(TEMPORARY_FILES, node.get("Alias"), rows, spill)
+
+    actual = _number(node.get("Actual Rows"))
+    # Statistics are kept per table, so only scans are compared. A scan that never ran (Actual Loops 0) has no count
+    if node.get("Relation Name") and not limited and node.get("Actual Loops") and actual is not None \
+            and rows is not None and max(actual, rows) >= MISESTIMATE_MIN_ROWS \
+            and max(actual, rows) >= MISESTIMATE_FACTOR * max(min(actual, rows), 1):
+        yield PlanIssue(ROW_MISESTIMATE, node.get("Alias"), rows, f"{node_type} estimated {rows:.0f} rows per loop, "
+                        f"produced {actual:.0f}, run ANALYZE on {node['Relation Name']}")
+
+    inner_filter = node.get("Join Filter", "") if node_type == "Nested Loop" else ""
+    if node_type == "Limit":
+        limited = True
+    elif node_type in _BLOCKING_NODES:
+        limited = False
+    children = node.get("Plans") or ()
+    for i, child in enumerate(children):
+        yield from _plan_issues(child, inner_filter if i == len(children) - 1 else "", limited)
+
+
+def suggest_indexes(sql: str, issues: List[PlanIssue]) -> List[Dict[str, Any]]:
+    """
+    Candidate indexes for the tables read by sequential scans with a filter
+
+    Returns:
+        List[Dict[str, Any]]: table, columns, reason and the CREATE INDEX statement of each candidate
+    """
+    tables = _table_references(sql)
+    single = single_table(sql)
+    sorts = any(issue.type == SORT for issue in issues)
+    order_columns = _order_by_columns(sql) if single is not None and sorts else []
+    candidates: Dict[Tuple[Optional[str], str], Dict[str, List[str]]] = {}
+    for issue in issues:
+        if issue.type != FULL_SCAN or not issue.relation:
+            continue
+        schema, table = tables.get(issue.relation, (None, issue.relation))
+        if issue.table and issue.table in tables:
+            schema = tables[issue.table][0]
+        names = {issue.table, issue.relation}
+        candidate = candidates.setdefault((schema, table), {"equality": [], "order": [], "range": []})
+        for reference, kind in _comparisons(issue.condition or ""):
+            qualifier = reference[-2] if len(reference) > 1 else None
+            if (qualifier is None or qualifier in names) and reference[-1] not in candidate[kind]:
+                candidate[kind].append(reference[-1])
+        if single is not None and single[1] == table:
+            candidate["order"] = order_columns
+
+    suggestions = []
+    for (schema, table), candidate in candidates.items():
+        columns = list(candidate["equality"])
+        reason = [f"equality on {', '.join(columns)}"] if columns else []
+        order = [column for column in candidate["order"] if column not in columns]
+        if order:
+            columns += order
+            reason.append(f"ORDER BY {', '.join(order)}")
+        # A range ends the usable prefix of the index, the ORDER BY columns must come first
+        range_column = next((column for column in candidate["range"] if column not in columns), None)
+        if range_column:
+            columns.append(range_column)
+            reason.append(f"range on {range_column}")
+        if not columns:
+            continue
+        columns = columns[:MAX_INDEX_COLUMNS]
+        relation = f"{quote_identifier(schema)}.{quote_identifier(table)}" if schema else quote_identifier(table)
+        suggestions.append({
+            "table": f"{schema}.{table}" if schema else table,
+            "columns": columns,
+            "reason": "; ".join(reason),
+            "ddl": f"CREATE INDEX ON {relation} ({', '.join(quote_identifier(column) for column in columns)})"
+        })
+    return suggestions
+
+
+def analyze_plan(sql: str, plan: Any, analyzed: bool) -> Dict[str, Any]:
+    """
+    Flagged issues and candidate indexes of a plan
+
+    Args:
+        sql (str): The explained statement
+        plan: The EXPLAIN (FORMAT JSON) document
+        analyzed (bool): The plan was produced with ANALYZE and carries actual row counts
+
+    Returns:
+        Dict[str, Any]: format, analyzed, plan, issues and index_suggestions
+    """
+    issues = list(_plan_issues(plan[0]["Plan"]))
+    return {
+        "format": "json",
+        "analyzed": analyzed,
+        "plan": plan,
+        "issues": [{"type": issue.type, "table": issue.table, "estimated_rows": issue.rows, "detail": issue.detail}
+                   for issue in issues],
+        "index_suggestions": suggest_indexes(sql, issues)
+    }
@@ -1,5 +1,8 @@
 from src.utils.db_config import load_activate_redis_config
+from src.utils.db_session import current_instance_id
+from src.utils.db_metrics import render_prometheus
 from src.utils.db_operate import execute_command
+from src.utils.db_pool import collect_pool_stats, get_redis_pool
 from src.utils.logger_util import logger
 
 
@@ -27,7 +30,7 @@ async def get_connection_status() -> dict:
 
 async def generate_database_config():
 
-    active_redis, redis_config = load_activate_redis_config()
+    active_redis, redis_config = load_activate_redis_config(current_instance_id.get())
 
     # Hide sensitive information
     safe_config = {
@@ -44,4 +47,17 @@ async def generate_database_config():
     }
     logger.info("Successfully retrieved Redis configuration information")
     logger.info(f"Redis configuration: {safe_config}")
-    return safe_config
\ No newline at end of file
+    return safe_config
+
+
+async def generate_pool_stats():
+    """Get Redis connection pool metrics"""
+    pool = await get_redis_pool()
+    pool_stats = {"pools": [pool.stats()]}
+    logger.debug(f"Redis connection pool statistics: {pool_stats}")
+    return pool_stats
+
+
+def generate_prometheus_metrics() -> str:
+    """Render Redis connection pool metrics in Prometheus text format"""
+    return render_prometheus(collect_pool_stats())
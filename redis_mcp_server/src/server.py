@@ -6,8 +6,19 @@ Main entry point for Redis MCP Client server.
 """
 import os
 import sys
-from fastmcp import FastMCP
-from src.resources.db_resources import generate_database_config, get_connection_status
+from contextlib import asynccontextmanager
+from fastmcp import Context, FastMCP
+from fastmcp.server.middleware import Middleware, MiddlewareContext
+from starlette.requests import Request
+from starlette.responses import Response
+from src.resources.db_resources import generate_database_config, get_connection_status, generate_pool_stats, \
+    generate_prometheus_metrics
+from src.utils.db_metrics import PROMETHEUS_CONTENT_TYPE, start_metrics_server
+from src.utils.tracing import configure_tracing, start_span, tracer
+from src.utils.runtime_monitor import configure_runtime_monitor, runtime_monitor
+from src.utils.db_config import config_watcher
+from src.utils.db_session import current_instance_id, session_registry
+from src.utils import http_workers
 from src.tools.db_tool import generate_test_data, get_redis_server_info, get_redis_memory_info, get_redis_clients_info, \
     get_redis_stats_info, get_database_info, get_keys_sample, get_key_types_distribution, get_config_info
 from src.utils.db_operate import execute_command
@@ -15,10 +26,35 @@ from src.utils.db_operate import execute_command
 project_path=os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 # Add current directory to Python module search path
 sys.path.insert(0,project_path)
-from src.utils.logger_util import logger, db_config_path
+from src.utils.logger_util import logger, db_config_path, log_logging_config, sample_query_log
 from src.utils import load_activate_redis_config
+
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    """Start the runtime monitor and the configuration file watcher on the server's event loop"""
+    log_logging_config()
+    runtime_monitor.start()
+    config_watcher.start()
+    yield {}
+
 # Create global MCP server instance
-mcp = FastMCP("Redis MCP Client Server")
+mcp = FastMCP("Redis MCP Client Server", lifespan=lifespan)
+
+
+class SessionInstanceMiddleware(Middleware):
+    """Makes the Redis instance selected by the calling session current while its request is handled"""
+
+    async def on_request(self, context: MiddlewareContext, call_next):
+        fastmcp_context = context.fastmcp_context
+        session_id = fastmcp_context.session_id if fastmcp_context is not None else None
+        token = current_instance_id.set(session_registry.selected(session_id))
+        try:
+            return await call_next(context)
+        finally:
+            current_instance_id.reset(token)
+
+
+mcp.add_middleware(SessionInstanceMiddleware())
 
 
 @mcp.tool()
@@ -41,14 +77,20 @@ async def redis_exec(command: str, args: list = None):
     if args is None:
         args = []
 
-    logger.info(f"Executing Redis command: {command} {args}")
-    try:
-        result = await execute_command(command, *args)
-        logger.info(f"Redis command executed successfully")
-        return {"success": True, "result": result}
-    except Exception as e:
-        logger.error(f"Redis command execution failed: {e}")
-        return {"success": False, "error": str(e)}
+    # Per-command INFO lines are sampled (logSampleRate) and formatted only when a sink accepts them
+    sampled = sample_query_log()
+    if sampled:
+        logger.info("Executing Redis command: {} {}", command, args)
+    with start_span("mcp.tool redis_exec", {"mcp.tool.name": "redis_exec"}) as span:
+        try:
+            result = await execute_command(command, *args)
+            if sampled:
+                logger.info("Redis command executed successfully")
+            return {"success": True, "result": result}
+        except Exception as e:
+            logger.error(f"Redis command execution failed: {e}")
+            span.record_error(e)
+            return {"success": False, "error": str(e)}
 
 
 @mcp.tool()
@@ -66,13 +108,15 @@ async def gen_test_data(table: str, columns: list, num: int = 10):
     """
     logger.info(f"Generating {num} test data records for table {table}, fields: {columns}")
 
-    try:
-        await generate_test_data(table, columns, num)
-        logger.info(f"Successfully generated {num} data records for {table}")
-        return {"success": True, "msg": f"Generated {num} rows for {table}"}
-    except Exception as e:
-        logger.error(f"Failed to generate test data: {e}")
-        return {"success": False, "error": str(e)}
+    with start_span("mcp.tool gen_test_data", {"mcp.tool.name": "gen_test_data"}) as span:
+        try:
+            await generate_test_data(table, columns, num)
+            logger.info(f"Successfully generated {num} data records for {table}")
+            return {"success": True, "msg": f"Generated {num} rows for {table}"}
+        except Exception as e:
+            logger.error(f"Failed to generate test data: {e}")
+            span.record_error(e)
+            return {"success": False, "error": str(e)}
 
 
 # ==================== Redis Resource Information ====================
@@ -123,6 +167,46 @@ async def get_database_status_resource():
         }
 
 
+@mcp.resource("database://pool_stats")
+async def get_pool_stats_resource():
+    """
+    Get Redis connection pool statistics: size, in-use, idle, waiters, acquire latency histogram,
+    connection ages and errors by type, used to size redisMaxConnections for real traffic
+    """
+    logger.info("Getting Redis connection pool statistics")
+
+    try:
+        pool_stats = await generate_pool_stats()
+        return {
+            "uri": "database://pool_stats",
+            "mimeType": "application/json",
+            "text": str(pool_stats)
+        }
+    except Exception as e:
+        logger.error(f"Failed to get connection pool statistics: {e}")
+        return {
+            "uri": "database://pool_stats",
+            "mimeType": "application/json",
+            "text": f'{{"error": "{str(e)}"}}'
+        }
+
+
+@mcp.resource("database://traces")
+async def get_traces_resource():
+    """
+    Get the 20 most recent request traces, newest first. Each trace is split into spans for the MCP tool
+    handler, pool acquire and command round trips, in the OpenTelemetry (OTLP JSON) span shape.
+    Enabled with "traceExporter": "memory" or "stderr" in dbconfig.json
+    """
+    logger.info("Getting recent request traces")
+
+    return {
+        "uri": "database://traces",
+        "mimeType": "application/json",
+        "text": str(tracer.recent_traces())
+    }
+
+
 # ==================== Redis Information Retrieval Tools ====================
 
 @mcp.tool()
@@ -279,24 +363,67 @@ async def get_redis_overview():
     """
     logger.info("Getting Redis complete overview information")
 
+    with start_span("mcp.tool get_redis_overview", {"mcp.tool.name": "get_redis_overview"}) as span:
+        try:
+            overview = {}
+
+            # Get all information
+            overview['server'] = await get_redis_server_info()
+            overview['memory'] = await get_redis_memory_info()
+            overview['clients'] = await get_redis_clients_info()
+            overview['stats'] = await get_redis_stats_info()
+            overview['database'] = await get_database_info()
+            overview['keys_sample'] = await get_keys_sample()
+            overview['key_types'] = await get_key_types_distribution()
+            overview['config'] = await get_config_info()
+
+            return {"success": True, "data": overview}
+        except Exception as e:
+            logger.error(f"Failed to get Redis overview information: {e}")
+            span.record_error(e)
+            return {"success": False, "error": str(e)}
+
+
+@mcp.tool()
+async def runtime_stats():
+    """
+    Get event loop lag, stalls and slow callbacks of this server
+
+    Returns:
+        dict: Dictionary containing loop lag percentiles, stacks captured while the event loop was blocked
+        and callbacks slower than slowCallbackMs
+    """
+    logger.info("Getting runtime statistics")
+    return {"success": True, "data": runtime_monitor.stats()}
+
+
+@mcp.tool()
+async def use_instance(ctx: Context, redis_instance_id: str = None):
+    """
+    Select the Redis instance used by the calling MCP session
+
+    Over HTTP many clients share one server, each session keeps its own selection.
+
+    Args:
+        redis_instance_id: redisInstanceId of an instance with dbActive true, omit for the first active instance
+
+    Returns:
+        dict: Dictionary containing the selected instance id, address and database
+    """
+    logger.info(f"Selecting Redis instance: {redis_instance_id or 'default'}")
+    if http_workers.worker_index is not None:
+        return {"success": False, "error": "Instance selection is not available with httpWorkers > 1, "
+                "the requests of a session can reach any worker"}
     try:
-        overview = {}
-
-        # Get all information
-        overview['server'] = await get_redis_server_info()
-        overview['memory'] = await get_redis_memory_info()
-        overview['clients'] = await get_redis_clients_info()
-        overview['stats'] = await get_redis_stats_info()
-        overview['database'] = await get_database_info()
-        overview['keys_sample'] = await get_keys_sample()
-        overview['key_types'] = await get_key_types_distribution()
-        overview['config'] = await get_config_info()
-
-        return {"success": True, "data": overview}
-    except Exception as e:
-        logger.error(f"Failed to get Redis overview information: {e}")
+        redis_instance = session_registry.select(ctx.session_id, redis_instance_id)
+    except ValueError as e:
         return {"success": False, "error": str(e)}
-
+    return {"success": True, "data": {
+        "redis_instance_id": redis_instance.redis_instance_id,
+        "redis_host": redis_instance.redis_host,
+        "redis_port": redis_instance.redis_port,
+        "redis_database": redis_instance.redis_database,
+    }}
 
 @mcp.tool()
 async def delete_key(key: str):
@@ -438,6 +565,11 @@ async def delete_keys_by_pattern(pattern: str, limit: int = 500):
         logger.error(f"Failed to delete keys by pattern '{pattern}': {e}")
         return {"success": False, "error": str(e), "pattern": pattern}
 
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_endpoint(request: Request) -> Response:
+    """Prometheus metrics on the MCP HTTP port when transport is http or sse"""
+    return Response(generate_prometheus_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 # ==================== Server Startup Related ====================
 
 # When using fastmcp run, FastMCP CLI automatically handles server startup
@@ -451,8 +583,31 @@ def main():
 
     active_db, db_config = load_activate_redis_config()
     logger.info(f"Current database instance configuration: {active_db}")
-    # When using fastmcp run, just call mcp.run() directly
-    mcp.run(transport='stdio')
+    configure_tracing(db_config.trace_exporter)
+    configure_runtime_monitor(db_config.loop_monitor_interval_ms, db_config.loop_stall_threshold_ms,
+                              db_config.slow_callback_ms)
+    multi_worker = db_config.transport != "stdio" and int(db_config.http_workers) > 1
+    if multi_worker and db_config.redis_metrics_port:
+        logger.warning("redisMetricsPort is ignored with httpWorkers > 1, every worker serves its own /metrics on the HTTP port")
+    elif db_config.redis_metrics_port:
+        start_metrics_server(db_config.redis_metrics_host, int(db_config.redis_metrics_port), generate_prometheus_metrics)
+    if db_config.transport == "stdio":
+        # When using fastmcp run, just call mcp.run() directly
+        mcp.run(transport='stdio')
+        return
+
+    if multi_worker:
+        sys.exit(http_workers.serve_http_workers(mcp, db_config))
+
+    # One long-lived server for many MCP clients, all sessions share the connection pools
+    uvicorn_config = {"timeout_keep_alive": int(db_config.http_keep_alive_timeout)}
+    if db_config.http_limit_concurrency:
+        uvicorn_config["limit_concurrency"] = int(db_config.http_limit_concurrency)
+    transport_kwargs = {"host": db_config.http_host, "port": int(db_config.http_port), "uvicorn_config": uvicorn_config}
+    if db_config.http_path:
+        transport_kwargs["path"] = db_config.http_path
+    logger.info(f"Serving MCP over {db_config.transport} on {db_config.http_host}:{db_config.http_port}")
+    mcp.run(transport=db_config.transport, **transport_kwargs)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,43 @@
+"""
+Instrumented Connection Pool Module
+
+redis.asyncio connection pool that feeds PoolMetrics. Kept apart from db_pool so redis.asyncio
+is only imported when the first pool is created.
+"""
+import redis.asyncio as redis
+from src.utils.db_metrics import PoolMetrics
+from src.utils.tracing import start_span
+
+
+class InstrumentedConnectionPool(redis.ConnectionPool):
+    """Redis connection pool that records acquire latency and connection ages into PoolMetrics"""
+
+    def __init__(self, metrics: PoolMetrics, **kwargs):
+        super().__init__(**kwargs)
+        self.metrics = metrics
+
+    async def get_connection(self, *args, **kwargs):
+        with start_span("db.pool.acquire", {"db.pool.name": self.metrics.name,
+                                            "db.pool.waiters": self.metrics.waiters}):
+            started = self.metrics.acquire_started()
+            try:
+                connection = await super().get_connection(*args, **kwargs)
+            except BaseException:
+                # Command errors, including failed connects, are counted once by execute_command
+                self.metrics.acquire_failed(started)
+                raise
+            self.metrics.acquire_finished(started, id(connection), self.connection_count())
+        return connection
+
+    def connection_count(self) -> int:
+        """Connections currently held by the pool"""
+        return len(self._available_connections) + len(self._in_use_connections)
+
+    def stats(self) -> dict:
+        """Get pool state and metrics"""
+        return self.metrics.snapshot({
+            "size": self.connection_count(),
+            "in_use": len(self._in_use_connections),
+            "idle": len(self._available_connections),
+            "max_size": self.max_connections,
+        })
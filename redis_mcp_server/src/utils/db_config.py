@@ -4,14 +4,66 @@ Database Configuration Module
 Uses singleton pattern to handle database configuration loading and management.
 """
 
+import asyncio
 import json
 import os
+import threading
+import time
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple
-from .logger_util import logger, db_config_path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from . import logger_util
+from .logger_util import logger, db_config_path, read_config_file
 
 
-@dataclass
+# Index of this process and number of worker processes sharing the connection budget, see set_worker_share
+_worker_share: Tuple[int, int] = (0, 1)
+
+
+def set_worker_share(worker_index: int, workers: int):
+    """
+    Give this worker process its share of redisPoolSize and redisMaxConnections and reload the configuration
+
+    Must run before the first pool of the process is created, later reloads keep the share.
+
+    Args:
+        worker_index (int): Index of this worker, 0 to workers - 1
+        workers (int): Number of worker processes
+    """
+    global _worker_share
+    _worker_share = (worker_index, workers)
+    DatabaseConfigLoader().reload()
+
+
+def _share(total: int, worker_index: int, workers: int) -> int:
+    """Split total across workers, the first total % workers workers get one more"""
+    return total // workers + (1 if worker_index < total % workers else 0)
+
+
+def worker_pool_limits(pool_size: int, max_overflow: int) -> Tuple[int, int]:
+    """
+    Pool limits of this process, the configured limits divided across the worker processes
+
+    The shares of all workers add up to the configured limits, so the processes together never open more
+    connections than one process would. Every worker gets at least one connection: startup rejects more workers
+    than connections, but after a reload that lowers the limits below the number of workers, the workers left
+    without a share still open one connection each.
+
+    Args:
+        pool_size (int): Configured redisPoolSize
+        max_overflow (int): Connections allowed beyond the pool size, redisMaxConnections - redisPoolSize
+
+    Returns:
+        Tuple[int, int]: Pool size and connections beyond it of this process
+    """
+    worker_index, workers = _worker_share
+    if workers <= 1:
+        return int(pool_size), int(max_overflow)
+    capacity = max(_share(int(pool_size) + int(max_overflow), worker_index, workers), 1)
+    size = min(_share(int(pool_size), worker_index, workers), capacity)
+    return size, capacity - size
+
+
+@dataclass(frozen=True)
 class RedisInstance:
     """Redis instance configuration"""
     redis_instance_id: str
@@ -25,7 +77,7 @@ class RedisInstance:
     redis_decode_responses: bool = True
 
 
-@dataclass
+@dataclass(frozen=True)
 class DatabaseConfig:
     """Database configuration, including connection pool settings and Redis instance list"""
     redis_encoding: str
@@ -35,7 +87,36 @@ class DatabaseConfig:
     socket_timeout: int
     retry_on_timeout: bool
     health_check_interval: int
-    redis_instances_list: List[RedisInstance]
+    redis_instances_list: Tuple[RedisInstance, ...]
+    redis_metrics_port: int = 0
+    redis_metrics_host: str = "127.0.0.1"
+    trace_exporter: str = "none"
+    loop_monitor_interval_ms: int = 100
+    loop_stall_threshold_ms: int = 200
+    slow_callback_ms: int = 0
+    config_reload_interval: float = 5
+    transport: str = "stdio"
+    http_host: str = "127.0.0.1"
+    http_port: int = 8000
+    http_path: str = ""
+    http_limit_concurrency: int = 0
+    http_keep_alive_timeout: int = 5
+    http_workers: int = 1
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """One parsed version of the configuration file, replaced as a whole when the file changes"""
+    config: DatabaseConfig
+    active_redis: Optional[RedisInstance]
+    mtime_ns: int
+
+    def get_instance(self, redis_instance_id: str) -> Optional[RedisInstance]:
+        """Active (dbActive) instance with this id, None when it is not configured or not active"""
+        for redis in self.config.redis_instances_list:
+            if redis.redis_instance_id == redis_instance_id and redis.redis_active:
+                return redis
+        return None
 
 
 class DatabaseConfigLoader:
@@ -61,13 +142,14 @@ class DatabaseConfigLoader:
         """
         if not self._initialized:
             self.config_json_file = db_config_path
-            self._config: Optional[DatabaseConfig] = None
+            self._snapshot: Optional[ConfigSnapshot] = None
+            self._failed_mtime_ns = 0
             self._initialized = True
             logger.debug(f"Database configuration loader initialized, configuration file: {self.config_json_file}")
 
     def load_config(self) -> DatabaseConfig:
         """
-        Load database configuration from JSON file
+        Load database configuration from JSON file and make it the current snapshot
 
         Returns:
             DatabaseConfig: Loaded configuration object
@@ -83,8 +165,7 @@ class DatabaseConfigLoader:
             raise FileNotFoundError(error_msg)
 
         try:
-            with open(self.config_json_file, 'r', encoding='utf-8') as f:
-                config_data = json.load(f)
+            config_data, mtime_ns = self._read_config_file()
             logger.debug(f"Successfully read database configuration file: {self.config_json_file}")
         except json.JSONDecodeError as e:
             error_msg = f"Database configuration file JSON format error: {e}"
@@ -127,20 +208,73 @@ class DatabaseConfigLoader:
             logger.debug(
                 f"Parsed Redis instance: {redis_instance.redis_instance_id} ({redis_instance.redis_host}:{redis_instance.redis_port})")
 
+        # Each worker process gets its share of the connection budget
+        pool_size, max_overflow = worker_pool_limits(
+            config_data['redisPoolSize'], config_data['redisMaxConnections'] - config_data['redisPoolSize'])
+
         # Create configuration object
-        self._config = DatabaseConfig(
+        config = DatabaseConfig(
             redis_encoding=config_data.get('redisEncoding', 'utf-8'),
-            redis_pool_size=config_data['redisPoolSize'],
-            redis_max_connections=config_data['redisMaxConnections'],
+            redis_pool_size=pool_size,
+            redis_max_connections=pool_size + max_overflow,
             redis_connection_timeout=config_data['redisConnectionTimeout'],
             socket_timeout=config_data.get('socketTimeout', 30),
             retry_on_timeout=config_data.get('retryOnTimeout', True),
             health_check_interval=config_data.get('healthCheckInterval', 30),
-            redis_instances_list=redis_instances
+            redis_instances_list=tuple(redis_instances),
+            redis_metrics_port=config_data.get('redisMetricsPort', 0),
+            redis_metrics_host=config_data.get('redisMetricsHost', "127.0.0.1"),
+            trace_exporter=config_data.get('traceExporter', "none"),
+            loop_monitor_interval_ms=config_data.get('loopMonitorIntervalMs', 100),
+            loop_stall_threshold_ms=config_data.get('loopStallThresholdMs', 200),
+            slow_callback_ms=config_data.get('slowCallbackMs', 0),
+            config_reload_interval=config_data.get('configReloadInterval', 5),
+            transport=config_data.get('transport', "stdio"),
+            http_host=config_data.get('httpHost', "127.0.0.1"),
+            http_port=config_data.get('httpPort', 8000),
+            http_path=config_data.get('httpPath', ""),
+            http_limit_concurrency=config_data.get('httpLimitConcurrency', 0),
+            http_keep_alive_timeout=config_data.get('httpKeepAliveTimeout', 5),
+            http_workers=config_data.get('httpWorkers', 1)
         )
 
+        active_redis = next((redis for redis in redis_instances if redis.redis_active), None)
+        if active_redis is None:
+            logger.warning("No active Redis instance found")
+        else:
+            logger.info(f"Found first active Redis instance: {active_redis.redis_instance_id}")
+        # A single reference assignment, readers see either the old or the new snapshot
+        self._snapshot = ConfigSnapshot(config, active_redis, mtime_ns)
         logger.debug(f"Database configuration loading completed, {len(redis_instances)} Redis instances in total")
-        return self._config
+        return config
+
+    def _read_config_file(self) -> Tuple[Dict[str, Any], int]:
+        """Parse the configuration file, reusing the parse done for the log settings while the file is unchanged"""
+        mtime_ns = os.stat(self.config_json_file).st_mtime_ns
+        if logger_util.config_file_data is not None and mtime_ns == logger_util.config_file_mtime_ns:
+            return logger_util.config_file_data, mtime_ns
+        return read_config_file(self.config_json_file)
+
+    def reload(self) -> ConfigSnapshot:
+        """
+        Read the configuration file again and make it the current snapshot
+
+        Returns:
+            ConfigSnapshot: The new snapshot
+        """
+        self.load_config()
+        return self._snapshot
+
+    def get_snapshot(self) -> ConfigSnapshot:
+        """
+        Get the current configuration snapshot, automatically load if not loaded
+
+        Returns:
+            ConfigSnapshot: Configuration and active Redis instance, never re-read from disk
+        """
+        if self._snapshot is None:
+            self.reload()
+        return self._snapshot
 
     def get_config(self) -> DatabaseConfig:
         """
@@ -149,9 +283,7 @@ class DatabaseConfigLoader:
         Returns:
             DatabaseConfig: Configuration object
         """
-        if self._config is None:
-            return self.load_config()
-        return self._config
+        return self.get_snapshot().config
 
     def get_active_redis(self) -> Optional[RedisInstance]:
         """
@@ -160,13 +292,86 @@ class DatabaseConfigLoader:
         Returns:
             Optional[RedisInstance]: First active Redis instance, return None if no active instance
         """
-        config = self.get_config()
-        for redis in config.redis_instances_list:
-            if redis.redis_active:
-                logger.info(f"Found first active Redis instance: {redis.redis_instance_id}")
-                return redis
-        logger.warning("No active Redis instance found")
-        return None
+        return self.get_snapshot().active_redis
+
+    def reload_if_changed(self) -> Optional[Tuple[ConfigSnapshot, ConfigSnapshot]]:
+        """
+        Load the configuration file again when its modification time changed
+
+        An invalid file is logged once and the current snapshot stays in use.
+
+        Returns:
+            Optional[Tuple[ConfigSnapshot, ConfigSnapshot]]: Old and new snapshot, None when nothing changed
+        """
+        old = self.get_snapshot()
+        try:
+            mtime_ns = os.stat(self.config_json_file).st_mtime_ns
+        except OSError:
+            return None
+        if mtime_ns in (old.mtime_ns, self._failed_mtime_ns):
+            return None
+
+        try:
+            self.reload()
+        except Exception as e:
+            self._failed_mtime_ns = mtime_ns
+            logger.error(f"Configuration file changed but could not be loaded, keeping the current configuration: {e}")
+            return None
+        logger.info(f"Configuration file reloaded: {self.config_json_file}")
+        return old, self._snapshot
+
+
+ConfigListener = Callable[[ConfigSnapshot, ConfigSnapshot], Awaitable[None]]
+
+
+class ConfigWatcher:
+    """Polls the configuration file modification time and swaps in a new snapshot when it changes"""
+
+    def __init__(self):
+        self._listeners: List[ConfigListener] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def add_listener(self, listener: ConfigListener):
+        """
+        Register a coroutine function called on the event loop with the old and new snapshot after each reload
+
+        Args:
+            listener (ConfigListener): Coroutine function taking (old, new)
+        """
+        self._listeners.append(listener)
+
+    def start(self):
+        """Start polling from a background thread, a no-op when already watching the running event loop"""
+        loop = asyncio.get_running_loop()
+        interval = float(DatabaseConfigLoader().get_config().config_reload_interval)
+        if interval <= 0 or self._loop is loop:
+            return
+        self._loop = loop
+        # File reads and JSON parsing stay off the event loop
+        threading.Thread(target=self._watch, args=(loop, interval), name="config-watcher", daemon=True).start()
+        logger.info(f"Configuration watcher started, polling every {interval}s")
+
+    def _watch(self, loop: asyncio.AbstractEventLoop, interval: float):
+        loader = DatabaseConfigLoader()
+        while True:
+            time.sleep(interval)
+            if loop.is_closed():
+                return
+            change = loader.reload_if_changed()
+            if change is None:
+                continue
+            for listener in self._listeners:
+                asyncio.run_coroutine_threadsafe(self._notify(listener, *change), loop)
+
+    @staticmethod
+    async def _notify(listener: ConfigListener, old: ConfigSnapshot, new: ConfigSnapshot):
+        try:
+            await listener(old, new)
+        except Exception as e:
+            logger.error(f"Failed to apply configuration change in {getattr(listener, '__qualname__', listener)}: {e}")
+
+
+config_watcher = ConfigWatcher()
 
 
 def load_db_config() -> DatabaseConfig:
@@ -177,22 +382,28 @@ def load_db_config() -> DatabaseConfig:
         DatabaseConfig: Loaded configuration object
     """
     loader = DatabaseConfigLoader()
-    return loader.load_config()
+    return loader.get_config()
 
 
-def load_active_redis_config() -> tuple[RedisInstance, DatabaseConfig]:
+def load_active_redis_config(redis_instance_id: Optional[str] = None) -> tuple[RedisInstance, DatabaseConfig]:
     """
     Convenience function to load database configuration and active Redis instance
 
+    Args:
+        redis_instance_id (str, optional): Instance selected by the session, None for the first active instance
+
     Returns:
         tuple[RedisInstance, DatabaseConfig]: Tuple of active Redis instance and configuration object
     """
-    loader = DatabaseConfigLoader()
-    config = loader.get_config()
-    active_redis = loader.get_active_redis()
-    if active_redis is None:
+    snapshot = DatabaseConfigLoader().get_snapshot()
+    if redis_instance_id is not None:
+        redis_instance = snapshot.get_instance(redis_instance_id)
+        if redis_instance is None:
+            raise ValueError(f"Redis instance '{redis_instance_id}' is not configured or not active")
+        return redis_instance, snapshot.config
+    if snapshot.active_redis is None:
         raise ValueError("No active Redis instance found")
-    return active_redis, config
+    return snapshot.active_redis, snapshot.config
 
 
 # For backward compatibility, keep original function names
@@ -206,14 +417,17 @@ def load_redis_config() -> DatabaseConfig:
     return load_db_config()
 
 
-def load_activate_redis_config() -> tuple[RedisInstance, DatabaseConfig]:
+def load_activate_redis_config(redis_instance_id: Optional[str] = None) -> tuple[RedisInstance, DatabaseConfig]:
     """
     Convenience function to load Redis configuration and active Redis instance (backward compatible)
 
+    Args:
+        redis_instance_id (str, optional): Instance selected by the session, None for the first active instance
+
     Returns:
         tuple[RedisInstance, DatabaseConfig]: Tuple of active Redis instance and configuration object
     """
-    return load_active_redis_config()
+    return load_active_redis_config(redis_instance_id)
 
 
 # Example usage
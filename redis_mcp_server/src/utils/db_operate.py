@@ -4,8 +4,11 @@ Database Operations Module
 Provides database operation functions with HTTP proxy support.
 """
 
+import shlex
+
 from src.utils.db_pool import get_redis_pool
-from src.utils.logger_util import logger
+from src.utils.logger_util import logger, sample_query_log
+from src.utils.tracing import start_span
 from typing import Any, Dict, List, Optional, Union, Tuple
 
 async def get_redis_connection():
@@ -29,6 +32,12 @@ async def get_redis_status():
         raise
 
 
+def _truncate(value: Any, limit: int = 200) -> str:
+    """Render a value for the log, cut to limit characters"""
+    text = str(value)
+    return text[:limit] + ('...' if len(text) > limit else '')
+
+
 async def execute_command(command: str, *args, **kwargs) -> Any:
     """
     Execute any Redis command (async version, using connection pool)
@@ -82,10 +91,20 @@ async def execute_command(command: str, *args, **kwargs) -> Any:
         await execute_command('INFO')
         await execute_command('PING')
     """
-    logger.debug(f"Preparing to execute Redis command: {command} {args} {kwargs}")
+    logger.debug("Preparing to execute Redis command: {} {} {}", command, args, kwargs)
+
+    # The span covers pool acquire (child span) and the command round trip
+    with start_span("db.execute", {"db.system": "redis", "db.operation": command.upper()}):
+        return await _execute_command(command, *args, **kwargs)
 
+
+async def _execute_command(command: str, *args, **kwargs) -> Any:
+    """Run one Redis command through the client method of the same name, or the raw execute_command"""
+    pool = None
+    redis_client = None
     try:
-        redis_client = await get_redis_connection()
+        pool = await get_redis_pool()
+        redis_client = await pool.get_redis()
 
         # Convert command name to lowercase
         command_lower = command.lower()
@@ -102,12 +121,13 @@ async def execute_command(command: str, *args, **kwargs) -> Any:
                 # Only positional arguments
                 result = await cmd_method(*args)
 
-            logger.debug(f"Redis command executed successfully, return type: {type(result)}")
+            logger.debug("Redis command executed successfully, return type: {}", type(result))
 
-            # Log successfully executed command (truncate long parameters to avoid overly long logs)
-            args_str = str(args)[:200] + ('...' if len(str(args)) > 200 else '')
-            kwargs_str = str(kwargs)[:200] + ('...' if len(str(kwargs)) > 200 else '')
-            logger.info(f"Redis command executed successfully: {command} {args_str} {kwargs_str}")
+            # Log successfully executed command (truncate long parameters to avoid overly long logs),
+            # sampled by logSampleRate and only formatted when a sink accepts the line
+            if sample_query_log():
+                logger.opt(lazy=True).info("Redis command executed successfully: {} {} {}",
+                                           lambda: command, lambda: _truncate(args), lambda: _truncate(kwargs))
 
             return result
 
@@ -116,7 +136,9 @@ async def execute_command(command: str, *args, **kwargs) -> Any:
             try:
                 # Use Redis native execute_command method
                 result = await redis_client.execute_command(command.upper(), *args)
-                logger.info(f"Redis command executed successfully via execute_command: {command} {args}")
+                if sample_query_log():
+                    logger.opt(lazy=True).info("Redis command executed successfully via execute_command: {} {}",
+                                               lambda: command, lambda: _truncate(args))
                 return result
             except Exception as e:
                 logger.error(f"Unsupported Redis command: {command}, error: {e}")
@@ -124,6 +146,9 @@ async def execute_command(command: str, *args, **kwargs) -> Any:
 
     except Exception as e:
         logger.error(f"Redis command execution failed: {command} {args} {kwargs}, error: {e}")
+        if redis_client is not None:
+            # Pool creation failures are already counted by the pool
+            pool.metrics.record_error(e)
         raise
 
 
@@ -147,7 +172,6 @@ async def execute_raw_command(command_string: str) -> Any:
 
     try:
         # Simple command string parsing (handle quotes)
-        import shlex
         parts = shlex.split(command_string.strip())
         if not parts:
             raise ValueError("Command string cannot be empty")
@@ -204,7 +228,9 @@ async def execute_pipeline_commands(commands: List[Tuple[str, tuple, dict]]) ->
                 pipe.execute_command(command.upper(), *args)
 
         # Execute pipeline
-        results = await pipe.execute()
+        with start_span("db.execute", {"db.system": "redis", "db.operation": "PIPELINE",
+                                       "db.redis.pipeline_length": len(commands)}):
+            results = await pipe.execute()
 
         logger.info(f"Pipeline commands executed successfully, {len(commands)} commands in total")
         return results
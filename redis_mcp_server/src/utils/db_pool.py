@@ -3,38 +3,83 @@ Database Connection Pool Management Module
 Provides asynchronous MySQL connection pool functionality
 """
 import asyncio
+from typing import TYPE_CHECKING, Dict, Optional
 
-import redis.asyncio as redis
 from src.utils.logger_util import logger
-from src.utils.db_config import load_activate_redis_config
+from src.utils.db_config import ConfigSnapshot, DatabaseConfigLoader, config_watcher, load_activate_redis_config
+from src.utils.db_session import current_instance_id
+from src.utils.db_metrics import PoolMetrics
+
+if TYPE_CHECKING:
+    import redis.asyncio as redis
+
+# Settings that only take effect in a new connection pool
+POOL_SETTINGS = ("redis_max_connections", "redis_connection_timeout", "socket_timeout", "retry_on_timeout",
+                 "health_check_interval")
 
 
 class RedisPool:
     """Redis connection pool management class"""
 
-    _instance = None
+    # Pools by selected instance id, None is the pool of the first active instance
+    _instances: Dict[Optional[str], "RedisPool"] = {}
+    # Pools being created, concurrent first calls for an instance wait for the same one
+    _starting: Dict[Optional[str], "asyncio.Future[RedisPool]"] = {}
     _pool = None
     _redis = None
     _config = None
+    _redis_instance = None
+
+    def __init__(self, redis_instance_id: Optional[str] = None):
+        # None follows the first active instance across configuration reloads
+        self.redis_instance_id = redis_instance_id
+        self.metrics = PoolMetrics("redis")
+        # Held while the pool is created, so a pool dropped by close_pool is reopened once
+        self._initializing = asyncio.Lock()
+
+    @classmethod
+    async def get_instance(cls, redis_instance_id: Optional[str] = None):
+        """Get the pool of a Redis instance, created on first use, None for the first active instance"""
+        instance = cls._instances.get(redis_instance_id)
+        if instance is not None:
+            return instance
+        starting = cls._starting.get(redis_instance_id)
+        if starting is None:
+            starting = cls._starting[redis_instance_id] = asyncio.ensure_future(cls._start(redis_instance_id))
+            starting.add_done_callback(lambda _: cls._starting.pop(redis_instance_id, None))
+        # A cancelled caller does not cancel the creation the other callers wait for
+        return await asyncio.shield(starting)
 
     @classmethod
-    async def get_instance(cls):
-        """Get singleton instance"""
-        if cls._instance is None:
-            cls._instance = RedisPool()
-            await cls._instance._initialize()
-        return cls._instance
+    async def _start(cls, redis_instance_id: Optional[str]):
+        """Create the pool of an instance and register it once it is initialized"""
+        instance = RedisPool(redis_instance_id)
+        await instance._initialize()
+        # Statistics and configuration reloads only see initialized pools
+        cls._instances[redis_instance_id] = instance
+        return instance
 
     async def _initialize(self):
-        """Initialize connection pool"""
-        if self._pool is not None:
-            return
+        """Initialize connection pool, concurrent calls create a single pool"""
+        async with self._initializing:
+            if self._pool is not None:
+                return
+
+            # Get active Redis instance and configuration
+            redis_instance, redis_config = load_activate_redis_config(self.redis_instance_id)
+            self._pool, self._redis = await self._create_pool(redis_instance, redis_config)
 
-        # Get active Redis instance and configuration
-        redis_instance, redis_config = load_activate_redis_config()
+    async def _create_pool(self, redis_instance, redis_config):
+        """Create a connection pool and client for a Redis instance and make the instance and configuration current"""
         self._config = redis_config
+        self._redis_instance = redis_instance
+        self.metrics.name = redis_instance.redis_instance_id
 
         try:
+            # redis.asyncio is imported with the first pool, not at server startup
+            import redis.asyncio as redis
+            from src.utils.connection_pool import InstrumentedConnectionPool
+
             # Prepare connection pool parameters
             pool_kwargs = {
                 'host': redis_instance.redis_host,
@@ -59,25 +104,61 @@ class RedisPool:
                 pool_kwargs['ssl_cert_reqs'] = None
 
             # Create connection pool
-            self._pool = redis.ConnectionPool(**pool_kwargs)
+            pool = InstrumentedConnectionPool(self.metrics, **pool_kwargs)
 
             # Create Redis client
-            self._redis = redis.Redis(connection_pool=self._pool)
+            client = redis.Redis(connection_pool=pool)
 
             # Test connection
-            await self._redis.ping()
+            await client.ping()
 
             logger.info(f"Redis connection pool initialized successfully")
             logger.info(f"  Instance: {redis_instance.redis_instance_id}")
             logger.info(f"  Address: {redis_instance.redis_host}:{redis_instance.redis_port}")
             logger.info(f"  Database: {redis_instance.redis_database}")
             logger.info(f"  Max connections: {redis_config.redis_max_connections}")
+            return pool, client
 
         except Exception as e:
             logger.error(f"Redis connection pool initialization failed: {str(e)}")
+            self.metrics.record_error(e)
             raise
 
-    async def get_redis(self) -> redis.Redis:
+    async def apply_config(self, snapshot: ConfigSnapshot):
+        """
+        Switch to a new configuration snapshot
+
+        A changed instance or connection setting builds a new pool and client first, then the old
+        pool drops its idle connections, connections in use are closed when they are released.
+        """
+        redis_config = snapshot.config
+        if self.redis_instance_id is None:
+            redis_instance = snapshot.active_redis
+        else:
+            redis_instance = snapshot.get_instance(self.redis_instance_id)
+        if redis_instance is None:
+            logger.error("No active Redis instance in the new configuration, keeping the current pool")
+            return
+
+        rebuild = redis_instance != self._redis_instance or any(
+            getattr(redis_config, name) != getattr(self._config, name) for name in POOL_SETTINGS)
+        if not rebuild or self._pool is None:
+            self._config = redis_config
+            return
+
+        old_pool, old_config, old_instance = self._pool, self._config, self._redis_instance
+        try:
+            self._pool, self._redis = await self._create_pool(redis_instance, redis_config)
+        except Exception:
+            self._config, self._redis_instance = old_config, old_instance
+            self.metrics.name = old_instance.redis_instance_id
+            logger.error("Keeping the current connection pool, the new configuration could not be applied")
+            return
+
+        logger.info(f"Redis connection pool rebuilt for {redis_instance.redis_instance_id}, closing the previous pool")
+        await old_pool.disconnect(inuse_connections=False)
+
+    async def get_redis(self) -> "redis.Redis":
         """
         Get Redis client instance
 
@@ -88,6 +169,17 @@ class RedisPool:
             await self._initialize()
         return self._redis
 
+    def stats(self) -> dict:
+        """
+        Get pool state and metrics
+
+        Returns:
+            dict: Pool size, in-use, idle, waiters, acquire latency histogram, connection ages and errors by type
+        """
+        if self._pool is None:
+            return self.metrics.snapshot()
+        return self._pool.stats()
+
     async def health_check(self) -> bool:
         """
         Perform health check
@@ -136,8 +228,31 @@ class RedisPool:
 
 # Export connection pool retrieval function
 async def get_redis_pool():
-    """Get Redis connection pool instance"""
-    return await RedisPool.get_instance()
+    """Get the connection pool of the Redis instance selected by the current session"""
+    redis_instance_id = current_instance_id.get()
+    if redis_instance_id is not None and redis_instance_id == _active_instance_id():
+        # Sessions that select the first active instance share its pool
+        redis_instance_id = None
+    return await RedisPool.get_instance(redis_instance_id)
+
+
+def _active_instance_id() -> Optional[str]:
+    active_redis = DatabaseConfigLoader().get_active_redis()
+    return active_redis.redis_instance_id if active_redis else None
+
+
+def collect_pool_stats() -> list:
+    """Get metrics of the connection pools created so far, without creating one"""
+    return [pool.stats() for pool in RedisPool._instances.values()]
+
+
+async def _on_config_change(old: ConfigSnapshot, new: ConfigSnapshot):
+    """Apply a reloaded configuration to the pools created so far"""
+    for pool in list(RedisPool._instances.values()):
+        await pool.apply_config(new)
+
+
+config_watcher.add_listener(_on_config_change)
 
 
 if __name__ == "__main__":